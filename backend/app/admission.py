@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import heapq
+import itertools
+import math
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import (
+    WEBHOOK_MAX_INFLIGHT, WEBHOOK_PARTIAL_SHARE, WEBHOOK_QUEUE_MAX, WEBHOOK_QUEUE_WAIT_SEC, WEBHOOK_RATE_BURST,
+    WEBHOOK_RATE_CLOSE_RESERVE, WEBHOOK_RATE_PER_SEC,
+)
+
+# Admission control for POST /api/webhook/tradingview and /order.
+#
+# 1. Token bucket per sender (the secret it presented, else its address):
+#    WEBHOOK_RATE_PER_SEC sustained, WEBHOOK_RATE_BURST at once. Partial-bar updates stop
+#    at WEBHOOK_RATE_CLOSE_RESERVE tokens and then get 429 with Retry-After = seconds until
+#    they may take one again. Bar closes are never refused here: TradingView does not
+#    retry, so a close takes a token if one is left and otherwise goes on to step 2, whose
+#    bounded queue is what limits a sender that floods closes.
+# 2. In-flight slots: at most WEBHOOK_MAX_INFLIGHT ingests run at once (each in the
+#    threadpool, so the event loop and UI reads stay responsive); partial-bar updates may
+#    only take WEBHOOK_PARTIAL_SHARE of them, so bar closes always find room. Requests
+#    beyond that wait in a bounded queue, bar closes first, for up to
+#    WEBHOOK_QUEUE_WAIT_SEC; a full queue or a timeout answers 429 with Retry-After
+#    estimated from the recent ingest time.
+# State is per worker and only touched from the event loop thread, so it needs no locks.
+
+
+class Rejected(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = max(1, int(math.ceil(retry_after)))
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+        self._buckets: Dict[str, Tuple[float, float]] = {}  # key -> (tokens, updated_at)
+
+    def take(self, key: str, now: Optional[float] = None, reserve: float = 0.0) -> float:
+        """0 when a token was taken, else seconds until one is available.
+
+        `reserve` tokens (capped below the burst) are left in the bucket for other callers.
+        """
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic() if now is None else now
+        need = 1.0 + min(max(0.0, reserve), self.burst - 1.0)
+        tokens, at = self._buckets.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - at) * self.rate)
+        if tokens >= need:
+            self._buckets[key] = (tokens - 1.0, now)
+            return 0.0
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > 10_000:
+            self._prune(now)
+        return (need - tokens) / self.rate
+
+    def _prune(self, now: float) -> None:
+        # Buckets that have refilled completely carry no state.
+        full = self.burst / self.rate
+        for k in [k for k, (_, at) in self._buckets.items() if now - at >= full]:
+            del self._buckets[k]
+
+
+class Gate:
+    """Bounded in-flight slots with a priority wait queue (0 = bar close, 1 = partial update)."""
+
+    def __init__(self, capacity: int, partial_share: float, queue_max: int, wait_sec: float):
+        self.capacity = max(1, int(capacity))
+        self.partial_cap = max(1, int(self.capacity * float(partial_share)))
+        self.queue_max = max(0, int(queue_max))
+        self.wait_sec = float(wait_sec)
+        self.in_flight = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._service_sec = 0.05  # EWMA of ingest time, for Retry-After
+        self.stats: Dict[str, int] = {"admitted": 0, "queued": 0, "rejected_queue_full": 0, "rejected_timeout": 0}
+
+    def _limit(self, prio: int) -> int:
+        return self.capacity if prio == 0 else self.partial_cap
+
+    def retry_after(self) -> float:
+        return self._service_sec * (len(self._waiters) + 1) / self.capacity
+
+    async def acquire(self, prio: int) -> None:
+        if self.in_flight < self._limit(prio) and not any(w[0] <= prio for w in self._waiters):
+            self.in_flight += 1
+            self.stats["admitted"] += 1
+            return
+        if len(self._waiters) >= self.queue_max:
+            self.stats["rejected_queue_full"] += 1
+            raise Rejected("ingest queue full", self.retry_after())
+        fut: asyncio.Future = asyncio.get_running_loop().create_future()
+        entry = (prio, next(self._seq), fut)
+        heapq.heappush(self._waiters, entry)
+        self.stats["queued"] += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(fut), self.wait_sec)
+        except asyncio.TimeoutError:
+            self._abandon(entry)
+            self.stats["rejected_timeout"] += 1
+            raise Rejected("ingest queue wait timed out", self.retry_after())
+        except BaseException:  # client went away while queued
+            self._abandon(entry)
+            raise
+        self.stats["admitted"] += 1
+
+    def _abandon(self, entry: Tuple[int, int, asyncio.Future]) -> None:
+        fut = entry[2]
+        if fut.done() and not fut.cancelled():
+            self.release(0.0)  # the slot was handed over just as we gave up
+            return
+        fut.cancel()
+        self._waiters.remove(entry)
+        heapq.heapify(self._waiters)
+
+    def release(self, elapsed_sec: float) -> None:
+        self.in_flight -= 1
+        if elapsed_sec > 0:
+            self._service_sec = 0.8 * self._service_sec + 0.2 * elapsed_sec
+        # Hand free slots to the best waiters their class allows.
+        while self._waiters and self.in_flight < self._limit(self._waiters[0][0]):
+            _, _, fut = heapq.heappop(self._waiters)
+            if fut.done():
+                continue
+            self.in_flight += 1
+            fut.set_result(True)
+
+    def state(self) -> Dict[str, Any]:
+        return {"in_flight": self.in_flight, "waiting": len(self._waiters), "capacity": self.capacity,
+                "partial_capacity": self.partial_cap, "avg_ingest_ms": round(self._service_sec * 1000.0, 2),
+                **self.stats}
+
+
+_BUCKETS = TokenBucket(WEBHOOK_RATE_PER_SEC, WEBHOOK_RATE_BURST)
+_GATE = Gate(WEBHOOK_MAX_INFLIGHT, WEBHOOK_PARTIAL_SHARE, WEBHOOK_QUEUE_MAX, WEBHOOK_QUEUE_WAIT_SEC)
+_RATE_LIMITED = 0
+_CLOSES_OVER_RATE = 0
+
+
+def sender_key(secret: Optional[str], client_host: Optional[str]) -> str:
+    if secret:
+        return "s:" + hashlib.sha1(secret.encode("utf-8")).hexdigest()[:16]
+    return "h:" + (client_host or "?")
+
+
+def check_rate(key: str, bar_close: bool = False) -> None:
+    """Take one token for `key` or raise Rejected (partial updates only; see the header)."""
+    global _RATE_LIMITED, _CLOSES_OVER_RATE
+    wait = _BUCKETS.take(key, reserve=0.0 if bar_close else WEBHOOK_RATE_CLOSE_RESERVE)
+    if wait <= 0:
+        return
+    if bar_close:
+        _CLOSES_OVER_RATE += 1
+        return
+    _RATE_LIMITED += 1
+    raise Rejected("rate limit exceeded", wait)
+
+
+class slot:
+    """`async with slot(bar_close):` around one ingest."""
+
+    def __init__(self, bar_close: bool):
+        self.prio = 0 if bar_close else 1
+        self._t0 = 0.0
+
+    async def __aenter__(self) -> "slot":
+        await _GATE.acquire(self.prio)
+        self._t0 = time.perf_counter()
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        _GATE.release(time.perf_counter() - self._t0)
+
+
+def state() -> Dict[str, Any]:
+    return {"rate_per_sec": WEBHOOK_RATE_PER_SEC, "burst": WEBHOOK_RATE_BURST,
+            "close_reserve": WEBHOOK_RATE_CLOSE_RESERVE, "rate_limited": _RATE_LIMITED,
+            "closes_over_rate": _CLOSES_OVER_RATE, "senders": len(_BUCKETS._buckets), **_GATE.state()}
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from .config import DB_READERS
+
+# Awaitable access to the SQLite layer for async handlers (webhook, /api/candles,
+# /api/recommend).
+#
+# Two dedicated lanes replace the shared anyio threadpool for DB work:
+#   writer   one thread. Every candle write of the webhook runs here, one after another,
+#            so writers never wait on each other's WAL write lock (no busy-timeout spins)
+#            and the order of writes is the order of arrival.
+#   readers  DB_READERS threads for reads and read-mostly builds (chart data, recommend).
+#            A burst of slow reads queues here instead of taking the threadpool slots that
+#            the rest of the app (sync endpoints, notifications) runs on.
+# Both lanes borrow connections from db.connect()'s pool like everything else; the event
+# loop itself never touches SQLite. Sync callers (tools, background jobs) keep calling db.*.
+
+T = TypeVar("T")
+
+
+class _Lane:
+    def __init__(self, name: str, threads: int):
+        self.name = name
+        self.threads = max(1, int(threads))
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.stats: Dict[str, float] = {"done": 0, "errors": 0, "wait_sec": 0.0, "run_sec": 0.0}
+
+    def executor(self) -> ThreadPoolExecutor:
+        pool = self._pool
+        if pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(self.threads, thread_name_prefix=f"wonyodd-db-{self.name}")
+                pool = self._pool
+        return pool
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        queued = time.perf_counter()
+
+        def call() -> T:
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except BaseException:
+                with self._lock:
+                    self.stats["errors"] += 1
+                raise
+            finally:
+                done = time.perf_counter()
+                with self._lock:
+                    self.stats["done"] += 1
+                    self.stats["wait_sec"] += started - queued
+                    self.stats["run_sec"] += done - started
+
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor(), call)
+        finally:
+            self.pending -= 1
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)  # queued writes still land
+
+    def state(self) -> Dict[str, Any]:
+        done = max(1.0, self.stats["done"])
+        return {"threads": self.threads, "pending": self.pending, "done": int(self.stats["done"]),
+                "errors": int(self.stats["errors"]),
+                "avg_wait_ms": round(self.stats["wait_sec"] / done * 1000.0, 3),
+                "avg_run_ms": round(self.stats["run_sec"] / done * 1000.0, 3)}
+
+
+_WRITER = _Lane("writer", 1)
+_READERS = _Lane("reader", DB_READERS)
+
+
+async def read(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run `fn(*args, **kwargs)` (which does its own db.connect()) on a reader thread."""
+    return await _READERS.run(fn, *args, **kwargs)
+
+
+async def write(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run `fn(*args, **kwargs)` on the single writer thread, after every write queued before it."""
+    return await _WRITER.run(fn, *args, **kwargs)
+
+
+def shutdown() -> None:
+    """Finish queued work and stop both lanes (app shutdown); they restart on next use."""
+    _WRITER.shutdown()
+    _READERS.shutdown()
+
+
+def state() -> Dict[str, Any]:
+    return {"writer": _WRITER.state(), "readers": _READERS.state()}
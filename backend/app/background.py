@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional
+
+from . import shared
+from .config import (
+    BACKGROUND_REFRESH_SEC, BACKUP_INTERVAL_SEC, GAP_BACKFILL_SEC, LEADER_LEASE_SEC, MAINTENANCE_INTERVAL_SEC,
+    OUTCOME_ENABLED, OUTCOME_POLL_SEC,
+)
+
+LEADER_LEASE = "background_refresh"
+
+_THREAD: Optional[threading.Thread] = None
+_STOP = threading.Event()
+
+_WARM: Dict[str, Any] = {"status": "cold", "started_ts": None, "elapsed_sec": None, "detail": None}
+_WARM_LOCK = threading.Lock()
+
+
+def refresh_best_params() -> int:
+    """Recompute best params for every intraday tf/side (no-op when already current)."""
+    from .recommend import best_params_many
+    from .timeframes import trade_timeframes
+
+    pairs = [(tf, side) for tf in trade_timeframes() for side in ("long", "short")]
+    return sum(1 for p in best_params_many(pairs).values() if p.get("ok"))
+
+
+def _warmup() -> None:
+    t0 = time.time()
+    detail = "skipped (not leader)"
+    try:
+        # Import the numpy/evaluator stack here so no request pays for it.
+        from .recommend import recommend
+
+        if shared.try_acquire_lease(LEADER_LEASE, float(LEADER_LEASE_SEC)):
+            # recommend() fills regime, per-tf indicators and the best-params cache.
+            oks = [bool(recommend(side=side).get("ok")) for side in ("long", "short")]
+            detail = f"recommend ok={oks}"
+    except Exception as e:
+        detail = f"error: {type(e).__name__}: {e}"
+    elapsed = round(time.time() - t0, 3)
+    with _WARM_LOCK:
+        _WARM.update({"status": "ok", "elapsed_sec": elapsed, "detail": detail})
+    print(f"[DEBUG] Warm-up done in {elapsed:.3f}s ({detail})")
+
+
+def start_warmup() -> None:
+    """Precompute in a background thread; /api/health reports "warming" meanwhile."""
+    with _WARM_LOCK:
+        if _WARM["status"] == "warming":
+            return
+        _WARM.update({"status": "warming", "started_ts": int(time.time()), "elapsed_sec": None, "detail": None})
+    threading.Thread(target=_warmup, name="wonyodd-warmup", daemon=True).start()
+
+
+def warm_state() -> Dict[str, Any]:
+    with _WARM_LOCK:
+        return dict(_WARM)
+
+
+@dataclass
+class Job:
+    name: str
+    interval_sec: float
+    fn: Callable[[], Any]
+    leader_only: bool = True
+    next_run: float = 0.0
+    last: Dict[str, Any] = field(default_factory=dict)
+
+
+_JOBS: Dict[str, Job] = {}
+_JOBS_LOCK = threading.Lock()
+
+
+def register_job(name: str, interval_sec: float, fn: Callable[[], Any], leader_only: bool = True,
+                 first_delay_sec: float = 0.0) -> bool:
+    """Run fn every interval_sec on the background thread (interval <= 0 disables it).
+
+    leader_only jobs run on the lease holder only, so N workers do the work once.
+    """
+    if float(interval_sec) <= 0:
+        return False
+    with _JOBS_LOCK:
+        _JOBS[name] = Job(name, float(interval_sec), fn, leader_only, next_run=time.time() + float(first_delay_sec))
+    return True
+
+
+def jobs_state() -> Dict[str, Dict[str, Any]]:
+    with _JOBS_LOCK:
+        return {j.name: {"interval_sec": j.interval_sec, "leader_only": j.leader_only, **j.last} for j in _JOBS.values()}
+
+
+def _run_due_jobs() -> float:
+    """Run every due job once; return seconds until the next one is due."""
+    now = time.time()
+    with _JOBS_LOCK:
+        jobs = list(_JOBS.values())
+    leader: Optional[bool] = None
+    for job in jobs:
+        if job.next_run > now:
+            continue
+        if job.leader_only:
+            if leader is None:
+                ttl = max(float(LEADER_LEASE_SEC), min(min(j.interval_sec for j in jobs) * 2, 600.0))
+                leader = shared.try_acquire_lease(LEADER_LEASE, ttl)
+            if not leader:
+                job.next_run = now + job.interval_sec
+                continue
+        t0 = time.time()
+        try:
+            result = job.fn()
+            job.last = {"last_run_ts": int(t0), "elapsed_sec": round(time.time() - t0, 3), "result": result}
+            if result is not None:  # None = nothing to do (frequent polling jobs)
+                print(f"[DEBUG] Job {job.name} ({shared.WORKER_ID}): {result} in {time.time() - t0:.2f}s")
+        except Exception as e:
+            job.last = {"last_run_ts": int(t0), "error": f"{type(e).__name__}: {e}"}
+            print(f"[WARN] Job {job.name} error: {type(e).__name__}: {e}")
+        job.next_run = time.time() + job.interval_sec
+    with _JOBS_LOCK:
+        nxt = min((j.next_run for j in _JOBS.values()), default=now + 60.0)
+    return max(0.5, nxt - time.time())
+
+
+def _loop() -> None:
+    while not _STOP.is_set():
+        _STOP.wait(_run_due_jobs())
+
+
+def _register_builtin_jobs() -> None:
+    register_job("refresh_best_params", BACKGROUND_REFRESH_SEC, refresh_best_params, first_delay_sec=BACKGROUND_REFRESH_SEC)
+
+    def maintenance() -> Any:
+        from .retention import run_maintenance
+        return run_maintenance()
+
+    register_job("db_maintenance", MAINTENANCE_INTERVAL_SEC, maintenance, first_delay_sec=60.0)
+
+    def outcomes() -> Any:
+        from .outcomes import run
+        return run()
+
+    register_job("outcomes", OUTCOME_POLL_SEC if OUTCOME_ENABLED else 0, outcomes, first_delay_sec=OUTCOME_POLL_SEC)
+
+    def gap_backfill() -> Any:
+        from .gaps import backfill
+        return backfill()
+
+    register_job("gap_backfill", GAP_BACKFILL_SEC, gap_backfill, first_delay_sec=30.0)
+
+    def db_backup() -> Any:
+        from .backup import run_scheduled
+        return run_scheduled()
+
+    register_job("db_backup", BACKUP_INTERVAL_SEC, db_backup, first_delay_sec=min(float(BACKUP_INTERVAL_SEC), 600.0))
+
+
+def start() -> bool:
+    global _THREAD
+    if _THREAD is not None and _THREAD.is_alive():
+        return False
+    _register_builtin_jobs()
+    with _JOBS_LOCK:
+        if not _JOBS:
+            return False
+    _STOP.clear()
+    _THREAD = threading.Thread(target=_loop, name="wonyodd-background", daemon=True)
+    _THREAD.start()
+    return True
+
+
+def stop() -> None:
+    global _THREAD
+    _STOP.set()
+    if _THREAD is not None:
+        _THREAD.join(timeout=5)
+        _THREAD = None
+    shared.release_lease(LEADER_LEASE)
@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from . import db
+from .config import BACKUP_DIR, BACKUP_KEEP, BACKUP_PAGES, BACKUP_SLEEP_SEC, DB_PATH
+
+# Online snapshots of the live database with SQLite's backup API (tools/backup.py and the
+# "db_backup" background job).
+#
+# The copy runs in steps of BACKUP_PAGES pages with a BACKUP_SLEEP_SEC pause between
+# them, so it never competes with ingestion for long. The source connection holds one
+# read transaction for the whole copy: in WAL mode that pins a single snapshot (the file
+# is consistent as of the start) without blocking writers. Without it, every commit by
+# another connection restarts the backup from page 0 and a busy DB never finishes.
+# The WAL cannot be checkpointed past the pinned snapshot, so it grows until the copy ends.
+#
+# Every snapshot is a full, self-contained file (rollback journal, quick_check'ed) written
+# to a .tmp name and renamed; the BACKUP_KEEP newest are kept. The report compares this
+# process's candle write latency during the copy with the same span just before it.
+
+PREFIX = "wonyodd-"
+SUFFIX = ".sqlite3"
+
+_LOCK = threading.Lock()
+_LAST: Dict[str, Any] = {}
+
+
+def backup_dir() -> Path:
+    if BACKUP_DIR:
+        return Path(BACKUP_DIR)
+    return Path(DB_PATH).resolve().parent / "backups"
+
+
+def list_backups(directory: Optional[Path] = None) -> List[Path]:
+    """Snapshot files in `directory` (default: backup_dir()), oldest first."""
+    d = Path(directory) if directory is not None else backup_dir()
+    if not d.is_dir():
+        return []
+    return sorted(p for p in d.glob(f"{PREFIX}*{SUFFIX}") if p.is_file())
+
+
+def _latency_ms(samples: List[float]) -> Dict[str, Any]:
+    if not samples:
+        return {"writes": 0}
+    s = sorted(samples)
+    return {
+        "writes": len(s),
+        "p50_ms": round(s[len(s) // 2] * 1000.0, 3),
+        "p99_ms": round(s[min(len(s) - 1, int(len(s) * 0.99))] * 1000.0, 3),
+        "max_ms": round(s[-1] * 1000.0, 3),
+    }
+
+
+def _copy(src: sqlite3.Connection, dst: sqlite3.Connection, pages: int, sleep: float) -> Dict[str, int]:
+    steps = {"steps": 0, "restarts": 0, "pages": 0}
+    last_remaining: List[Optional[int]] = [None]
+
+    def progress(status: int, remaining: int, total: int) -> None:
+        steps["steps"] += 1
+        steps["pages"] = total
+        prev = last_remaining[0]
+        if prev is not None and remaining > prev:
+            steps["restarts"] += 1
+        last_remaining[0] = remaining
+        if remaining and sleep > 0:
+            time.sleep(sleep)  # the GIL and all locks are free here; writers proceed
+
+    # `sleep=` of Connection.backup only applies on SQLITE_BUSY; the pause between steps is the progress callback.
+    src.backup(dst, pages=max(1, int(pages)), progress=progress)
+    return steps
+
+
+def snapshot(dest: Optional[str] = None, pages: int = BACKUP_PAGES, sleep: float = BACKUP_SLEEP_SEC,
+             keep: int = BACKUP_KEEP) -> Dict[str, Any]:
+    """Copy the live DB to `dest` (default: a timestamped file in backup_dir()) and return a report."""
+    if not _LOCK.acquire(blocking=False):
+        raise RuntimeError("a backup is already running")
+    try:
+        if dest is None:
+            stamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+            path = backup_dir() / f"{PREFIX}{stamp}{SUFFIX}"
+        else:
+            path = Path(dest)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.unlink(missing_ok=True)
+
+        t0 = time.time()
+        src = sqlite3.connect(DB_PATH, isolation_level=None, check_same_thread=False)
+        dst = sqlite3.connect(str(tmp), isolation_level=None)
+        try:
+            src.execute("BEGIN")
+            # The first read starts the transaction's snapshot; the backup then reads it.
+            src.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+            steps = _copy(src, dst, pages, sleep)
+            src.execute("ROLLBACK")
+            copied = time.time()
+            dst.execute("PRAGMA journal_mode=DELETE")  # one self-contained file
+            check = dst.execute("PRAGMA quick_check").fetchone()[0]
+        finally:
+            src.close()
+            dst.close()
+        if check != "ok":
+            tmp.unlink(missing_ok=True)
+            raise RuntimeError(f"backup failed quick_check: {check}")
+        os.replace(tmp, path)
+        removed = _rotate(path.parent, keep) if dest is None else []
+
+        span = max(copied - t0, 1.0)
+        out = {
+            "path": str(path),
+            "bytes": path.stat().st_size,
+            "started_ts": int(t0),
+            "elapsed_sec": round(copied - t0, 3),
+            "check_sec": round(time.time() - copied, 3),
+            **steps,
+            "page_step": int(pages),
+            "sleep_sec": float(sleep),
+            "write_latency": {
+                "before": _latency_ms(db.write_times(t0 - span, t0)),
+                "during": _latency_ms(db.write_times(t0, copied)),
+            },
+            "removed": removed,
+        }
+        _LAST.clear()
+        _LAST.update(out)
+        return out
+    finally:
+        _LOCK.release()
+
+
+def _rotate(directory: Path, keep: int) -> List[str]:
+    if int(keep) <= 0:
+        return []
+    files = list_backups(directory)
+    old = files[:-int(keep)]
+    for p in old:
+        p.unlink(missing_ok=True)
+    return [p.name for p in old]
+
+
+def verify(path: str) -> Dict[str, Any]:
+    """quick_check and schema version of a snapshot file (opened read-only)."""
+    p = Path(path)
+    if not p.is_file():
+        raise ValueError(f"no such backup: {path}")
+    conn = sqlite3.connect(f"{p.resolve().as_uri()}?mode=ro", uri=True)
+    try:
+        check = conn.execute("PRAGMA quick_check").fetchone()[0]
+        version = int(conn.execute("PRAGMA user_version").fetchone()[0])
+        has_candles = conn.execute(
+            """SELECT 1 FROM sqlite_master WHERE type='table' AND name='candles'"""
+        ).fetchone() is not None
+    except sqlite3.DatabaseError as e:
+        raise ValueError(f"not a usable SQLite database: {path} ({e})")
+    finally:
+        conn.close()
+    return {"path": str(p), "bytes": p.stat().st_size, "quick_check": check, "schema_version": version,
+            "candles_table": has_candles}
+
+
+def restore(path: str, keep_current: bool = True, pages: int = BACKUP_PAGES) -> Dict[str, Any]:
+    """Replace the DB at DB_PATH with the snapshot at `path` (run with the service stopped).
+
+    The snapshot is checked first; with keep_current the existing DB is snapshotted next to
+    it as <db>.pre-restore-<time> before it is overwritten. Pages are written through the
+    backup API into the target connection, so its WAL and -shm stay consistent.
+    """
+    info = verify(path)
+    if info["quick_check"] != "ok" or not info["candles_table"]:
+        raise ValueError(f"refusing to restore {path}: {info}")
+    t0 = time.time()
+    target = Path(DB_PATH)
+    saved = None
+    if keep_current and target.exists():
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+        saved = str(target.with_name(f"{target.name}.pre-restore-{stamp}"))
+        snapshot(dest=saved, pages=pages, sleep=0.0)
+    src = sqlite3.connect(f"{Path(path).resolve().as_uri()}?mode=ro", uri=True)
+    dst = sqlite3.connect(DB_PATH, isolation_level=None)
+    try:
+        src.backup(dst, pages=max(1, int(pages)))
+        dst.execute("PRAGMA journal_mode=WAL")
+        dst.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        src.close()
+        dst.close()
+    return {"restored": str(path), "db_path": DB_PATH, "previous_saved_to": saved,
+            "schema_version": info["schema_version"], "elapsed_sec": round(time.time() - t0, 3)}
+
+
+def run_scheduled() -> Dict[str, Any]:
+    """Background job: one snapshot + rotation; the result is a short summary."""
+    out = snapshot()
+    return {k: out[k] for k in ("path", "elapsed_sec", "steps", "restarts", "write_latency")}
+
+
+def state() -> Dict[str, Any]:
+    files = list_backups()
+    return {
+        "dir": str(backup_dir()),
+        "files": len(files),
+        "latest": files[-1].name if files else None,
+        "running": _LOCK.locked(),
+        "last": dict(_LAST) or None,
+    }
@@ -36,10 +36,20 @@ ENTRY_ATR_K_30 = env_float("WONYODD_ENTRY_ATR_K_30", 1.0)
 ENTRY_ATR_K_60 = env_float("WONYODD_ENTRY_ATR_K_60", 0.25)
 ENTRY_ATR_K_180 = env_float("WONYODD_ENTRY_ATR_K_180", 0.6)
 
+# Timeframes recommend() evaluates (any of 5m,15m,30m,60m,180m,240m,1D,1W...); other TFs
+# use WONYODD_ENTRY_ATR_K_<minutes>, e.g. WONYODD_ENTRY_ATR_K_240
+TRADE_TFS = env_str("WONYODD_TRADE_TFS", "30m,60m,180m")
+EXTRA_TFS = env_str("WONYODD_EXTRA_TFS", "")  # more timeframes the webhook accepts, e.g. "240m"
+
 # how many candles to keep in memory calculations
-LOOKBACK_1D = int(env_float("WONYODD_LOOKBACK_1D", 260))
 LOOKBACK_INTRA = int(env_float("WONYODD_LOOKBACK_INTRA", 260))
 
+# 1D regime (app/regime.py); the whole daily history is labelled once per 1D write
+REGIME_SLOPE_DAYS = int(env_float("WONYODD_REGIME_SLOPE_DAYS", 20))  # log-close regression window
+REGIME_VOL_DAYS = int(env_float("WONYODD_REGIME_VOL_DAYS", 20))  # realized volatility window
+REGIME_VOL_RANK_DAYS = int(env_float("WONYODD_REGIME_VOL_RANK_DAYS", 365))  # low/normal/high terciles over this
+REGIME_MACRO = env_str("WONYODD_REGIME_MACRO", "")  # 1D feature z-scores, e.g. "t10y2y*1,hy_spread*-1" (empty = off)
+
 
 # Webhook ingestion guards
 REQUIRE_BAR_CLOSE = env_bool("WONYODD_REQUIRE_BAR_CLOSE", False)
@@ -52,6 +62,29 @@ INCLUDE_PARTIAL_BARS = env_bool("WONYODD_INCLUDE_PARTIAL_BARS", True)
 # Evaluator / scoring (recent backtest window)
 EVAL_LOOKBACK_BARS = int(env_float("WONYODD_EVAL_LOOKBACK_BARS", 2000))
 
+# Parallel best-params grid search across timeframes (processes; 0 = in-process)
+EVAL_PROCESSES = int(env_float("WONYODD_EVAL_PROCESSES", 0))
+
+# Trading costs used by the evaluator (best params are ranked on net returns)
+FEE_MAKER_BPS = env_float("WONYODD_FEE_MAKER_BPS", 2.0)  # limit entries
+FEE_TAKER_BPS = env_float("WONYODD_FEE_TAKER_BPS", 5.0)  # market entries, stops, SMA5 exits
+SLIPPAGE_BPS = env_float("WONYODD_SLIPPAGE_BPS", 1.0)  # per taker fill
+SLIPPAGE_ATR_FRAC = env_float("WONYODD_SLIPPAGE_ATR_FRAC", 0.0)  # extra per taker fill, fraction of ATR14
+SLIPPAGE_VOLUME_SCALED = env_bool("WONYODD_SLIPPAGE_VOLUME_SCALED", False)  # scale by sqrt(avg volume / bar volume)
+FUNDING_ENABLED = env_bool("WONYODD_FUNDING_ENABLED", True)  # charge funding_rates to held positions
+
+# Intrabar fills: settle limit-entry and stop prices from stored 1m candles on the bars that touch them
+INTRABAR_FILLS = env_bool("WONYODD_INTRABAR_FILLS", False)
+INTRABAR_TF = env_str("WONYODD_INTRABAR_TF", "1m")
+
+# Robustness mode for the best-params search: rank grid points by a bootstrap of their trades
+ROBUST_EVAL = env_bool("WONYODD_ROBUST_EVAL", False)
+ROBUST_METHOD = env_str("WONYODD_ROBUST_METHOD", "block").strip().lower()  # block|window
+ROBUST_RESAMPLES = int(env_float("WONYODD_ROBUST_RESAMPLES", 1000))
+ROBUST_BLOCK = int(env_float("WONYODD_ROBUST_BLOCK", 5))  # trades per bootstrap block
+ROBUST_WINDOW_FRAC = env_float("WONYODD_ROBUST_WINDOW_FRAC", 0.5)  # share of trades per sub-window
+ROBUST_STD_PENALTY = env_float("WONYODD_ROBUST_STD_PENALTY", 1.0)  # robust = mean - penalty * std
+
 # Volatility filters (ATR% bounds)
 MIN_ATR_PCT = env_float("WONYODD_MIN_ATR_PCT", 0.15)
 MAX_ATR_PCT = env_float("WONYODD_MAX_ATR_PCT", 4.0)
@@ -80,3 +113,93 @@ READY_NOTIFY_TFS = env_str("WONYODD_READY_NOTIFY_TFS", "30m,60m,180m")  # comma-
 READY_NOTIFY_SIDE = env_str("WONYODD_READY_NOTIFY_SIDE", "both")  # auto|long|short|both
 READY_NOTIFY_ONLY_BAR_CLOSE = env_bool("WONYODD_READY_NOTIFY_ONLY_BAR_CLOSE", True)
 READY_NOTIFY_COOLDOWN_SEC = int(env_float("WONYODD_READY_NOTIFY_COOLDOWN_SEC", 0))
+# A claimed notification whose send never finished (process died) is free again after this
+NOTIFY_CLAIM_TTL_SEC = int(env_float("WONYODD_NOTIFY_CLAIM_TTL_SEC", 120))
+
+# API response encoding (uses orjson when installed; falls back to stdlib json)
+FAST_JSON = env_bool("WONYODD_FAST_JSON", True)
+
+# HTTP caching for /api/candles and /api/recommend (ETag / Last-Modified / 304)
+HTTP_CACHE_ENABLED = env_bool("WONYODD_HTTP_CACHE_ENABLED", True)
+RESPONSE_CACHE_SIZE = int(env_float("WONYODD_RESPONSE_CACHE_SIZE", 64))  # entries, 0 = off
+RESPONSE_CACHE_MAX_AGE_SEC = env_float("WONYODD_RESPONSE_CACHE_MAX_AGE_SEC", 300)  # bounds wall-clock fields
+RECOMMEND_ETAG_BUCKET_SEC = env_float("WONYODD_RECOMMEND_ETAG_BUCKET_SEC", 60)  # /api/recommend ETag also rolls over this often (time_to_next_sec), 0 = off
+DATA_VERSION_POLL_SEC = env_float("WONYODD_DATA_VERSION_POLL_SEC", 1.0)  # local mode: check data_versions for other processes' writes
+
+# Multi-worker deployment: with more than one worker, caches/versions/leases live in SQLite
+WORKERS = int(env_float("WONYODD_WORKERS", 1))
+SHARED_STATE = env_str("WONYODD_SHARED_STATE", "sqlite" if WORKERS > 1 else "local").strip().lower()  # local|sqlite
+LEADER_LEASE_SEC = env_float("WONYODD_LEADER_LEASE_SEC", 30)
+BACKGROUND_REFRESH_SEC = env_float("WONYODD_BACKGROUND_REFRESH_SEC", 60 if WORKERS > 1 else 0)  # 0 = off
+
+# Startup (lifespan): pooled connections, background warm-up, static frontend dir
+DB_POOL_SIZE = int(env_float("WONYODD_DB_POOL_SIZE", 4))
+DB_READERS = int(env_float("WONYODD_DB_READERS", 4))  # reader threads of app/aiodb.py (plus one writer)
+
+# Write-behind buffer / group commit for candle upserts (app/writebuf.py)
+WRITE_BUFFER_MS = env_float("WONYODD_WRITE_BUFFER_MS", 0)  # flush interval; 0 = off (one commit per upsert)
+WRITE_BUFFER_MAX_ROWS = int(env_float("WONYODD_WRITE_BUFFER_MAX_ROWS", 500))  # flush early at this many bars
+WRITE_DURABILITY = env_str("WONYODD_WRITE_DURABILITY", "full")  # full|normal|buffered
+WARMUP_ENABLED = env_bool("WONYODD_WARMUP_ENABLED", True)
+FRONTEND_DIR = env_str("WONYODD_FRONTEND_DIR", "")  # default: <project root>/frontend
+
+# Retention / archival / maintenance for the candles table
+RETENTION_RAW_TFS = env_str("WONYODD_RETENTION_RAW_TFS", "1m,5m,15m")  # TFs subject to retention
+RETENTION_RAW_DAYS = env_float("WONYODD_RETENTION_RAW_DAYS", 30)  # 0 = keep forever
+ARCHIVE_DIR = env_str("WONYODD_ARCHIVE_DIR", "")  # default: <db dir>/archive
+MAINTENANCE_INTERVAL_SEC = env_float("WONYODD_MAINTENANCE_INTERVAL_SEC", 3600)  # 0 = off
+
+# Webhook admission control (app/admission.py), per worker
+WEBHOOK_RATE_PER_SEC = env_float("WONYODD_WEBHOOK_RATE_PER_SEC", 20)  # per sender (secret or address); 0 = off
+WEBHOOK_RATE_BURST = env_float("WONYODD_WEBHOOK_RATE_BURST", 60)
+WEBHOOK_RATE_CLOSE_RESERVE = env_float("WONYODD_WEBHOOK_RATE_CLOSE_RESERVE", 20)  # tokens partial updates leave
+WEBHOOK_MAX_INFLIGHT = int(env_float("WONYODD_WEBHOOK_MAX_INFLIGHT", 4))  # concurrent ingests
+WEBHOOK_PARTIAL_SHARE = env_float("WONYODD_WEBHOOK_PARTIAL_SHARE", 0.5)  # slots partial-bar updates may use
+WEBHOOK_QUEUE_MAX = int(env_float("WONYODD_WEBHOOK_QUEUE_MAX", 64))  # waiting requests before 429
+WEBHOOK_QUEUE_WAIT_SEC = env_float("WONYODD_WEBHOOK_QUEUE_WAIT_SEC", 5.0)
+
+# Webhook dedup: (tf, ts) -> content digest of recently accepted bars, per worker (app/ingest.py)
+INGEST_DEDUP_SIZE = int(env_float("WONYODD_INGEST_DEDUP_SIZE", 4096))  # 0 = off
+
+# Gap index + backfill of missing trade-TF bars from lower-TF bars (app/gaps.py)
+GAP_BACKFILL_SEC = env_float("WONYODD_GAP_BACKFILL_SEC", 300)  # 0 = off
+GAP_BACKFILL_MAX_BUCKETS = int(env_float("WONYODD_GAP_BACKFILL_MAX_BUCKETS", 500))  # per target TF and run
+
+# Online snapshots (app/backup.py): stepped SQLite backup API copies of the live DB
+BACKUP_DIR = env_str("WONYODD_BACKUP_DIR", "")  # default: <db dir>/backups
+BACKUP_INTERVAL_SEC = env_float("WONYODD_BACKUP_INTERVAL_SEC", 0)  # 0 = off
+BACKUP_KEEP = int(env_float("WONYODD_BACKUP_KEEP", 7))  # newest snapshots kept (0 = all)
+BACKUP_PAGES = int(env_float("WONYODD_BACKUP_PAGES", 1024))  # pages copied per step
+BACKUP_SLEEP_SEC = env_float("WONYODD_BACKUP_SLEEP_SEC", 0.02)  # pause between steps
+
+# Point-in-time recommendation history (one row per trade-TF bar close and side)
+HISTORY_ENABLED = env_bool("WONYODD_HISTORY_ENABLED", True)
+HISTORY_FLUSH_SEC = env_float("WONYODD_HISTORY_FLUSH_SEC", 2.0)  # batch window after a bar close
+
+# Outcome tracking of READY plans (fills, TP1-3, stop) from incoming candles
+OUTCOME_ENABLED = env_bool("WONYODD_OUTCOME_ENABLED", True)
+OUTCOME_POLL_SEC = env_float("WONYODD_OUTCOME_POLL_SEC", 10)  # 0 = off
+OUTCOME_FEED_TFS = env_str("WONYODD_OUTCOME_FEED_TFS", "1m")  # finest first; trade TFs are always added
+OUTCOME_MAX_BARS = int(env_float("WONYODD_OUTCOME_MAX_BARS", 48))  # filled plans time out after this many bars
+OUTCOME_SETTLE_SEC = env_float("WONYODD_OUTCOME_SETTLE_SEC", 60)  # wait for a feed TF's latest bar past its close
+
+# plan.scenario projection: block bootstrap of past moves conditioned on 1D regime and ATR%
+SCENARIO_ENABLED = env_bool("WONYODD_SCENARIO_ENABLED", True)
+SCENARIO_PATHS = int(env_float("WONYODD_SCENARIO_PATHS", 2000))
+SCENARIO_BARS = int(env_float("WONYODD_SCENARIO_BARS", 20))  # projection horizon (bars of the plan TF)
+SCENARIO_BLOCK = int(env_float("WONYODD_SCENARIO_BLOCK", 5))  # consecutive historical bars per draw
+SCENARIO_LOOKBACK_BARS = int(env_float("WONYODD_SCENARIO_LOOKBACK_BARS", 5000))
+SCENARIO_ATR_FRAC = env_float("WONYODD_SCENARIO_ATR_FRAC", 0.3)  # share of start bars nearest the current ATR%
+SCENARIO_CACHE_SIZE = int(env_float("WONYODD_SCENARIO_CACHE_SIZE", 16))  # (tf, bar) entries
+
+# Streaming export (app/export.py): rows per keyset page / CSV chunk / Parquet row group
+EXPORT_CHUNK_ROWS = int(env_float("WONYODD_EXPORT_CHUNK_ROWS", 50000))
+
+# Entry/exit rule sets (app/strategies.py); the first drives status/plans/backtests, the rest are scored alongside
+STRATEGIES = env_str("WONYODD_STRATEGIES", "connors_rsi2")  # e.g. "connors_rsi2,double7"
+
+# Feature store rules for recommend() (names as in /api/features; empty = off)
+FEATURE_FILTERS = env_str("WONYODD_FEATURE_FILTERS", "")  # e.g. "hy_spread<5,long:sahm_rule<0.5"
+FEATURE_SCORE = env_str("WONYODD_FEATURE_SCORE", "")  # e.g. "t10y2y*2,short:hy_spread*-3" (added to composite)
+FEATURE_SOURCE_TFS = env_str("WONYODD_FEATURE_SOURCE_TFS", "")  # fallback TFs after the candidate's own, e.g. "240m,1D"
+FEATURE_MAX_AGE_SEC = env_float("WONYODD_FEATURE_MAX_AGE_SEC", 3 * 86400)  # older values count as missing
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+from typing import Optional, Sequence
+
+import numpy as np
+
+from .config import (
+    FEE_MAKER_BPS, FEE_TAKER_BPS, SLIPPAGE_BPS, SLIPPAGE_ATR_FRAC, SLIPPAGE_VOLUME_SCALED, FUNDING_ENABLED,
+)
+
+# Trading cost model shared by the evaluator, the best-params grid and the portfolio replay:
+#   fees     - maker for resting limit entries, taker for market entries and every exit
+#              (stops and the next-open SMA5 exit are market orders)
+#   slippage - taker fills only: fixed bps + a fraction of ATR14, optionally scaled by
+#              sqrt(average volume / bar volume)
+#   funding  - sum of funding_rates with ts in (entry, exit]; positive rates are paid by
+#              longs and received by shorts
+# Everything is applied once per trade (funding through prefix sums), so the bar loops
+# keep their cost.
+
+
+@dataclass
+class CostModel:
+    maker_bps: float = 0.0
+    taker_bps: float = 0.0
+    slippage_bps: float = 0.0
+    slippage_atr_frac: float = 0.0
+    volume_scaled: bool = False
+    funding_ts: Optional[np.ndarray] = None
+    funding_cum: Optional[np.ndarray] = None  # funding_cum[k] = sum of the first k rates
+
+    def fee(self, maker: bool) -> float:
+        return (self.maker_bps if maker else self.taker_bps) / 10000.0
+
+    def slip(self, price: float, atr: float, buy: bool, vol_scale: float = 1.0) -> float:
+        """Taker fill price: `price` moved against the order."""
+        d = (price * self.slippage_bps / 10000.0 + atr * self.slippage_atr_frac) * vol_scale
+        return price + d if buy else price - d
+
+    def funding(self, side: str, t0: int, t1: int) -> float:
+        """Funding paid (as a fraction of notional; negative = received) holding from t0 to t1."""
+        ts = self.funding_ts
+        if ts is None or not len(ts) or t1 <= t0:
+            return 0.0
+        a = int(np.searchsorted(ts, t0, side="right"))
+        b = int(np.searchsorted(ts, t1, side="right"))
+        paid = float(self.funding_cum[b] - self.funding_cum[a])
+        return paid if side == "long" else -paid
+
+    def net_return(self, side: str, entry_px: float, exit_px: float, entry_maker: bool,
+                   funding: float = 0.0) -> float:
+        gross = exit_px / entry_px - 1.0 if side == "long" else entry_px / exit_px - 1.0
+        return (1.0 + gross) * (1.0 - self.fee(entry_maker)) * (1.0 - self.fee(False)) - 1.0 - funding
+
+
+NO_COSTS = CostModel()
+
+
+def volume_scale(volumes: Sequence[Optional[float]], lookback: int = 20) -> np.ndarray:
+    """Per-bar slippage multiplier sqrt(mean of the previous `lookback` volumes / bar volume), clipped to 0.5..3."""
+    v = np.array([x if x is not None else np.nan for x in volumes], dtype=np.float64)
+    out = np.ones(len(v))
+    if len(v) <= lookback:
+        return out
+    filled = np.where(np.isfinite(v), v, 0.0)
+    cs = np.concatenate([[0.0], np.cumsum(filled)])
+    avg = (cs[lookback:-1] - cs[:-lookback - 1]) / lookback  # mean of bars i-lookback..i-1
+    cur = v[lookback:]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = np.sqrt(avg / cur)
+    out[lookback:] = np.where(np.isfinite(ratio), np.clip(ratio, 0.5, 3.0), 1.0)
+    return out
+
+
+def with_funding(model: CostModel, start_ts: int, end_ts: int) -> CostModel:
+    """Copy of `model` with the stored funding series for [start_ts, end_ts] attached."""
+    from . import db
+
+    rows = db.fetch_funding(int(start_ts), int(end_ts))
+    if not rows:
+        return model
+    arr = np.array(rows, dtype=np.float64)
+    rates = np.where(np.isfinite(arr[:, 1]), arr[:, 1], 0.0)
+    return CostModel(
+        maker_bps=model.maker_bps, taker_bps=model.taker_bps, slippage_bps=model.slippage_bps,
+        slippage_atr_frac=model.slippage_atr_frac, volume_scaled=model.volume_scaled,
+        funding_ts=arr[:, 0].astype(np.int64), funding_cum=np.concatenate([[0.0], np.cumsum(rates)]),
+    )
+
+
+def from_config(start_ts: Optional[int] = None, end_ts: Optional[int] = None) -> CostModel:
+    """Cost model from WONYODD_FEE_* / WONYODD_SLIPPAGE_*, with funding for the range when enabled."""
+    model = CostModel(
+        maker_bps=max(0.0, FEE_MAKER_BPS), taker_bps=max(0.0, FEE_TAKER_BPS),
+        slippage_bps=max(0.0, SLIPPAGE_BPS), slippage_atr_frac=max(0.0, SLIPPAGE_ATR_FRAC),
+        volume_scaled=SLIPPAGE_VOLUME_SCALED,
+    )
+    if FUNDING_ENABLED and start_ts is not None and end_ts is not None and math.isfinite(end_ts):
+        model = with_funding(model, start_ts, end_ts)
+    return model
+
+
+def config_key() -> str:
+    """Short signature of the configured cost settings, for best-params cache keys."""
+    m = from_config()
+    return (f"m{m.maker_bps:g}t{m.taker_bps:g}s{m.slippage_bps:g}a{m.slippage_atr_frac:g}"
+            f"v{int(m.volume_scaled)}f{int(FUNDING_ENABLED)}")
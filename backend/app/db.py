@@ -1,104 +1,572 @@
 from __future__ import annotations
-import json
+import queue
 import sqlite3
+import threading
+import time
+from collections import deque
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional, Tuple
-from .config import DB_PATH
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from . import writebuf
+from .config import DATA_VERSION_POLL_SEC, DB_PATH, NOTIFY_CLAIM_TTL_SEC, SHARED_STATE
+from .serialize import dumps_str
 
-SCHEMA = """
+# Connection-level settings; tables and indexes are created by app/migrations.py.
+# auto_vacuum only takes effect on a new database (see retention.enable_incremental_vacuum).
+PRAGMAS = """
+PRAGMA auto_vacuum=INCREMENTAL;
 PRAGMA journal_mode=WAL;
-CREATE TABLE IF NOT EXISTS candles (
-  timeframe TEXT NOT NULL,
-  ts INTEGER NOT NULL,
-  open REAL NOT NULL,
-  high REAL NOT NULL,
-  low REAL NOT NULL,
-  close REAL NOT NULL,
-  volume REAL,
-  features TEXT,
-  PRIMARY KEY (timeframe, ts)
-);
-CREATE INDEX IF NOT EXISTS idx_candles_tf_ts ON candles(timeframe, ts);
-
-CREATE TABLE IF NOT EXISTS notifications (
-  kind TEXT NOT NULL,
-  timeframe TEXT NOT NULL,
-  ts INTEGER NOT NULL,
-  created_ts INTEGER NOT NULL,
-  detail TEXT,
-  PRIMARY KEY (kind, timeframe, ts)
-);
-CREATE INDEX IF NOT EXISTS idx_notifications_kind_created ON notifications(kind, created_ts);
 """
 
+# Write tracking used for HTTP caching: timeframe -> (latest_ts, write_seq, written_at).
+# Every candle write of any process (webhook, tools/import_csv.py, gaps backfill, retention)
+# bumps the timeframe's data_versions row in its own transaction.
+# local mode: kept in memory, seeded from SQLite once per timeframe and bumped by this
+#   process's writes; writes of other processes are picked up by polling data_versions at
+#   most every DATA_VERSION_POLL_SEC.
+# sqlite mode: data_versions is read on every call, so every worker sees every other worker's writes.
+_SHARED_VERSIONS = SHARED_STATE == "sqlite"
+_WRITE_STATE: Dict[str, Tuple[int, int, float]] = {}
+_WRITE_SEQ = 0
+_WRITE_LOCK = threading.Lock()
+FUNDING_VERSION_KEY = "funding"  # data_version() key of the funding_rates table
+_SEEN_SEQ: Dict[str, int] = {}  # local mode: data_versions.seq already accounted for, per timeframe
+_POLLED_AT = 0.0
+_POLL_LOCK = threading.Lock()
+_PROCESS_START = time.time()
+
+# (finished_at, seconds) of this process's recent candle writes; app/backup.py compares
+# them before and during a snapshot.
+_WRITE_TIMES: "deque[Tuple[float, float]]" = deque(maxlen=4096)
+
+# Optional connection pool (opened by the app lifespan; tools keep one-shot connections).
+_POOL: Optional["queue.LifoQueue[PooledConnection]"] = None
+
+class PooledConnection(sqlite3.Connection):
+    """sqlite3 connection whose close() hands it back to the pool when one is open.
+
+    Callers keep the usual `conn = connect(); try: ... finally: conn.close()` shape.
+    """
+
+    def close(self) -> None:
+        pool = _POOL
+        if pool is not None:
+            try:
+                if self.in_transaction:
+                    self.rollback()
+                self.row_factory = sqlite3.Row
+                self.isolation_level = ""
+                pool.put_nowait(self)
+                return
+            except (queue.Full, sqlite3.Error):
+                pass
+        super().close()
+
 def connect() -> sqlite3.Connection:
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+    pool = _POOL
+    if pool is not None:
+        try:
+            return pool.get_nowait()
+        except queue.Empty:
+            pass
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False, factory=PooledConnection)
     conn.row_factory = sqlite3.Row
     return conn
 
+def open_pool(size: int) -> int:
+    """Pre-open `size` connections and keep closed connections for reuse. Returns pool size."""
+    global _POOL
+    if size <= 0 or _POOL is not None:
+        return 0
+    pool: "queue.LifoQueue[PooledConnection]" = queue.LifoQueue(maxsize=size)
+    for _ in range(size):
+        conn = sqlite3.connect(DB_PATH, check_same_thread=False, factory=PooledConnection)
+        conn.row_factory = sqlite3.Row
+        pool.put_nowait(conn)
+    _POOL = pool
+    return size
+
+def close_pool() -> None:
+    global _POOL
+    pool, _POOL = _POOL, None
+    while pool is not None:
+        try:
+            conn = pool.get_nowait()
+        except queue.Empty:
+            break
+        sqlite3.Connection.close(conn)
+
 def init_db() -> None:
+    from .migrations import migrate
+
     conn = connect()
     try:
-        conn.executescript(SCHEMA)
-        conn.commit()
+        conn.executescript(PRAGMAS)
+        migrate(conn)
     finally:
         conn.close()
 
+def schema_version() -> int:
+    conn = connect()
+    try:
+        return int(conn.execute("PRAGMA user_version").fetchone()[0])
+    finally:
+        conn.close()
+
+# candles are keyed by an integer timeframe id (see the `timeframes` table).
+# Ids are never reused or deleted, so the mapping is cached for the process lifetime.
+_TF_IDS: Dict[str, int] = {}
+
+def _tf_id(timeframe: str, create: bool = False) -> Optional[int]:
+    tid = _TF_IDS.get(timeframe)
+    if tid is not None:
+        return tid
+    conn = connect()
+    try:
+        if create:
+            conn.execute("""INSERT OR IGNORE INTO timeframes(key) VALUES (?)""", (timeframe,))
+            conn.commit()
+        row = conn.execute("""SELECT id FROM timeframes WHERE key=?""", (timeframe,)).fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        return None
+    _TF_IDS[timeframe] = int(row[0])
+    return int(row[0])
+
+_UPSERT_CANDLE_SQL = """INSERT INTO candles(tf_id, ts, open, high, low, close, volume)
+     VALUES (?, ?, ?, ?, ?, ?, ?)
+     ON CONFLICT(tf_id, ts) DO UPDATE SET
+       open=excluded.open, high=excluded.high, low=excluded.low, close=excluded.close,
+       volume=excluded.volume
+"""
+
 def upsert_candle(timeframe: str, ts: int, o: float, h: float, l: float, c: float, v: Optional[float], features: Optional[Dict[str, Any]]=None) -> None:
+    """Upsert one bar. Numeric features go to the feature store; anything else stays as JSON.
+
+    With the write buffer open (app/writebuf.py) the bar is queued for the next group commit.
+    """
+    buf = writebuf.active()
+    if buf is not None:
+        buf.put(timeframe, int(ts), (o, h, l, c, v, features))
+        if not _SHARED_VERSIONS:
+            _note_write(timeframe, int(ts))
+        return
+    ids = _feature_ids([features])
+    tid = _tf_id(timeframe, create=True)
+    t0 = time.perf_counter()
     conn = connect()
     try:
-        conn.execute(
-            """INSERT INTO candles(timeframe, ts, open, high, low, close, volume, features)
-                 VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                 ON CONFLICT(timeframe, ts) DO UPDATE SET
-                   open=excluded.open, high=excluded.high, low=excluded.low, close=excluded.close,
-                   volume=excluded.volume, features=excluded.features
-            """,
-            (timeframe, ts, o, h, l, c, v, json.dumps(features) if features is not None else None),
-        )
+        stored = _write_bars(conn, timeframe, tid, {int(ts): (o, h, l, c, v, features)}, ids)
+        conn.commit()
+    finally:
+        conn.close()
+    _WRITE_TIMES.append((time.time(), time.perf_counter() - t0))
+    if not _SHARED_VERSIONS:
+        _note_write(timeframe, int(ts), stored)
+
+def _feature_ids(all_features: Iterable[Optional[Dict[str, Any]]]) -> Dict[str, int]:
+    # Registered on their own connection, before the candle transaction takes the write lock.
+    names: Dict[str, None] = {}
+    for features in all_features:
+        if features:
+            from .features import split_numeric
+
+            names.update(dict.fromkeys(split_numeric(features)[0]))
+    if not names:
+        return {}
+    from .features import ensure_ids
+
+    return ensure_ids(names, source="webhook")
+
+def _write_bars(conn: sqlite3.Connection, timeframe: str, tid: int, bars: Dict[int, "writebuf.Bar"],
+                feature_ids: Dict[str, int]) -> Tuple[int, int]:
+    """Upsert {ts: (o, h, l, c, v, features)} of one timeframe on an open transaction; the caller commits.
+
+    Returns the timeframe's data_versions (latest_ts, seq) after this write.
+    """
+    from . import gaps
+
+    conn.executemany(_UPSERT_CANDLE_SQL, [(tid, ts, b[0], b[1], b[2], b[3], b[4]) for ts, b in bars.items()])
+    numeric_rows = []
+    for ts, b in bars.items():
+        numeric: Dict[str, float] = {}
+        rest = b[5]
+        if rest:
+            from .features import split_numeric
+
+            numeric, rest = split_numeric(rest)
+        if numeric:
+            numeric_rows.append((ts, numeric))
+        # Same semantics as the old single-table upsert: the latest write defines features.
+        if rest:
+            conn.execute(
+                """INSERT INTO candle_features(tf_id, ts, features) VALUES (?, ?, ?)
+                     ON CONFLICT(tf_id, ts) DO UPDATE SET features=excluded.features""",
+                (tid, ts, dumps_str(rest)),
+            )
+        else:
+            conn.execute("""DELETE FROM candle_features WHERE tf_id=? AND ts=?""", (tid, ts))
+    if numeric_rows:
+        from .features import insert_values
+
+        insert_values(conn, tid, numeric_rows, feature_ids)
+    gaps.update(conn, tid, timeframe, min(bars), max(bars))
+    return bump_version(conn, timeframe, max(bars))
+
+# Dedicated connection of the write buffer's flusher thread (see open_write_buffer).
+_BUFFER_CONN: Optional[sqlite3.Connection] = None
+
+def _write_batch(batch: "writebuf.Batch") -> None:
+    """Group commit: every buffered bar of every timeframe in one transaction."""
+    ids = _feature_ids(b[5] for bars in batch.values() for b in bars.values())
+    tids = {tf: _tf_id(tf, create=True) for tf in batch}
+    t0 = time.perf_counter()
+    conn = _BUFFER_CONN
+    try:
+        stored = {tf: _write_bars(conn, tf, tids[tf], bars, ids) for tf, bars in batch.items()}
         conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    _WRITE_TIMES.append((time.time(), time.perf_counter() - t0))
+    if not _SHARED_VERSIONS:
+        # data_version() already moved when the bars were buffered; only account for the seq.
+        for tf, v in stored.items():
+            _note_write(tf, v[0], v, bump=False)
+
+def open_write_buffer(interval_ms: Optional[float] = None, max_rows: Optional[int] = None) -> bool:
+    """Start group-committing upsert_candle() (WRITE_BUFFER_MS > 0). Returns whether it started."""
+    global _BUFFER_CONN
+    if writebuf.active() is not None:
+        return False
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+    conn.execute(f"PRAGMA synchronous={'FULL' if writebuf.DURABILITY == 'full' else 'NORMAL'}")
+    _BUFFER_CONN = conn
+    kw = {k: v for k, v in (("interval_ms", interval_ms), ("max_rows", max_rows)) if v is not None}
+    if not writebuf.start(_write_batch, **kw):
+        _BUFFER_CONN = None
+        conn.close()
+        return False
+    return True
+
+def close_write_buffer() -> None:
+    """Flush pending bars and stop buffering (app shutdown)."""
+    global _BUFFER_CONN
+    writebuf.stop()
+    conn, _BUFFER_CONN = _BUFFER_CONN, None
+    if conn is not None:
+        conn.close()
+
+def upsert_candles_many(timeframe: str, rows: Iterable[Tuple[int, float, float, float, float, Optional[float]]]) -> int:
+    """Upsert (ts, open, high, low, close, volume) rows in one transaction; features are left untouched."""
+    rows = [(int(r[0]), r[1], r[2], r[3], r[4], r[5]) for r in rows]
+    if not rows:
+        return 0
+    buf = writebuf.active()
+    if buf is not None:
+        buf.flush()  # buffered bars are older writes; they must not land on top of these
+    from . import gaps
+
+    tid = _tf_id(timeframe, create=True)
+    latest = max(r[0] for r in rows)
+    t0 = time.perf_counter()
+    conn = connect()
+    try:
+        conn.executemany(_UPSERT_CANDLE_SQL, [(tid,) + r for r in rows])
+        gaps.update(conn, tid, timeframe, min(r[0] for r in rows), latest)
+        stored = bump_version(conn, timeframe, latest)
+        conn.commit()
+    finally:
+        conn.close()
+    _WRITE_TIMES.append((time.time(), time.perf_counter() - t0))
+    if not _SHARED_VERSIONS:
+        _note_write(timeframe, latest, stored)
+    return len(rows)
+
+def bump_version(conn: sqlite3.Connection, timeframe: str, ts: int = 0) -> Tuple[int, int]:
+    """Record a write of `timeframe` (any key, e.g. "funding") on an open transaction.
+
+    Every process that changes candles calls this before committing, so servers notice
+    writes they did not make. Returns (latest_ts, seq) as of this write.
+    """
+    conn.execute(
+        """INSERT INTO data_versions(timeframe, latest_ts, seq, written_at) VALUES (?, ?, 1, ?)
+             ON CONFLICT(timeframe) DO UPDATE SET
+               latest_ts=MAX(latest_ts, excluded.latest_ts), seq=seq+1, written_at=excluded.written_at
+        """,
+        (timeframe, int(ts), time.time()),
+    )
+    row = conn.execute("""SELECT latest_ts, seq FROM data_versions WHERE timeframe=?""", (timeframe,)).fetchone()
+    return int(row[0]), int(row[1])
+
+def _note_write(timeframe: str, ts: int, stored: Optional[Tuple[int, int]] = None, bump: bool = True) -> None:
+    """Local mode: move this process's version of `timeframe` after a write.
+
+    stored: data_versions (latest_ts, seq) returned by the write's bump_version(). When the
+    seq skipped a value, another process wrote in between and its latest_ts is taken over.
+    """
+    global _WRITE_SEQ
+    with _WRITE_LOCK:
+        if stored is not None:
+            seen = _SEEN_SEQ.get(timeframe)
+            if seen is not None and seen != stored[1] - 1:
+                bump = True
+            _SEEN_SEQ[timeframe] = max(seen or 0, stored[1])
+            ts = max(ts, stored[0])
+        if not bump:
+            return
+        _WRITE_SEQ += 1
+        prev = _WRITE_STATE.get(timeframe)
+        latest = max(prev[0], ts) if prev else ts
+        _WRITE_STATE[timeframe] = (latest, _WRITE_SEQ, time.time())
+
+def _poll_versions(force: bool = False) -> None:
+    """Local mode: take over writes of other processes recorded in data_versions (rate-limited)."""
+    global _POLLED_AT, _WRITE_SEQ
+    now = time.monotonic()
+    if not force and now - _POLLED_AT < DATA_VERSION_POLL_SEC:
+        return
+    if not _POLL_LOCK.acquire(blocking=force):
+        return  # another thread is polling right now
+    try:
+        _POLLED_AT = now
+        conn = connect()
+        try:
+            rows = conn.execute("""SELECT timeframe, latest_ts, seq FROM data_versions""").fetchall()
+        finally:
+            conn.close()
+        with _WRITE_LOCK:
+            for tf, latest, seq in rows:
+                prev = _WRITE_STATE.get(tf)
+                if prev is None or _SEEN_SEQ.get(tf) == int(seq):
+                    continue  # not served yet (seeded from SQLite on first use) or unchanged
+                _SEEN_SEQ[tf] = int(seq)
+                _WRITE_SEQ += 1
+                _WRITE_STATE[tf] = (max(prev[0], int(latest)), _WRITE_SEQ, time.time())
+    finally:
+        _POLL_LOCK.release()
+
+def write_times(start: float, end: Optional[float] = None) -> List[float]:
+    """Durations (seconds) of this process's candle writes that finished in [start, end]."""
+    end = time.time() if end is None else end
+    return [d for t, d in list(_WRITE_TIMES) if start <= t <= end]
+
+def data_version(timeframe: str, fresh: bool = False) -> Tuple[int, int, float]:
+    """Return (latest_ts, write_seq, written_at) for a timeframe without a query on the hot path.
+
+    write_seq changes on every upsert (including re-writes of the same bar), so it is a
+    valid cache validator; written_at is the wall time of that write (process start
+    when only seeded from disk). In local mode writes of other processes show up within
+    DATA_VERSION_POLL_SEC; fresh=True polls now (one small query).
+    """
+    if _SHARED_VERSIONS:
+        v = _shared_data_version(timeframe)
+        buf = writebuf.active()
+        pending = buf.rows(timeframe, v[0] + 1, _TS_MAX) if buf is not None else None
+        # This worker's newer buffered bars count before their batch bumps data_versions.
+        return (max(pending), v[1], v[2]) if pending else v
+    _poll_versions(force=fresh)
+    with _WRITE_LOCK:
+        st = _WRITE_STATE.get(timeframe)
+    if st is not None:
+        return st
+    # The seq is read before the bars: a write landing in between is seen by the next poll.
+    conn = connect()
+    try:
+        seq = conn.execute("""SELECT seq FROM data_versions WHERE timeframe=?""", (timeframe,)).fetchone()
     finally:
         conn.close()
+    row = fetch_latest(timeframe)
+    seeded = (int(row["ts"]) if row else 0, 0, _PROCESS_START)
+    with _WRITE_LOCK:
+        if seq is not None:
+            _SEEN_SEQ.setdefault(timeframe, int(seq[0]))
+        return _WRITE_STATE.setdefault(timeframe, seeded)
+
+def _shared_data_version(timeframe: str) -> Tuple[int, int, float]:
+    conn = connect()
+    try:
+        row = conn.execute(
+            """SELECT latest_ts, seq, written_at FROM data_versions WHERE timeframe=?""", (timeframe,)
+        ).fetchone()
+        if row is None:
+            # Seed once for all workers; whoever inserts first defines written_at.
+            tid = _tf_id(timeframe)
+            latest = conn.execute(
+                """SELECT MAX(ts) FROM candles WHERE tf_id=?""", (tid,)
+            ).fetchone()[0] if tid is not None else None
+            conn.execute(
+                """INSERT OR IGNORE INTO data_versions(timeframe, latest_ts, seq, written_at) VALUES (?, ?, 0, ?)""",
+                (timeframe, int(latest or 0), time.time()),
+            )
+            conn.commit()
+            row = conn.execute(
+                """SELECT latest_ts, seq, written_at FROM data_versions WHERE timeframe=?""", (timeframe,)
+            ).fetchone()
+        return (int(row[0]), int(row[1]), float(row[2]))
+    finally:
+        conn.close()
+
+_OHLCV_COLS = "ts, open, high, low, close, volume"
+_TS_MIN, _TS_MAX = -(1 << 62), 1 << 62
+
+class BufferedRow(tuple):
+    """(ts, open, high, low, close, volume) of a bar still in the write buffer, indexable like sqlite3.Row."""
+
+    __slots__ = ()
+    _KEYS = ("ts", "open", "high", "low", "close", "volume")
+
+    def __getitem__(self, k):
+        return tuple.__getitem__(self, self._KEYS.index(k) if isinstance(k, str) else k)
+
+    def keys(self) -> List[str]:
+        return list(self._KEYS)
+
+def _as_row(ts: int, b: "writebuf.Bar") -> BufferedRow:
+    return BufferedRow((ts, b[0], b[1], b[2], b[3], b[4]))
+
+def _as_ohlcv(ts: int, b: "writebuf.Bar") -> Tuple[int, float, float, float, float, float]:
+    return (ts, b[0], b[1], b[2], b[3], 0.0 if b[4] is None else b[4])
+
+def _overlay(timeframe: str, rows: list, lo: int, hi: int, make, limit: Optional[int] = None) -> list:
+    """Merge write-buffered bars in [lo, hi] over ascending `rows`; buffered versions win."""
+    buf = writebuf.active()
+    pending = buf.rows(timeframe, lo, hi) if buf is not None else None
+    if not pending:
+        return rows
+    merged = {int(r[0]): r for r in rows}
+    for ts, b in pending.items():
+        merged[ts] = make(ts, b)
+    out = [merged[ts] for ts in sorted(merged)]
+    return out[-limit:] if limit is not None and limit > 0 else out
 
 def fetch_recent(timeframe: str, limit: int) -> List[sqlite3.Row]:
+    tid = _tf_id(timeframe)
+    rows: List[sqlite3.Row] = []
+    if tid is not None:
+        conn = connect()
+        try:
+            cur = conn.execute(
+                f"""SELECT {_OHLCV_COLS} FROM candles WHERE tf_id=? ORDER BY ts DESC LIMIT ?""",
+                (tid, limit),
+            )
+            rows = cur.fetchall()
+            rows.reverse()  # ascending
+        finally:
+            conn.close()
+    lo = int(rows[0]["ts"]) if len(rows) >= limit > 0 else _TS_MIN
+    return _overlay(timeframe, rows, lo, _TS_MAX, _as_row, limit)
+
+def fetch_recent_ohlcv(timeframe: str, limit: int) -> List[Tuple[int, float, float, float, float, float]]:
+    """Like fetch_recent() but returns plain (ts, open, high, low, close, volume) tuples.
+
+    Values come back from SQLite already typed, so callers can serialize them
+    without per-row conversions. Missing volume is reported as 0.0.
+    """
+    tid = _tf_id(timeframe)
+    rows: List[Tuple[int, float, float, float, float, float]] = []
+    if tid is not None:
+        conn = connect()
+        try:
+            conn.row_factory = None
+            cur = conn.execute(
+                """SELECT ts, open, high, low, close, COALESCE(volume, 0.0) FROM candles
+                     WHERE tf_id=? ORDER BY ts DESC LIMIT ?""",
+                (tid, limit),
+            )
+            rows = cur.fetchall()
+            rows.reverse()  # ascending
+        finally:
+            conn.close()
+    lo = int(rows[0][0]) if len(rows) >= limit > 0 else _TS_MIN
+    return _overlay(timeframe, rows, lo, _TS_MAX, _as_ohlcv, limit)
+
+def fetch_latest(timeframe: str) -> Optional[sqlite3.Row]:
+    tid = _tf_id(timeframe)
+    row = None
+    if tid is not None:
+        conn = connect()
+        try:
+            cur = conn.execute(
+                f"""SELECT {_OHLCV_COLS} FROM candles WHERE tf_id=? ORDER BY ts DESC LIMIT 1""",
+                (tid,),
+            )
+            row = cur.fetchone()
+        finally:
+            conn.close()
+    rows = _overlay(timeframe, [row] if row is not None else [], int(row["ts"]) if row is not None else _TS_MIN,
+                    _TS_MAX, _as_row)
+    return rows[-1] if rows else None
+
+def fetch_range(timeframe: str, start_ts: int, end_ts: int) -> List[sqlite3.Row]:
+    tid = _tf_id(timeframe)
+    rows: List[sqlite3.Row] = []
+    if tid is not None:
+        conn = connect()
+        try:
+            cur = conn.execute(
+                f"""SELECT {_OHLCV_COLS} FROM candles WHERE tf_id=? AND ts BETWEEN ? AND ? ORDER BY ts ASC""",
+                (tid, start_ts, end_ts),
+            )
+            rows = cur.fetchall()
+        finally:
+            conn.close()
+    return _overlay(timeframe, rows, int(start_ts), int(end_ts), _as_row)
+
+def fetch_features(timeframe: str, start_ts: int, end_ts: int) -> Dict[int, str]:
+    """Non-numeric JSON features stored with candles of `timeframe` in [start_ts, end_ts], by ts.
+
+    Numeric features live in the feature store (app/features.py).
+    """
+    tid = _tf_id(timeframe)
+    if tid is None:
+        return {}
     conn = connect()
     try:
         cur = conn.execute(
-            """SELECT * FROM candles WHERE timeframe=? ORDER BY ts DESC LIMIT ?""",
-            (timeframe, limit),
+            """SELECT ts, features FROM candle_features WHERE tf_id=? AND ts BETWEEN ? AND ?""",
+            (tid, start_ts, end_ts),
         )
-        rows = cur.fetchall()
-        return list(reversed(rows))  # ascending
+        return {int(r[0]): r[1] for r in cur.fetchall()}
     finally:
         conn.close()
 
-def fetch_latest(timeframe: str) -> Optional[sqlite3.Row]:
+def upsert_funding_many(rows: Iterable[Tuple[int, float]]) -> int:
+    """Bulk upsert (ts, rate) funding rows (rate as a fraction, e.g. 0.0001 = 0.01%)."""
+    rows = [(int(ts), float(rate)) for ts, rate in rows]
+    if not rows:
+        return 0
     conn = connect()
     try:
-        cur = conn.execute(
-            """SELECT * FROM candles WHERE timeframe=? ORDER BY ts DESC LIMIT 1""",
-            (timeframe,),
+        conn.executemany(
+            """INSERT INTO funding_rates(ts, rate) VALUES (?, ?)
+                 ON CONFLICT(ts) DO UPDATE SET rate=excluded.rate""",
+            rows,
         )
-        row = cur.fetchone()
-        return row
+        bump_version(conn, FUNDING_VERSION_KEY, max(r[0] for r in rows))
+        conn.commit()
     finally:
         conn.close()
+    return len(rows)
 
-def fetch_range(timeframe: str, start_ts: int, end_ts: int) -> List[sqlite3.Row]:
+def fetch_funding(start_ts: int, end_ts: int) -> List[Tuple[int, float]]:
     conn = connect()
     try:
         cur = conn.execute(
-            """SELECT * FROM candles WHERE timeframe=? AND ts BETWEEN ? AND ? ORDER BY ts ASC""",
-            (timeframe, start_ts, end_ts),
+            """SELECT ts, rate FROM funding_rates WHERE ts BETWEEN ? AND ? ORDER BY ts ASC""",
+            (int(start_ts), int(end_ts)),
         )
-        return cur.fetchall()
+        return [(int(r[0]), float(r[1])) for r in cur.fetchall()]
     finally:
         conn.close()
 
 def timeframes_available() -> List[str]:
     conn = connect()
     try:
-        cur = conn.execute("""SELECT DISTINCT timeframe FROM candles""")
+        cur = conn.execute(
+            """SELECT key FROM timeframes t
+                 WHERE EXISTS (SELECT 1 FROM candles c WHERE c.tf_id = t.id) ORDER BY id"""
+        )
         return [r[0] for r in cur.fetchall()]
     finally:
         conn.close()
@@ -137,3 +605,70 @@ def insert_notification(kind: str, timeframe: str, ts: int, created_ts: int, det
         return bool(cur.rowcount)
     finally:
         conn.close()
+
+def claim_notification(kind: str, timeframe: str, ts: int, created_ts: int, cooldown_sec: int = 0) -> bool:
+    """Atomically reserve a notification slot before sending it.
+
+    Runs the "already sent?" and cooldown checks and the insert inside one
+    BEGIN IMMEDIATE transaction, so two workers handling the same bar can never
+    both win. Call complete_notification() after a successful send, or
+    release_notification() if the send failed so a later event can retry.
+
+    A claim (detail NULL) older than NOTIFY_CLAIM_TTL_SEC belongs to a send that never
+    finished: it is taken over here and does not count toward the cooldown.
+    """
+    stale_before = int(created_ts) - NOTIFY_CLAIM_TTL_SEC
+    conn = connect()
+    conn.isolation_level = None
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                """DELETE FROM notifications
+                    WHERE kind=? AND timeframe=? AND ts=? AND detail IS NULL AND created_ts < ?""",
+                (kind, timeframe, int(ts), stale_before),
+            )
+            if int(cooldown_sec) > 0:
+                last = conn.execute(
+                    """SELECT created_ts FROM notifications
+                        WHERE kind=? AND (detail IS NOT NULL OR created_ts >= ?)
+                        ORDER BY created_ts DESC LIMIT 1""",
+                    (kind, stale_before),
+                ).fetchone()
+                if last is not None and (int(created_ts) - int(last[0])) < int(cooldown_sec):
+                    conn.execute("ROLLBACK")
+                    return False
+            cur = conn.execute(
+                """INSERT OR IGNORE INTO notifications(kind, timeframe, ts, created_ts, detail)
+                   VALUES (?, ?, ?, ?, NULL)""",
+                (kind, timeframe, int(ts), int(created_ts)),
+            )
+            conn.execute("COMMIT")
+            return bool(cur.rowcount)
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+
+def complete_notification(kind: str, timeframe: str, ts: int, detail: Optional[str] = None) -> None:
+    conn = connect()
+    try:
+        conn.execute(
+            """UPDATE notifications SET detail=? WHERE kind=? AND timeframe=? AND ts=?""",
+            (detail, kind, timeframe, int(ts)),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+def release_notification(kind: str, timeframe: str, ts: int) -> None:
+    conn = connect()
+    try:
+        conn.execute(
+            """DELETE FROM notifications WHERE kind=? AND timeframe=? AND ts=?""",
+            (kind, timeframe, int(ts)),
+        )
+        conn.commit()
+    finally:
+        conn.close()
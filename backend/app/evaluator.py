@@ -3,7 +3,12 @@ from __future__ import annotations
 from dataclasses import dataclass
 from typing import Dict, Any, List, Optional, Tuple
 
+import numpy as np
+
+from .costs import CostModel, NO_COSTS, volume_scale
 from .indicators import clamp
+from .intrabar import MinuteIndex, first_touch
+from .strategies import ATR, Indicators, get as get_strategy
 
 @dataclass
 class Metrics:
@@ -28,55 +33,6 @@ def _parse_grid(s: str) -> List[float]:
             continue
     return out
 
-def _rolling_sma(values: List[float], period: int) -> List[Optional[float]]:
-    n = len(values)
-    out: List[Optional[float]] = [None]*n
-    if n < period:
-        return out
-    s = sum(values[:period])
-    out[period-1] = s/period
-    for i in range(period, n):
-        s += values[i] - values[i-period]
-        out[i] = s/period
-    return out
-
-def _rsi2(closes: List[float]) -> List[Optional[float]]:
-    n = len(closes)
-    out: List[Optional[float]] = [None]*n
-    if n < 3:
-        return out
-    # RSI(2) using simple average of last 2 gains/losses
-    for i in range(2, n):
-        d1 = closes[i-1] - closes[i-2]
-        d2 = closes[i] - closes[i-1]
-        g = (max(d1,0.0) + max(d2,0.0)) / 2.0
-        l = (max(-d1,0.0) + max(-d2,0.0)) / 2.0
-        if l == 0 and g == 0:
-            out[i] = 50.0
-        elif l == 0:
-            out[i] = 100.0
-        else:
-            rs = g/l
-            out[i] = 100.0 - (100.0/(1.0+rs))
-    return out
-
-def _atr14(highs: List[float], lows: List[float], closes: List[float]) -> List[Optional[float]]:
-    n = len(closes)
-    out: List[Optional[float]] = [None]*n
-    if n < 15:
-        return out
-    trs: List[float] = [0.0]*n
-    for i in range(1,n):
-        tr = max(highs[i]-lows[i], abs(highs[i]-closes[i-1]), abs(lows[i]-closes[i-1]))
-        trs[i] = tr
-    # rolling mean 14
-    s = sum(trs[1:15])  # i=1..14 (14 values)
-    out[14] = s/14.0
-    for i in range(15,n):
-        s += trs[i] - trs[i-14]
-        out[i] = s/14.0
-    return out
-
 def backtest_price_plan(
     rows: List[Dict[str, Any]],
     side: str,
@@ -84,17 +40,28 @@ def backtest_price_plan(
     entry_k: float,
     stop_mult: float,
     fee_bps: float = 0.0,
+    costs: Optional[CostModel] = None,
+    intrabar: Optional[MinuteIndex] = None,
+    strategy: Optional[str] = None,
+    ind: Optional[Indicators] = None,
 ) -> Tuple[Metrics, Dict[str, Any]]:
-    """Backtest the Connors/Wonyodd-style rule on a single timeframe.
+    """Backtest a strategy's rules (app/strategies.py, default the primary one) on a single timeframe.
 
     Rules (no lookahead):
-    - Signal uses bar i close.
+    - Signal uses bar i close (the strategy's vectorized entry rule).
     - If entry condition true, trade executes on bar i+1 (next bar).
       * market: entry = next_open
       * limit_atr: entry = next_open +/- entry_k * ATR14(i); must be filled within bar i+1 range
-    - Exit rule: after entry, if bar j close crosses SMA5 in favor, exit at bar j+1 open.
+    - Exit rule: after entry, if bar j close meets the strategy's exit rule (connors_rsi2:
+      close crosses SMA5 in favor), exit at bar j+1 open.
     - Stop: hard stop based on ATR14(i) and stop_mult; triggered intrabar at stop price.
-    - Fees: applied on entry and exit (bps each side).
+    - Costs (app/costs.py): maker fee on limit fills, taker fee + slippage on market
+      entries and all exits, funding for positions held across funding timestamps.
+      `fee_bps` alone is a flat fee on both sides (used when `costs` is None).
+    - intrabar (app/intrabar.py): the limit-fill bar and bars touching the stop are
+      replayed on stored 1m candles, so gaps fill at the minute's open and a stop is only
+      taken after the fill minute; a pending exit at the open precedes the stop.
+    - ind: precomputed indicators of `rows` (shared across a grid search's backtests).
     """
     side = side.lower().strip()
     if side not in ("long","short"):
@@ -114,10 +81,10 @@ def backtest_price_plan(
     c = [float(r["close"]) for r in rows]
     ts = [int(r["ts"]) for r in rows]
 
-    sma5 = _rolling_sma(c, 5)
-    sma200 = _rolling_sma(c, 200)
-    rsi2 = _rsi2(c)
-    atr14 = _atr14(h, l, c)
+    if ind is None:
+        ind = Indicators.from_rows(rows)
+    entry_sig, exit_sig = (x.tolist() for x in ind.signals(get_strategy(strategy), side))
+    atr14 = ind[ATR].tolist()
 
     # equity curve (mark-to-market)
     equity = 1.0
@@ -139,16 +106,20 @@ def backtest_price_plan(
     signals = 0
     fills = 0
 
-    def apply_fee(x: float) -> float:
-        # fee_bps applied multiplicatively
-        if fee_bps <= 0:
-            return x
-        return x * (1.0 - fee_bps/10000.0)
+    if costs is None:
+        costs = CostModel(maker_bps=fee_bps, taker_bps=fee_bps) if fee_bps > 0 else NO_COSTS
+    vs = volume_scale([r.get("volume") for r in rows]) if costs.volume_scaled else None
+    entry_maker = entry_mode != "market"
+    entry_atr = 0.0
+    fill_k = 0  # minute of the fill inside the entry bar (intrabar mode)
+    drilled = 0
+
+    def exit_fill(px: float, bar: int) -> float:
+        # exits are market orders: buy back shorts, sell longs
+        return costs.slip(px, entry_atr, side == "short", vs[bar] if vs is not None else 1.0)
 
-    def apply_fee_exit(x: float) -> float:
-        if fee_bps <= 0:
-            return x
-        return x * (1.0 - fee_bps/10000.0)
+    def trade_ret(exit_px: float, t_exit: int) -> float:
+        return costs.net_return(side, entry_px, exit_px, entry_maker, costs.funding(side, ts[entry_i], t_exit))
 
     # iterate bars; use i as signal bar, i+1 as execution bar
     i = 0
@@ -169,18 +140,8 @@ def backtest_price_plan(
             mdd = max(mdd, dd)
 
         if not in_pos:
-            # need indicators available
-            if sma5[i] is None or sma200[i] is None or rsi2[i] is None or atr14[i] is None:
-                i += 1
-                continue
-
-            # entry rule
-            if side == "long":
-                cond = (c[i] > sma200[i]) and (c[i] < sma5[i]) and (rsi2[i] <= 5.0)
-            else:
-                cond = (c[i] < sma200[i]) and (c[i] > sma5[i]) and (rsi2[i] >= 95.0)
-
-            if not cond:
+            # entry rule (false while its indicators or ATR are still warming up)
+            if not entry_sig[i]:
                 i += 1
                 continue
 
@@ -208,8 +169,21 @@ def backtest_price_plan(
             fills += 1
             in_pos = True
             exit_pending = False
-            entry_px = apply_fee(entry)  # fee on entry
-            stop_px = entry_px - stop_mult * atr if side == "long" else entry_px + stop_mult * atr
+            entry_atr = atr
+            fill_k = 0
+            if entry_maker:
+                entry_px = entry
+                if intrabar is not None:
+                    mb = intrabar.bar(ts[i+1])
+                    hit = first_touch(mb, entry, side == "long") if mb is not None else None
+                    if hit is not None:
+                        fill_k, entry_px = hit
+                        drilled += 1
+                stop_base = entry  # the stop order is placed off the limit price
+            else:
+                entry_px = costs.slip(entry, atr, side == "long", vs[i+1] if vs is not None else 1.0)
+                stop_base = entry_px
+            stop_px = stop_base - stop_mult * atr if side == "long" else stop_base + stop_mult * atr
             entry_i = i+1
             # record initial MAE baseline
             i += 1
@@ -219,21 +193,25 @@ def backtest_price_plan(
         if in_pos:
             # stop intrabar at stop price (worst-case)
             stopped = False
-            if side == "long":
-                if l[i] <= stop_px:
-                    exit_px = apply_fee_exit(stop_px)
-                    stopped = True
-            else:
-                if h[i] >= stop_px:
-                    exit_px = apply_fee_exit(stop_px)
-                    stopped = True
+            if intrabar is not None and exit_pending:
+                pass  # the pending exit at this bar's open happens first
+            elif (l[i] <= stop_px) if side == "long" else (h[i] >= stop_px):
+                stop_fill = stop_px
+                if intrabar is not None:
+                    mb = intrabar.bar(ts[i])
+                    from_k = fill_k if i == entry_i else 0
+                    hit = first_touch(mb, stop_px, side == "long", from_k) if mb is not None else None
+                    if hit is not None:
+                        drilled += 1
+                        # inside the fill minute the order of fill and stop is unknown: stop price
+                        if not (i == entry_i and hit[0] == fill_k):
+                            stop_fill = hit[1]
+                exit_px = exit_fill(stop_fill, i)
+                stopped = True
 
             if stopped:
-                # finalize trade at this bar
-                if side == "long":
-                    ret = (exit_px / entry_px) - 1.0
-                else:
-                    ret = (entry_px / exit_px) - 1.0
+                # finalize trade at this bar (funding counted to its close)
+                ret = trade_ret(exit_px, ts[i+1])
                 equity *= (1.0 + ret)
                 trade_rets.append(ret)
                 # MAE: worst excursion from entry during holding (approx using lows/highs)
@@ -254,11 +232,8 @@ def backtest_price_plan(
 
             # exit rule: if exit_pending, exit at next open
             if exit_pending:
-                exit_px = apply_fee_exit(o[i])  # execute on this bar open (it is next open after signal)
-                if side == "long":
-                    ret = (exit_px / entry_px) - 1.0
-                else:
-                    ret = (entry_px / exit_px) - 1.0
+                exit_px = exit_fill(o[i], i)  # execute on this bar open (it is next open after signal)
+                ret = trade_ret(exit_px, ts[i])
                 equity *= (1.0 + ret)
                 trade_rets.append(ret)
                 if side == "long":
@@ -276,12 +251,9 @@ def backtest_price_plan(
                 i += 1
                 continue
 
-            # set exit_pending when close crosses SMA5 (at bar close i)
-            if sma5[i] is not None:
-                if side == "long" and (c[i] > sma5[i]):
-                    exit_pending = True
-                elif side == "short" and (c[i] < sma5[i]):
-                    exit_pending = True
+            # set exit_pending on the strategy's exit rule (at bar close i)
+            if exit_sig[i]:
+                exit_pending = True
 
             i += 1
             continue
@@ -291,11 +263,8 @@ def backtest_price_plan(
     # finalize mtm for last close
     if in_pos:
         # exit at last close (conservative)
-        exit_px = apply_fee_exit(c[-1])
-        if side == "long":
-            ret = (exit_px / entry_px) - 1.0
-        else:
-            ret = (entry_px / exit_px) - 1.0
+        exit_px = exit_fill(c[-1], n-1)
+        ret = trade_ret(exit_px, ts[-1])
         equity *= (1.0 + ret)
         trade_rets.append(ret)
         if side == "long":
@@ -335,9 +304,17 @@ def backtest_price_plan(
     detail = {
         "signals": signals,
         "fills": fills,
+        "trade_rets": trade_rets,
     }
+    if intrabar is not None:
+        detail["intrabar_bars"] = drilled
     return m, detail
 
+def signal_bars(rows: List[Dict[str, Any]], side: str, strategy: Optional[str] = None) -> List[int]:
+    """Indices of bars whose close meets the entry rule (independent of entry/stop params)."""
+    entry, _ = Indicators.from_rows(rows).signals(get_strategy(strategy), side)
+    return np.flatnonzero(entry).tolist()
+
 def score_metrics(m: Metrics) -> float:
     # A pragmatic score emphasizing MDD reduction + stable edge:
     # - Reward return
@@ -0,0 +1,279 @@
+from __future__ import annotations
+
+import csv
+import gzip
+import io
+import json
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from . import db, features
+from .config import EXPORT_CHUNK_ROWS
+
+# Streaming candle export (tools/export_csv.py and GET /api/export).
+#
+# Rows are read in keyset pages of EXPORT_CHUNK_ROWS on the (tf_id, ts) primary key, one
+# short read per page, so memory stays at one page whatever the table size and a slow
+# download never pins a WAL snapshot. Each page becomes one column chunk: archived
+# months first (include_archive), then live rows, with feature-store values of the same
+# bars joined per page. Output is produced incrementally as bytes:
+#   csv / csv.gz / csv.zst  time (ISO-8601 UTC), open, high, low, close, volume, features...
+#                           (the layout tools/import_csv.py reads back)
+#   parquet                 one row group per page (zstd), time as a UTC timestamp
+# csv.zst needs `zstandard` and parquet needs `pyarrow`; both are optional.
+
+FORMATS = ("csv", "csv.gz", "csv.zst", "parquet")
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "csv.gz": "application/gzip",
+    "csv.zst": "application/zstd",
+    "parquet": "application/vnd.apache.parquet",
+}
+OHLCV = ("open", "high", "low", "close", "volume")
+
+
+def parse_time(s: Any) -> Optional[int]:
+    """Epoch seconds (or ms), or an ISO date/datetime (UTC unless it has an offset); None = unbounded."""
+    if s is None or str(s).strip() == "":
+        return None
+    s = str(s).strip()
+    if s.lstrip("-").isdigit():
+        ts = int(s)
+        return ts // 1000 if ts > 10_000_000_000 else ts
+    try:
+        dt = datetime.fromisoformat(s.replace("Z", "+00:00"))
+    except ValueError:
+        raise ValueError(f"invalid time {s!r}: use epoch seconds or an ISO date")
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+
+def feature_names(tf: str, spec: str = "all") -> List[str]:
+    """Feature columns for `tf`: all (every feature with values on this timeframe) | none | a,b,c."""
+    spec = str(spec or "").strip()
+    if spec.lower() in ("", "none"):
+        return []
+    if spec.lower() != "all":
+        return [n for n in dict.fromkeys(features.feature_name(p) for p in spec.split(",")) if n]
+    tid = db._tf_id(tf)
+    if tid is None:
+        return []
+    conn = db.connect()
+    try:
+        # One primary-key probe per registered feature instead of a DISTINCT over all values.
+        return [r[0] for r in conn.execute(
+            """SELECT d.name FROM feature_defs d
+                WHERE EXISTS (SELECT 1 FROM feature_values v WHERE v.tf_id=? AND v.feature_id=d.id)
+                ORDER BY d.id""",
+            (tid,),
+        ).fetchall()]
+    finally:
+        conn.close()
+
+
+def _archive_chunks(tf: str, start_ts: int, end_ts: int, names: Sequence[str],
+                    chunk: int) -> Iterator[Dict[str, np.ndarray]]:
+    """Archived rows older than the first live row, one month file at a time."""
+    from .retention import ARCHIVE_COLUMNS, _load_npz, _month_of, archive_root
+
+    tf_dir = archive_root() / tf
+    if not tf_dir.is_dir():
+        return
+    live_from = _first_live_ts(tf)
+    lo, hi = _month_of(start_ts), _month_of(end_ts)
+    for path in sorted(tf_dir.glob("*.npz")):
+        month = path.stem
+        if month < lo or month > hi or month.endswith(".tmp"):
+            continue
+        cols = _load_npz(path)
+        mask = (cols["ts"] >= start_ts) & (cols["ts"] <= end_ts)
+        if live_from is not None:
+            mask &= cols["ts"] < live_from
+        idx = np.flatnonzero(mask)
+        for a in range(0, len(idx), chunk):
+            sel = idx[a:a + chunk]
+            out = {"ts": cols["ts"][sel].astype(np.int64)}
+            out.update({k: cols[k][sel].astype(np.float64) for k in OHLCV if k in ARCHIVE_COLUMNS})
+            if names:
+                # Archived bars keep their features as JSON next to the OHLCV columns.
+                vals = [json.loads(f) if f else {} for f in cols["features"][sel].tolist()]
+                for n in names:
+                    out[n] = np.array([_as_float(v.get(n)) for v in vals], dtype=np.float64)
+            yield out
+
+
+def _as_float(v: Any) -> float:
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+def _first_live_ts(tf: str) -> Optional[int]:
+    tid = db._tf_id(tf)
+    if tid is None:
+        return None
+    conn = db.connect()
+    try:
+        row = conn.execute("""SELECT MIN(ts) FROM candles WHERE tf_id=?""", (tid,)).fetchone()
+        return None if row is None or row[0] is None else int(row[0])
+    finally:
+        conn.close()
+
+
+def _live_chunks(tf: str, start_ts: int, end_ts: int, names: Sequence[str],
+                 chunk: int) -> Iterator[Dict[str, np.ndarray]]:
+    tid = db._tf_id(tf)
+    if tid is None:
+        return
+    after = start_ts - 1
+    while True:
+        conn = db.connect()
+        try:
+            conn.row_factory = None
+            cur = conn.execute(
+                """SELECT ts, open, high, low, close, volume FROM candles
+                     WHERE tf_id=? AND ts > ? AND ts <= ? ORDER BY ts ASC LIMIT ?""",
+                (tid, after, end_ts, chunk),
+            )
+            rows = cur.fetchmany(chunk)
+        finally:
+            conn.close()
+        if not rows:
+            return
+        arr = np.array(rows, dtype=np.float64).reshape(-1, 6)  # NULL volume -> NaN
+        del rows
+        out = {"ts": arr[:, 0].astype(np.int64)}
+        out.update({k: arr[:, j + 1] for j, k in enumerate(OHLCV)})
+        if names:
+            m = features.values_at(tf, names, out["ts"])
+            out.update({n: m[:, j] for j, n in enumerate(names)})
+        yield out
+        if len(arr) < chunk:
+            return
+        after = int(out["ts"][-1])
+
+
+def iter_chunks(tf: str, start_ts: Optional[int] = None, end_ts: Optional[int] = None,
+                names: Sequence[str] = (), include_archive: bool = False,
+                chunk: int = EXPORT_CHUNK_ROWS) -> Iterator[Dict[str, np.ndarray]]:
+    """Column chunks (ts, OHLCV, features) of `tf` in [start_ts, end_ts], oldest first."""
+    lo = 0 if start_ts is None else int(start_ts)
+    hi = 2**62 if end_ts is None else int(end_ts)
+    chunk = max(1, int(chunk))
+    if include_archive:
+        yield from _archive_chunks(tf, lo, hi, names, chunk)
+    yield from _live_chunks(tf, lo, hi, names, chunk)
+
+
+class _Buffer(io.RawIOBase):
+    """Write-only sink the encoders write into; drained after every chunk."""
+
+    def __init__(self) -> None:
+        self._parts: List[bytes] = []
+        self._pos = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        data = bytes(b)
+        self._parts.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def drain(self) -> bytes:
+        out = b"".join(self._parts)
+        self._parts = []
+        return out
+
+
+def _time_strings(ts: np.ndarray) -> List[str]:
+    return [s + "+00:00" for s in np.datetime_as_string(ts.astype("datetime64[s]"), unit="s").tolist()]
+
+
+def _csv_text(c: Dict[str, np.ndarray], cols: Sequence[str]) -> str:
+    lists = [_time_strings(c["ts"])]
+    for k in cols:
+        v = c[k]
+        nan = np.isnan(v)
+        lists.append([None if m else x for x, m in zip(v.tolist(), nan.tolist())] if nan.any() else v.tolist())
+    buf = io.StringIO()
+    csv.writer(buf, lineterminator="\n").writerows(zip(*lists))
+    return buf.getvalue()
+
+
+def _compressor(fmt: str, sink: _Buffer):
+    if fmt == "csv.gz":
+        return gzip.GzipFile(fileobj=sink, mode="wb", compresslevel=3, mtime=0)
+    if fmt == "csv.zst":
+        import zstandard
+
+        return zstandard.ZstdCompressor(level=3).stream_writer(sink, closefd=False)
+    return sink
+
+
+def _stream_csv(chunks: Iterator[Dict[str, np.ndarray]], names: Sequence[str], fmt: str) -> Iterator[bytes]:
+    sink = _Buffer()
+    out = _compressor(fmt, sink)
+    cols = list(OHLCV) + list(names)
+    out.write((",".join(["time"] + cols) + "\n").encode())
+    for c in chunks:
+        out.write(_csv_text(c, cols).encode())
+        if out is not sink:
+            out.flush()
+        yield sink.drain()
+    if out is not sink:
+        out.close()
+    tail = sink.drain()
+    if tail:
+        yield tail
+
+
+def _stream_parquet(chunks: Iterator[Dict[str, np.ndarray]], names: Sequence[str]) -> Iterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([("time", pa.timestamp("s", tz="UTC"))] + [(k, pa.float64()) for k in list(OHLCV) + list(names)])
+    sink = _Buffer()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    try:
+        for c in chunks:
+            arrays = [pa.array(c["ts"], type=pa.int64()).cast(schema.field("time").type)]
+            arrays += [pa.array(c[k], from_pandas=True) for k in list(OHLCV) + list(names)]  # NaN -> null
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    tail = sink.drain()
+    if tail:
+        yield tail
+
+
+def stream(tf: str, fmt: str = "csv", start_ts: Optional[int] = None, end_ts: Optional[int] = None,
+           names: Sequence[str] = (), include_archive: bool = False,
+           chunk: int = EXPORT_CHUNK_ROWS) -> Iterator[bytes]:
+    """Encoded export of `tf` as a byte stream (one piece per chunk). Raises ValueError/RuntimeError up front."""
+    fmt = str(fmt).lower().strip()
+    if fmt not in FORMATS:
+        raise ValueError("format must be one of " + ", ".join(FORMATS))
+    _check_format(fmt)
+    chunks = iter_chunks(tf, start_ts, end_ts, names, include_archive, chunk)
+    return _stream_parquet(chunks, names) if fmt == "parquet" else _stream_csv(chunks, names, fmt)
+
+
+def _check_format(fmt: str) -> None:
+    # Fail before the first byte is sent rather than mid-stream.
+    mod = {"csv.zst": "zstandard", "parquet": "pyarrow"}.get(fmt)
+    if mod is None:
+        return
+    try:
+        __import__(mod)
+    except ImportError:
+        raise RuntimeError(f"{fmt} export needs {mod} (pip install {mod})")
@@ -0,0 +1,323 @@
+from __future__ import annotations
+import math
+import re
+import sqlite3
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from . import db
+from .timeframes import tf_seconds
+
+# Feature store: numeric TradingView/CSV features kept column-wise per (timeframe, feature, ts)
+# in `feature_values` (schema v3). Names are registered once in `feature_defs`; values
+# that are not numbers stay as JSON in `candle_features`.
+
+_NAME_RE = re.compile(r"[^a-z0-9]+")
+_FEATURE_IDS: Dict[str, int] = {}
+
+
+def feature_name(raw: Any) -> Optional[str]:
+    """Canonical feature name: "FXCM COPPER (FX:COPPER)" -> "fxcm_copper_fx_copper"."""
+    name = _NAME_RE.sub("_", str(raw).strip().lower()).strip("_")
+    return name or None
+
+
+def _as_float(v: Any) -> Optional[float]:
+    if isinstance(v, bool):
+        return 1.0 if v else 0.0
+    if isinstance(v, (int, float)):
+        f = float(v)
+    elif isinstance(v, str):
+        try:
+            f = float(v.strip())
+        except ValueError:
+            return None
+    else:
+        return None
+    return f if math.isfinite(f) else None
+
+
+def split_numeric(values: Dict[str, Any]) -> Tuple[Dict[str, float], Dict[str, Any]]:
+    """Split a features dict into (numeric values by canonical name, everything else)."""
+    numeric: Dict[str, float] = {}
+    rest: Dict[str, Any] = {}
+    for k, v in (values or {}).items():
+        name = feature_name(k)
+        f = _as_float(v) if name else None
+        if f is None:
+            if v is not None:
+                rest[k] = v
+        else:
+            numeric[name] = f
+    return numeric, rest
+
+
+def ensure_ids(names: Iterable[str], source: str = "") -> Dict[str, int]:
+    """Register feature names (idempotent) and return name -> feature id."""
+    out: Dict[str, int] = {}
+    missing: List[str] = []
+    for n in names:
+        fid = _FEATURE_IDS.get(n)
+        if fid is None:
+            missing.append(n)
+        else:
+            out[n] = fid
+    if not missing:
+        return out
+    conn = db.connect()
+    try:
+        conn.executemany(
+            """INSERT OR IGNORE INTO feature_defs(name, source, created_ts) VALUES (?, ?, ?)""",
+            [(n, source or None, int(time.time())) for n in missing],
+        )
+        conn.commit()
+        for n in missing:
+            row = conn.execute("""SELECT id FROM feature_defs WHERE name=?""", (n,)).fetchone()
+            _FEATURE_IDS[n] = out[n] = int(row[0])
+    finally:
+        conn.close()
+    return out
+
+
+def _lookup_ids(names: Sequence[str]) -> Dict[str, int]:
+    """Like ensure_ids() but without registering; unknown names are left out."""
+    out: Dict[str, int] = {}
+    missing = [n for n in names if n not in _FEATURE_IDS]
+    if missing:
+        conn = db.connect()
+        try:
+            for n in missing:
+                row = conn.execute("""SELECT id FROM feature_defs WHERE name=?""", (n,)).fetchone()
+                if row is not None:
+                    _FEATURE_IDS[n] = int(row[0])
+        finally:
+            conn.close()
+    for n in names:
+        if n in _FEATURE_IDS:
+            out[n] = _FEATURE_IDS[n]
+    return out
+
+
+def insert_values(conn: sqlite3.Connection, tf_id: int, rows: Iterable[Tuple[int, Dict[str, float]]],
+                  ids: Dict[str, int]) -> int:
+    """Upsert (ts, {name: value}) rows on an open transaction; the caller commits."""
+    params = [(tf_id, ids[name], int(ts), float(v)) for ts, vals in rows for name, v in vals.items()]
+    conn.executemany(
+        """INSERT INTO feature_values(tf_id, feature_id, ts, value) VALUES (?, ?, ?, ?)
+             ON CONFLICT(tf_id, feature_id, ts) DO UPDATE SET value=excluded.value""",
+        params,
+    )
+    return len(params)
+
+
+def store(timeframe: str, rows: Iterable[Tuple[int, Dict[str, float]]], source: str = "") -> int:
+    """Bulk upsert numeric features for `timeframe` (rows of (ts, {name: value})). Returns values written."""
+    rows = [(int(ts), vals) for ts, vals in rows if vals]
+    if not rows:
+        return 0
+    ids = ensure_ids(dict.fromkeys(n for _, vals in rows for n in vals), source=source)
+    tid = db._tf_id(timeframe, create=True)
+    conn = db.connect()
+    try:
+        n = insert_values(conn, tid, rows, ids)
+        conn.commit()
+    finally:
+        conn.close()
+    return n
+
+
+def registry() -> List[Dict[str, Any]]:
+    """Registered features with value counts and ts range per timeframe."""
+    conn = db.connect()
+    try:
+        defs = conn.execute("""SELECT id, name, source, created_ts FROM feature_defs ORDER BY id""").fetchall()
+        stats = conn.execute(
+            """SELECT v.feature_id, t.key, COUNT(*), MIN(v.ts), MAX(v.ts)
+                 FROM feature_values v JOIN timeframes t ON t.id = v.tf_id
+                 GROUP BY v.tf_id, v.feature_id"""
+        ).fetchall()
+    finally:
+        conn.close()
+    by_id: Dict[int, Dict[str, Any]] = {}
+    for fid, tf, n, lo, hi in stats:
+        by_id.setdefault(int(fid), {})[tf] = {"values": int(n), "min_ts": lo, "max_ts": hi}
+    return [
+        {"name": r[1], "source": r[2], "created_ts": r[3], "timeframes": by_id.get(int(r[0]), {})}
+        for r in defs
+    ]
+
+
+def _fetch_columns(source_tf: str, ids: Dict[str, int], start_ts: int, end_ts: int) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+    """name -> (ts, value) arrays for one source timeframe, read in a single range scan per feature."""
+    tid = db._tf_id(source_tf)
+    if tid is None or not ids:
+        return {}
+    conn = db.connect()
+    try:
+        conn.row_factory = None
+        out: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for name, fid in ids.items():
+            rows = conn.execute(
+                """SELECT ts, value FROM feature_values
+                     WHERE tf_id=? AND feature_id=? AND ts BETWEEN ? AND ? ORDER BY ts ASC""",
+                (tid, fid, int(start_ts), int(end_ts)),
+            ).fetchall()
+            if rows:
+                arr = np.array(rows, dtype=np.float64)
+                out[name] = (arr[:, 0].astype(np.int64), arr[:, 1])
+        return out
+    finally:
+        conn.close()
+
+
+def matrix(timeframe: str, names: Sequence[str], ts: Sequence[int],
+           source_tfs: Optional[Sequence[str]] = None, max_age_sec: Optional[float] = None) -> np.ndarray:
+    """Feature matrix aligned to bars of `timeframe` opening at `ts` (shape len(ts) x len(names), NaN = missing).
+
+    Values are joined as-of bar close: a value from a source bar is used once that
+    bar has closed, so higher-timeframe features (e.g. 1D macro columns on 30m bars)
+    never look ahead. source_tfs are tried in order; the first with a value wins.
+    """
+    grid = np.asarray(ts, dtype=np.int64)
+    out = np.full((len(grid), len(names)), np.nan, dtype=np.float64)
+    if not len(grid) or not names:
+        return out
+    names = [feature_name(n) or "" for n in names]
+    ids = _lookup_ids([n for n in names if n])
+    tgt_sec = tf_seconds(timeframe)
+    grid_close = grid + tgt_sec
+    max_age = float(max_age_sec) if max_age_sec else None
+    lookback = int(max_age) if max_age else 366 * 86400
+
+    for src in (source_tfs or (timeframe,)):
+        src_sec = tf_seconds(src)
+        cols = _fetch_columns(src, ids, int(grid.min()) - lookback - src_sec, int(grid.max()))
+        for j, name in enumerate(names):
+            col = cols.get(name)
+            if col is None:
+                continue
+            avail = col[0] + src_sec  # known at the source bar's close
+            idx = np.searchsorted(avail, grid_close, side="right") - 1
+            ok = idx >= 0
+            if max_age:
+                ok &= (grid_close - avail[np.maximum(idx, 0)]) <= max_age
+            fill = ok & np.isnan(out[:, j])
+            out[fill, j] = col[1][idx[fill]]
+    return out
+
+
+def values_at(timeframe: str, names: Sequence[str], ts: np.ndarray) -> np.ndarray:
+    """Values stored for `timeframe` at exactly the bar ts in `ts` (ascending; shape len(ts) x len(names), NaN = missing).
+
+    Unlike matrix() there is no as-of join: one range scan per feature over [ts[0], ts[-1]],
+    so exporting a long series chunk by chunk reads every value once.
+    """
+    out = np.full((len(ts), len(names)), np.nan, dtype=np.float64)
+    if not len(ts) or not names:
+        return out
+    cols = _fetch_columns(timeframe, _lookup_ids(list(names)), int(ts[0]), int(ts[-1]))
+    for j, name in enumerate(names):
+        col = cols.get(name)
+        if col is None:
+            continue
+        idx = np.clip(np.searchsorted(col[0], ts), 0, len(col[0]) - 1)
+        hit = col[0][idx] == ts
+        out[hit, j] = col[1][idx[hit]]
+    return out
+
+
+def latest(timeframe: str, ts: int, names: Sequence[str], source_tfs: Optional[Sequence[str]] = None,
+           max_age_sec: Optional[float] = None) -> Dict[str, Optional[float]]:
+    """Values of `names` as of the close of the `timeframe` bar opening at `ts`."""
+    row = matrix(timeframe, names, [int(ts)], source_tfs=source_tfs, max_age_sec=max_age_sec)[0]
+    return {n: (None if np.isnan(v) else float(v)) for n, v in zip(names, row)}
+
+
+def attach(rows: List[Dict[str, Any]], timeframe: str, names: Sequence[str],
+           source_tfs: Optional[Sequence[str]] = None, max_age_sec: Optional[float] = None) -> List[Dict[str, Any]]:
+    """Add feature columns (None when missing) to candle dicts in place, e.g. for the backtester."""
+    if not rows or not names:
+        return rows
+    m = matrix(timeframe, names, [int(r["ts"]) for r in rows], source_tfs=source_tfs, max_age_sec=max_age_sec)
+    for i, r in enumerate(rows):
+        for j, n in enumerate(names):
+            v = m[i, j]
+            r[n] = None if np.isnan(v) else float(v)
+    return rows
+
+
+# --- rules used by recommend() and tools/backtest.py -------------------------------
+# filter: "[long:|short:]name<op>number"   e.g. "hy_spread<5,long:sahm_rule<0.5"
+# score:  "[long:|short:]name*weight"      e.g. "t10y2y*2,short:hy_spread*-3"
+
+_FILTER_RE = re.compile(r"^(?:(long|short):)?\s*([^<>=!*]+?)\s*(<=|>=|==|!=|<|>)\s*(-?[\d.]+(?:e-?\d+)?)$", re.I)
+_SCORE_RE = re.compile(r"^(?:(long|short):)?\s*([^<>=!*]+?)\s*\*\s*(-?[\d.]+(?:e-?\d+)?)$", re.I)
+
+_OPS = {
+    "<": lambda a, b: a < b, "<=": lambda a, b: a <= b, ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b, "==": lambda a, b: a == b, "!=": lambda a, b: a != b,
+}
+
+
+def parse_filters(spec: str) -> List[Tuple[Optional[str], str, str, float]]:
+    out = []
+    for part in str(spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        m = _FILTER_RE.match(part)
+        if not m or not feature_name(m.group(2)):
+            print(f"[WARN] Ignoring feature filter: {part!r}")
+            continue
+        side = m.group(1).lower() if m.group(1) else None
+        out.append((side, feature_name(m.group(2)), m.group(3), float(m.group(4))))
+    return out
+
+
+def parse_score(spec: str) -> List[Tuple[Optional[str], str, float]]:
+    out = []
+    for part in str(spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        m = _SCORE_RE.match(part)
+        if not m or not feature_name(m.group(2)):
+            print(f"[WARN] Ignoring feature score term: {part!r}")
+            continue
+        side = m.group(1).lower() if m.group(1) else None
+        out.append((side, feature_name(m.group(2)), float(m.group(3))))
+    return out
+
+
+def check_filters(filters, side: str, values: Dict[str, Optional[float]]) -> List[str]:
+    """Return the failed rules (a missing value fails its rule)."""
+    failed = []
+    for f_side, name, op, thr in filters:
+        if f_side and f_side != side:
+            continue
+        v = values.get(name)
+        if v is None or not _OPS[op](v, thr):
+            failed.append(f"{name}{op}{thr:g}")
+    return failed
+
+
+def score_terms(terms, side: str, values: Dict[str, Optional[float]]) -> float:
+    """Sum of weight * value over matching terms (missing values contribute 0)."""
+    total = 0.0
+    for t_side, name, w in terms:
+        if t_side and t_side != side:
+            continue
+        v = values.get(name)
+        if v is not None:
+            total += w * v
+    return total
+
+
+def rule_names(filters, terms) -> List[str]:
+    names: List[str] = []
+    for n in [f[1] for f in filters] + [t[1] for t in terms]:
+        if n not in names:
+            names.append(n)
+    return names
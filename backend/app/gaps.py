@@ -0,0 +1,311 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from . import db, timeframes
+from .config import GAP_BACKFILL_MAX_BUCKETS
+
+# Gap index (candle_gaps, schema v7): runs of missing bars per timeframe.
+#
+# A gap is a run of bar slots between two stored bars that are more than one bar apart;
+# slots before the first stored bar are history that was never loaded, not gaps. Every
+# gap row lies strictly between two stored bars, so a write only affects the gaps
+# between the nearest stored bars around it. db.upsert_candle / upsert_candles_many call
+# update() in the same transaction: two primary-key probes find those neighbours, the ts
+# column between them is diffed (one vectorized pass for a bulk import, two values for
+# a webhook bar) and the gap rows in that span are replaced. The full-table scan only
+# runs once, when migration v7 builds the index; retention drops gaps before the first
+# live bar together with the bars it archives.
+#
+# backfill() (background job "gap_backfill" and tools/gaps.py) rebuilds missing bars of
+# the trade timeframes from lower-TF bars that cover a whole bucket, e.g. 1m bars that
+# arrived late or were loaded with tools/import_csv.py. Buckets without complete
+# lower-TF data stay missing; they are retried when the source's row count in the gap
+# changes.
+
+_FAR = 2**62
+
+_LOCK = threading.Lock()
+_TRIED: Dict[Tuple[str, int], int] = {}  # (target tf, gap start) -> source rows seen at the last attempt
+_STATS: Dict[str, Any] = {"runs": 0, "bars_filled": 0, "last": None}
+
+
+def runs(ts: np.ndarray, sec: int) -> List[Tuple[int, int, int]]:
+    """(first missing ts, last missing ts, missing bars) for every hole in sorted `ts`."""
+    if len(ts) < 2 or sec <= 0:
+        return []
+    d = np.diff(ts)
+    missing = d // sec - 1
+    idx = np.flatnonzero(missing > 0)
+    return [(int(ts[i]) + sec, int(ts[i]) + sec * int(missing[i]), int(missing[i])) for i in idx]
+
+
+def _ts_column(conn: sqlite3.Connection, sql: str, params: Tuple) -> np.ndarray:
+    cur = conn.cursor()
+    cur.row_factory = None  # plain tuples whatever the connection uses
+    rows = cur.execute(sql, params).fetchall()
+    return np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+
+
+def _ts_between(conn: sqlite3.Connection, tid: int, lo: int, hi: int) -> np.ndarray:
+    return _ts_column(conn, """SELECT ts FROM candles WHERE tf_id=? AND ts BETWEEN ? AND ? ORDER BY ts""", (tid, lo, hi))
+
+
+def update(conn: sqlite3.Connection, tid: int, timeframe: str, lo: int, hi: int) -> None:
+    """Re-index the gaps around bars just written to [lo, hi] (inside the caller's transaction)."""
+    sec = timeframes.tf_seconds(timeframe)
+    if sec <= 0:
+        return
+    row = conn.execute("""SELECT MAX(ts) FROM candles WHERE tf_id=? AND ts < ?""", (tid, lo)).fetchone()
+    a = lo if row[0] is None else int(row[0])
+    row = conn.execute("""SELECT MIN(ts) FROM candles WHERE tf_id=? AND ts > ?""", (tid, hi)).fetchone()
+    b = hi if row[0] is None else int(row[0])
+    found = runs(_ts_between(conn, tid, a, b), sec)
+    conn.execute("""DELETE FROM candle_gaps WHERE tf_id=? AND start_ts > ? AND start_ts < ?""", (tid, a, b))
+    if found:
+        conn.executemany(
+            """INSERT OR REPLACE INTO candle_gaps(tf_id, start_ts, end_ts, missing) VALUES (?, ?, ?, ?)""",
+            [(tid,) + g for g in found],
+        )
+
+
+def rebuild(conn: sqlite3.Connection, tid: int, timeframe: str, chunk: int = 500_000) -> int:
+    """Full scan of one timeframe (migration v7 / tools/gaps.py rebuild). Returns gap rows."""
+    sec = timeframes.tf_seconds(timeframe)
+    conn.execute("""DELETE FROM candle_gaps WHERE tf_id=?""", (tid,))
+    if sec <= 0:
+        return 0
+    n = 0
+    after = -_FAR
+    while True:
+        ts = _ts_column(conn, """SELECT ts FROM candles WHERE tf_id=? AND ts > ? ORDER BY ts LIMIT ?""",
+                        (tid, after, chunk))
+        if not len(ts):
+            break
+        # Carry the previous chunk's last bar so a hole across the boundary is found too.
+        found = runs(ts if after == -_FAR else np.concatenate([[after], ts]), sec)
+        conn.executemany(
+            """INSERT OR REPLACE INTO candle_gaps(tf_id, start_ts, end_ts, missing) VALUES (?, ?, ?, ?)""",
+            [(tid,) + g for g in found],
+        )
+        n += len(found)
+        after = int(ts[-1])
+        if len(ts) < chunk:
+            break
+    return n
+
+
+def rebuild_all(conn: sqlite3.Connection) -> Dict[str, int]:
+    return {key: rebuild(conn, int(tid), key)
+            for tid, key in conn.execute("""SELECT id, key FROM timeframes ORDER BY id""").fetchall()}
+
+
+def list_gaps(tf: str, start_ts: Optional[int] = None, end_ts: Optional[int] = None,
+              limit: int = 500) -> List[Dict[str, int]]:
+    """Gaps of `tf` overlapping [start_ts, end_ts], newest first."""
+    tid = db._tf_id(tf)
+    if tid is None:
+        return []
+    conn = db.connect()
+    try:
+        conn.row_factory = None
+        rows = conn.execute(
+            """SELECT start_ts, end_ts, missing FROM candle_gaps
+                 WHERE tf_id=? AND start_ts <= ? AND end_ts >= ? ORDER BY start_ts DESC LIMIT ?""",
+            (tid, _FAR if end_ts is None else int(end_ts), -_FAR if start_ts is None else int(start_ts),
+             max(1, int(limit))),
+        ).fetchall()
+    finally:
+        conn.close()
+    return [{"start_ts": a, "end_ts": b, "missing": m} for a, b, m in rows]
+
+
+def missing_bars(tf: str, start_ts: int, end_ts: int) -> int:
+    """Missing bars of `tf` inside [start_ts, end_ts]."""
+    sec = timeframes.tf_seconds(tf)
+    tid = db._tf_id(tf)
+    if tid is None or sec <= 0:
+        return 0
+    conn = db.connect()
+    try:
+        rows = conn.execute(
+            """SELECT start_ts, end_ts FROM candle_gaps WHERE tf_id=? AND start_ts <= ? AND end_ts >= ?""",
+            (tid, int(end_ts), int(start_ts)),
+        ).fetchall()
+    finally:
+        conn.close()
+    return sum((min(b, end_ts) - max(a, start_ts)) // sec + 1 for a, b in rows)
+
+
+def summary() -> Dict[str, Dict[str, Any]]:
+    conn = db.connect()
+    try:
+        rows = conn.execute(
+            """SELECT t.key, COUNT(*), SUM(g.missing), MAX(g.end_ts)
+                 FROM candle_gaps g JOIN timeframes t ON t.id = g.tf_id GROUP BY g.tf_id"""
+        ).fetchall()
+    finally:
+        conn.close()
+    return {r[0]: {"gaps": int(r[1]), "missing_bars": int(r[2] or 0), "latest_end_ts": r[3]} for r in rows}
+
+
+def sources(target: str) -> List[str]:
+    """Stored timeframes that can build whole `target` buckets, coarsest first."""
+    out = [k for k in db.timeframes_available() if any(t.key == target for t in timeframes.resample_targets(k))]
+    return sorted(out, key=timeframes.tf_seconds, reverse=True)
+
+
+def _ohlcv_between(tid: int, lo: int, hi: int) -> np.ndarray:
+    conn = db.connect()
+    try:
+        conn.row_factory = None
+        rows = conn.execute(
+            """SELECT ts, open, high, low, close, COALESCE(volume, 0.0) FROM candles
+                 WHERE tf_id=? AND ts BETWEEN ? AND ? ORDER BY ts""",
+            (tid, lo, hi),
+        ).fetchall()
+    finally:
+        conn.close()
+    return np.array(rows, dtype=np.float64).reshape(-1, 6)
+
+
+def _count_between(tid: int, lo: int, hi: int) -> int:
+    conn = db.connect()
+    try:
+        return int(conn.execute(
+            """SELECT COUNT(*) FROM candles WHERE tf_id=? AND ts BETWEEN ? AND ?""", (tid, lo, hi)
+        ).fetchone()[0])
+    finally:
+        conn.close()
+
+
+def resample(src: str, target: str, lo: int, hi: int) -> List[Tuple[int, float, float, float, float, float]]:
+    """`target` bars with bucket start in [lo, hi] built from complete runs of `src` bars."""
+    src_tf, tgt_tf = timeframes.get(src), timeframes.get(target)
+    tid = db._tf_id(src)
+    if src_tf is None or tgt_tf is None or tid is None:
+        return []
+    arr = _ohlcv_between(tid, lo, hi + tgt_tf.seconds - 1)
+    if not len(arr):
+        return []
+    ts = arr[:, 0].astype(np.int64)
+    bucket = ts - (ts - tgt_tf.offset_sec) % tgt_tf.seconds
+    first = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    count = np.diff(np.r_[first, len(ts)])
+    out = np.column_stack([
+        bucket[first],
+        arr[first, 1],
+        np.maximum.reduceat(arr[:, 2], first),
+        np.minimum.reduceat(arr[:, 3], first),
+        arr[first + count - 1, 4],
+        np.add.reduceat(arr[:, 5], first),
+    ])[count == tgt_tf.seconds // src_tf.seconds]
+    return [(int(r[0]), float(r[1]), float(r[2]), float(r[3]), float(r[4]), float(r[5])) for r in out]
+
+
+def _bounds(tf: str) -> Optional[Tuple[int, int]]:
+    tid = db._tf_id(tf)
+    if tid is None:
+        return None
+    conn = db.connect()
+    try:
+        # Two subqueries: SQLite only answers a lone MIN/MAX from the primary key.
+        row = conn.execute(
+            """SELECT (SELECT MIN(ts) FROM candles WHERE tf_id=?), (SELECT MAX(ts) FROM candles WHERE tf_id=?)""",
+            (tid, tid),
+        ).fetchone()
+    finally:
+        conn.close()
+    return None if row[0] is None else (int(row[0]), int(row[1]))
+
+
+def _ranges(target: str, srcs: Sequence[str]) -> Iterator[Tuple[int, int]]:
+    """Bucket-start ranges of `target` the sources may fill, newest first: the buckets after
+    its last bar, its gaps, then the buckets before its first bar."""
+    tgt_tf = timeframes.get(target)
+    spans = [b for b in (_bounds(s) for s in srcs) if b is not None]
+    if tgt_tf is None or not spans:
+        return
+    sec = tgt_tf.seconds
+    lo = tgt_tf.bucket_start(min(a for a, _ in spans))
+    hi = tgt_tf.bucket_start(max(b for _, b in spans))
+    own = _bounds(target)
+    if own is None:
+        yield lo, hi
+        return
+    if hi > own[1]:
+        yield own[1] + sec, hi
+    after = _FAR
+    while True:
+        page = list_gaps(target, end_ts=after - 1, limit=200)
+        for g in page:
+            if g["end_ts"] >= lo and g["start_ts"] <= hi:
+                yield max(g["start_ts"], lo), min(g["end_ts"], hi)
+        if len(page) < 200:
+            break
+        after = page[-1]["start_ts"]
+    if lo < own[0]:
+        yield lo, own[0] - sec
+
+
+def _windows(target: str, srcs: Sequence[str], size: int) -> Iterator[Tuple[int, int]]:
+    """The ranges cut into windows of at most `size` buckets, newest first."""
+    sec = timeframes.tf_seconds(target)
+    for a, b in _ranges(target, srcs):
+        while b >= a:
+            w = max(a, b - (size - 1) * sec)
+            yield w, b
+            b = w - sec
+
+
+def backfill(targets: Optional[Sequence[str]] = None, max_buckets: int = GAP_BACKFILL_MAX_BUCKETS) -> Optional[Dict[str, int]]:
+    """Fill missing trade-TF bars from lower-TF data; returns {tf: bars written} or None when nothing changed.
+
+    At most `max_buckets` bucket slots per target are read per run. Windows whose source
+    row count has not changed since they were last tried are skipped for free, so a run
+    moves on to older windows and later runs walk back through the history.
+    """
+    if not _LOCK.acquire(blocking=False):
+        return None
+    try:
+        filled: Dict[str, int] = {}
+        budget_all = max(1, int(max_buckets))
+        for target in targets or timeframes.trade_timeframes():
+            srcs = sources(target)
+            sec = timeframes.tf_seconds(target)
+            if not srcs or sec <= 0:
+                continue
+            src_ids = [tid for tid in (db._tf_id(s) for s in srcs) if tid is not None]
+            bars: Dict[int, Tuple[int, float, float, float, float, float]] = {}
+            budget = budget_all
+            for a, b in _windows(target, srcs, min(budget_all, 100)):
+                if budget <= 0:
+                    break
+                seen = sum(_count_between(tid, a, b + sec - 1) for tid in src_ids)
+                if seen == 0 or _TRIED.get((target, a)) == seen:
+                    continue
+                for src in srcs:  # coarsest first; finer sources fill what is still missing
+                    for r in resample(src, target, a, b):
+                        bars.setdefault(r[0], r)
+                _TRIED[(target, a)] = seen
+                budget -= (b - a) // sec + 1
+            if bars:
+                filled[target] = db.upsert_candles_many(target, [bars[k] for k in sorted(bars)])
+                print(f"[DEBUG] Gap backfill: {filled[target]} {target} bars from {','.join(srcs)}")
+        if len(_TRIED) > 100_000:
+            _TRIED.clear()
+        _STATS["runs"] += 1
+        _STATS["bars_filled"] += sum(filled.values())
+        _STATS["last"] = {"ts": int(time.time()), "filled": filled}
+        return filled or None
+    finally:
+        _LOCK.release()
+
+
+def state() -> Dict[str, Any]:
+    return dict(_STATS)
@@ -0,0 +1,267 @@
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from . import db
+from .config import HISTORY_ENABLED, HISTORY_FLUSH_SEC, OUTCOME_ENABLED
+from .timeframes import trade_timeframes
+
+# Point-in-time recommendation history (schema v5): every trade-TF bar close appends one
+# row per side to `recommend_history` with what recommend() said at that moment - status,
+# composite score, confidence, plan levels and the parameter set. Rows are never updated
+# (INSERT OR IGNORE: the first snapshot of a bar wins).
+#
+# The webhook only queues (tf, ts); a writer thread waits HISTORY_FLUSH_SEC so a 1m close
+# and the bars resampled from it land in one batch, runs recommend() once per side and
+# writes the whole batch in one transaction.
+#
+# Compact row: side 0/1, flag bits, score x100 and confidence x10 as integers, prices as
+# integer cents, and the (entry_mode, entry_k, stop_mult) triple interned in `param_sets`.
+
+SIDES = ("long", "short")
+REGIMES = ("unknown", "long_favored", "short_favored")
+
+F_READY = 1
+F_SELECTED = 2
+F_TRIGGER = 4
+F_TREND_OK = 8
+F_VOL_OK = 16
+_REGIME_SHIFT = 5  # two bits: index into REGIMES
+
+COLUMNS = ("tf", "side", "ts", "status", "selected", "trigger_now", "trend_ok", "vol_ok", "regime",
+           "composite_score", "confidence", "entry_price", "stop_price", "tp1_price",
+           "entry_mode", "entry_k", "stop_mult")
+
+_QUEUE: "queue.Queue[Tuple[str, int]]" = queue.Queue()
+_THREAD: Optional[threading.Thread] = None
+_STOP = threading.Event()
+_STATS: Dict[str, int] = {"queued": 0, "written": 0, "stale": 0, "batches": 0}
+
+_PARAM_IDS: Dict[Tuple[str, float, float], int] = {}
+_PARAMS_BY_ID: Dict[int, Tuple[str, float, float]] = {}
+
+
+def _cents(x: Optional[float]) -> Optional[int]:
+    return None if x is None else int(round(float(x) * 100.0))
+
+
+def _param_ids(conn, keys: Iterable[Tuple[str, float, float]]) -> Dict[Tuple[str, float, float], int]:
+    """Intern (entry_mode, entry_k, stop_mult) triples on an open transaction."""
+    for key in dict.fromkeys(keys):
+        if key in _PARAM_IDS:
+            continue
+        conn.execute("""INSERT OR IGNORE INTO param_sets(entry_mode, entry_k, stop_mult) VALUES (?, ?, ?)""", key)
+        row = conn.execute(
+            """SELECT id FROM param_sets WHERE entry_mode=? AND entry_k=? AND stop_mult=?""", key,
+        ).fetchone()
+        _PARAM_IDS[key] = int(row[0])
+        _PARAMS_BY_ID[int(row[0])] = key
+    return _PARAM_IDS
+
+
+def encode(c: Dict[str, Any], plan: Dict[str, Any], side: str, regime_bias: str, selected: bool) -> Tuple:
+    """Row (minus tf_id and params_id) for one scored candidate and its plan."""
+    flags = (
+        (F_READY if c.get("status") == "ready" else 0)
+        | (F_SELECTED if selected else 0)
+        | (F_TRIGGER if c.get("trigger_now") else 0)
+        | (F_TREND_OK if c.get("trend_ok") else 0)
+        | (F_VOL_OK if c.get("vol_ok") else 0)
+        | ((REGIMES.index(regime_bias) if regime_bias in REGIMES else 0) << _REGIME_SHIFT)
+    )
+    return (
+        SIDES.index(side), int(c["ts"]), flags,
+        int(round(float(c["composite_score"]) * 100.0)), int(round(float(c["confidence"]) * 10.0)),
+        _cents(plan.get("entry_price")), _cents(plan.get("stop_price")), _cents(plan.get("tp1_price")),
+    )
+
+
+def decode(tf: str, row: Tuple) -> Dict[str, Any]:
+    side, ts, flags, score, conf, entry, stop, tp1, pid = row
+    mode, k, sm = _PARAMS_BY_ID.get(pid, (None, None, None)) if pid is not None else (None, None, None)
+    return {
+        "tf": tf,
+        "side": SIDES[side],
+        "ts": int(ts),
+        "status": "ready" if flags & F_READY else "wait",
+        "selected": bool(flags & F_SELECTED),
+        "trigger_now": bool(flags & F_TRIGGER),
+        "trend_ok": bool(flags & F_TREND_OK),
+        "vol_ok": bool(flags & F_VOL_OK),
+        "regime": REGIMES[(flags >> _REGIME_SHIFT) & 3],
+        "composite_score": score / 100.0,
+        "confidence": conf / 10.0,
+        "entry_price": None if entry is None else entry / 100.0,
+        "stop_price": None if stop is None else stop / 100.0,
+        "tp1_price": None if tp1 is None else tp1 / 100.0,
+        "entry_mode": mode,
+        "entry_k": k,
+        "stop_mult": sm,
+    }
+
+
+def snapshot(events: Set[Tuple[str, int]]) -> List[Tuple[str, Tuple, Tuple[str, float, float], Dict[str, Any]]]:
+    """(tf, encoded row, param key, plan) for every queued bar close still current in recommend().
+
+    A bar that is no longer the latest of its timeframe (a newer bar arrived before the
+    flush, or an old bar was re-sent) is skipped: its point-in-time view is gone.
+    """
+    from .recommend import build_plan, recommend
+
+    out = []
+    seen: Set[Tuple[str, int]] = set()
+    for side in SIDES:
+        rec = recommend(side=side)
+        bias = (rec.get("regime") or {}).get("bias", "unknown")
+        sel = rec.get("selected") or {}
+        for c in rec.get("candidates") or []:
+            key = (c["tf"], int(c["ts"]))
+            if key not in events:
+                continue
+            seen.add(key)
+            plan = build_plan(c, side, best_params=c.get("best_params"))
+            pkey = (str(plan["entry_type"]), float(plan["params"]["entry_atr_k"]), float(plan["params"]["stop_atr_mult"]))
+            is_sel = rec.get("ok") and sel.get("tf") == c["tf"]
+            out.append((c["tf"], encode(c, plan, side, bias, bool(is_sel)), pkey, plan))
+    _STATS["stale"] += len(events - seen)
+    return out
+
+
+def write(rows: List[Tuple[str, Tuple, Tuple[str, float, float], Dict[str, Any]]]) -> int:
+    """Append snapshot rows; READY ones are also registered with the outcome tracker."""
+    if not rows:
+        return 0
+    tf_ids = {tf: db._tf_id(tf, create=True) for tf in dict.fromkeys(r[0] for r in rows)}
+    conn = db.connect()
+    try:
+        ids = _param_ids(conn, (p for _, _, p, _ in rows))
+        cur = conn.executemany(
+            """INSERT OR IGNORE INTO recommend_history(side, ts, flags, score, confidence, entry, stop, tp1, tf_id, params_id)
+                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            [r + (tf_ids[tf], ids[p]) for tf, r, p, _ in rows],
+        )
+        n = cur.rowcount
+        if OUTCOME_ENABLED:
+            from .outcomes import insert_plans
+
+            insert_plans(conn, [
+                (tf_ids[tf], r[0], r[1], int(bool(r[2] & F_SELECTED)), int(plan["entry_type"] == "market"),
+                 plan["entry_price"], plan["stop_price"], plan["tp1_price"], plan["tp2_price"], plan["tp3_price"])
+                for tf, r, _, plan in rows if r[2] & F_READY
+            ])
+        conn.commit()
+        return max(0, n)
+    finally:
+        conn.close()
+
+
+def flush(events: Set[Tuple[str, int]]) -> int:
+    t0 = time.time()
+    n = write(snapshot(events))
+    _STATS["written"] += n
+    _STATS["batches"] += 1
+    print(f"[DEBUG] Recommend history: {n} rows for {len(events)} bar closes in {time.time() - t0:.3f}s")
+    return n
+
+
+def note_bar_close(tf: str, ts: int) -> None:
+    """Queue a closed trade-TF bar for the history writer (cheap; called from the webhook)."""
+    if not HISTORY_ENABLED or tf not in trade_timeframes():
+        return
+    _QUEUE.put_nowait((tf, int(ts)))
+    _STATS["queued"] += 1
+
+
+def _drain(first: Optional[Tuple[str, int]] = None) -> Set[Tuple[str, int]]:
+    events = {first} if first else set()
+    while True:
+        try:
+            events.add(_QUEUE.get_nowait())
+        except queue.Empty:
+            return events
+
+
+def _flush_safe(events: Set[Tuple[str, int]]) -> None:
+    if not events:
+        return
+    try:
+        flush(events)
+    except Exception as e:
+        print(f"[WARN] Recommend history error: {type(e).__name__}: {e}")
+
+
+def _loop() -> None:
+    while not _STOP.is_set():
+        try:
+            first = _QUEUE.get(timeout=1.0)
+        except queue.Empty:
+            continue
+        # Collect the rest of the burst (resampled bars, other TFs closing together).
+        _STOP.wait(max(0.0, float(HISTORY_FLUSH_SEC)))
+        _flush_safe(_drain(first))
+    _flush_safe(_drain())
+
+
+def start() -> bool:
+    global _THREAD
+    if not HISTORY_ENABLED or (_THREAD is not None and _THREAD.is_alive()):
+        return False
+    _STOP.clear()
+    _THREAD = threading.Thread(target=_loop, name="wonyodd-history", daemon=True)
+    _THREAD.start()
+    return True
+
+
+def stop() -> None:
+    global _THREAD
+    _STOP.set()
+    if _THREAD is not None:
+        _THREAD.join(timeout=10)
+        _THREAD = None
+
+
+def state() -> Dict[str, Any]:
+    return {"enabled": HISTORY_ENABLED, "pending": _QUEUE.qsize(), **_STATS}
+
+
+def _load_params(conn) -> None:
+    for pid, mode, k, sm in conn.execute("""SELECT id, entry_mode, entry_k, stop_mult FROM param_sets""").fetchall():
+        _PARAMS_BY_ID[int(pid)] = (mode, float(k), float(sm))
+        _PARAM_IDS[(mode, float(k), float(sm))] = int(pid)
+
+
+def iter_rows(tf: str, side: Optional[str] = None, start_ts: int = 0, end_ts: Optional[int] = None,
+              limit: Optional[int] = None, chunk: int = 5000) -> Iterator[Dict[str, Any]]:
+    """Decoded history rows for `tf` in [start_ts, end_ts], oldest first, read in keyset chunks."""
+    tid = db._tf_id(tf)
+    if tid is None:
+        return
+    side_sql = "" if side is None else f" AND side={SIDES.index(side)}"
+    end_ts = 2**62 if end_ts is None else int(end_ts)
+    after = (int(start_ts) - 1, 1)  # (ts, side) of the last row returned
+    left = limit
+    while left is None or left > 0:
+        n = chunk if left is None else min(chunk, left)
+        conn = db.connect()
+        try:
+            conn.row_factory = None
+            rows = conn.execute(
+                f"""SELECT side, ts, flags, score, confidence, entry, stop, tp1, params_id FROM recommend_history
+                      WHERE tf_id=? AND (ts, side) > (?, ?) AND ts <= ?{side_sql}
+                      ORDER BY ts ASC, side ASC LIMIT ?""",
+                (tid, after[0], after[1], end_ts, n),
+            ).fetchall()
+            if any(r[8] is not None and r[8] not in _PARAMS_BY_ID for r in rows):
+                _load_params(conn)
+        finally:
+            conn.close()
+        for r in rows:
+            yield decode(tf, r)
+        if len(rows) < n:
+            return
+        if left is not None:
+            left -= len(rows)
+        after = (rows[-1][1], rows[-1][0])
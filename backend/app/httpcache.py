@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from fastapi import Request, Response
+
+from . import config, db
+from .serialize import dumps
+
+# Bump when the shape of a cached response changes without a config change.
+CACHE_FORMAT = 1
+
+# Secrets never take part in the config hash.
+_HASH_EXCLUDE = {"WEBHOOK_SECRET", "DISCORD_WEBHOOK_URL", "DISCORD_WEBHOOK_FILE"}
+
+_RESP_CACHE: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+_RESP_LOCK = threading.Lock()
+_CONFIG_HASH: Optional[str] = None
+
+
+def config_hash() -> str:
+    """Short hash of every config value (and CACHE_FORMAT) that can change a response."""
+    global _CONFIG_HASH
+    if _CONFIG_HASH is None:
+        items = sorted(
+            (k, repr(v)) for k, v in vars(config).items()
+            if k.isupper() and k not in _HASH_EXCLUDE
+        )
+        h = hashlib.sha1(repr((CACHE_FORMAT, items)).encode("utf-8"))
+        _CONFIG_HASH = h.hexdigest()[:12]
+    return _CONFIG_HASH
+
+
+def etag_for(kind: str, tfs: Iterable[str], params: Tuple[Any, ...]) -> str:
+    versions = tuple((tf, db.data_version(tf)) for tf in tfs)
+    raw = repr((kind, params, versions, config_hash()))
+    return 'W/"' + hashlib.sha1(raw.encode("utf-8")).hexdigest()[:20] + '"'
+
+
+def last_modified(tfs: Iterable[str]) -> float:
+    return max((db.data_version(tf)[2] for tf in tfs), default=0.0)
+
+
+def _not_modified(request: Request, etag: str, modified_at: float) -> bool:
+    inm = request.headers.get("if-none-match")
+    if inm:
+        tags = [t.strip() for t in inm.split(",")]
+        return "*" in tags or etag in tags or etag[2:] in tags
+    ims = request.headers.get("if-modified-since")
+    if ims:
+        try:
+            return int(modified_at) <= int(parsedate_to_datetime(ims).timestamp())
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _cache_get(key: str) -> Optional[bytes]:
+    with _RESP_LOCK:
+        hit = _RESP_CACHE.get(key)
+        if hit is None:
+            return None
+        body, created = hit
+        if (time.time() - created) > float(config.RESPONSE_CACHE_MAX_AGE_SEC):
+            del _RESP_CACHE[key]
+            return None
+        _RESP_CACHE.move_to_end(key)
+        return body
+
+
+def _cache_put(key: str, body: bytes) -> None:
+    size = int(config.RESPONSE_CACHE_SIZE)
+    if size <= 0:
+        return
+    with _RESP_LOCK:
+        _RESP_CACHE[key] = (body, time.time())
+        _RESP_CACHE.move_to_end(key)
+        while len(_RESP_CACHE) > size:
+            _RESP_CACHE.popitem(last=False)
+
+
+def clear() -> None:
+    with _RESP_LOCK:
+        _RESP_CACHE.clear()
+
+
+def cached_json(
+    request: Request,
+    kind: str,
+    tfs: Iterable[str],
+    params: Tuple[Any, ...],
+    build: Callable[[], Dict[str, Any]],
+    time_bucket_sec: float = 0.0,
+) -> Response:
+    """Serve a JSON body validated by the data version of `tfs`.
+
+    - If the client already holds the current ETag (or Last-Modified), answer 304
+      without touching SQLite or calling `build`.
+    - Otherwise reuse an identical body rendered earlier for the same data version,
+      and only call `build` on a miss.
+    - time_bucket_sec > 0: the body also has wall-clock fields, so ETag and Last-Modified
+      roll over every time_bucket_sec even when the data did not change.
+    """
+    if not config.HTTP_CACHE_ENABLED:
+        return Response(dumps(build()), media_type="application/json")
+
+    tfs = tuple(tfs)
+    modified_at = last_modified(tfs)
+    if time_bucket_sec > 0:
+        bucket = int(time.time() // time_bucket_sec)
+        params = tuple(params) + (bucket,)
+        modified_at = max(modified_at, bucket * time_bucket_sec)
+    etag = etag_for(kind, tfs, params)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(modified_at, usegmt=True),
+        "Cache-Control": "no-cache",
+    }
+    if _not_modified(request, etag, modified_at):
+        return Response(status_code=304, headers=headers)
+
+    body = _cache_get(etag)
+    if body is None:
+        body = dumps(build())
+        _cache_put(etag, body)
+        headers["X-Cache"] = "MISS"
+    else:
+        headers["X-Cache"] = "HIT"
+    return Response(body, media_type="application/json", headers=headers)
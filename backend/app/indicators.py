@@ -1,6 +1,7 @@
 from __future__ import annotations
 from typing import Optional, Sequence, Tuple
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 
 def sma_last(values: Sequence[float], period: int) -> Optional[float]:
     if len(values) < period:
@@ -37,5 +38,45 @@ def atr_sma_last(highs: Sequence[float], lows: Sequence[float], closes: Sequence
         return None
     return float(tr[-period:].mean())
 
+# Whole-series versions of the above (NaN until the window is full), for backtests and
+# replays. Bar i of each array equals the *_last() value over values[:i+1].
+
+def sma_series(x: np.ndarray, n: int) -> np.ndarray:
+    out = np.full(len(x), np.nan)
+    if len(x) >= n:
+        out[n - 1:] = sliding_window_view(x, n).mean(axis=1)
+    return out
+
+def rsi_sma_series(c: np.ndarray, period: int = 2) -> np.ndarray:
+    out = np.full(len(c), np.nan)
+    if len(c) < period + 1:
+        return out
+    d = np.diff(c)
+    g = sma_series(np.clip(d, 0, None), period)
+    l = sma_series(np.clip(-d, 0, None), period)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r = np.where(l == 0, np.where(g == 0, 50.0, 100.0), 100.0 - 100.0 / (1.0 + g / l))
+    out[1:] = np.where(np.isnan(g), np.nan, r)
+    return out
+
+def atr_sma_series(h: np.ndarray, l: np.ndarray, c: np.ndarray, period: int = 14) -> np.ndarray:
+    prev = np.concatenate([[c[0]], c[:-1]]) if len(c) else c
+    tr = np.maximum(h - l, np.maximum(np.abs(h - prev), np.abs(l - prev)))
+    out = sma_series(tr, period)
+    out[:period] = np.nan  # needs `period` true ranges with a previous close
+    return out
+
+def rolling_min_series(x: np.ndarray, n: int) -> np.ndarray:
+    out = np.full(len(x), np.nan)
+    if len(x) >= n:
+        out[n - 1:] = sliding_window_view(x, n).min(axis=1)
+    return out
+
+def rolling_max_series(x: np.ndarray, n: int) -> np.ndarray:
+    out = np.full(len(x), np.nan)
+    if len(x) >= n:
+        out[n - 1:] = sliding_window_view(x, n).max(axis=1)
+    return out
+
 def clamp(x: float, lo: float, hi: float) -> float:
     return max(lo, min(hi, x))
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Tuple
+
+from . import shared
+from .config import INGEST_DEDUP_SIZE
+from .models import WebhookPayload
+
+# Webhook dedup and late-bar handling (POST /api/webhook/tradingview).
+#
+# TradingView retries, double-fires and delivers late. Every accepted bar leaves a
+# content digest under its (tf, ts) in a bounded LRU; a delivery whose digest matches
+# returns before any DB write, so a duplicate bumps no data version (ETags and the
+# per-TF caches stay valid) and runs no resample/history/notification step again.
+# The LRU is per worker: a duplicate that lands on another worker is processed once
+# more, which the idempotent upsert and the notification claims already tolerate.
+#
+# A bar older than the timeframe's latest (a late delivery, or a revision of history)
+# changes data that caches keyed by the latest bar do not see: it re-resamples only the
+# buckets that contain it and drops only that timeframe's best-params and scenario
+# entries (see history_changed). The latest bar itself keeps the normal pipeline.
+
+Key = Tuple[str, int]
+
+# Fields that define the stored bar and how it is handled; `password`, `time` (an
+# alternative spelling of ts) and the instrument names do not.
+_DIGEST_FIELDS = ("open", "high", "low", "close", "volume", "features",
+                  "bar_close_confirmed", "bar_close", "is_bar_close", "barstate")
+
+_SEEN: "OrderedDict[Key, bytes]" = OrderedDict()
+_LOCK = threading.Lock()
+_STATS: Dict[str, int] = {"accepted": 0, "duplicates": 0, "revisions": 0, "late": 0}
+
+
+def digest(payload: WebhookPayload) -> bytes:
+    body = {k: getattr(payload, k) for k in _DIGEST_FIELDS}
+    raw = json.dumps(body, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).digest()
+
+
+def is_duplicate(tf: str, ts: int, d: bytes) -> bool:
+    """True when (tf, ts) was already accepted with exactly this content."""
+    if INGEST_DEDUP_SIZE <= 0:
+        return False
+    key = (tf, int(ts))
+    with _LOCK:
+        if _SEEN.get(key) != d:
+            return False
+        _SEEN.move_to_end(key)
+        _STATS["duplicates"] += 1
+        return True
+
+
+def remember(tf: str, ts: int, d: bytes, late: bool = False) -> None:
+    """Record an accepted bar (call after the write succeeded)."""
+    with _LOCK:
+        _STATS["accepted"] += 1
+        if late:
+            _STATS["late"] += 1
+        if INGEST_DEDUP_SIZE <= 0:
+            return
+        key = (tf, int(ts))
+        prev = _SEEN.get(key)
+        if prev is not None and prev != d:
+            _STATS["revisions"] += 1
+        _SEEN[key] = d
+        _SEEN.move_to_end(key)
+        while len(_SEEN) > INGEST_DEDUP_SIZE:
+            _SEEN.popitem(last=False)
+
+
+def history_changed(tf: str) -> None:
+    """Drop caches of `tf` that are keyed by its latest bar after an older bar was written.
+
+    The indicator snapshot and HTTP caches are keyed by db.data_version and follow by themselves.
+    """
+    from . import scenario
+
+    shared.cache_delete_prefix(f"best_params:{tf}:")
+    scenario.invalidate(tf)
+
+
+def state() -> Dict[str, Any]:
+    with _LOCK:
+        return {"dedup_size": INGEST_DEDUP_SIZE, "tracked": len(_SEEN), **_STATS}
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import bisect
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from . import db
+from .config import INTRABAR_TF
+
+# Intrabar drill-down for the evaluator (WONYODD_INTRABAR_FILLS): on the few bars where
+# the OHLC of a higher timeframe cannot tell the real fill price (the limit-entry bar and
+# bars that touch the stop), look up the stored 1m candles of that bar and take the
+# first minute that trades through the level. A minute that opens beyond the level
+# fills at its open (gaps), otherwise at the level itself.
+#
+# Lookups go through the (tf_id, ts) primary key; windows known up front (every bar
+# after an entry signal) are prefetched as merged range scans on one connection, and
+# everything is cached per bar so the grid's 26 backtests share one set of reads.
+# Bars already moved to the archive are read per month file.
+
+# One higher-TF bar: minute opens, highs, lows, and the running low (negated) / running
+# high, so the first minute through a level is a bisect instead of an array scan.
+Minutes = Tuple[List[float], np.ndarray, np.ndarray, List[float], List[float]]
+
+
+class MinuteIndex:
+    def __init__(self, bar_sec: int, tf: str = INTRABAR_TF, include_archive: bool = True):
+        self.bar_sec = int(bar_sec)
+        self.tf = tf
+        self.include_archive = include_archive
+        self._bars: Dict[int, Optional[Minutes]] = {}
+        self._months: Dict[str, Dict[str, np.ndarray]] = {}
+        self.stats = {"prefetched": 0, "queries": 0, "missing": 0}
+
+    def _split(self, t0s: List[int], ts: np.ndarray, o: np.ndarray, h: np.ndarray, l: np.ndarray) -> None:
+        for t0 in t0s:
+            a = int(np.searchsorted(ts, t0, side="left"))
+            b = int(np.searchsorted(ts, t0 + self.bar_sec, side="left"))
+            # Only a bar whose first minute is stored can settle the order of events.
+            if b > a and int(ts[a]) == t0:
+                self._bars[t0] = (o[a:b].tolist(), h[a:b], l[a:b],
+                                  (-np.minimum.accumulate(l[a:b])).tolist(), np.maximum.accumulate(h[a:b]).tolist())
+            else:
+                self._bars.setdefault(t0, None)
+
+    def _read_live(self, ranges: List[Tuple[int, int]]) -> Tuple[np.ndarray, ...]:
+        tid = db._tf_id(self.tf)
+        if tid is None or not ranges:
+            empty = np.array([], dtype=np.float64)
+            return np.array([], dtype=np.int64), empty, empty, empty
+        conn = db.connect()
+        try:
+            conn.row_factory = None
+            rows: List[Tuple] = []
+            for lo, hi in ranges:
+                rows.extend(conn.execute(
+                    """SELECT ts, open, high, low FROM candles WHERE tf_id=? AND ts >= ? AND ts < ? ORDER BY ts ASC""",
+                    (tid, int(lo), int(hi)),
+                ).fetchall())
+                self.stats["queries"] += 1
+        finally:
+            conn.close()
+        arr = np.array(rows, dtype=np.float64).reshape(-1, 4)
+        return arr[:, 0].astype(np.int64), arr[:, 1], arr[:, 2], arr[:, 3]
+
+    def _read_archive(self, t0: int) -> None:
+        from .retention import _month_of, fetch_archive_range
+
+        month = _month_of(t0)
+        cols = self._months.get(month)
+        if cols is None:
+            # Whole month at once: later misses in the same month are served from memory.
+            lo = int(np.datetime64(month, "s").astype(np.int64))
+            hi = int(np.datetime64(np.datetime64(month, "M") + 1, "s").astype(np.int64)) - 1
+            cols = fetch_archive_range(self.tf, lo, hi)
+            self._months[month] = cols
+        self._split([t0], cols["ts"].astype(np.int64), cols["open"], cols["high"], cols["low"])
+
+    def prefetch(self, t0s: Iterable[int]) -> None:
+        """Load the minutes of several higher-TF bars (opening at t0s) in merged range scans."""
+        todo = sorted({int(t) for t in t0s if int(t) not in self._bars})
+        if not todo:
+            return
+        ranges: List[List[int]] = []
+        for t0 in todo:
+            if ranges and t0 <= ranges[-1][1]:
+                ranges[-1][1] = max(ranges[-1][1], t0 + self.bar_sec)
+            else:
+                ranges.append([t0, t0 + self.bar_sec])
+        self._split(todo, *self._read_live([(lo, hi) for lo, hi in ranges]))
+        self.stats["prefetched"] += len(todo)
+        if self.include_archive:
+            for t0 in todo:
+                if self._bars.get(t0) is None:
+                    self._read_archive(t0)
+
+    def bar(self, t0: int) -> Optional[Minutes]:
+        """Minutes of the higher-TF bar opening at t0, or None when they are not stored."""
+        t0 = int(t0)
+        if t0 not in self._bars:
+            self._split([t0], *self._read_live([(t0, t0 + self.bar_sec)]))
+            if self._bars.get(t0) is None and self.include_archive:
+                self._read_archive(t0)
+        m = self._bars.get(t0)
+        if m is None:
+            self.stats["missing"] += 1
+        return m
+
+    def __getstate__(self):
+        # Ship the cache to grid-search worker processes, not the archive month arrays.
+        state = dict(self.__dict__)
+        state["_months"] = {}
+        return state
+
+
+def first_touch(m: Minutes, level: float, down: bool, from_k: int = 0) -> Optional[Tuple[int, float]]:
+    """(minute index, fill price) of the first minute >= from_k trading through `level`.
+
+    down=True looks for low <= level (long limit entries, long stops); the fill is the
+    level, or the minute's open when it already opened beyond it. None = not touched.
+    """
+    o, h, l, neg_low, run_high = m
+    if from_k:
+        hit = np.flatnonzero(l[from_k:] <= level) if down else np.flatnonzero(h[from_k:] >= level)
+        if not len(hit):
+            return None
+        k = from_k + int(hit[0])
+    else:
+        k = bisect.bisect_left(neg_low, -level) if down else bisect.bisect_left(run_high, level)
+        if k >= len(o):
+            return None
+    px = o[k]
+    return k, (min(level, px) if down else max(level, px))
@@ -1,15 +1,20 @@
 from __future__ import annotations
 import time
+from contextlib import asynccontextmanager
 from pathlib import Path
 from typing import Optional
 
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import JSONResponse
-from fastapi.staticfiles import StaticFiles
+_BOOT_TS = time.time()
 
-from dateutil import parser as dtparser
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from fastapi.staticfiles import StaticFiles
 
 from .config import (
+    DB_POOL_SIZE,
+    WARMUP_ENABLED,
+    FRONTEND_DIR,
     WEBHOOK_SECRET,
     REQUIRE_BAR_CLOSE,
     VALIDATE_TS_ALIGNMENT,
@@ -26,21 +31,82 @@ from .config import (
     READY_NOTIFY_SIDE,
     READY_NOTIFY_ONLY_BAR_CLOSE,
     READY_NOTIFY_COOLDOWN_SEC,
+    FEATURE_SOURCE_TFS,
+    FUNDING_ENABLED,
+    RECOMMEND_ETAG_BUCKET_SEC,
 )
-from . import db
+from . import admission, aiodb, background, db, history, httpcache, ingest, timeframes, writebuf
 from .models import WebhookPayload
-from .recommend import recommend, tf_key
+from .timeframes import tf_key
 from .notify import build_discord_message, send_discord_webhook
 from .alerts import detect_volume_volatility_spike
-
-import json
-
-# Resolve project root (/opt/wonyodd-reco)
-PROJECT_ROOT = Path("/opt/wonyodd-reco")
-FRONTEND_DIR = PROJECT_ROOT / "frontend"
-
-app = FastAPI(title="Wonyodd Reco Engine", version="1.0.0")
-db.init_db()
+from .responses import FastJSONResponse
+from .serialize import dumps_str
+
+# Project root is two levels above this file (/opt/wonyodd-reco when installed by install.sh)
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+FRONTEND_PATH = Path(FRONTEND_DIR) if FRONTEND_DIR else PROJECT_ROOT / "frontend"
+
+_FIRST_RESPONSE: dict = {}
+
+def recommend(*args, **kwargs):
+    # Deferred import: numpy and the evaluator stack load on first use, normally in the
+    # warm-up thread rather than on the import/startup path.
+    from .recommend import recommend as _recommend
+    return _recommend(*args, **kwargs)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    db.init_db()
+    pooled = db.open_pool(DB_POOL_SIZE)
+    buffered = db.open_write_buffer()
+    if WARMUP_ENABLED:
+        background.start_warmup()
+    background.start()
+    history.start()
+    print(f"[DEBUG] Startup: ready in {time.time() - _BOOT_TS:.3f}s (db pool={pooled}, write buffer={buffered}, "
+          f"warmup={WARMUP_ENABLED})")
+    try:
+        yield
+    finally:
+        history.stop()
+        background.stop()
+        aiodb.shutdown()
+        db.close_write_buffer()
+        db.close_pool()
+
+class _FirstResponseTimer:
+    """ASGI middleware that logs time-to-first-byte of the first request after boot."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if _FIRST_RESPONSE or scope.get("type") != "http":
+            await self.app(scope, receive, send)
+            return
+        t0 = time.time()
+
+        async def send_timed(message):
+            if message.get("type") == "http.response.start" and not _FIRST_RESPONSE:
+                now = time.time()
+                _FIRST_RESPONSE.update({
+                    "path": scope.get("path"),
+                    "ttfb_sec": round(now - t0, 4),
+                    "since_boot_sec": round(now - _BOOT_TS, 3),
+                })
+                print(f"[DEBUG] First response: {_FIRST_RESPONSE}")
+            await send(message)
+
+        await self.app(scope, receive, send_timed)
+
+app = FastAPI(
+    title="Wonyodd Reco Engine",
+    version="1.0.0",
+    default_response_class=FastJSONResponse,
+    lifespan=lifespan,
+)
+app.add_middleware(_FirstResponseTimer)
 
 def _parse_tf_list(s: str) -> set[str]:
     out: set[str] = set()
@@ -89,6 +155,36 @@ def _choose_auto_side(rec_long: dict, rec_short: dict) -> str:
         return "short"
     return "long"
 
+def _notify_recs(side_mode: str, ready_only: bool, focus_tf: Optional[str] = None) -> list[tuple[str, dict]]:
+    """(side, recommend()) pairs a notification looks at: long / short / both / auto (one side).
+
+    Messages only use status, plan and regime, so the summary projection is enough; with
+    ready_only a side with nothing READY returns before the best-params grid search
+    (_choose_auto_side prefers a READY side anyway).
+    """
+    def rec(side: str) -> dict:
+        return recommend(side=side, focus_tf=focus_tf, detail="summary", ready_only=ready_only)
+
+    if side_mode in ("long", "short"):
+        return [(side_mode, rec(side_mode))]
+    if side_mode == "both":
+        return [("long", rec("long")), ("short", rec("short"))]
+    rec_long, rec_short = rec("long"), rec("short")
+    side = _choose_auto_side(rec_long, rec_short)
+    return [(side, rec_long if side == "long" else rec_short)]
+
+def _send_claimed(kind: str, tf: str, ts: int, ctx: dict, msg: dict, label: str) -> None:
+    # The slot was claimed by db.claim_notification(); keep it on success, free it otherwise.
+    ok, detail = False, "error"
+    try:
+        ok, detail = send_discord_webhook(msg)
+        print(f"[DEBUG] {label} notify: ok={ok} detail={detail}")
+    finally:
+        if ok:
+            db.complete_notification(kind, tf, ts, detail=dumps_str({"ctx": ctx, "detail": detail}))
+        else:
+            db.release_notification(kind, tf, ts)
+
 def _maybe_notify_spike(
     tf: str,
     ts: int,
@@ -118,17 +214,7 @@ def _maybe_notify_spike(
         ctx["exchange"] = payload.exchange
 
     side_mode = str(SPIKE_NOTIFY_SIDE or "auto").strip().lower()
-    recs = []
-    if side_mode in ("long", "short"):
-        recs.append(recommend(side=side_mode))
-    elif side_mode == "both":
-        recs.append(recommend(side="long"))
-        recs.append(recommend(side="short"))
-    else:
-        rec_long = recommend(side="long")
-        rec_short = recommend(side="short")
-        side = _choose_auto_side(rec_long, rec_short)
-        recs.append(rec_long if side == "long" else rec_short)
+    recs = [rec for _, rec in _notify_recs(side_mode, ready_only=bool(SPIKE_NOTIFY_ONLY_READY))]
 
     now = int(time.time())
     for rec in recs:
@@ -140,28 +226,15 @@ def _maybe_notify_spike(
         side = str(plan.get("side") or "").lower() or str(rec.get("side") or "").lower() or "auto"
         kind = f"{ctx.get('kind', 'spike')}:{side}"
 
-        if db.notification_exists(kind, tf, ts):
-            continue
-
-        last = db.fetch_latest_notification(kind)
-        if last:
-            try:
-                last_created = int(last["created_ts"])
-                if int(SPIKE_NOTIFY_COOLDOWN_SEC) > 0 and (now - last_created) < int(SPIKE_NOTIFY_COOLDOWN_SEC):
-                    print("[DEBUG] Spike notify skipped (cooldown)")
-                    continue
-            except Exception:
-                pass
-
         if SPIKE_NOTIFY_ONLY_READY and (rec.get("selected") or {}).get("status") != "ready":
             print("[DEBUG] Spike notify skipped (status!=ready)")
             continue
 
-        msg = build_discord_message(rec, context=ctx, content="스파이크 감지 → 추천")
-        ok, detail = send_discord_webhook(msg)
-        print(f"[DEBUG] Spike notify: ok={ok} detail={detail}")
-        if ok:
-            db.insert_notification(kind, tf, ts, created_ts=now, detail=json.dumps({"ctx": ctx, "detail": detail}, ensure_ascii=False))
+        if not db.claim_notification(kind, tf, ts, created_ts=now, cooldown_sec=int(SPIKE_NOTIFY_COOLDOWN_SEC)):
+            print("[DEBUG] Spike notify skipped (already sent or cooldown)")
+            continue
+
+        _send_claimed(kind, tf, ts, ctx, build_discord_message(rec, context=ctx, content="스파이크 감지 → 추천"), "Spike")
 
 def _maybe_notify_ready(tf: str, ts: int, payload: WebhookPayload, *, force_bar_close: bool = False) -> None:
     if not READY_NOTIFY_ENABLED:
@@ -175,17 +248,7 @@ def _maybe_notify_ready(tf: str, ts: int, payload: WebhookPayload, *, force_bar_
         return
 
     side_mode = str(READY_NOTIFY_SIDE or "both").strip().lower()
-    recs: list[tuple[str, dict]] = []
-    if side_mode in ("long", "short"):
-        recs.append((side_mode, recommend(side=side_mode, focus_tf=tf)))
-    elif side_mode == "both":
-        recs.append(("long", recommend(side="long", focus_tf=tf)))
-        recs.append(("short", recommend(side="short", focus_tf=tf)))
-    else:
-        rec_long = recommend(side="long", focus_tf=tf)
-        rec_short = recommend(side="short", focus_tf=tf)
-        side = _choose_auto_side(rec_long, rec_short)
-        recs.append((side, rec_long if side == "long" else rec_short))
+    recs = _notify_recs(side_mode, ready_only=True, focus_tf=tf)
 
     now = int(time.time())
     ctx = {"kind": "ready", "timeframe": tf, "ts": int(ts)}
@@ -196,24 +259,11 @@ def _maybe_notify_ready(tf: str, ts: int, payload: WebhookPayload, *, force_bar_
             continue
 
         kind = f"ready:{tf}:{side}"
-        if db.notification_exists(kind, tf, ts):
+        if not db.claim_notification(kind, tf, ts, created_ts=now, cooldown_sec=int(READY_NOTIFY_COOLDOWN_SEC)):
+            print("[DEBUG] Ready notify skipped (already sent or cooldown)")
             continue
 
-        last = db.fetch_latest_notification(kind)
-        if last:
-            try:
-                last_created = int(last["created_ts"])
-                if int(READY_NOTIFY_COOLDOWN_SEC) > 0 and (now - last_created) < int(READY_NOTIFY_COOLDOWN_SEC):
-                    print("[DEBUG] Ready notify skipped (cooldown)")
-                    continue
-            except Exception:
-                pass
-
-        msg = build_discord_message(rec, context=ctx, content="READY 신호 → 추천")
-        ok, detail = send_discord_webhook(msg)
-        print(f"[DEBUG] Ready notify: ok={ok} detail={detail}")
-        if ok:
-            db.insert_notification(kind, tf, ts, created_ts=now, detail=json.dumps({"ctx": ctx, "detail": detail}, ensure_ascii=False))
+        _send_claimed(kind, tf, ts, ctx, build_discord_message(rec, context=ctx, content="READY 신호 → 추천"), "Ready")
 
 def _parse_ts(payload: WebhookPayload) -> int:
     # 1. ts field
@@ -227,6 +277,8 @@ def _parse_ts(payload: WebhookPayload) -> int:
             try:
                 val = int(payload.time)
             except ValueError:
+                from dateutil import parser as dtparser
+
                 dt = dtparser.parse(str(payload.time))
                 return int(dt.timestamp())
     else:
@@ -260,39 +312,36 @@ def _is_bar_close(payload: WebhookPayload) -> bool:
     return False
 
 def _is_ts_aligned(ts: int, tf: str) -> bool:
-    # Accept alignment to bar open OR bar close.
-    # e.g. 30m bar: ts % 1800 == 0 (open) or (ts + 1800) % 1800 == 0 (close).
-    tf_sec = {
-        "30m": 30 * 60,
-        "60m": 60 * 60,
-        "180m": 180 * 60,
-        "1D": 24 * 60 * 60,
-    }.get(tf)
-    if not tf_sec:
+    # Bar boundary of the timeframe (open or close, incl. the 1W Monday offset); unknown TFs pass.
+    t = timeframes.get(tf)
+    if t is None:
         return True
-    return (ts % tf_sec == 0) or ((ts + tf_sec) % tf_sec == 0)
+    return t.is_aligned(ts)
+
+def _resample_from_lower_tf(tf: str, ts: int, latest_ts: Optional[int] = None) -> list[tuple[str, int]]:
+    """Rebuild the higher-TF buckets a new `tf` bar completes.
 
-def _resample_from_lower_tf(tf: str, ts: int) -> list[tuple[str, int]]:
+    latest_ts (the newest stored `tf` bar) marks `ts` as a late bar: then the bucket that
+    contains it is rebuilt if that bucket has already closed.
+    """
     if not RESAMPLE_FROM_LOWER_TF:
         return []
-    if tf not in ("1m", "5m", "15m"):
+    targets = timeframes.resample_targets(tf)
+    if not targets:
         return []
-
-    tf_sec_map = {"1m": 60, "5m": 300, "15m": 900, "30m": 1800, "60m": 3600, "180m": 10800}
-    src_sec = tf_sec_map[tf]
-    targets = ("30m", "60m", "180m")
+    src_sec = timeframes.tf_seconds(tf)
+    late = latest_ts is not None and ts < latest_ts
 
     resampled: list[tuple[str, int]] = []
-    for tgt in targets:
-        tgt_sec = tf_sec_map[tgt]
-        if tgt_sec % src_sec != 0:
-            continue
+    for target in targets:
+        tgt, tgt_sec = target.key, target.seconds
         # Use bar-open timestamps. A lower-tf bar at ts is the last bar of target
         # if its close time aligns with target close.
-        if (ts + src_sec) % tgt_sec != 0:
+        start_ts = target.bucket_start(ts)
+        last_ts = start_ts + tgt_sec - src_sec
+        if last_ts != ts and not (late and last_ts <= latest_ts):
             continue
-        start_ts = ts + src_sec - tgt_sec
-        rows = db.fetch_range(tf, start_ts, ts)
+        rows = db.fetch_range(tf, start_ts, last_ts)
         expected = tgt_sec // src_sec
         if len(rows) < expected:
             print(f"[WARN] Not enough {tf} bars to resample {tgt}: {len(rows)}/{expected}")
@@ -312,15 +361,14 @@ def _resample_from_lower_tf(tf: str, ts: int) -> list[tuple[str, int]]:
 def _partial_candle_from_1m(tf_norm: str) -> Optional[dict]:
     if not INCLUDE_PARTIAL_BARS:
         return None
-    if tf_norm not in ("30m", "60m", "180m"):
+    if tf_norm not in timeframes.trade_timeframes() or not timeframes.is_intraday(tf_norm):
         return None
     latest_1m = db.fetch_latest("1m")
     if not latest_1m:
         return None
 
-    tf_sec = {"30m": 1800, "60m": 3600, "180m": 10800}[tf_norm]
     latest_ts = int(latest_1m["ts"])
-    bucket_start = latest_ts - (latest_ts % tf_sec)
+    bucket_start = timeframes.get(tf_norm).bucket_start(latest_ts)
 
     last_closed = db.fetch_latest(tf_norm)
     last_closed_ts = int(last_closed["ts"]) if last_closed else -1
@@ -361,22 +409,69 @@ async def tradingview_webhook(req: Request):
         raise HTTPException(status_code=401, detail="unauthorized")
 
     tf = tf_key(payload.timeframe)
-    if tf is None:
-        raise HTTPException(status_code=400, detail="unsupported timeframe; use 30,60,180,1D")
+    if tf is None or not timeframes.is_known(tf):
+        raise HTTPException(status_code=400, detail="unsupported timeframe; use " + ",".join(timeframes.known_timeframes()))
 
     ts = _parse_ts(payload)
     if REQUIRE_BAR_CLOSE and not _is_bar_close(payload):
         raise HTTPException(status_code=400, detail="bar_close_confirmed required")
     if VALIDATE_TS_ALIGNMENT and not _is_ts_aligned(ts, tf):
         raise HTTPException(status_code=400, detail="timestamp not aligned to timeframe")
-    print(f"[DEBUG] Upserting: tf={tf}, ts={ts}, price={payload.close}")
+    has_hint = any(v is not None for v in (payload.bar_close_confirmed, payload.bar_close,
+                                            payload.is_bar_close, payload.barstate))
+    # Unflagged alerts fire once per close, so they queue as bar closes.
+    bar_close = _is_bar_close(payload) or not has_hint
+    try:
+        admission.check_rate(admission.sender_key(header_secret or payload.password,
+                                                  req.client.host if req.client else None), bar_close)
+        digest = ingest.digest(payload)
+        if ingest.is_duplicate(tf, ts, digest):
+            print(f"[DEBUG] Duplicate webhook skipped: tf={tf}, ts={ts}")
+            return {"ok": True, "timeframe": tf, "ts": ts, "duplicate": True}
+        async with admission.slot(bar_close):
+            late, resampled, batch = await aiodb.write(_store, payload, tf, ts)
+            out = await run_in_threadpool(_after_store, payload, tf, ts, bar_close, late, resampled)
+        # Outside the slot: a group commit gathers every request waiting here.
+        await writebuf.committed(batch)
+        ingest.remember(tf, ts, digest, late=late)
+        return out
+    except admission.Rejected as e:
+        print(f"[WARN] Webhook rejected (429): tf={tf}, ts={ts}, {e.reason}, retry after {e.retry_after}s")
+        raise HTTPException(status_code=429, detail=e.reason, headers={"Retry-After": str(e.retry_after)})
+
+def _store(payload: WebhookPayload, tf: str, ts: int) -> tuple[bool, list[tuple[str, int]], int]:
+    """Write one accepted bar and the bars resampled from it (on the DB writer thread).
+
+    Returns (late, resampled, write-buffer batch to wait for; 0 when unbuffered).
+    """
+    # fresh: bars a CLI backfill/import just wrote past the cached latest make this one late.
+    latest_ts = db.data_version(tf, fresh=True)[0]
+    late = ts < latest_ts
+    print(f"[DEBUG] Upserting: tf={tf}, ts={ts}, price={payload.close}" + (" (late)" if late else ""))
     db.upsert_candle(
         tf, ts,
         float(payload.open), float(payload.high), float(payload.low), float(payload.close),
         float(payload.volume) if payload.volume is not None else None,
         features=payload.features,
     )
-    resampled = _resample_from_lower_tf(tf, ts)
+    resampled = _resample_from_lower_tf(tf, ts, latest_ts)
+    return late, resampled, writebuf.batch_id()
+
+def _after_store(payload: WebhookPayload, tf: str, ts: int, bar_close: bool, late: bool,
+                 resampled: list[tuple[str, int]]) -> dict:
+    """Cache invalidation, history and notifications for a stored bar (in the threadpool)."""
+    if late:
+        # History changed under the current latest bar: refresh what is keyed by it, but a
+        # past bar is not a bar close to snapshot or alert on.
+        for changed in [tf] + [res_tf for res_tf, _ in resampled]:
+            ingest.history_changed(changed)
+        return {"ok": True, "timeframe": tf, "ts": ts, "late": True, "resampled": [r[0] for r in resampled]}
+    # Resampled bars are complete by construction; a posted bar counts unless it carries a
+    # bar-state hint that says it is still open.
+    if bar_close:
+        history.note_bar_close(tf, ts)
+    for res_tf, res_ts in resampled:
+        history.note_bar_close(res_tf, res_ts)
     try:
         is_1m = (tf == "1m")
         _maybe_notify_spike(
@@ -401,36 +496,156 @@ async def tradingview_webhook(req: Request):
 
     return {"ok": True, "timeframe": tf, "ts": ts}
 
+_CANDLE_KEYS = ("ts", "open", "high", "low", "close", "volume")
+# Timeframes (and funding rates, which the best-params backtests charge) read by
+# recommend(); a write to any of them changes its ETag.
+RECOMMEND_DEPS = tuple(dict.fromkeys(
+    (timeframes.REGIME_TIMEFRAME,) + timeframes.trade_timeframes() + timeframes.parse_tf_list(FEATURE_SOURCE_TFS)
+    + ((db.FUNDING_VERSION_KEY,) if FUNDING_ENABLED else ())
+))
+
 @app.get("/api/candles")
-def candles(tf: str, limit: int = 200):
+async def candles(request: Request, tf: str, limit: int = 200):
     """Return recent candles for charting."""
     tf_norm = tf_key(tf) or str(tf).strip()
-    if tf_norm not in ("1D", "30m", "60m", "180m"):
-        raise HTTPException(status_code=400, detail="unsupported timeframe; use 30,60,180,1D")
-    
-    rows = db.fetch_recent(tf_norm, limit)
-    data = []
-    for r in rows:
-        data.append({
-            "ts": int(r["ts"]),
-            "open": float(r["open"]),
-            "high": float(r["high"]),
-            "low": float(r["low"]),
-            "close": float(r["close"]),
-            "volume": float(r["volume"]) if r["volume"] else 0.0
-        })
-    partial = _partial_candle_from_1m(tf_norm)
-    if partial:
-        data.append(partial)
-    return {"ok": True, "timeframe": tf_norm, "data": data}
+    if tf_norm not in timeframes.chart_timeframes():
+        raise HTTPException(status_code=400, detail="unsupported timeframe; use " + ",".join(timeframes.chart_timeframes()))
+
+    def build() -> dict:
+        rows = db.fetch_recent_ohlcv(tf_norm, limit)
+        data = [dict(zip(_CANDLE_KEYS, r)) for r in rows]
+        partial = _partial_candle_from_1m(tf_norm)
+        if partial:
+            data.append(partial)
+        return {"ok": True, "timeframe": tf_norm, "data": data}
+
+    # The partial bar is rebuilt from 1m, so 1m writes must invalidate too.
+    deps = (tf_norm, "1m") if (INCLUDE_PARTIAL_BARS and timeframes.is_intraday(tf_norm)) else (tf_norm,)
+    return await aiodb.read(httpcache.cached_json, request, "candles", deps, (tf_norm, int(limit)), build)
 
 @app.get("/api/recommend")
-def api_recommend(side: str, risk_pct: Optional[float] = None, tf: Optional[str] = None):
+async def api_recommend(request: Request, side: str, risk_pct: Optional[float] = None, tf: Optional[str] = None,
+                        detail: str = "full", fields: Optional[str] = None):
+    """detail=summary: status/score/plan without metrics, scenario fan or full candidates; fields=plan,selected,..."""
     try:
-        out = recommend(side=side, risk_pct=risk_pct, focus_tf=tf)
-        return JSONResponse(out)
+        return await aiodb.read(
+            httpcache.cached_json,
+            request,
+            "recommend",
+            RECOMMEND_DEPS,
+            (str(side).lower().strip(), risk_pct, tf, str(detail).lower().strip(), fields or ""),
+            lambda: recommend(side=side, risk_pct=risk_pct, focus_tf=tf, detail=detail, fields=fields),
+            RECOMMEND_ETAG_BUCKET_SEC,  # candidates carry time_to_next_sec
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/recommend/history")
+def api_recommend_history(tf: str, side: Optional[str] = None, start: Optional[int] = None, end: Optional[int] = None,
+                          limit: int = 1000, format: str = "json"):
+    """Stored bar-close snapshots for one trade timeframe, oldest first (format=csv streams an export)."""
+    tf_norm = tf_key(tf)
+    if tf_norm is None:
+        raise HTTPException(status_code=400, detail="unsupported tf")
+    side_norm = str(side).lower().strip() if side else None
+    if side_norm not in (None, "long", "short"):
+        raise HTTPException(status_code=400, detail="side must be 'long' or 'short'")
+    start_ts = int(start or 0)
+
+    if str(format).lower() == "csv":
+        def lines():
+            yield ",".join(history.COLUMNS) + "\n"
+            for r in history.iter_rows(tf_norm, side_norm, start_ts, end, limit=int(limit) if limit > 0 else None):
+                yield ",".join("" if r[c] is None else str(int(r[c]) if isinstance(r[c], bool) else r[c])
+                               for c in history.COLUMNS) + "\n"
+
+        name = f"recommend_history_{tf_norm}_{side_norm or 'both'}.csv"
+        return StreamingResponse(lines(), media_type="text/csv",
+                                 headers={"Content-Disposition": f'attachment; filename="{name}"'})
+
+    limit = max(1, min(int(limit), 10000))
+    rows = list(history.iter_rows(tf_norm, side_norm, start_ts, end, limit=limit))
+    next_start = None
+    if len(rows) == limit:
+        # Resume at the last bar; a long/short pair is never split across pages.
+        if side_norm is None and rows[-1]["side"] == "long":
+            rows.pop()
+        next_start = rows[-1]["ts"] + 1 if rows else None
+    return {"ok": True, "timeframe": tf_norm, "side": side_norm, "rows": rows, "next_start": next_start}
+
+@app.get("/api/export")
+def api_export(req: Request, tf: str, from_: Optional[str] = Query(None, alias="from"),
+               to: Optional[str] = Query(None), start: Optional[str] = None, end: Optional[str] = None,
+               format: str = "csv", features: str = "all", include_archive: bool = False):
+    """Stream one timeframe's candles (+ feature columns) as csv / csv.gz / csv.zst / parquet.
+
+    from/to match the CLI's --from/--to; start/end are kept as aliases.
+    """
+    from . import export
+
+    # A misspelled range parameter would otherwise be ignored and stream the whole table.
+    unknown = sorted(set(req.query_params) - {"tf", "from", "to", "start", "end", "format", "features",
+                                              "include_archive"})
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"unknown parameter(s): {', '.join(unknown)}")
+    if (from_ is not None and start is not None) or (to is not None and end is not None):
+        raise HTTPException(status_code=400, detail="use from/to or start/end, not both")
+    tf_norm = tf_key(tf)
+    if tf_norm is None:
+        raise HTTPException(status_code=400, detail="unsupported tf")
+    try:
+        start_ts = export.parse_time(from_ if from_ is not None else start)
+        end_ts = export.parse_time(to if to is not None else end)
+        if start_ts is not None and end_ts is not None and start_ts > end_ts:
+            raise ValueError("from is after to")
+        body = export.stream(tf_norm, format, start_ts, end_ts, export.feature_names(tf_norm, features),
+                             include_archive=include_archive)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    fmt = str(format).lower().strip()
+    return StreamingResponse(body, media_type=export.MEDIA_TYPES[fmt],
+                             headers={"Content-Disposition": f'attachment; filename="candles_{tf_norm}.{fmt}"'})
+
+@app.get("/api/gaps")
+def api_gaps(tf: Optional[str] = None, start: Optional[int] = None, end: Optional[int] = None, limit: int = 500):
+    """Runs of missing bars per timeframe (summary without tf; newest first with tf)."""
+    from . import gaps
+
+    if not tf:
+        return {"ok": True, "timeframes": gaps.summary(), "backfill": gaps.state()}
+    tf_norm = tf_key(tf)
+    if tf_norm is None:
+        raise HTTPException(status_code=400, detail="unsupported tf")
+    rows = gaps.list_gaps(tf_norm, start, end, limit=max(1, min(int(limit), 10000)))
+    return {"ok": True, "timeframe": tf_norm, "gaps": rows, "missing_bars": sum(g["missing"] for g in rows),
+            "backfill_sources": gaps.sources(tf_norm)}
+
+def _tf_side_params(tf: Optional[str], side: Optional[str]) -> tuple[Optional[str], Optional[str]]:
+    tf_norm = tf_key(tf) if tf else None
+    if tf and tf_norm is None:
+        raise HTTPException(status_code=400, detail="unsupported tf")
+    side_norm = str(side).lower().strip() if side else None
+    if side_norm not in (None, "long", "short"):
+        raise HTTPException(status_code=400, detail="side must be 'long' or 'short'")
+    return tf_norm, side_norm
+
+@app.get("/api/outcomes/stats")
+def api_outcome_stats(tf: Optional[str] = None, side: Optional[str] = None, since: Optional[int] = None,
+                      selected_only: bool = False):
+    """Live hit rates of READY plans per timeframe and side."""
+    from . import outcomes
+
+    tf_norm, side_norm = _tf_side_params(tf, side)
+    return {"ok": True, "stats": outcomes.stats(tf_norm, side_norm, since, selected_only), "tracker": outcomes.state()}
+
+@app.get("/api/outcomes")
+def api_outcomes(tf: Optional[str] = None, side: Optional[str] = None, limit: int = 100):
+    from . import outcomes
+
+    tf_norm, side_norm = _tf_side_params(tf, side)
+    return {"ok": True, "plans": outcomes.recent(tf_norm, side_norm, max(1, min(int(limit), 1000)))}
 
 @app.post("/api/notify/recommend")
 def api_notify_recommend(side: str, risk_pct: Optional[float] = None, tf: Optional[str] = None):
@@ -438,21 +653,70 @@ def api_notify_recommend(side: str, risk_pct: Optional[float] = None, tf: Option
         out = recommend(side=side, risk_pct=risk_pct, focus_tf=tf)
         msg = build_discord_message(out)
         ok, detail = send_discord_webhook(msg)
-        return {"ok": ok, "detail": detail, "recommend": out}
+        return FastJSONResponse({"ok": ok, "detail": detail, "recommend": out})
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/api/health")
 def health():
-    return {"ok": True, "ts": int(time.time())}
+    warm = background.warm_state()
+    return {
+        "ok": True,
+        "ts": int(time.time()),
+        "status": "warming" if warm["status"] == "warming" else "ok",
+        "warmup": warm,
+        "first_response": _FIRST_RESPONSE or None,
+    }
+
+@app.get("/api/db/stats")
+def api_db_stats():
+    from . import backup, regime
+    from .retention import db_stats
+
+    return {"ok": True, **db_stats(), "jobs": background.jobs_state(), "history": history.state(),
+            "backup": backup.state(), "ingest": ingest.state(), "admission": admission.state(),
+            "db_lanes": aiodb.state(), "write_buffer": writebuf.state(),
+            "regime": regime.state()}
+
+@app.get("/api/features")
+def api_features():
+    from .features import registry
+
+    return {"ok": True, "features": registry()}
+
+@app.get("/api/features/matrix")
+def api_feature_matrix(request: Request, tf: str, names: str, limit: int = 200, source_tfs: Optional[str] = None):
+    from . import features
+
+    tf_norm = tf_key(tf)
+    if tf_norm is None:
+        raise HTTPException(status_code=400, detail="unsupported tf")
+    cols = [n for n in dict.fromkeys(features.feature_name(x) for x in names.split(",")) if n]
+    if not cols:
+        raise HTTPException(status_code=400, detail="names required (see /api/features)")
+    limit = max(1, min(int(limit), 5000))
+    sources = timeframes.parse_tf_list(source_tfs) if source_tfs else (tf_norm,)
+
+    def build() -> dict:
+        ts = [int(r[0]) for r in db.fetch_recent_ohlcv(tf_norm, limit)]
+        m = features.matrix(tf_norm, cols, ts, source_tfs=sources)
+        return {"ok": True, "timeframe": tf_norm, "names": cols, "ts": ts, "values": m}
+
+    return httpcache.cached_json(
+        request, "features", dict.fromkeys((tf_norm,) + sources), (tf_norm, tuple(cols), limit, sources), build,
+    )
 
 @app.get("/api/latest")
 def latest():
     out = {}
-    for tf in ("1m","5m","15m","1D","30m","60m","180m"):
+    tfs = timeframes.SOURCE_TIMEFRAMES + timeframes.chart_timeframes()
+    for tf in dict.fromkeys(tfs):
         row = db.fetch_latest(tf)
         out[tf] = {"ts": int(row["ts"]), "close": float(row["close"])} if row else None
-    return {"ok": True, "latest": out}
+    return FastJSONResponse({"ok": True, "latest": out})
 
 # Serve frontend (static) AFTER API routes so /api/* wins.
-app.mount("/", StaticFiles(directory=str(FRONTEND_DIR), html=True), name="frontend")
+if FRONTEND_PATH.is_dir():
+    app.mount("/", StaticFiles(directory=str(FRONTEND_PATH), html=True), name="frontend")
+else:
+    print(f"[WARN] Frontend dir not found, static UI disabled: {FRONTEND_PATH}")
@@ -0,0 +1,296 @@
+from __future__ import annotations
+import json
+import sqlite3
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Versioned schema migrations, tracked in PRAGMA user_version.
+#
+# Each migration runs in its own BEGIN IMMEDIATE transaction together with the
+# user_version bump, so a crash leaves the database at the previous version and
+# concurrent workers starting at the same time apply every step exactly once.
+# Append new steps at the end; never edit a step that has shipped.
+
+_V1_BASELINE = (
+    """CREATE TABLE IF NOT EXISTS candles (
+      timeframe TEXT NOT NULL,
+      ts INTEGER NOT NULL,
+      open REAL NOT NULL,
+      high REAL NOT NULL,
+      low REAL NOT NULL,
+      close REAL NOT NULL,
+      volume REAL,
+      features TEXT,
+      PRIMARY KEY (timeframe, ts)
+    )""",
+    """CREATE INDEX IF NOT EXISTS idx_candles_tf_ts ON candles(timeframe, ts)""",
+    """CREATE TABLE IF NOT EXISTS notifications (
+      kind TEXT NOT NULL,
+      timeframe TEXT NOT NULL,
+      ts INTEGER NOT NULL,
+      created_ts INTEGER NOT NULL,
+      detail TEXT,
+      PRIMARY KEY (kind, timeframe, ts)
+    )""",
+    """CREATE INDEX IF NOT EXISTS idx_notifications_kind_created ON notifications(kind, created_ts)""",
+    # Write versions bumped by every candle writer (db.bump_version); shared state for multi-worker mode
+    """CREATE TABLE IF NOT EXISTS data_versions (
+      timeframe TEXT PRIMARY KEY,
+      latest_ts INTEGER NOT NULL,
+      seq INTEGER NOT NULL,
+      written_at REAL NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS shared_cache (
+      key TEXT PRIMARY KEY,
+      value TEXT NOT NULL,
+      expires_ts REAL
+    )""",
+    """CREATE TABLE IF NOT EXISTS leases (
+      name TEXT PRIMARY KEY,
+      holder TEXT NOT NULL,
+      expires_ts REAL NOT NULL
+    )""",
+)
+
+# candles -> WITHOUT ROWID keyed by (tf_id, ts); the primary key is the only
+# B-tree per row (the old idx_candles_tf_ts duplicated it), timeframe text is
+# stored once in `timeframes`, and the rarely-read JSON features move out of the
+# rows the indicators scan.
+_V2_CANDLES_WITHOUT_ROWID = (
+    """CREATE TABLE timeframes (
+      id INTEGER PRIMARY KEY,
+      key TEXT NOT NULL UNIQUE
+    )""",
+    """INSERT INTO timeframes(key) SELECT DISTINCT timeframe FROM candles ORDER BY timeframe""",
+    """CREATE TABLE candles_v2 (
+      tf_id INTEGER NOT NULL,
+      ts INTEGER NOT NULL,
+      open REAL NOT NULL,
+      high REAL NOT NULL,
+      low REAL NOT NULL,
+      close REAL NOT NULL,
+      volume REAL,
+      PRIMARY KEY (tf_id, ts)
+    ) WITHOUT ROWID""",
+    """INSERT INTO candles_v2(tf_id, ts, open, high, low, close, volume)
+         SELECT t.id, c.ts, c.open, c.high, c.low, c.close, c.volume
+           FROM candles c JOIN timeframes t ON t.key = c.timeframe
+          ORDER BY t.id, c.ts""",
+    """CREATE TABLE candle_features (
+      tf_id INTEGER NOT NULL,
+      ts INTEGER NOT NULL,
+      features TEXT NOT NULL,
+      PRIMARY KEY (tf_id, ts)
+    ) WITHOUT ROWID""",
+    """INSERT INTO candle_features(tf_id, ts, features)
+         SELECT t.id, c.ts, c.features
+           FROM candles c JOIN timeframes t ON t.key = c.timeframe
+          WHERE c.features IS NOT NULL
+          ORDER BY t.id, c.ts""",
+    """DROP INDEX IF EXISTS idx_candles_tf_ts""",
+    """DROP TABLE candles""",
+    """ALTER TABLE candles_v2 RENAME TO candles""",
+)
+
+# Typed feature store: one row per (timeframe, feature, ts) so a feature series is a
+# single contiguous range scan, and adding features never widens the candle rows.
+_V3_FEATURE_STORE = (
+    """CREATE TABLE feature_defs (
+      id INTEGER PRIMARY KEY,
+      name TEXT NOT NULL UNIQUE,
+      source TEXT,
+      created_ts INTEGER NOT NULL
+    )""",
+    """CREATE TABLE feature_values (
+      tf_id INTEGER NOT NULL,
+      feature_id INTEGER NOT NULL,
+      ts INTEGER NOT NULL,
+      value REAL NOT NULL,
+      PRIMARY KEY (tf_id, feature_id, ts)
+    ) WITHOUT ROWID""",
+)
+
+# Perpetual funding rates (one instrument per DB), charged by the cost model to positions
+# held across a funding timestamp.
+_V4_FUNDING_RATES = (
+    """CREATE TABLE funding_rates (
+      ts INTEGER PRIMARY KEY,
+      rate REAL NOT NULL
+    ) WITHOUT ROWID""",
+)
+
+# Point-in-time recommendation history: one row per (timeframe, side, bar close), written
+# by app/history.py. Prices are integer cents and scores are scaled integers so a row
+# stays around 35 bytes (SQLite stores small integers in 1-4 bytes, REAL always in 8).
+_V5_RECOMMEND_HISTORY = (
+    """CREATE TABLE param_sets (
+      id INTEGER PRIMARY KEY,
+      entry_mode TEXT NOT NULL,
+      entry_k REAL NOT NULL,
+      stop_mult REAL NOT NULL,
+      UNIQUE (entry_mode, entry_k, stop_mult)
+    )""",
+    """CREATE TABLE recommend_history (
+      tf_id INTEGER NOT NULL,
+      side INTEGER NOT NULL,
+      ts INTEGER NOT NULL,
+      flags INTEGER NOT NULL,
+      score INTEGER NOT NULL,
+      confidence INTEGER NOT NULL,
+      entry INTEGER,
+      stop INTEGER,
+      tp1 INTEGER,
+      params_id INTEGER,
+      PRIMARY KEY (tf_id, ts, side)
+    ) WITHOUT ROWID""",
+)
+
+# Outcomes of READY plans (app/outcomes.py): one row per READY (timeframe, side, bar close)
+# snapshot, resolved against later candles. state: 0 = waiting for the entry fill,
+# 1 = filled, 2 = finished. The partial index keeps the startup load of unfinished plans
+# cheap however long the table grows. outcome_cursor: candles up to covered_until have been
+# applied to every plan with id <= last_plan_id.
+_V6_PLAN_OUTCOMES = (
+    """CREATE TABLE plan_outcomes (
+      id INTEGER PRIMARY KEY,
+      tf_id INTEGER NOT NULL,
+      side INTEGER NOT NULL,
+      ts INTEGER NOT NULL,
+      selected INTEGER NOT NULL,
+      market INTEGER NOT NULL,
+      entry REAL NOT NULL,
+      stop REAL NOT NULL,
+      tp1 REAL NOT NULL,
+      tp2 REAL NOT NULL,
+      tp3 REAL NOT NULL,
+      state INTEGER NOT NULL DEFAULT 0,
+      fill_ts INTEGER,
+      fill_price REAL,
+      tp_hit INTEGER NOT NULL DEFAULT 0,
+      exit_ts INTEGER,
+      exit_price REAL,
+      outcome TEXT,
+      UNIQUE (tf_id, side, ts)
+    )""",
+    """CREATE INDEX idx_plan_outcomes_active ON plan_outcomes(id) WHERE state < 2""",
+    """CREATE TABLE outcome_cursor (
+      id INTEGER PRIMARY KEY CHECK (id = 1),
+      covered_until INTEGER NOT NULL,
+      last_plan_id INTEGER NOT NULL
+    )""",
+)
+
+# Gap index: one row per run of missing bars between two stored bars of a timeframe
+# (app/gaps.py keeps it current on every candle write).
+_V7_CANDLE_GAPS = (
+    """CREATE TABLE candle_gaps (
+      tf_id INTEGER NOT NULL,
+      start_ts INTEGER NOT NULL,
+      end_ts INTEGER NOT NULL,
+      missing INTEGER NOT NULL,
+      PRIMARY KEY (tf_id, start_ts)
+    ) WITHOUT ROWID""",
+)
+
+Step = Callable[[sqlite3.Connection], None]
+
+
+def _statements(stmts: Sequence[str]) -> Step:
+    def run(conn: sqlite3.Connection) -> None:
+        for sql in stmts:
+            conn.execute(sql)
+    return run
+
+
+def _v3_feature_store(conn: sqlite3.Connection) -> None:
+    """Create the feature tables and move numeric values out of candle_features JSON."""
+    from .features import split_numeric
+
+    _statements(_V3_FEATURE_STORE)(conn)
+    ids: Dict[str, int] = {}
+    now = int(time.time())
+    # Read everything first: the loop rewrites candle_features.
+    rows = conn.execute("""SELECT tf_id, ts, features FROM candle_features""").fetchall()
+    for i in range(0, len(rows), 5000):
+        batch = rows[i:i + 5000]
+        values = []
+        leftovers = []
+        for tf_id, ts, text in batch:
+            try:
+                raw = json.loads(text)
+            except ValueError:
+                continue
+            if not isinstance(raw, dict):
+                continue
+            numeric, rest = split_numeric(raw)
+            for name, v in numeric.items():
+                if name not in ids:
+                    conn.execute(
+                        """INSERT OR IGNORE INTO feature_defs(name, source, created_ts) VALUES (?, 'webhook', ?)""",
+                        (name, now),
+                    )
+                    ids[name] = conn.execute("""SELECT id FROM feature_defs WHERE name=?""", (name,)).fetchone()[0]
+                values.append((tf_id, ids[name], ts, v))
+            leftovers.append((json.dumps(rest, ensure_ascii=False, separators=(",", ":")) if rest else None, tf_id, ts))
+        conn.executemany("""INSERT OR REPLACE INTO feature_values(tf_id, feature_id, ts, value) VALUES (?, ?, ?, ?)""", values)
+        conn.executemany("""UPDATE candle_features SET features=? WHERE tf_id=? AND ts=?""",
+                         [l for l in leftovers if l[0] is not None])
+        conn.executemany("""DELETE FROM candle_features WHERE tf_id=? AND ts=?""",
+                         [(l[1], l[2]) for l in leftovers if l[0] is None])
+
+
+def _v7_candle_gaps(conn: sqlite3.Connection) -> None:
+    """Create the gap index and fill it with one scan of every timeframe."""
+    from .gaps import rebuild_all
+
+    _statements(_V7_CANDLE_GAPS)(conn)
+    rebuild_all(conn)
+
+
+MIGRATIONS: List[Tuple[int, str, Step]] = [
+    (1, "baseline schema", _statements(_V1_BASELINE)),
+    (2, "candles WITHOUT ROWID + timeframes + candle_features", _statements(_V2_CANDLES_WITHOUT_ROWID)),
+    (3, "feature store (feature_defs + feature_values)", _v3_feature_store),
+    (4, "funding_rates", _statements(_V4_FUNDING_RATES)),
+    (5, "recommend_history + param_sets", _statements(_V5_RECOMMEND_HISTORY)),
+    (6, "plan_outcomes + outcome_cursor", _statements(_V6_PLAN_OUTCOMES)),
+    (7, "candle_gaps", _v7_candle_gaps),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(conn: sqlite3.Connection) -> int:
+    return int(conn.execute("PRAGMA user_version").fetchone()[0])
+
+
+def migrate(conn: sqlite3.Connection, target: Optional[int] = None) -> List[int]:
+    """Apply pending migrations up to `target` (default: latest). Returns applied versions."""
+    target = LATEST_VERSION if target is None else int(target)
+    applied: List[int] = []
+    old_isolation = conn.isolation_level
+    conn.isolation_level = None  # explicit BEGIN/COMMIT below
+    try:
+        for version, name, step in MIGRATIONS:
+            if version > target:
+                break
+            if current_version(conn) >= version:
+                continue
+            t0 = time.time()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Another worker may have migrated while we waited for the write lock.
+                if current_version(conn) >= version:
+                    conn.execute("ROLLBACK")
+                    continue
+                step(conn)
+                conn.execute(f"PRAGMA user_version={int(version)}")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            applied.append(version)
+            print(f"[DEBUG] Schema migration {version} ({name}) applied in {time.time() - t0:.2f}s")
+    finally:
+        conn.isolation_level = old_isolation
+    return applied
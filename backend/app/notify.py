@@ -1,6 +1,5 @@
 from __future__ import annotations
 
-import json
 import re
 import urllib.request
 import urllib.error
@@ -9,6 +8,7 @@ from pathlib import Path
 from typing import Any, Dict, Optional, Tuple
 
 from .config import DISCORD_WEBHOOK_URL, DISCORD_WEBHOOK_FILE
+from .serialize import dumps
 
 TRADING_SITE_URL = "http://trading.p-e.kr"
 
@@ -142,7 +142,7 @@ def send_discord_webhook(message: Dict[str, Any]) -> Tuple[bool, str]:
     if not url:
         return False, "discord_webhook_missing"
 
-    data = json.dumps(message).encode("utf-8")
+    data = dumps(message)
     req = urllib.request.Request(
         url=url,
         data=data,
@@ -0,0 +1,444 @@
+from __future__ import annotations
+
+import bisect
+import heapq
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from . import db, timeframes
+from .config import OUTCOME_FEED_TFS, OUTCOME_MAX_BARS, OUTCOME_SETTLE_SEC
+
+# Live outcome tracker for READY plans. Every READY snapshot written by app/history.py
+# also lands in `plan_outcomes` (schema v6) with its build_plan levels; a leader-only
+# background job feeds new candles into an in-memory index and persists what changed.
+#
+# The index keeps one sorted (level, plan id) book per kind of order: unfilled entries,
+# stops and each open plan's next take-profit, per side. A candle resolves a plan only
+# when its high/low crosses a level, so finding the hit plans is a bisect on each book
+# (plans the candle does not reach are never visited). Pending limit orders lapse after
+# one bar of the plan's timeframe (like the evaluator); filled plans time out after
+# WONYODD_OUTCOME_MAX_BARS bars.
+#
+# Conventions match the evaluator: a gap fills at the candle open; the stop counts on
+# the fill candle but take-profits only from the next candle; when a candle touches both
+# the stop and a take-profit, the stop wins. The finest feed candle wins where feeds
+# overlap (a 30m bar already covered by 1m bars is skipped).
+#
+# Only finished candles are applied: the webhook also stores still-forming bars, and a bar
+# applied early would never be replayed with its final high/low. The latest stored bar of
+# a feed TF waits until a newer bar exists or OUTCOME_SETTLE_SEC have passed since its close.
+
+PENDING, OPEN, DONE = 0, 1, 2
+SIDES = ("long", "short")
+
+_PLAN_COLS = "id, tf_id, side, ts, selected, market, entry, stop, tp1, tp2, tp3, state, fill_ts, fill_price, tp_hit"
+
+
+@dataclass
+class Plan:
+    id: int
+    tf: str
+    side: str
+    ts: int
+    market: bool
+    entry: float
+    stop: float
+    tps: Tuple[float, float, float]
+    state: int = PENDING
+    fill_ts: Optional[int] = None
+    fill_price: Optional[float] = None
+    tp_hit: int = 0
+    exit_ts: Optional[int] = None
+    exit_price: Optional[float] = None
+    outcome: Optional[str] = None
+
+    @property
+    def active_from(self) -> int:
+        # The plan is made at the close of bar `ts`; orders work from the next bar.
+        return self.ts + timeframes.tf_seconds(self.tf)
+
+    @property
+    def expires(self) -> int:
+        return self.active_from + timeframes.tf_seconds(self.tf)
+
+    def deadline(self, max_bars: int) -> int:
+        return self.active_from + max(1, int(max_bars)) * timeframes.tf_seconds(self.tf)
+
+
+class _Book:
+    """(level, plan id) pairs sorted by level: everything at/above or at/below a price is one bisect."""
+
+    def __init__(self) -> None:
+        self._keys: List[Tuple[float, int]] = []
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, level: float, pid: int) -> None:
+        bisect.insort(self._keys, (level, pid))
+
+    def remove(self, level: float, pid: int) -> None:
+        i = bisect.bisect_left(self._keys, (level, pid))
+        if i < len(self._keys) and self._keys[i] == (level, pid):
+            del self._keys[i]
+
+    def at_or_above(self, price: float) -> List[int]:
+        return [pid for _, pid in self._keys[bisect.bisect_left(self._keys, (price, -1)):]]
+
+    def at_or_below(self, price: float) -> List[int]:
+        return [pid for _, pid in self._keys[:bisect.bisect_right(self._keys, (price, float("inf")))]]
+
+
+class OutcomeIndex:
+    def __init__(self, max_bars: int = OUTCOME_MAX_BARS):
+        self.max_bars = int(max_bars)
+        self.plans: Dict[int, Plan] = {}
+        self.changed: Dict[int, Plan] = {}
+        self.last_close: Optional[float] = None
+        self.loaded_id = 0
+        self._entries = {s: _Book() for s in SIDES}
+        self._stops = {s: _Book() for s in SIDES}
+        self._tps = {s: _Book() for s in SIDES}
+        self._timers: List[Tuple[int, int]] = []  # (ts, plan id): pending lapse / open timeout
+        self._waiting: List[Tuple[int, int]] = []  # (active_from, plan id) not in the books yet
+
+    def add(self, p: Plan) -> None:
+        # Books only hold live plans, so a catch-up over old candles never visits plans
+        # whose first bar is still ahead.
+        self.plans[p.id] = p
+        self.loaded_id = max(self.loaded_id, p.id)
+        heapq.heappush(self._waiting, (p.active_from, p.id))
+
+    def _activate(self, now: int) -> None:
+        while self._waiting and self._waiting[0][0] <= now:
+            _, pid = heapq.heappop(self._waiting)
+            p = self.plans.get(pid)
+            if p is None:
+                continue
+            if p.state == PENDING:
+                self._entries[p.side].add(p.entry, p.id)
+                heapq.heappush(self._timers, (p.expires, p.id))
+            elif p.state == OPEN:
+                self._arm(p)
+
+    def _arm(self, p: Plan) -> None:
+        self._stops[p.side].add(p.stop, p.id)
+        if p.tp_hit < 3:
+            self._tps[p.side].add(p.tps[p.tp_hit], p.id)
+        heapq.heappush(self._timers, (p.deadline(self.max_bars), p.id))
+
+    def _fill(self, p: Plan, ts: int, price: float) -> None:
+        self._entries[p.side].remove(p.entry, p.id)
+        p.state, p.fill_ts, p.fill_price = OPEN, int(ts), float(price)
+        self._arm(p)
+        self.changed[p.id] = p
+
+    def _close(self, p: Plan, ts: int, price: Optional[float], outcome: str) -> None:
+        if p.state == PENDING:
+            self._entries[p.side].remove(p.entry, p.id)
+        else:
+            self._stops[p.side].remove(p.stop, p.id)
+            if p.tp_hit < 3:
+                self._tps[p.side].remove(p.tps[p.tp_hit], p.id)
+        p.state, p.exit_ts, p.exit_price, p.outcome = DONE, int(ts), price, outcome
+        self.changed[p.id] = p
+        del self.plans[p.id]
+
+    def expire(self, now: int) -> None:
+        """Lapse pending orders and time out open plans whose time ended by `now`."""
+        self._activate(now)
+        while self._timers and self._timers[0][0] <= now:
+            t, pid = heapq.heappop(self._timers)
+            p = self.plans.get(pid)
+            if p is None:
+                continue
+            if p.state == PENDING and t == p.expires:
+                self._close(p, t, None, "unfilled")
+            elif p.state == OPEN and t == p.deadline(self.max_bars):
+                self._close(p, t, self.last_close if self.last_close is not None else p.fill_price, "timeout")
+
+    def on_candle(self, ts: int, o: float, h: float, l: float, c: float, only: Optional[Set[int]] = None) -> None:
+        """Apply one candle (opening at ts); `only` restricts it to those plan ids (catch-up)."""
+        self.expire(ts)
+
+        def live(pids: List[int]) -> List[Plan]:
+            out = []
+            for pid in pids:
+                p = self.plans.get(pid)
+                if p is not None and (only is None or pid in only):
+                    out.append(p)
+            return out
+
+        filled_now: Set[int] = set()
+        for p in live(self._entries["long"].at_or_above(l)):
+            if ts < p.expires:
+                self._fill(p, ts, min(p.entry, o))
+                filled_now.add(p.id)
+        for p in live(self._entries["short"].at_or_below(h)):
+            if ts < p.expires:
+                self._fill(p, ts, max(p.entry, o))
+                filled_now.add(p.id)
+
+        for p in live(self._stops["long"].at_or_above(l)):
+            self._close(p, ts, min(p.stop, p.fill_price if p.id in filled_now else o), "stop")
+        for p in live(self._stops["short"].at_or_below(h)):
+            self._close(p, ts, max(p.stop, p.fill_price if p.id in filled_now else o), "stop")
+
+        for side, hits in (("long", self._tps["long"].at_or_below(h)), ("short", self._tps["short"].at_or_above(l))):
+            for p in live(hits):
+                if p.id in filled_now or ts < (p.fill_ts or 0):
+                    continue
+                book = self._tps[side]
+                while p.tp_hit < 3 and (h >= p.tps[p.tp_hit] if side == "long" else l <= p.tps[p.tp_hit]):
+                    book.remove(p.tps[p.tp_hit], p.id)
+                    p.tp_hit += 1
+                    if p.tp_hit < 3:
+                        book.add(p.tps[p.tp_hit], p.id)
+                self.changed[p.id] = p
+                if p.tp_hit == 3:
+                    self._close(p, ts, p.tps[2], "tp3")
+        self.last_close = c
+
+    def sizes(self) -> Dict[str, int]:
+        return {
+            "plans": len(self.plans),
+            "waiting": len(self._waiting),
+            "entries": sum(len(b) for b in self._entries.values()),
+            "stops": sum(len(b) for b in self._stops.values()),
+            "tps": sum(len(b) for b in self._tps.values()),
+        }
+
+
+def insert_plans(conn: sqlite3.Connection, rows: Iterable[Tuple]) -> None:
+    """Register READY plans on an open transaction; the caller commits.
+
+    rows: (tf_id, side 0/1, ts, selected, market, entry, stop, tp1, tp2, tp3).
+    """
+    conn.executemany(
+        """INSERT OR IGNORE INTO plan_outcomes(tf_id, side, ts, selected, market, entry, stop, tp1, tp2, tp3)
+             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+        list(rows),
+    )
+
+
+# Index of the process currently running the job, and the cursor it last wrote; when the
+# stored cursor differs another worker held the lease in between, so the index is reloaded.
+_INDEX: Optional[OutcomeIndex] = None
+_CURSOR: Optional[Tuple[int, int]] = None
+_LOCK = threading.Lock()
+
+
+def _tf_keys(conn: sqlite3.Connection) -> Dict[int, str]:
+    return {int(r[0]): r[1] for r in conn.execute("""SELECT id, key FROM timeframes""").fetchall()}
+
+
+def _plan_from_row(r: Tuple, tf_keys: Dict[int, str]) -> Optional[Plan]:
+    pid, tf_id, side, ts, _sel, market, entry, stop, tp1, tp2, tp3, state, fill_ts, fill_price, tp_hit = r
+    tf = tf_keys.get(int(tf_id))
+    if tf is None or not timeframes.tf_seconds(tf):
+        return None
+    p = Plan(int(pid), tf, SIDES[int(side)], int(ts), bool(market), float(entry), float(stop),
+             (float(tp1), float(tp2), float(tp3)), int(state), fill_ts, fill_price, int(tp_hit))
+    if p.market and p.state == PENDING:
+        # Market entries fill at the next bar's open, which the plan's entry already is.
+        p.state, p.fill_ts, p.fill_price = OPEN, p.active_from, p.entry
+    return p
+
+
+def _read_feed(conn: sqlite3.Connection, start_ts: int, now: float) -> List[Tuple[int, int, float, float, float, float]]:
+    """(ts, seconds, o, h, l, c) of every finished feed candle opening at/after start_ts, finest first per ts."""
+    out = []
+    for tf in dict.fromkeys(timeframes.parse_tf_list(OUTCOME_FEED_TFS) + timeframes.trade_timeframes()):
+        tid = db._tf_id(tf)
+        sec = timeframes.tf_seconds(tf)
+        if tid is None or not sec:
+            continue
+        rows = conn.execute(
+            """SELECT ts, open, high, low, close FROM candles WHERE tf_id=? AND ts >= ? ORDER BY ts ASC""",
+            (tid, int(start_ts)),
+        ).fetchall()
+        if rows and rows[-1][0] + sec + OUTCOME_SETTLE_SEC > now:
+            rows.pop()  # may still be forming
+        for ts, o, h, l, c in rows:
+            out.append((int(ts), int(sec), float(o), float(h), float(l), float(c)))
+    out.sort(key=lambda x: (x[0], x[1]))
+    return out
+
+
+def run(now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """Background job: load new plans, apply new candles, persist changes (None when idle)."""
+    global _INDEX, _CURSOR
+    with _LOCK:
+        t0 = time.time()
+        now = t0 if now is None else now
+        conn = db.connect()
+        try:
+            conn.row_factory = None
+            row = conn.execute("""SELECT covered_until, last_plan_id FROM outcome_cursor WHERE id=1""").fetchone()
+            stored = (int(row[0]), int(row[1])) if row else None
+            idx = _INDEX
+            if idx is None or stored != _CURSOR:
+                idx = OutcomeIndex()
+            covered, done_id = stored if stored else (0, 0)
+            tf_keys = _tf_keys(conn)
+            new: Set[int] = set()
+            for r in conn.execute(
+                f"""SELECT {_PLAN_COLS} FROM plan_outcomes WHERE state < 2 AND id > ? ORDER BY id""", (idx.loaded_id,),
+            ):
+                p = _plan_from_row(r, tf_keys)
+                if p is None:
+                    continue
+                idx.add(p)
+                if p.state != r[11]:
+                    idx.changed[p.id] = p
+                if p.id > done_id:
+                    new.add(p.id)
+            _INDEX = idx
+            if not idx.plans:
+                return None
+
+            # Plans registered since the last run catch up from their first live bar; the
+            # others have already seen everything before `covered`.
+            start = min([covered] + [idx.plans[i].active_from for i in new]) if covered else \
+                min(p.active_from for p in idx.plans.values())
+            candles = _read_feed(conn, start, now)
+            last_id = max(done_id, idx.loaded_id)
+            applied = 0
+            seen_until = start
+            for ts, sec, o, h, l, c in candles:
+                if ts < seen_until:
+                    continue  # already covered by a finer feed
+                idx.on_candle(ts, o, h, l, c, only=new if ts < covered else None)
+                seen_until = ts + sec
+                applied += 1
+            new_covered = max(covered, seen_until)
+            idx.expire(new_covered)
+            changed = list(idx.changed.values())
+            idx.changed = {}
+            if not changed and (new_covered, last_id) == stored:
+                _CURSOR = stored
+                return None
+
+            conn.executemany(
+                """UPDATE plan_outcomes SET state=?, fill_ts=?, fill_price=?, tp_hit=?, exit_ts=?, exit_price=?, outcome=?
+                     WHERE id=?""",
+                [(p.state, p.fill_ts, p.fill_price, p.tp_hit, p.exit_ts, p.exit_price, p.outcome, p.id) for p in changed],
+            )
+            conn.execute(
+                """INSERT INTO outcome_cursor(id, covered_until, last_plan_id) VALUES (1, ?, ?)
+                     ON CONFLICT(id) DO UPDATE SET covered_until=excluded.covered_until, last_plan_id=excluded.last_plan_id""",
+                (new_covered, last_id),
+            )
+            conn.commit()
+            _CURSOR = (new_covered, last_id)
+        finally:
+            conn.close()
+    return {"candles": applied, "changed": len(changed), "open": len(idx.plans), "sec": round(time.time() - t0, 3)}
+
+
+def state() -> Dict[str, Any]:
+    idx = _INDEX
+    return {
+        "index": idx.sizes() if idx is not None else None,
+        "covered_until": _CURSOR[0] if _CURSOR else None,
+    }
+
+
+def stats(tf: Optional[str] = None, side: Optional[str] = None, since: Optional[int] = None,
+          selected_only: bool = False) -> List[Dict[str, Any]]:
+    """Hit rates of READY plans per (timeframe, side).
+
+    hit_rate = plans that reached TP1 / (those + plans stopped before TP1); open plans
+    that have not reached TP1 yet are not counted either way.
+    """
+    where = ["1=1"]
+    args: List[Any] = []
+    if tf is not None:
+        tid = db._tf_id(tf)
+        if tid is None:
+            return []
+        where.append("o.tf_id=?")
+        args.append(tid)
+    if side is not None:
+        where.append("o.side=?")
+        args.append(SIDES.index(side))
+    if since is not None:
+        where.append("o.ts >= ?")
+        args.append(int(since))
+    if selected_only:
+        where.append("o.selected=1")
+    conn = db.connect()
+    try:
+        rows = conn.execute(
+            f"""SELECT t.key, o.side, COUNT(*),
+                       SUM(o.fill_ts IS NOT NULL), SUM(o.outcome='unfilled'), SUM(o.state=0), SUM(o.state=1),
+                       SUM(o.tp_hit >= 1), SUM(o.tp_hit >= 2), SUM(o.tp_hit >= 3),
+                       SUM(o.outcome='stop'), SUM(o.outcome='stop' AND o.tp_hit=0), SUM(o.outcome='timeout'),
+                       AVG(CASE WHEN o.state=2 AND o.fill_price IS NOT NULL THEN
+                             (CASE WHEN o.side=0 THEN o.exit_price - o.fill_price ELSE o.fill_price - o.exit_price END)
+                             / NULLIF(ABS(o.fill_price - o.stop), 0) END)
+                  FROM plan_outcomes o JOIN timeframes t ON t.id = o.tf_id
+                 WHERE {" AND ".join(where)}
+                 GROUP BY o.tf_id, o.side ORDER BY t.key, o.side""",
+            args,
+        ).fetchall()
+    finally:
+        conn.close()
+    out = []
+    for key, s, n, filled, unfilled, pending, open_, tp1, tp2, tp3, stops, stops0, timeouts, avg_r in rows:
+        decided = (tp1 or 0) + (stops0 or 0)
+        out.append({
+            "tf": key,
+            "side": SIDES[int(s)],
+            "plans": int(n),
+            "filled": int(filled or 0),
+            "unfilled": int(unfilled or 0),
+            "pending": int(pending or 0),
+            "open": int(open_ or 0),
+            "tp1": int(tp1 or 0),
+            "tp2": int(tp2 or 0),
+            "tp3": int(tp3 or 0),
+            "stopped": int(stops or 0),
+            "stopped_before_tp1": int(stops0 or 0),
+            "timed_out": int(timeouts or 0),
+            "hit_rate": round(tp1 / decided, 4) if decided else None,
+            "fill_rate": round(filled / (filled + unfilled), 4) if (filled or 0) + (unfilled or 0) else None,
+            "avg_r": round(float(avg_r), 3) if avg_r is not None else None,
+        })
+    return out
+
+
+def recent(tf: Optional[str] = None, side: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+    """Latest tracked plans with their current state, newest first."""
+    where = ["1=1"]
+    args: List[Any] = []
+    if tf is not None:
+        where.append("t.key=?")
+        args.append(tf)
+    if side is not None:
+        where.append("o.side=?")
+        args.append(SIDES.index(side))
+    conn = db.connect()
+    try:
+        rows = conn.execute(
+            f"""SELECT t.key, o.side, o.ts, o.selected, o.market, o.entry, o.stop, o.tp1, o.tp2, o.tp3, o.state,
+                       o.fill_ts, o.fill_price, o.tp_hit, o.exit_ts, o.exit_price, o.outcome
+                  FROM plan_outcomes o JOIN timeframes t ON t.id = o.tf_id
+                 WHERE {" AND ".join(where)} ORDER BY o.id DESC LIMIT ?""",
+            args + [int(limit)],
+        ).fetchall()
+    finally:
+        conn.close()
+    keys = ("tf", "side", "ts", "selected", "market", "entry", "stop", "tp1", "tp2", "tp3", "state",
+            "fill_ts", "fill_price", "tp_hit", "exit_ts", "exit_price", "outcome")
+    out = []
+    for r in rows:
+        d = dict(zip(keys, r))
+        d["side"] = SIDES[int(d["side"])]
+        d["selected"], d["market"] = bool(d["selected"]), bool(d["market"])
+        d["state"] = ("pending", "open", "done")[int(d["state"])]
+        out.append(d)
+    return out
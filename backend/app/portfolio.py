@@ -0,0 +1,327 @@
+from __future__ import annotations
+
+import bisect
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from . import costs, db, regime, strategies, timeframes
+from . import recommend as rec
+from .strategies import ATR, Indicators
+from .config import (
+    EVAL_LOOKBACK_BARS, LOOKBACK_INTRA, ENTRY_K_GRID, STOP_MULT_GRID, MIN_ATR_PCT, MAX_ATR_PCT,
+)
+
+# Multi-timeframe portfolio replay: walks every bar close of the trade timeframes in
+# time order and, whenever flat, picks a timeframe exactly like recommend() does
+# (regime table / candidate_from_snapshot / score_candidate / candidate_rank /
+# build_plan), using only data that existed at that moment:
+#   - indicators and entry/exit signals come from precomputed arrays (app/strategies.py,
+#     the same rules recommend() and the evaluator use),
+#   - the 1D regime is the app/regime.py label of the last daily bar closed by then,
+#   - best params come from walk-forward refits of _grid_search() on the
+#     EVAL_LOOKBACK_BARS bars before each refit point.
+# One position at a time, net of the app/costs.py model (the refits use it too);
+# feature-store rules are not replayed.
+
+MIN_BARS = 210  # same readiness threshold as recommend._indicator_snapshot()
+
+
+@dataclass
+class Series:
+    tf: str
+    sec: int
+    ts: np.ndarray
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    ind: Indicators
+    rows: List[Dict[str, Any]]
+
+    @property
+    def close_ts(self) -> np.ndarray:
+        return self.ts + self.sec
+
+    @property
+    def atr14(self) -> np.ndarray:
+        return self.ind[ATR]
+
+
+def load_series(tf: str, end_ts: Optional[int] = None, include_archive: bool = False) -> Series:
+    end = int(end_ts) if end_ts is not None else 2**62
+    if include_archive:
+        from .retention import fetch_history
+        rows = fetch_history(tf, 0, end)
+    else:
+        rows = [dict(r) for r in db.fetch_range(tf, 0, end)]
+    arr = np.array([(r["ts"], r["open"], r["high"], r["low"], r["close"]) for r in rows], dtype=np.float64).reshape(-1, 5)
+    o, h, l, c = arr[:, 1], arr[:, 2], arr[:, 3], arr[:, 4]
+    return Series(
+        tf=tf, sec=timeframes.tf_seconds(tf), ts=arr[:, 0].astype(np.int64), open=o, high=h, low=l, close=c,
+        ind=Indicators(o, h, l, c), rows=rows,
+    )
+
+
+class _WalkForwardParams:
+    """Best params per timeframe as they were known at time t (refit every `refit_bars` bars)."""
+
+    def __init__(self, side: str):
+        self.side = side
+        self.valid_from: Dict[str, List[int]] = {}
+        self.params: Dict[str, List[Dict[str, Any]]] = {}
+        self.fits = 0
+
+    def fit(self, series: Sequence[Series], start_ts: int, end_ts: int, refit_bars: Dict[str, int],
+            cost_model: Optional[costs.CostModel] = None) -> None:
+        entry_ks = rec._grid_from_cfg(ENTRY_K_GRID)
+        stop_mults = rec._grid_from_cfg(STOP_MULT_GRID)
+        jobs: List[Tuple[str, int, List[Dict[str, Any]]]] = []
+        # One intrabar index per timeframe (WONYODD_INTRABAR_FILLS), shared by its refits.
+        minutes = {s.tf: rec.minute_index_for(s.tf, s.rows, self.side) for s in series}
+        for s in series:
+            close_ts = s.close_ts
+            first = max(int(np.searchsorted(close_ts, start_ts, side="right")) - 1, MIN_BARS - 1)
+            last = int(np.searchsorted(close_ts, end_ts, side="right")) - 1
+            for j in range(first, last + 1, max(1, int(refit_bars[s.tf]))):
+                jobs.append((s.tf, int(close_ts[j]), s.rows[max(0, j + 1 - EVAL_LOOKBACK_BARS):j + 1]))
+
+        results: Optional[List[Dict[str, Any]]] = None
+        pool = rec._eval_pool() if len(jobs) > 1 else None
+        if pool is not None:
+            try:
+                futures = [pool.submit(rec._grid_search, rows, self.side, entry_ks, stop_mults, cost_model, minutes[tf])
+                           for tf, _, rows in jobs]
+                results = [f.result() for f in futures]
+            except Exception as e:
+                print(f"[WARN] Parallel walk-forward fit failed, running in-process: {type(e).__name__}: {e}")
+        if results is None:
+            results = [rec._grid_search(rows, self.side, entry_ks, stop_mults, cost_model, minutes[tf])
+                       for tf, _, rows in jobs]
+
+        for (tf, valid_from, _), res in zip(jobs, results):
+            self.valid_from.setdefault(tf, []).append(valid_from)
+            self.params.setdefault(tf, []).append(res)
+        self.fits = len(jobs)
+
+    def at(self, tf: str, t: int) -> Dict[str, Any]:
+        k = bisect.bisect_right(self.valid_from.get(tf, []), t)
+        return self.params[tf][k - 1] if k else {"ok": False, "reason": "no_data"}
+
+
+def _maybe_ready(s: Series, side: str) -> np.ndarray:
+    """Vectorized pre-check of the READY conditions (trigger + trend + ATR% band) per bar."""
+    entry, _ = s.ind.signals(strategies.get(), side)
+    with np.errstate(invalid="ignore"):
+        atr_pct = s.atr14 / s.close * 100.0
+        ok = entry & (atr_pct >= MIN_ATR_PCT) & (atr_pct <= MAX_ATR_PCT)
+    ok[:MIN_BARS - 1] = False
+    return ok
+
+
+def _snapshot(s: Series, i: int) -> Optional[rec.Snapshot]:
+    if i < MIN_BARS - 1 or LOOKBACK_INTRA < MIN_BARS:
+        return None
+    values = s.ind.at(i, strategies.indicator_names(strategies.active()))
+    if any(np.isnan(v) for v in values.values()):
+        return None
+    return (int(s.ts[i]), float(s.close[i]), values)
+
+
+def _new_tf_stats() -> Dict[str, Any]:
+    return {"decisions_selected": 0, "ready_selected": 0, "orders": 0, "unfilled": 0,
+            "trades": 0, "wins": 0, "bars_held": 0, "pnl": 0.0, "compound_return": 1.0}
+
+
+def simulate(side: str, tfs: Optional[Sequence[str]] = None, start_ts: Optional[int] = None,
+             end_ts: Optional[int] = None, refit_days: float = 7.0, cost_model: Optional[costs.CostModel] = None,
+             include_archive: bool = False, risk_pct: Optional[float] = None) -> Dict[str, Any]:
+    """Replay recommend() over history and trade its READY selections; see module comment.
+
+    cost_model defaults to the configured one (with funding for the replayed range).
+    """
+    side = side.lower().strip()
+    if side not in ("long", "short"):
+        raise ValueError("side must be 'long' or 'short'")
+    tfs = tuple(tfs or timeframes.trade_timeframes())
+    t0 = time.time()
+
+    series = [load_series(tf, end_ts, include_archive) for tf in tfs]
+    series = [s for s in series if len(s.ts) >= MIN_BARS]
+    if not series:
+        return {"ok": False, "error": "not_enough_data_for_" + "_".join(tfs)}
+    regimes = regime.load(end_ts, include_archive)
+
+    all_close = np.concatenate([s.close_ts for s in series])
+    start = int(start_ts) if start_ts is not None else int(min(s.close_ts[MIN_BARS - 1] for s in series))
+    end = int(end_ts) if end_ts is not None else int(all_close.max())
+
+    if cost_model is None:
+        first_ts = min(int(s.ts[0]) for s in series)
+        cost_model = costs.from_config(first_ts, end)
+    params = _WalkForwardParams(side)
+    refit_bars = {s.tf: max(1, int(float(refit_days) * 86400 // s.sec)) for s in series}
+    params.fit(series, start, end, refit_bars, cost_model)
+    t_fit = time.time() - t0
+
+    # Event stream: (close time, series index, bar index), in time order.
+    ev_t = np.concatenate([s.close_ts for s in series])
+    ev_s = np.concatenate([np.full(len(s.ts), k) for k, s in enumerate(series)])
+    ev_i = np.concatenate([np.arange(len(s.ts)) for s in series])
+    mask = (ev_t >= start) & (ev_t <= end)
+    order = np.lexsort((ev_s[mask], ev_t[mask]))
+    ev_t, ev_s, ev_i = ev_t[mask][order], ev_s[mask][order], ev_i[mask][order]
+    ready = [_maybe_ready(s, side) for s in series]
+    exits = [s.ind.signals(strategies.get(), side)[1] for s in series]
+    last_idx = [int(np.searchsorted(s.close_ts, start, side="left")) - 1 for s in series]
+
+    exit_fee = cost_model.fee(False)
+    vscale = [costs.volume_scale([r.get("volume") for r in s.rows]) if cost_model.volume_scaled else None
+              for s in series]
+    equity = 1.0
+    curve_t: List[int] = []
+    curve_eq: List[float] = []
+    pos: Optional[Dict[str, Any]] = None
+    stats = {s.tf: _new_tf_stats() for s in series}
+    trades: List[Dict[str, Any]] = []
+    decisions = 0
+
+    def close_trade(px: float, t: int, reason: str, bar: int) -> None:
+        nonlocal equity, pos
+        vs = vscale[pos["k"]]
+        exit_px = cost_model.slip(px, pos["atr"], side == "short", vs[bar] if vs is not None else 1.0)
+        funding = cost_model.funding(side, pos["entry_ts"], t)
+        ret = cost_model.net_return(side, pos["entry"], exit_px, pos["entry_type"] != "market", funding)
+        st = stats[pos["tf"]]
+        st["trades"] += 1
+        st["wins"] += 1 if ret > 0 else 0
+        st["pnl"] += equity * ret
+        st["compound_return"] *= 1.0 + ret
+        st["bars_held"] += pos["bars"]
+        equity *= 1.0 + ret
+        trades.append({"tf": pos["tf"], "entry_ts": pos["entry_ts"], "exit_ts": t, "entry": pos["entry"],
+                       "exit": float(exit_px), "ret": ret, "reason": reason, "entry_type": pos["entry_type"]})
+        pos = None
+
+    n_ev = len(ev_t)
+    g = 0
+    while g < n_ev:
+        t = int(ev_t[g])
+        h = g
+        fresh: List[int] = []
+        while h < n_ev and ev_t[h] == t:
+            k, i = int(ev_s[h]), int(ev_i[h])
+            last_idx[k] = i
+            fresh.append(k)
+            if pos is not None and pos["k"] == k:
+                s = series[k]
+                if pos["state"] == "pending":
+                    if pos["entry_type"] == "market":
+                        vs = vscale[k]
+                        pos["entry"] = cost_model.slip(float(s.open[i]), pos["atr"], side == "long",
+                                                       vs[i] if vs is not None else 1.0)
+                        pos["stop"] = pos["entry"] - pos["stop_dist"] if side == "long" else pos["entry"] + pos["stop_dist"]
+                        filled = True
+                    else:
+                        filled = s.low[i] <= pos["entry"] if side == "long" else s.high[i] >= pos["entry"]
+                    if filled:
+                        pos.update(state="open", entry_ts=int(s.ts[i]), bars=0)
+                    else:
+                        stats[s.tf]["unfilled"] += 1
+                        pos = None
+                # Like backtest_price_plan, the fill bar itself is checked for the stop and
+                # the strategy's exit; a pending exit at the open is taken before an intrabar stop.
+                if pos is not None and pos["state"] == "open":
+                    pos["bars"] += 1
+                    if pos["exit_pending"]:
+                        close_trade(float(s.open[i]), int(s.ts[i]), "exit", i)
+                    elif (side == "long" and s.low[i] <= pos["stop"]) or (side == "short" and s.high[i] >= pos["stop"]):
+                        close_trade(pos["stop"], int(s.ts[i]) + s.sec, "stop", i)
+                    elif exits[k][i]:
+                        pos["exit_pending"] = True
+            h += 1
+        g = h
+
+        if pos is not None:
+            s = series[pos["k"]]
+            if pos["state"] == "open":
+                px = float(s.close[last_idx[pos["k"]]])
+                m2m = px / pos["entry"] if side == "long" else pos["entry"] / px
+                curve_t.append(t)
+                curve_eq.append(equity * m2m * (1.0 - exit_fee))
+            continue
+
+        curve_t.append(t)
+        curve_eq.append(equity)
+        # Only a fresh bar that passes the READY pre-check can lead to an order; every
+        # other moment would select a "wait" candidate and do nothing.
+        if not any(ready[k][last_idx[k]] for k in fresh):
+            continue
+
+        decisions += 1
+        reg = regimes.at(t)
+        candidates = []
+        for k, s in enumerate(series):
+            snap = _snapshot(s, last_idx[k]) if last_idx[k] >= 0 else None
+            if snap is not None:
+                candidates.append(rec.candidate_from_snapshot(s.tf, snap, side, reg["bias"], t))
+        scored = [rec.score_candidate(c, params.at(c["tf"], t), reg, side) for c in candidates]
+        chosen = sorted(scored, key=rec.candidate_rank, reverse=True)[0]
+        k = next(k for k, s in enumerate(series) if s.tf == chosen["tf"])
+        st = stats[chosen["tf"]]
+        st["decisions_selected"] += 1
+        if chosen["status"] != "ready" or int(chosen["ts"]) + series[k].sec != t:
+            continue
+        st["ready_selected"] += 1
+        if last_idx[k] + 1 >= len(series[k].ts):
+            continue
+        plan = rec.build_plan(chosen, side, best_params=chosen.get("best_params"), risk_pct=risk_pct)
+        st["orders"] += 1
+        pos = {
+            "k": k, "tf": chosen["tf"], "state": "pending", "entry_type": plan["entry_type"],
+            "entry": float(plan["entry_price"]), "stop": float(plan["stop_price"]),
+            "stop_dist": float(plan["params"]["stop_atr_mult"]) * float(chosen["atr14"]), "atr": float(chosen["atr14"]),
+            "exit_pending": False, "bars": 0, "entry_ts": None,
+        }
+
+    if pos is not None and pos["state"] == "open":
+        s = series[pos["k"]]
+        close_trade(float(s.close[last_idx[pos["k"]]]), end, "end", last_idx[pos["k"]])
+        curve_t.append(end)
+        curve_eq.append(equity)
+
+    eq = np.asarray(curve_eq or [1.0])
+    peak = np.maximum.accumulate(np.maximum(eq, 1.0))
+    dd = (peak - eq) / peak
+    n_tr = len(trades)
+    by_tf = {}
+    for tf, st in stats.items():
+        by_tf[tf] = {
+            **{k: v for k, v in st.items() if k != "compound_return"},
+            "win_rate": st["wins"] / st["trades"] if st["trades"] else None,
+            "return": st["compound_return"] - 1.0,
+            "pnl_share": st["pnl"] / (equity - 1.0) if abs(equity - 1.0) > 1e-12 else None,
+        }
+    return {
+        "ok": True,
+        "side": side,
+        "timeframes": [s.tf for s in series],
+        "start_ts": start,
+        "end_ts": end,
+        "total_return": equity - 1.0,
+        "mdd": float(dd.max()),
+        "trades": n_tr,
+        "win_rate": (sum(1 for x in trades if x["ret"] > 0) / n_tr) if n_tr else None,
+        "decisions": decisions,
+        "refits": params.fits,
+        "refit_bars": refit_bars,
+        "costs": {"maker_bps": cost_model.maker_bps, "taker_bps": cost_model.taker_bps,
+                  "slippage_bps": cost_model.slippage_bps, "slippage_atr_frac": cost_model.slippage_atr_frac,
+                  "funding_points": int(len(cost_model.funding_ts)) if cost_model.funding_ts is not None else 0},
+        "by_tf": by_tf,
+        "equity": list(zip(curve_t, curve_eq)),
+        "trade_log": trades,
+        "elapsed_sec": {"fit": round(t_fit, 2), "total": round(time.time() - t0, 2)},
+    }
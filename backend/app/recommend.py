@@ -1,164 +1,126 @@
 from __future__ import annotations
 import time
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 from typing import Dict, Any, List, Optional, Tuple
 import math
 
-from . import db
-from .indicators import sma_last, rsi_sma_last, atr_sma_last, clamp
-from .evaluator import backtest_price_plan, score_metrics
+import numpy as np
+
+from . import costs, db, features, gaps, regime, robustness, shared, strategies
+from . import timeframes
+from .timeframes import tf_key, trade_timeframes
+from .indicators import clamp
+from .evaluator import backtest_price_plan, score_metrics, signal_bars
+from .intrabar import MinuteIndex
 from .config import (
-    LOOKBACK_1D, LOOKBACK_INTRA, MAX_LEVERAGE, RISK_PCT_DEFAULT, STOP_ATR_MULT,
-    ENTRY_ATR_K_30, ENTRY_ATR_K_60, ENTRY_ATR_K_180,
-    EVAL_LOOKBACK_BARS, ENTRY_K_GRID, STOP_MULT_GRID, MIN_ATR_PCT, MAX_ATR_PCT,
+    LOOKBACK_INTRA, MAX_LEVERAGE, RISK_PCT_DEFAULT, STOP_ATR_MULT,
+    EVAL_LOOKBACK_BARS, ENTRY_K_GRID, STOP_MULT_GRID, MIN_ATR_PCT, MAX_ATR_PCT, EVAL_PROCESSES,
+    FEATURE_FILTERS, FEATURE_SCORE, FEATURE_SOURCE_TFS, FEATURE_MAX_AGE_SEC,
+    ROBUST_EVAL, ROBUST_METHOD, ROBUST_RESAMPLES, ROBUST_BLOCK, ROBUST_WINDOW_FRAC, ROBUST_STD_PENALTY,
+    INTRABAR_FILLS, INTRABAR_TF, SCENARIO_ENABLED, FUNDING_ENABLED,
 )
 
-_EVAL_CACHE: Dict[tuple, Dict[str, Any]] = {}
-
-TF_MINUTES = {
-    "30m": 30,
-    "60m": 60,
-    "180m": 180,
-    "1D": 1440,
-}
-
-def tf_key(minutes_or_str: str) -> Optional[str]:
-    s = str(minutes_or_str).strip()
-    s = s.upper()
-    # Accept TradingView formats: "30", "60", "180", "1D", "D"
-    if s in ("30", "30M", "0.5H"):
-        return "30m"
-    if s in ("60", "60M", "1H"):
-        return "60m"
-    if s in ("180", "180M", "3H"):
-        return "180m"
-    if s in ("1D", "D", "1DAY", "DAY"):
-        return "1D"
-    if s in ("1", "1M", "1MIN", "1MINUTE"):
-        return "1m"
-    if s in ("5", "5M", "5MIN", "5MINUTE"):
-        return "5m"
-    if s in ("15", "15M", "15MIN", "15MINUTE"):
-        return "15m"
-    return None
+_FEATURE_FILTERS = features.parse_filters(FEATURE_FILTERS)
+_FEATURE_SCORE = features.parse_score(FEATURE_SCORE)
+_FEATURE_SOURCE_TFS = timeframes.parse_tf_list(FEATURE_SOURCE_TFS)
 
 def entry_k_for_tf(tf: str) -> float:
-    if tf == "30m":
-        return ENTRY_ATR_K_30
-    if tf == "60m":
-        return ENTRY_ATR_K_60
-    if tf == "180m":
-        return ENTRY_ATR_K_180
-    return 0.5
+    t = timeframes.get(tf)
+    return t.entry_k if t else 0.5
 
 def regime_1d() -> Dict[str, Any]:
-    rows = db.fetch_recent("1D", LOOKBACK_1D)
-    if len(rows) < 210:
-        return {"bias": "unknown", "confidence": 0.0, "detail": "not_enough_1D_data"}
-    closes = [r["close"] for r in rows]
-    sma200 = sma_last(closes, 200)
-    if sma200 is None:
-        return {"bias": "unknown", "confidence": 0.0, "detail": "no_sma200"}
-    last_close = closes[-1]
-    # simple confidence: distance from sma200 (%), capped
-    dist = abs(last_close - sma200) / last_close
-    conf = clamp(dist * 5.0, 0.0, 1.0)  # 0~1
-    bias = "long_favored" if last_close > sma200 else "short_favored"
-    return {
-        "bias": bias,
-        "confidence": round(conf, 3),
-        "last_close": last_close,
-        "sma200": sma200,
-        "ts": int(rows[-1]["ts"]),
-    }
-
-def _ease_score(side: str, close: float, sma5: float, sma200: float, rsi2: float, regime_bias: str) -> Tuple[float, Dict[str, Any]]:
-    # Hard trend filter (SMA200) to reduce MDD.
-    if side == "long":
-        trend_ok = close > sma200
-        trigger = trend_ok and (close < sma5) and (rsi2 <= 5.0)
-
-        dist_sma5 = max(0.0, (close - sma5) / close) * 100.0
-        dist_rsi = max(0.0, (rsi2 - 5.0) / 5.0) * 100.0
-        dist_trend = max(0.0, (sma200 - close) / close) * 100.0
-
-        base = 100.0 if trigger else 100.0 - (dist_sma5 * 200.0 + dist_rsi * 1.0 + dist_trend * 300.0)
-
-        if regime_bias == "long_favored":
-            base += 10.0
-        elif regime_bias == "short_favored":
-            base -= 25.0
-
-        return clamp(base, 0.0, 110.0), {
-            "trigger_now": trigger,
-            "trend_ok": trend_ok,
-            "distance_close_to_sma5_pct": round(dist_sma5, 4),
-            "distance_close_to_sma200_pct": round(dist_trend, 4),
-            "distance_rsi_to_threshold": round(max(0.0, rsi2 - 5.0), 4),
-        }
-    else:
-        trend_ok = close < sma200
-        trigger = trend_ok and (close > sma5) and (rsi2 >= 95.0)
-
-        dist_sma5 = max(0.0, (sma5 - close) / close) * 100.0
-        dist_rsi = max(0.0, (95.0 - rsi2) / 95.0) * 100.0
-        dist_trend = max(0.0, (close - sma200) / close) * 100.0
-
-        base = 100.0 if trigger else 100.0 - (dist_sma5 * 200.0 + dist_rsi * 1.0 + dist_trend * 300.0)
-
-        if regime_bias == "short_favored":
-            base += 10.0
-        elif regime_bias == "long_favored":
-            base -= 25.0
-
-        return clamp(base, 0.0, 110.0), {
-            "trigger_now": trigger,
-            "trend_ok": trend_ok,
-            "distance_close_to_sma5_pct": round(dist_sma5, 4),
-            "distance_close_to_sma200_pct": round(dist_trend, 4),
-            "distance_rsi_to_threshold": round(max(0.0, 95.0 - rsi2), 4),
-        }
-
-def evaluate_timeframe(tf: str, side: str, regime_bias: str) -> Optional[Dict[str, Any]]:
-    rows = db.fetch_recent(tf, LOOKBACK_INTRA)
-    if len(rows) < 210:
-        return None
-    closes = [r["close"] for r in rows]
-    highs  = [r["high"] for r in rows]
-    lows   = [r["low"] for r in rows]
-    sma5 = sma_last(closes, 5)
-    sma200 = sma_last(closes, 200)
-    rsi2 = rsi_sma_last(closes, 2)
-    atr14 = atr_sma_last(highs, lows, closes, 14)
-    if sma5 is None or sma200 is None or rsi2 is None or atr14 is None:
-        return None
-
-    last = rows[-1]
-    close = float(last["close"])
-    ts = int(last["ts"])
-    score, detail = _ease_score(side, close, float(sma5), float(sma200), float(rsi2), regime_bias)
-    atr_pct = (float(atr14) / close * 100.0) if close else 0.0
+    """Regime of the latest daily bar (app/regime.py; rebuilt only after a 1D write)."""
+    return regime.current()
+
+def _ease_score(strategy: strategies.Strategy, side: str, values: Dict[str, float],
+                regime_bias: str) -> Tuple[float, Dict[str, Any]]:
+    """Entry ease 0..110: the strategy's closeness to its trigger (100 = triggered), tilted by the 1D regime."""
+    detail = strategy.evaluate(values, side)
+    base = detail.pop("ease")
+    if regime_bias == ("long_favored" if side == "long" else "short_favored"):
+        base += 10.0
+    elif regime_bias in ("long_favored", "short_favored"):
+        base -= 25.0
+    return clamp(base, 0.0, 110.0), detail
+
+# (ts, close, indicator values) of a timeframe's latest bar; the values cover every
+# active strategy plus ATR14.
+Snapshot = Tuple[int, float, Dict[str, float]]
+
+# Per-TF indicator snapshot, keyed by db.data_version(tf) so it is recomputed only when
+# that timeframe receives a write.
+_IND_CACHE: Dict[str, Tuple[Tuple[int, int, float], Optional[Snapshot]]] = {}
+_IND_LOCK = threading.Lock()
+
+def _indicator_snapshot(tf: str) -> Optional[Snapshot]:
+    """Return (ts, close, indicator values) for the latest bar of `tf`."""
+    version = db.data_version(tf)
+    with _IND_LOCK:
+        hit = _IND_CACHE.get(tf)
+    if hit is not None and hit[0] == version:
+        return hit[1]
+
+    snap = None
+    rows = db.fetch_recent_ohlcv(tf, LOOKBACK_INTRA)
+    if len(rows) >= 210:
+        ind = strategies.Indicators(*np.array(rows, dtype=np.float64)[:, 1:5].T)
+        values = ind.at(-1, strategies.indicator_names(strategies.active()))
+        if all(math.isfinite(v) for v in values.values()):
+            snap = (int(rows[-1][0]), float(rows[-1][4]), values)
+    with _IND_LOCK:
+        _IND_CACHE[tf] = (version, snap)
+    return snap
+
+def candidate_from_snapshot(tf: str, snap: Snapshot, side: str, regime_bias: str, now: int) -> Dict[str, Any]:
+    """Candidate dict for one timeframe from its indicator snapshot (pure).
+
+    Status fields come from the primary strategy; with several active strategies the
+    others are scored on the same values under "strategies".
+    """
+    ts, close, values = snap
+    active = strategies.active()
+    x = {"close": close, **values}
+    score, detail = _ease_score(active[0], side, x, regime_bias)
+    atr14 = float(values[strategies.ATR])
+    atr_pct = (atr14 / close * 100.0) if close else 0.0
     vol_ok = (atr_pct >= MIN_ATR_PCT) and (atr_pct <= MAX_ATR_PCT)
 
-    now = int(time.time())
-    tf_sec = TF_MINUTES[tf] * 60
+    tf_sec = timeframes.tf_seconds(tf)
     next_ts = ts + tf_sec
     time_to_next = max(0, next_ts - now)
 
-    return {
+    c = {
         "tf": tf,
         "ts": ts,
         "close": close,
-        "sma5": float(sma5),
-        "sma200": float(sma200),
-        "rsi2": float(rsi2),
-        "atr14": float(atr14),
+        **{k: float(v) for k, v in values.items()},
         "atr_pct": round(atr_pct, 4),
         "vol_ok": bool(vol_ok),
         "entry_ease_score": round(float(score), 2),
         "time_to_next_sec": int(time_to_next),
+        "strategy": active[0].name,
         **detail,
     }
+    if len(active) > 1:
+        others = {}
+        for s in active[1:]:
+            sc, det = _ease_score(s, side, x, regime_bias)
+            others[s.name] = {"entry_ease_score": round(float(sc), 2), "trigger_now": det["trigger_now"],
+                              "trend_ok": det["trend_ok"],
+                              "ready": bool(det["trigger_now"] and det["trend_ok"] and vol_ok)}
+        c["strategies"] = others
+    return c
+
+def evaluate_timeframe(tf: str, side: str, regime_bias: str) -> Optional[Dict[str, Any]]:
+    snap = _indicator_snapshot(tf)
+    if snap is None:
+        return None
+    c = candidate_from_snapshot(tf, snap, side, regime_bias, int(time.time()))
+    # SMA200 and friends are computed over stored bars; report holes in that span.
+    c["missing_bars"] = gaps.missing_bars(tf, snap[0] - 200 * timeframes.tf_seconds(tf), snap[0])
+    return c
 
 def _norm_backtest_score(x: float) -> float:
     # Compress to 0..1 range for UI scoring.
@@ -178,52 +140,162 @@ def _grid_from_cfg(s: str) -> List[float]:
             continue
     return out or [0.5]
 
-def _best_params_for_tf(tf: str, side: str) -> Dict[str, Any]:
-    """Return best (entry_mode, entry_k, stop_mult) by recent backtest score for this tf/side.
-    Cached by latest candle ts to avoid heavy recomputation.
+def _grid_search(rows_dicts: List[Dict[str, Any]], side: str, entry_ks: List[float], stop_mults: List[float],
+                 cost_model: Optional[costs.CostModel] = None, minutes: Optional[MinuteIndex] = None,
+                 strategy: Optional[str] = None) -> Dict[str, Any]:
+    """Score the market baseline plus the limit_atr grid on `rows_dicts`; return the best.
+
+    Every point is scored net of `cost_model` (fees, slippage, funding), so the
+    maker/taker difference between limit and market entries is part of the choice.
+    `minutes` (see minute_index_for) switches the backtests to intrabar fills.
+    `strategy` names the entry/exit rules (default: the primary active strategy); its
+    indicators and signals are computed once and shared by every grid point.
+
+    With WONYODD_ROBUST_EVAL the winner is chosen by the stability-weighted bootstrap
+    score of each point's trades instead of its single-path score.
+    Pure function of its arguments so it can run in a worker process.
+    """
+    # Evaluate: market baseline + limit_atr grid
+    points: List[Dict[str, Any]] = []
+    ind = strategies.Indicators.from_rows(rows_dicts)
+    m_market, det_market = backtest_price_plan(rows_dicts, side=side, entry_mode="market", entry_k=0.0,
+                                               stop_mult=stop_mults[0], costs=cost_model, intrabar=minutes,
+                                               strategy=strategy, ind=ind)
+    points.append({"params": {"entry_mode": "market", "entry_k": 0.0, "stop_mult": stop_mults[0]},
+                   "metrics": m_market, "trade_rets": det_market.get("trade_rets", [])})
+    for k in entry_ks:
+        for sm in stop_mults:
+            m, det = backtest_price_plan(rows_dicts, side=side, entry_mode="limit_atr", entry_k=k, stop_mult=sm,
+                                         costs=cost_model, intrabar=minutes, strategy=strategy, ind=ind)
+            points.append({"params": {"entry_mode": "limit_atr", "entry_k": float(k), "stop_mult": float(sm)},
+                           "metrics": m, "trade_rets": det.get("trade_rets", [])})
+    path_scores = [score_metrics(p["metrics"]) for p in points]
+
+    robust: List[Optional[Dict[str, Any]]] = [None] * len(points)
+    if ROBUST_EVAL:
+        robust = robustness.evaluate_many(
+            points, method=ROBUST_METHOD, resamples=ROBUST_RESAMPLES, block=ROBUST_BLOCK,
+            window_frac=ROBUST_WINDOW_FRAC, std_penalty=ROBUST_STD_PENALTY,
+        )
+    use_robust = any(r is not None for r in robust)
+    scores = [
+        (r["robust_score"] if r is not None else -1e18) if use_robust else ps
+        for r, ps in zip(robust, path_scores)
+    ]
+
+    best_i = 0
+    for i in range(1, len(points)):
+        if scores[i] > scores[best_i]:
+            best_i = i
+    best = points[best_i]
+    out = {"ok": True, "score": float(scores[best_i]), **best["params"], "metrics": best["metrics"].__dict__}
+    if use_robust:
+        out["path_score"] = float(path_scores[best_i])
+        out["robust"] = robust[best_i]
+    return out
+
+def minute_index_for(tf: str, rows_dicts: List[Dict[str, Any]], side: str) -> Optional[MinuteIndex]:
+    """Intrabar index for a grid search on `rows_dicts`, with the entry bars prefetched (None when off)."""
+    if not INTRABAR_FILLS or timeframes.tf_seconds(tf) <= timeframes.tf_seconds(INTRABAR_TF):
+        return None
+    idx = MinuteIndex(timeframes.tf_seconds(tf))
+    # The fill bar and the next two, where most stops are touched; later bars load on demand.
+    idx.prefetch(rows_dicts[j]["ts"] for i in signal_bars(rows_dicts, side) for j in range(i + 1, i + 4)
+                 if j < len(rows_dicts))
+    return idx
+
+_POOL: Optional[ProcessPoolExecutor] = None
+_POOL_LOCK = threading.Lock()
+
+def _eval_pool() -> Optional[ProcessPoolExecutor]:
+    global _POOL
+    if EVAL_PROCESSES <= 0:
+        return None
+    with _POOL_LOCK:
+        if _POOL is None:
+            import multiprocessing
+
+            # spawn: never fork a threaded server process.
+            _POOL = ProcessPoolExecutor(max_workers=EVAL_PROCESSES, mp_context=multiprocessing.get_context("spawn"))
+        return _POOL
+
+def best_params_many(pairs: List[Tuple[str, str]]) -> Dict[Tuple[str, str], Dict[str, Any]]:
+    """_best_params_for_tf() for several (tf, side) pairs at once.
+
+    Each pair is cached by its own timeframe's latest candle ts, so only timeframes
+    that received a new bar are searched again; misses on several timeframes run in
+    parallel when WONYODD_EVAL_PROCESSES > 0.
     """
-    latest = db.fetch_latest(tf)
-    if not latest:
-        return {"ok": False, "reason": "no_data"}
-    latest_ts = int(latest["ts"])
-    cache_key = (tf, side)
-    cached = _EVAL_CACHE.get(cache_key)
-    if cached and cached.get("latest_ts") == latest_ts:
-        return cached["best"]
-
-    rows = db.fetch_recent(tf, EVAL_LOOKBACK_BARS)
-    rows_dicts = [dict(r) for r in rows]
+    out: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    todo: List[Tuple[str, str, int]] = []
+    strategy = strategies.get().name
+    cost_key = f"{strategy}:" + costs.config_key() + (f"-ib{INTRABAR_TF}" if INTRABAR_FILLS else "")
+    if FUNDING_ENABLED:
+        cost_key += f"-fv{db.data_version(db.FUNDING_VERSION_KEY)[1]}"  # imported funding rates change net returns
+    for tf, side in pairs:
+        latest = db.fetch_latest(tf)
+        if not latest:
+            out[(tf, side)] = {"ok": False, "reason": "no_data"}
+            continue
+        latest_ts = int(latest["ts"])
+        cached = shared.cache_get(f"best_params:{tf}:{side}:{cost_key}")
+        if cached and cached.get("latest_ts") == latest_ts:
+            out[(tf, side)] = cached["best"]
+        else:
+            todo.append((tf, side, latest_ts))
+    if not todo:
+        return out
 
     entry_ks = _grid_from_cfg(ENTRY_K_GRID)
     stop_mults = _grid_from_cfg(STOP_MULT_GRID)
+    rows_by_tf = {tf: [dict(r) for r in db.fetch_recent(tf, EVAL_LOOKBACK_BARS)] for tf in {t[0] for t in todo}}
+    cost_by_tf = {
+        tf: costs.from_config(rows[0]["ts"], rows[-1]["ts"] + timeframes.tf_seconds(tf)) if rows else None
+        for tf, rows in rows_by_tf.items()
+    }
 
-    best_score = -1e18
-    best = None
-    best_metrics = None
+    results: Optional[List[Dict[str, Any]]] = None
+    pool = _eval_pool() if len(todo) > 1 else None
+    if pool is not None:
+        try:
+            futures = [pool.submit(_grid_search, rows_by_tf[tf], side, entry_ks, stop_mults, cost_by_tf[tf],
+                                   minute_index_for(tf, rows_by_tf[tf], side), strategy)
+                       for tf, side, _ in todo]
+            results = [f.result() for f in futures]
+        except Exception as e:
+            print(f"[WARN] Parallel grid search failed, running in-process: {type(e).__name__}: {e}")
+    if results is None:
+        results = [_grid_search(rows_by_tf[tf], side, entry_ks, stop_mults, cost_by_tf[tf],
+                                minute_index_for(tf, rows_by_tf[tf], side), strategy)
+                   for tf, side, _ in todo]
+
+    for (tf, side, latest_ts), res in zip(todo, results):
+        shared.cache_set(f"best_params:{tf}:{side}:{cost_key}", {"latest_ts": latest_ts, "best": res})
+        out[(tf, side)] = res
+    return out
 
-    # Evaluate: market baseline + limit_atr grid
-    # Use a small fee_bps by default (0) - user can add later
-    m_market, det_market = backtest_price_plan(rows_dicts, side=side, entry_mode="market", entry_k=0.0, stop_mult=stop_mults[0])
-    s_market = score_metrics(m_market)
-    best_score, best, best_metrics = s_market, {"entry_mode": "market", "entry_k": 0.0, "stop_mult": stop_mults[0], "metrics": m_market.__dict__}, m_market
+def _feature_terms(candidate: Dict[str, Any], side: str) -> Optional[Dict[str, Any]]:
+    """Feature-store filters/score for a candidate bar (None when no rules are configured)."""
+    if not (_FEATURE_FILTERS or _FEATURE_SCORE):
+        return None
+    tf = candidate["tf"]
+    names = features.rule_names(_FEATURE_FILTERS, _FEATURE_SCORE)
+    sources = (tf,) + tuple(t for t in _FEATURE_SOURCE_TFS if t != tf)
+    values = features.latest(tf, int(candidate["ts"]), names, source_tfs=sources, max_age_sec=FEATURE_MAX_AGE_SEC)
+    failed = features.check_filters(_FEATURE_FILTERS, side, values)
+    return {
+        "values": values,
+        "filters_ok": not failed,
+        "failed": failed,
+        "score": round(features.score_terms(_FEATURE_SCORE, side, values), 4),
+    }
 
-    for k in entry_ks:
-        for sm in stop_mults:
-            m, det = backtest_price_plan(rows_dicts, side=side, entry_mode="limit_atr", entry_k=k, stop_mult=sm)
-            s = score_metrics(m)
-            if s > best_score:
-                best_score = s
-                best_metrics = m
-                best = {
-                    "entry_mode": "limit_atr",
-                    "entry_k": float(k),
-                    "stop_mult": float(sm),
-                    "metrics": m.__dict__,
-                }
-
-    out = {"ok": True, "score": float(best_score), **best}
-    _EVAL_CACHE[cache_key] = {"latest_ts": latest_ts, "best": out}
-    return out
+def _best_params_for_tf(tf: str, side: str) -> Dict[str, Any]:
+    """Return best (entry_mode, entry_k, stop_mult) by recent backtest score for this tf/side.
+    Cached by latest candle ts to avoid heavy recomputation (shared across workers
+    in multi-worker mode).
+    """
+    return best_params_many([(tf, side)])[(tf, side)]
 
 def build_plan(candidate: Dict[str, Any], side: str, best_params: Optional[Dict[str, Any]] = None, risk_pct: Optional[float]=None) -> Dict[str, Any]:
     risk_pct = RISK_PCT_DEFAULT if risk_pct is None else float(risk_pct)
@@ -243,8 +315,9 @@ def build_plan(candidate: Dict[str, Any], side: str, best_params: Optional[Dict[
     # For UI recommendation, we anchor to current close (not future next_open)
     entry = price if entry_mode == 'market' else (price - k * atr if side == 'long' else price + k * atr)
     stop = entry - stop_mult * atr if side == 'long' else entry + stop_mult * atr
-    # TP anchored to SMA5 mean reversion
-    tp1 = float(candidate["sma5"])
+    # TP anchored to the strategy's mean-reversion target (SMA5 for connors_rsi2)
+    strategy = strategies.get(candidate.get("strategy"))
+    tp1 = strategy.tp1(candidate, side)
     # Optional RR-based targets for swing/runner management
     risk_unit = abs(entry - stop)
     if side == "long":
@@ -282,7 +355,7 @@ def build_plan(candidate: Dict[str, Any], side: str, best_params: Optional[Dict[
         "tp1_price": round(tp1, 2),
         "tp2_price": round(tp2, 2),
         "tp3_price": round(tp3, 2),
-        "tp_rule": "exit when close crosses SMA5, then exit next bar open",
+        "tp_rule": strategy.exit_note,
         "risk_pct": risk_pct,
         "stop_distance_pct": round(stop_pct, 3),
         "entry_distance_pct": round(abs(entry - price) / price * 100.0, 3) if price else None,
@@ -293,107 +366,216 @@ def build_plan(candidate: Dict[str, Any], side: str, best_params: Optional[Dict[
         "recent_metrics": best_params.get('metrics') if (best_params and best_params.get('ok')) else None,
     }
 
-def recommend(side: str, risk_pct: Optional[float]=None, focus_tf: Optional[str] = None) -> Dict[str, Any]:
+def score_candidate(c: Dict[str, Any], p: Dict[str, Any], reg: Dict[str, Any], side: str,
+                    feat: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Composite score/confidence/status for one candidate (pure; shared with the portfolio replay)."""
+    regime_bias = reg["bias"]
+    eval_score = float(p.get("score", 0.0)) if p.get("ok") else None
+    bt_norm = _norm_backtest_score(eval_score if eval_score is not None else 0.0)
+
+    reg_conf = float(reg.get("confidence", 0.0) or 0.0)
+    regime_bonus = 0.0
+    if regime_bias == "long_favored" and side == "long":
+        regime_bonus = 1.0
+    elif regime_bias == "short_favored" and side == "short":
+        regime_bonus = 1.0
+    elif regime_bias in ("long_favored", "short_favored"):
+        regime_bonus = -0.5
+
+    vol_penalty = -12.0 if not c.get("vol_ok", True) else 0.0
+    trigger_bonus = 6.0 if c.get("trigger_now") else 0.0
+    trend_bonus = 4.0 if c.get("trend_ok") else -4.0
+    feature_ok = feat is None or feat["filters_ok"]
+    feature_score = feat["score"] if feat else 0.0
+
+    composite = (
+        float(c["entry_ease_score"])
+        + (bt_norm * 20.0)
+        + (reg_conf * 10.0)
+        + (regime_bonus * 6.0)
+        + trigger_bonus
+        + trend_bonus
+        + vol_penalty
+        + feature_score
+        + (0.0 if feature_ok else -12.0)
+    )
+
+    confidence = clamp(
+        (float(c["entry_ease_score"]) / 110.0) * 0.5
+        + bt_norm * 0.3
+        + reg_conf * 0.2
+        + (0.05 if c.get("vol_ok") else -0.1),
+        0.0,
+        1.0,
+    )
+
+    c = dict(c)
+    c["backtest_score"] = round(float(eval_score), 4) if eval_score is not None else None
+    c["backtest_score_norm"] = round(bt_norm, 4)
+    c["composite_score"] = round(float(composite), 2)
+    c["confidence"] = round(confidence * 100.0, 1)
+    c["status"] = candidate_status(c, feat)
+    c["best_params"] = p if p.get("ok") else None
+    if feat is not None:
+        c["features"] = feat
+    return c
+
+def candidate_status(c: Dict[str, Any], feat: Optional[Dict[str, Any]] = None) -> str:
+    """READY / wait from the bar alone: the best params only move the score, never the status."""
+    feature_ok = feat is None or feat["filters_ok"]
+    return "ready" if (c.get("trigger_now") and c.get("trend_ok") and c.get("vol_ok") and feature_ok) else "wait"
+
+# Response projection. detail="summary" answers with status/score/plan only: no
+# bootstrap scenario fan (the 3-point guide line stays), no backtest metrics and one
+# compact row per candidate. fields= keeps the named top-level keys and skips building
+# the ones left out (no plan -> no build_plan / projection). The default is the full
+# response (UI, history, portfolio tools).
+DETAILS = ("full", "summary")
+FIELDS = ("regime", "selected", "best_params", "plan", "candidates", "notes")
+_SUMMARY_KEYS = ("tf", "ts", "close", "status", "composite_score", "confidence", "entry_ease_score",
+                 "trigger_now", "trend_ok", "vol_ok", "atr_pct", "time_to_next_sec")
+
+def parse_fields(fields: Optional[str]) -> Optional[frozenset]:
+    """"plan,selected" -> frozenset; None / "" = every field."""
+    names = [f.strip().lower() for f in str(fields or "").split(",") if f.strip()]
+    if not names:
+        return None
+    bad = [f for f in names if f not in FIELDS]
+    if bad:
+        raise ValueError(f"unknown fields {','.join(bad)}; use " + ",".join(FIELDS))
+    return frozenset(names)
+
+def _params_summary(p: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    if not p:
+        return None
+    return {k: v for k, v in p.items() if k not in ("metrics", "robust")}
+
+def _summary_candidate(c: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: c[k] for k in _SUMMARY_KEYS if k in c}
+
+def candidate_rank(x: Dict[str, Any]) -> Tuple[float, float, bool, int]:
+    return (x["composite_score"], x["entry_ease_score"], x["trigger_now"], -x["time_to_next_sec"])
+
+def recommend(side: str, risk_pct: Optional[float]=None, focus_tf: Optional[str] = None, detail: str = "full",
+              fields: Optional[str] = None, ready_only: bool = False) -> Dict[str, Any]:
+    """Selected timeframe + plan for `side`; see DETAILS / FIELDS for the projection.
+
+    ready_only: the caller only acts on a READY selection (notifications), so when no
+    eligible candidate is READY the answer is returned before the best-params grid
+    search, with selected.status "wait" and no plan.
+    """
     side = side.lower().strip()
     if side not in ("long", "short"):
         raise ValueError("side must be 'long' or 'short'")
+    detail = str(detail or "full").lower().strip()
+    if detail not in DETAILS:
+        raise ValueError("detail must be one of " + ",".join(DETAILS))
+    want = parse_fields(fields) or frozenset(FIELDS)
+    summary = detail == "summary"
 
     reg = regime_1d()
     regime_bias = reg["bias"]
 
+    tfs = trade_timeframes()
     candidates: List[Dict[str, Any]] = []
-    for tf in ("30m", "60m", "180m"):
+    for tf in tfs:
         c = evaluate_timeframe(tf, side, regime_bias)
         if c:
             candidates.append(c)
 
     if not candidates:
-        return {
+        return _project({
             "ok": False,
-            "error": "not_enough_data_for_30m_60m_180m",
+            "error": "not_enough_data_for_" + "_".join(tfs),
             "regime": reg,
             "candidates": [],
-        }
-
-    # Score each candidate with composite score
-    scored: List[Dict[str, Any]] = []
-    for c in candidates:
-        p = _best_params_for_tf(c["tf"], side)
-        eval_score = float(p.get("score", 0.0)) if p.get("ok") else None
-        bt_norm = _norm_backtest_score(eval_score if eval_score is not None else 0.0)
-
-        reg_conf = float(reg.get("confidence", 0.0) or 0.0)
-        regime_bonus = 0.0
-        if regime_bias == "long_favored" and side == "long":
-            regime_bonus = 1.0
-        elif regime_bias == "short_favored" and side == "short":
-            regime_bonus = 1.0
-        elif regime_bias in ("long_favored", "short_favored"):
-            regime_bonus = -0.5
-
-        vol_penalty = -12.0 if not c.get("vol_ok", True) else 0.0
-        trigger_bonus = 6.0 if c.get("trigger_now") else 0.0
-        trend_bonus = 4.0 if c.get("trend_ok") else -4.0
-
-        composite = (
-            float(c["entry_ease_score"])
-            + (bt_norm * 20.0)
-            + (reg_conf * 10.0)
-            + (regime_bonus * 6.0)
-            + trigger_bonus
-            + trend_bonus
-            + vol_penalty
-        )
-
-        confidence = clamp(
-            (float(c["entry_ease_score"]) / 110.0) * 0.5
-            + bt_norm * 0.3
-            + reg_conf * 0.2
-            + (0.05 if c.get("vol_ok") else -0.1),
-            0.0,
-            1.0,
-        )
-
-        c = dict(c)
-        c["backtest_score"] = round(float(eval_score), 4) if eval_score is not None else None
-        c["backtest_score_norm"] = round(bt_norm, 4)
-        c["composite_score"] = round(float(composite), 2)
-        c["confidence"] = round(confidence * 100.0, 1)
-        c["status"] = "ready" if (c.get("trigger_now") and c.get("trend_ok") and c.get("vol_ok")) else "wait"
-        c["best_params"] = p if p.get("ok") else None
-        scored.append(c)
-
-    candidates_sorted = sorted(
-        scored,
-        key=lambda x: (x["composite_score"], x["entry_ease_score"], x["trigger_now"], -x["time_to_next_sec"]),
-        reverse=True
-    )
+        }, want)
 
-    chosen = candidates_sorted[0]
+    tf_norm = None
     if focus_tf is not None:
         tf_norm = tf_key(focus_tf)
-        if tf_norm not in ("30m", "60m", "180m"):
-            return {
+        if tf_norm not in tfs:
+            return _project({
                 "ok": False,
-                "error": "unsupported tf; use 30m,60m,180m",
+                "error": "unsupported tf; use " + ",".join(tfs),
+                "regime": reg,
+                "candidates": [_summary_candidate(c) for c in candidates] if summary else candidates,
+            }, want)
+
+    feats = {c["tf"]: _feature_terms(c, side) for c in candidates}
+    if ready_only:
+        eligible = [c for c in candidates if tf_norm is None or c["tf"] == tf_norm]
+        if not any(candidate_status(c, feats[c["tf"]]) == "ready" for c in eligible):
+            sel = eligible[0] if len(eligible) == 1 else None
+            return _project({
+                "ok": True,
                 "regime": reg,
-                "candidates": candidates_sorted,
-            }
+                "selected": {"tf": sel["tf"], "ts": sel["ts"], "status": "wait"} if sel else {"status": "wait"},
+                "best_params": None,
+                "plan": None,
+                "candidates": [dict(_summary_candidate(c), status=candidate_status(c, feats[c["tf"]]))
+                               for c in candidates],
+                "notes": ["진입 조건 미충족(대기)"],
+                "skipped": "not_ready",
+            }, want)
+
+    params = best_params_many([(c["tf"], side) for c in candidates])
+
+    # Score each candidate with composite score
+    scored = [score_candidate(c, params[(c["tf"], side)], reg, side, feats[c["tf"]]) for c in candidates]
+    candidates_sorted = sorted(scored, key=candidate_rank, reverse=True)
+
+    chosen = candidates_sorted[0]
+    if tf_norm is not None:
         match = next((c for c in candidates_sorted if c.get("tf") == tf_norm), None)
         if not match:
-            return {
+            return _project({
                 "ok": False,
                 "error": f"not_enough_data_for_{tf_norm}",
                 "regime": reg,
-                "candidates": candidates_sorted,
-            }
+                "candidates": [_summary_candidate(c) for c in candidates_sorted] if summary else candidates_sorted,
+            }, want)
         chosen = match
     best_params_map = chosen.get("best_params") or None
-    plan = build_plan(chosen, side, best_params=best_params_map, risk_pct=risk_pct)
+    plan = _plan_with_scenario(chosen, side, best_params_map, risk_pct, summary) if "plan" in want else None
+
+    notes: List[str] = []
+    if reg.get("bias") == "unknown":
+        notes.append("1D 레짐 불확실 (데이터 부족)")
+    if not chosen.get("vol_ok", True):
+        notes.append(f"변동성(ATR%) 범위 이탈: {chosen.get('atr_pct')}%")
+    if chosen.get("features") and not chosen["features"]["filters_ok"]:
+        notes.append("피처 필터 미충족: " + ", ".join(chosen["features"]["failed"]))
+    if chosen.get("status") != "ready":
+        notes.append("진입 조건 미충족(대기)")
+
+    if summary:
+        chosen = dict(chosen, best_params=_params_summary(best_params_map))
+        best_params_map = _params_summary(best_params_map)
+        candidates_sorted = [_summary_candidate(c) for c in candidates_sorted]
+    return _project({
+        "ok": True,
+        "regime": reg,
+        "selected": chosen,
+        "best_params": best_params_map,
+        "plan": plan,
+        "candidates": candidates_sorted,
+        "notes": notes,
+    }, want)
+
+def _project(out: Dict[str, Any], want: frozenset) -> Dict[str, Any]:
+    """Drop the top-level fields not asked for ("ok", "error" and "skipped" always stay)."""
+    return {k: v for k, v in out.items() if k in want or k not in FIELDS}
+
+def _plan_with_scenario(chosen: Dict[str, Any], side: str, best_params: Optional[Dict[str, Any]],
+                        risk_pct: Optional[float], summary: bool) -> Dict[str, Any]:
+    plan = build_plan(chosen, side, best_params=best_params, risk_pct=risk_pct)
+    if summary:
+        plan.pop("recent_metrics", None)
 
     # Provide chart-overlay hints for the UI.
     # The UI fetches the full candles separately via /api/candles?tf=...
-    tf_sec = int(TF_MINUTES.get(plan["tf"], 60) * 60)
+    tf_sec = int(timeframes.tf_seconds(plan["tf"]) or 3600)
     last_ts = int(chosen.get("ts", int(time.time())))
     last_close = float(chosen.get("close", plan.get("entry_price", 0.0)))
     entry_v = float(plan.get("entry_price"))
@@ -415,21 +597,13 @@ def recommend(side: str, risk_pct: Optional[float]=None, focus_tf: Optional[str]
             "tp2": float(plan.get("tp2_price")),
         },
     }
-
-    notes: List[str] = []
-    if reg.get("bias") == "unknown":
-        notes.append("1D 레짐 불확실 (데이터 부족)")
-    if not chosen.get("vol_ok", True):
-        notes.append(f"변동성(ATR%) 범위 이탈: {chosen.get('atr_pct')}%")
-    if chosen.get("status") != "ready":
-        notes.append("진입 조건 미충족(대기)")
-
-    return {
-        "ok": True,
-        "regime": reg,
-        "selected": chosen,
-        "best_params": best_params_map,
-        "plan": plan,
-        "candidates": candidates_sorted,
-        "notes": notes,
-    }
+    if SCENARIO_ENABLED and not summary:
+        # Bootstrap fan (percentile bands + hit probabilities); the median band replaces
+        # the 3-point guide line. Falls back to it when the TF has too little history.
+        from .scenario import project
+
+        proj = project(plan, side)
+        if proj is not None:
+            plan["scenario"].update(proj)
+            plan["scenario"]["path"] = proj["bands"]["p50"]
+    return plan
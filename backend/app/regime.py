@@ -0,0 +1,293 @@
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from . import db, features, timeframes
+from .config import REGIME_MACRO, REGIME_SLOPE_DAYS, REGIME_VOL_DAYS, REGIME_VOL_RANK_DAYS
+from .indicators import sma_series
+
+# Daily (1D) market regime, computed for the whole daily history at once and cached until
+# the next 1D write (db.data_version), so recommend() no longer re-reads and re-derives
+# it on every call.
+#
+# Per daily bar:
+#   bias        close vs SMA200 (the original rule): long_favored / short_favored, unknown
+#               before 210 bars
+#   trend       least-squares slope of log close over REGIME_SLOPE_DAYS, in % per day
+#   vol_state   realized volatility (REGIME_VOL_DAYS log returns, annualized) ranked within
+#               the trailing REGIME_VOL_RANK_DAYS: low / normal / high by terciles
+#   macro       optional; REGIME_MACRO = "t10y2y*1,hy_spread*-1" weighs the z-score of 1D
+#               feature-store columns (vs their trailing year) into -1 (risk-off) .. 1
+#   confidence  distance from SMA200 (0.5), slope agreeing with the bias (0.3) and macro
+#               agreeing with it (0.2, dropped when macro is off), x0.75 in high volatility
+#
+# Every quantity is a trailing window, so a label never depends on later bars: the live
+# value is the last row of the same Table that the portfolio replay, the scenario
+# projection and tools/backtest.py index by bar close time (one searchsorted for a whole
+# series). VERSION changes whenever the definition does; it is part of the output and of
+# the cache key.
+
+VERSION = 2  # 1 = close vs SMA200 with confidence = distance * 5
+
+MIN_BARS = 210
+BIAS_NAMES = {1: "long_favored", -1: "short_favored", 0: "unknown"}
+VOL_NAMES = {0: "unknown", 1: "low", 2: "normal", 3: "high"}
+TREND_NAMES = {1: "up", -1: "down", 0: "flat"}
+FLAT_SLOPE_PCT = 0.05  # |slope| below this (% per day) is a flat trend
+FULL_SLOPE_PCT = 0.3  # slope (% per day) that counts as full agreement with the bias
+MACRO_WINDOW = 365
+MACRO_MIN_PERIODS = 60
+
+_LOCK = threading.Lock()
+_CACHE: Dict[str, Any] = {}  # "key" -> (data version, config), "table" -> Table
+
+
+def _sign(x: np.ndarray) -> np.ndarray:
+    return np.where(np.isnan(x), 0, np.sign(x)).astype(np.int8)
+
+
+def _ffill(x: np.ndarray) -> np.ndarray:
+    ok = ~np.isnan(x)
+    idx = np.maximum.accumulate(np.where(ok, np.arange(len(x)), -1))
+    return np.where(idx >= 0, x[np.maximum(idx, 0)], np.nan)
+
+
+def _slope_pct(close: np.ndarray, n: int) -> np.ndarray:
+    """Least-squares slope of log(close) over the last n bars, as % per bar (NaN until n bars)."""
+    out = np.full(len(close), np.nan)
+    if n < 2 or len(close) < n:
+        return out
+    x = np.arange(n, dtype=np.float64) - (n - 1) / 2.0
+    b = sliding_window_view(np.log(close), n) @ x / float(x @ x)
+    out[n - 1:] = np.expm1(b) * 100.0
+    return out
+
+
+def _realized_vol(close: np.ndarray, n: int) -> np.ndarray:
+    """Annualized stdev of the last n daily log returns, in % (NaN until n returns)."""
+    out = np.full(len(close), np.nan)
+    if len(close) < n + 1:
+        return out
+    r = np.diff(np.log(close))
+    out[n:] = sliding_window_view(r, n).std(axis=1, ddof=1) * np.sqrt(365.0) * 100.0
+    return out
+
+
+def _trailing_rank(x: np.ndarray, n: int) -> np.ndarray:
+    """Share of the trailing n values that are <= the current one (NaN until n/2 of them exist)."""
+    if not len(x):
+        return np.full(0, np.nan)
+    w = sliding_window_view(np.concatenate([np.full(n - 1, np.nan), x]), n)
+    valid = ~np.isnan(w)
+    cnt = valid.sum(axis=1)
+    le = ((w <= x[:, None]) & valid).sum(axis=1)
+    return np.where((cnt >= n // 2) & ~np.isnan(x), le / np.maximum(cnt, 1), np.nan)
+
+
+def _trailing_z(x: np.ndarray, n: int, min_periods: int) -> np.ndarray:
+    """(x - mean) / stdev over the trailing n values, NaNs skipped (NaN below min_periods)."""
+    if not len(x):
+        return np.full(0, np.nan)
+    w = sliding_window_view(np.concatenate([np.full(n - 1, np.nan), x]), n)
+    valid = ~np.isnan(w)
+    cnt = valid.sum(axis=1)
+    v = np.where(valid, w, 0.0)
+    den = np.maximum(cnt, 1)
+    mu = v.sum(axis=1) / den
+    sd = np.sqrt(np.maximum((v * v).sum(axis=1) / den - mu * mu, 0.0))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        z = (x - mu) / sd
+    return np.where((cnt >= min_periods) & (sd > 1e-12), z, np.nan)
+
+
+def parse_macro(spec: str) -> List[Tuple[str, float]]:
+    """REGIME_MACRO "name*weight,..." (same syntax as WONYODD_FEATURE_SCORE, without sides)."""
+    return [(name, w) for _, name, w in features.parse_score(spec) if w]
+
+
+def macro_score(ts: np.ndarray, terms: List[Tuple[str, float]],
+                columns: Optional[Dict[str, np.ndarray]] = None) -> np.ndarray:
+    """-1..1 per daily bar from the trailing-year z-scores of the weighted columns (NaN = no data)."""
+    out = np.full(len(ts), np.nan)
+    if not terms or not len(ts):
+        return out
+    if columns is None:
+        m = features.values_at(timeframes.REGIME_TIMEFRAME, [n for n, _ in terms], ts)
+        columns = {n: m[:, j] for j, (n, _) in enumerate(terms)}
+    num = np.zeros(len(ts))
+    den = np.zeros(len(ts))
+    for name, w in terms:
+        col = columns.get(name)
+        if col is None:
+            continue
+        z = _trailing_z(_ffill(np.asarray(col, dtype=np.float64)), MACRO_WINDOW, MACRO_MIN_PERIODS)
+        ok = ~np.isnan(z)
+        num[ok] += w * np.clip(z[ok] / 2.0, -1.0, 1.0)
+        den[ok] += abs(w)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(den > 0, np.clip(num / np.maximum(den, 1e-12), -1.0, 1.0), np.nan)
+
+
+@dataclass
+class Table:
+    """Regime of every daily bar; index it by the time a decision is made with index_at()."""
+
+    ts: np.ndarray
+    close_ts: np.ndarray
+    close: np.ndarray
+    sma200: np.ndarray
+    slope_pct: np.ndarray
+    vol_pct: np.ndarray
+    vol_rank: np.ndarray
+    macro: np.ndarray
+    bias: np.ndarray  # int8: 1 long_favored, -1 short_favored, 0 unknown
+    trend: np.ndarray  # int8: 1 up, -1 down, 0 flat / unknown
+    vol_state: np.ndarray  # int8: 0 unknown, 1 low, 2 normal, 3 high
+    confidence: np.ndarray
+    macro_terms: List[Tuple[str, float]] = field(default_factory=list)
+    _dicts: Dict[int, Dict[str, Any]] = field(default_factory=dict, repr=False)
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    def index_at(self, t) -> np.ndarray:
+        """Index of the last daily bar closed by time(s) `t` (-1 = none yet); vectorized."""
+        return np.searchsorted(self.close_ts, t, side="right") - 1
+
+    def bias_at(self, t: np.ndarray) -> np.ndarray:
+        """Bias code in force at each time of `t` (0 before the first daily close)."""
+        return self._code_at(self.bias, t)
+
+    def vol_state_at(self, t: np.ndarray) -> np.ndarray:
+        return self._code_at(self.vol_state, t)
+
+    def _code_at(self, codes: np.ndarray, t: np.ndarray) -> np.ndarray:
+        t = np.asarray(t, dtype=np.int64)
+        if not len(self):
+            return np.zeros(len(t), dtype=np.int8)
+        k = self.index_at(t)
+        return np.where(k >= 0, codes[np.maximum(k, 0)], 0).astype(np.int8)
+
+    def row(self, k: int) -> Dict[str, Any]:
+        """The regime dict recommend() reports, for daily bar k (k < 0: nothing closed yet)."""
+        hit = self._dicts.get(k)
+        if hit is not None:
+            return hit
+        if k < 0 or not len(self):
+            out: Dict[str, Any] = {"bias": "unknown", "confidence": 0.0, "detail": "not_enough_1D_data",
+                                   "version": VERSION}
+        elif self.bias[k] == 0:
+            out = {"bias": "unknown", "confidence": 0.0, "detail": "not_enough_1D_data", "ts": int(self.ts[k]),
+                   "version": VERSION}
+        else:
+            out = {
+                "bias": BIAS_NAMES[int(self.bias[k])],
+                "confidence": round(float(self.confidence[k]), 3),
+                "last_close": float(self.close[k]),
+                "sma200": float(self.sma200[k]),
+                "ts": int(self.ts[k]),
+                "trend": TREND_NAMES[int(self.trend[k])],
+                "slope_pct_per_day": _num(self.slope_pct[k], 4),
+                "vol_state": VOL_NAMES[int(self.vol_state[k])],
+                "realized_vol_pct": _num(self.vol_pct[k], 2),
+                "vol_rank": _num(self.vol_rank[k], 3),
+                "macro": _num(self.macro[k], 3) if self.macro_terms else None,
+                "version": VERSION,
+            }
+        self._dicts[k] = out
+        return out
+
+    def at(self, t: int) -> Dict[str, Any]:
+        """Regime as known at time `t` (daily bars closed by then)."""
+        return self.row(int(self.index_at(int(t)))) if len(self) else self.row(-1)
+
+    def latest(self) -> Dict[str, Any]:
+        return self.row(len(self) - 1)
+
+
+def _num(x: float, nd: int) -> Optional[float]:
+    return None if np.isnan(x) else round(float(x), nd)
+
+
+def build(ts: np.ndarray, close: np.ndarray, macro: Optional[np.ndarray] = None,
+          macro_terms: Optional[List[Tuple[str, float]]] = None) -> Table:
+    """Label every daily bar (ascending open ts + closes); macro: precomputed macro_score() or None."""
+    ts = np.asarray(ts, dtype=np.int64)
+    close = np.asarray(close, dtype=np.float64)
+    n = len(close)
+    sma = sma_series(close, 200)
+    slope = _slope_pct(close, max(2, int(REGIME_SLOPE_DAYS)))
+    vol = _realized_vol(close, max(2, int(REGIME_VOL_DAYS)))
+    rank = _trailing_rank(vol, max(10, int(REGIME_VOL_RANK_DAYS)))
+    mac = np.full(n, np.nan) if macro is None else np.asarray(macro, dtype=np.float64)
+
+    ready = (np.arange(n) >= MIN_BARS - 1) & ~np.isnan(sma)
+    bias = np.where(ready, np.where(close > sma, 1, -1), 0).astype(np.int8)
+    trend = np.where(np.abs(slope) < FLAT_SLOPE_PCT, 0, _sign(slope)).astype(np.int8)
+    vol_state = np.where(np.isnan(rank), 0, np.where(rank < 1 / 3, 1, np.where(rank > 2 / 3, 3, 2))).astype(np.int8)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        dist_term = np.clip(np.abs(close - sma) / close * 5.0, 0.0, 1.0)
+        slope_term = (np.clip(np.nan_to_num(slope) * bias / FULL_SLOPE_PCT, -1.0, 1.0) + 1.0) / 2.0
+        macro_term = (np.clip(mac * bias, -1.0, 1.0) + 1.0) / 2.0
+    has_macro = ~np.isnan(mac)
+    conf = np.where(has_macro, 0.5 * dist_term + 0.3 * slope_term + 0.2 * np.nan_to_num(macro_term),
+                    (0.5 * dist_term + 0.3 * slope_term) / 0.8)
+    conf = np.where(vol_state == 3, conf * 0.75, conf)
+    conf = np.where(bias != 0, np.clip(np.nan_to_num(conf), 0.0, 1.0), 0.0)
+
+    return Table(ts=ts, close_ts=ts + timeframes.tf_seconds(timeframes.REGIME_TIMEFRAME), close=close, sma200=sma,
+                 slope_pct=slope, vol_pct=vol, vol_rank=rank, macro=mac, bias=bias, trend=trend,
+                 vol_state=vol_state, confidence=conf, macro_terms=list(macro_terms or []))
+
+
+def load(end_ts: Optional[int] = None, include_archive: bool = False) -> Table:
+    """Table over every stored daily bar (up to end_ts)."""
+    tf = timeframes.REGIME_TIMEFRAME
+    end = int(end_ts) if end_ts is not None else 2**62
+    if include_archive:
+        from .retention import fetch_history
+
+        rows = [(r["ts"], r["close"]) for r in fetch_history(tf, 0, end)]
+    else:
+        rows = [(r[0], r[4]) for r in db.fetch_range(tf, 0, end)]
+    arr = np.array(rows, dtype=np.float64).reshape(-1, 2)
+    ts = arr[:, 0].astype(np.int64)
+    terms = parse_macro(REGIME_MACRO)
+    return build(ts, arr[:, 1], macro_score(ts, terms) if terms else None, terms)
+
+
+def table() -> Table:
+    """The live table, rebuilt only after a 1D write."""
+    key = (db.data_version(timeframes.REGIME_TIMEFRAME)[:2], VERSION, REGIME_MACRO, REGIME_SLOPE_DAYS,
+           REGIME_VOL_DAYS, REGIME_VOL_RANK_DAYS)
+    with _LOCK:
+        if _CACHE.get("key") == key:
+            return _CACHE["table"]
+    t0 = time.perf_counter()
+    tab = load()
+    with _LOCK:
+        _CACHE["key"] = key
+        _CACHE["table"] = tab
+        _CACHE["built_sec"] = round(time.perf_counter() - t0, 4)
+        _CACHE["builds"] = _CACHE.get("builds", 0) + 1
+    return tab
+
+
+def current() -> Dict[str, Any]:
+    """Regime of the latest daily bar (what recommend() uses)."""
+    return table().latest()
+
+
+def state() -> Dict[str, Any]:
+    with _LOCK:
+        tab = _CACHE.get("table")
+        return {"version": VERSION, "daily_bars": len(tab) if tab is not None else 0,
+                "builds": _CACHE.get("builds", 0), "last_build_sec": _CACHE.get("built_sec"),
+                "macro": REGIME_MACRO or None}
@@ -0,0 +1,17 @@
+from __future__ import annotations
+
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+from .serialize import dumps
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse that renders with serialize.dumps().
+
+    Return it directly from hot endpoints so FastAPI skips jsonable_encoder.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
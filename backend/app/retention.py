@@ -0,0 +1,308 @@
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from . import db
+from .config import ARCHIVE_DIR, DB_PATH, RETENTION_RAW_DAYS, RETENTION_RAW_TFS
+from .serialize import dumps_str
+from .timeframes import tf_key
+
+ARCHIVE_COLUMNS = ("ts", "open", "high", "low", "close", "volume", "features")
+# Rows moved per transaction; keeps each delete short so ingestion is not blocked for long.
+ARCHIVE_BATCH_ROWS = 20_000
+INCREMENTAL_VACUUM_PAGES = 2_000
+
+
+def archive_root() -> Path:
+    if ARCHIVE_DIR:
+        return Path(ARCHIVE_DIR)
+    return Path(DB_PATH).resolve().parent / "archive"
+
+
+def retention_tfs() -> List[str]:
+    out = []
+    for part in str(RETENTION_RAW_TFS or "").split(","):
+        k = tf_key(part) if part.strip() else None
+        if k and k not in out:
+            out.append(k)
+    return out
+
+
+_MAX_TS = 253402300799  # 9999-12-31T23:59:59Z
+
+
+def _month_of(ts: int) -> str:
+    return datetime.fromtimestamp(min(max(int(ts), 0), _MAX_TS), tz=timezone.utc).strftime("%Y-%m")
+
+
+def _archive_path(tf: str, month: str) -> Path:
+    return archive_root() / tf / f"{month}.npz"
+
+
+def _load_npz(path: Path) -> Dict[str, np.ndarray]:
+    with np.load(path, allow_pickle=False) as z:
+        return {k: z[k] for k in ARCHIVE_COLUMNS}
+
+
+def _write_month(tf: str, month: str, cols: Dict[str, np.ndarray]) -> int:
+    """Merge `cols` into the month file (newer rows win on duplicate ts); atomic replace."""
+    path = _archive_path(tf, month)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.exists():
+        old = _load_npz(path)
+        merged = {k: np.concatenate([old[k], cols[k]]) for k in ARCHIVE_COLUMNS}
+        # keep the last occurrence of each ts
+        _, idx = np.unique(merged["ts"][::-1], return_index=True)
+        keep = (len(merged["ts"]) - 1) - idx
+        merged = {k: v[keep] for k, v in merged.items()}
+    else:
+        merged = cols
+    order = np.argsort(merged["ts"], kind="stable")
+    merged = {k: v[order] for k, v in merged.items()}
+    tmp = path.with_name(path.name + ".tmp.npz")
+    np.savez_compressed(tmp, **merged)
+    os.replace(tmp, path)
+    return int(len(merged["ts"]))
+
+
+def _rows_to_columns(rows: List[Tuple]) -> Dict[str, np.ndarray]:
+    return {
+        "ts": np.array([r[0] for r in rows], dtype=np.int64),
+        "open": np.array([r[1] for r in rows], dtype=np.float64),
+        "high": np.array([r[2] for r in rows], dtype=np.float64),
+        "low": np.array([r[3] for r in rows], dtype=np.float64),
+        "close": np.array([r[4] for r in rows], dtype=np.float64),
+        "volume": np.array([np.nan if r[5] is None else r[5] for r in rows], dtype=np.float64),
+        "features": np.array([r[6] or "" for r in rows], dtype=np.str_),
+    }
+
+
+def _merge_feature_values(tid: int, rows: List[Tuple]) -> List[Tuple]:
+    """Fold feature-store values of these bars into the archived features JSON."""
+    conn = db.connect()
+    try:
+        vals = conn.execute(
+            """SELECT v.ts, d.name, v.value FROM feature_values v JOIN feature_defs d ON d.id = v.feature_id
+                 WHERE v.tf_id=? AND v.ts BETWEEN ? AND ?""",
+            (tid, int(rows[0][0]), int(rows[-1][0])),
+        ).fetchall()
+    finally:
+        conn.close()
+    if not vals:
+        return rows
+    by_ts: Dict[int, Dict[str, Any]] = {}
+    for ts, name, value in vals:
+        by_ts.setdefault(int(ts), {})[name] = value
+    out = []
+    for r in rows:
+        extra = by_ts.get(int(r[0]))
+        if extra:
+            merged = dict(json.loads(r[6])) if r[6] else {}
+            merged.update(extra)
+            r = r[:6] + (dumps_str(merged),)
+        out.append(r)
+    return out
+
+
+def archive_older_than(tf: str, cutoff_ts: int, max_batches: int = 50) -> int:
+    """Move rows of `tf` with ts < cutoff_ts into monthly compressed .npz files.
+
+    Each batch is written to disk (atomic rename) before the same rows are
+    deleted, so a crash can only leave rows in both places, never in neither.
+    """
+    tid = db._tf_id(tf)
+    if tid is None:
+        return 0
+    moved = 0
+    for _ in range(max(1, int(max_batches))):
+        conn = db.connect()
+        try:
+            rows = conn.execute(
+                """SELECT c.ts, c.open, c.high, c.low, c.close, c.volume, f.features
+                     FROM candles c LEFT JOIN candle_features f ON f.tf_id = c.tf_id AND f.ts = c.ts
+                     WHERE c.tf_id=? AND c.ts < ? ORDER BY c.ts ASC LIMIT ?""",
+                (tid, int(cutoff_ts), ARCHIVE_BATCH_ROWS),
+            ).fetchall()
+        finally:
+            conn.close()
+        if not rows:
+            break
+        rows = _merge_feature_values(tid, [tuple(r) for r in rows])
+
+        by_month: Dict[str, List[Tuple]] = {}
+        for r in rows:
+            by_month.setdefault(_month_of(r[0]), []).append(r)
+        for month, mrows in by_month.items():
+            _write_month(tf, month, _rows_to_columns(mrows))
+
+        conn = db.connect()
+        try:
+            span = (tid, int(rows[0][0]), int(rows[-1][0]))
+            conn.execute("""DELETE FROM candles WHERE tf_id=? AND ts BETWEEN ? AND ?""", span)
+            conn.execute("""DELETE FROM candle_features WHERE tf_id=? AND ts BETWEEN ? AND ?""", span)
+            conn.execute("""DELETE FROM feature_values WHERE tf_id=? AND ts BETWEEN ? AND ?""", span)
+            # Gaps are indexed between live bars only (app/gaps.py).
+            conn.execute(
+                """DELETE FROM candle_gaps WHERE tf_id=?
+                     AND start_ts < COALESCE((SELECT MIN(ts) FROM candles WHERE tf_id=?), ?)""",
+                (tid, tid, 2**62),
+            )
+            db.bump_version(conn, tf)
+            conn.commit()
+        finally:
+            conn.close()
+        moved += len(rows)
+        if len(rows) < ARCHIVE_BATCH_ROWS:
+            break
+    return moved
+
+
+def fetch_archive_range(tf: str, start_ts: int, end_ts: int) -> Dict[str, np.ndarray]:
+    """Columnar rows of `tf` in [start_ts, end_ts] from the archive (ascending)."""
+    tf_dir = archive_root() / tf
+    parts: List[Dict[str, np.ndarray]] = []
+    if tf_dir.is_dir():
+        lo, hi = _month_of(start_ts), _month_of(end_ts)
+        for path in sorted(tf_dir.glob("*.npz")):
+            month = path.stem
+            if month < lo or month > hi or month.endswith(".tmp"):
+                continue
+            cols = _load_npz(path)
+            mask = (cols["ts"] >= int(start_ts)) & (cols["ts"] <= int(end_ts))
+            if mask.any():
+                parts.append({k: v[mask] for k, v in cols.items()})
+    if not parts:
+        return {k: np.array([], dtype=(np.int64 if k == "ts" else np.str_ if k == "features" else np.float64))
+                for k in ARCHIVE_COLUMNS}
+    return {k: np.concatenate([p[k] for p in parts]) for k in ARCHIVE_COLUMNS}
+
+
+def fetch_history(tf: str, start_ts: int = 0, end_ts: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Archived + live rows for the backtester, as OHLCV dicts (live rows win on overlap)."""
+    end_ts = int(end_ts) if end_ts is not None else 2**62
+    arch = fetch_archive_range(tf, start_ts, end_ts)
+    live = [dict(r) for r in db.fetch_range(tf, int(start_ts), end_ts)]
+    first_live = live[0]["ts"] if live else None
+    out: List[Dict[str, Any]] = []
+    for i in range(len(arch["ts"])):
+        ts = int(arch["ts"][i])
+        if first_live is not None and ts >= first_live:
+            break
+        vol = float(arch["volume"][i])
+        out.append({
+            "ts": ts,
+            "open": float(arch["open"][i]),
+            "high": float(arch["high"][i]),
+            "low": float(arch["low"][i]),
+            "close": float(arch["close"][i]),
+            "volume": None if np.isnan(vol) else vol,
+        })
+    out.extend(live)
+    return out
+
+
+def _pragma(conn: sqlite3.Connection, sql: str) -> Any:
+    row = conn.execute(sql).fetchone()
+    return row[0] if row is not None else None
+
+
+def checkpoint_and_vacuum(pages: int = INCREMENTAL_VACUUM_PAGES) -> Dict[str, Any]:
+    """Truncate the WAL and return free pages to the OS (incremental, bounded)."""
+    conn = db.connect()
+    try:
+        ckpt = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+        auto_vacuum = _pragma(conn, "PRAGMA auto_vacuum")
+        freed = 0
+        if auto_vacuum == 2:  # INCREMENTAL
+            before = _pragma(conn, "PRAGMA freelist_count")
+            # execute() only steps the pragma once (one page); executescript runs it to completion.
+            conn.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+            freed = int(before or 0) - int(_pragma(conn, "PRAGMA freelist_count") or 0)
+        return {
+            "wal_checkpoint": {"busy": ckpt[0], "log_pages": ckpt[1], "checkpointed": ckpt[2]} if ckpt else None,
+            "auto_vacuum": {0: "none", 1: "full", 2: "incremental"}.get(auto_vacuum, auto_vacuum),
+            "pages_freed": freed,
+        }
+    finally:
+        conn.close()
+
+
+def enable_incremental_vacuum() -> bool:
+    """One-time switch to auto_vacuum=INCREMENTAL (needs a full VACUUM; run off-peak)."""
+    conn = db.connect()
+    try:
+        if _pragma(conn, "PRAGMA auto_vacuum") == 2:
+            return False
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+        return True
+    finally:
+        conn.close()
+
+
+def run_maintenance(now: Optional[int] = None) -> Dict[str, Any]:
+    """Archive expired raw bars, then checkpoint the WAL and vacuum incrementally."""
+    now = int(now if now is not None else time.time())
+    archived: Dict[str, int] = {}
+    if float(RETENTION_RAW_DAYS) > 0:
+        cutoff = now - int(float(RETENTION_RAW_DAYS) * 86400)
+        for tf in retention_tfs():
+            n = archive_older_than(tf, cutoff)
+            if n:
+                archived[tf] = n
+    out = {"archived": archived}
+    out.update(checkpoint_and_vacuum())
+    return out
+
+
+def _file_size(path: Path) -> int:
+    try:
+        return path.stat().st_size
+    except OSError:
+        return 0
+
+
+def db_stats() -> Dict[str, Any]:
+    """DB/WAL/archive sizes and row counts per timeframe."""
+    conn = db.connect()
+    try:
+        rows = conn.execute(
+            """SELECT t.key, COUNT(*), MIN(c.ts), MAX(c.ts)
+                 FROM candles c JOIN timeframes t ON t.id = c.tf_id GROUP BY c.tf_id"""
+        ).fetchall()
+        schema = _pragma(conn, "PRAGMA user_version")
+        page_size = _pragma(conn, "PRAGMA page_size") or 0
+        page_count = _pragma(conn, "PRAGMA page_count") or 0
+        freelist = _pragma(conn, "PRAGMA freelist_count") or 0
+    finally:
+        conn.close()
+
+    db_path = Path(DB_PATH)
+    arch: Dict[str, Dict[str, int]] = {}
+    root = archive_root()
+    if root.is_dir():
+        for tf_dir in sorted(p for p in root.iterdir() if p.is_dir()):
+            files = list(tf_dir.glob("*.npz"))
+            arch[tf_dir.name] = {"files": len(files), "bytes": sum(_file_size(f) for f in files)}
+
+    return {
+        "schema_version": schema,
+        "db_bytes": _file_size(db_path),
+        "wal_bytes": _file_size(db_path.with_name(db_path.name + "-wal")),
+        "page_size": page_size,
+        "page_count": page_count,
+        "freelist_pages": freelist,
+        "timeframes": {
+            r[0]: {"rows": int(r[1]), "min_ts": r[2], "max_ts": r[3]} for r in rows
+        },
+        "retention": {"raw_tfs": retention_tfs(), "raw_days": RETENTION_RAW_DAYS},
+        "archive": arch,
+    }
@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import math
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+# Robustness of a parameter set, judged on its trade sequence rather than on the
+# single historical path score_metrics() sees:
+#   block  - circular block bootstrap of trade returns (keeps short streaks together)
+#   window - random contiguous sub-windows covering `window_frac` of the trades
+# Every grid point is resampled from the same uniform draws (common random numbers),
+# scaled by its own trade count: a draw u picks block/window start floor(u * n), so the
+# k-th resample starts at the same relative position for every point and differences
+# between points are not sampling noise.
+
+QUANTILES = (0.05, 0.5, 0.95)
+
+
+def _uniforms(seed: int, resamples: int, cols: int) -> np.ndarray:
+    """(resamples, cols) uniforms in [0, 1); the first k columns do not depend on `cols`."""
+    return np.random.default_rng(seed).random((max(1, int(cols)), int(resamples))).T
+
+
+def _block_cols(n: int, block: int) -> int:
+    return -(-n // max(1, min(int(block), n)))
+
+
+def _block_indices(n: int, block: int, u: np.ndarray) -> np.ndarray:
+    block = max(1, min(int(block), n))
+    n_blocks = -(-n // block)
+    starts = (u[:, :n_blocks] * n).astype(np.int64)
+    idx = (starts[:, :, None] + np.arange(block)) % n
+    return idx.reshape(len(u), n_blocks * block)[:, :n]
+
+
+def _window_indices(n: int, frac: float, u: np.ndarray) -> np.ndarray:
+    w = max(1, min(n, int(round(n * float(frac)))))
+    starts = (u[:, 0] * (n - w + 1)).astype(np.int64)
+    return starts[:, None] + np.arange(w)
+
+
+def _path_stats(sampled: np.ndarray) -> Dict[str, np.ndarray]:
+    """Per-resample total return, trade-sequence MDD, win rate and profit factor."""
+    equity = np.cumprod(1.0 + sampled, axis=1)
+    peak = np.maximum(np.maximum.accumulate(equity, axis=1), 1.0)
+    mdd = ((peak - equity) / peak).max(axis=1)
+    wins = sampled > 0
+    gp = np.where(wins, sampled, 0.0).sum(axis=1)
+    gl = np.where(wins, 0.0, -sampled).sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pf = np.where(gl > 0, gp / gl, 1.0)
+    return {
+        "total_return": equity[:, -1] - 1.0,
+        "mdd": mdd,
+        "win_rate": wins.mean(axis=1),
+        "profit_factor": pf,
+    }
+
+
+def _ci(x: np.ndarray) -> Dict[str, float]:
+    q = np.quantile(x, QUANTILES)
+    return {"p05": float(q[0]), "p50": float(q[1]), "p95": float(q[2]), "mean": float(x.mean())}
+
+
+def evaluate(trade_rets: Sequence[float], base_metrics: Any, method: str = "block", resamples: int = 1000,
+             block: int = 5, window_frac: float = 0.5, std_penalty: float = 1.0, seed: int = 7,
+             min_trades: int = 5, uniforms: Optional[np.ndarray] = None) -> Optional[Dict[str, Any]]:
+    """Resample one grid point's trades; None when there are too few trades to resample.
+
+    The per-resample score mirrors evaluator.score_metrics() (fill rate and tail MAE
+    are taken from `base_metrics` since they do not depend on trade order).
+    robust_score = mean - std_penalty * std of that score. `uniforms` (from evaluate_many)
+    replaces the draws made from `seed`.
+    """
+    rets = np.asarray(trade_rets, dtype=np.float64)
+    n = len(rets)
+    if n < max(2, int(min_trades)):
+        return None
+    u = uniforms if uniforms is not None else _uniforms(seed, resamples, _block_cols(n, block))
+    if method == "window":
+        idx = _window_indices(n, window_frac, u)
+    else:
+        idx = _block_indices(n, block, u)
+    st = _path_stats(rets[idx])
+
+    fill = base_metrics.fill_rate if base_metrics.fill_rate is not None else 1.0
+    tail = base_metrics.mae_p95 if base_metrics.mae_p95 is not None else 0.0
+    score = (
+        st["total_return"] / np.maximum(st["mdd"], 1e-9)
+        + (st["win_rate"] - 0.5) * 0.5
+        + (st["profit_factor"] - 1.0) * 0.2
+        + (fill - 0.8) * 0.1
+        - tail * 1.5
+    )
+    if n < 20:
+        score = score * 0.5
+    mean, std = float(score.mean()), float(score.std())
+    robust = mean - float(std_penalty) * std
+    return {
+        "method": method,
+        "resamples": int(resamples),
+        "n_trades": n,
+        "total_return": _ci(st["total_return"]),
+        "mdd": _ci(st["mdd"]),
+        "win_rate": _ci(st["win_rate"]),
+        "score": {**_ci(score), "std": std},
+        "prob_loss": float((st["total_return"] < 0).mean()),
+        # 1.0 = identical score on every resample; falls towards 0 as the spread grows
+        "stability": float(1.0 / (1.0 + std / max(abs(mean), 1e-9))) if math.isfinite(std) else 0.0,
+        "robust_score": float(robust),
+    }
+
+
+def evaluate_many(points: List[Dict[str, Any]], **kwargs: Any) -> List[Optional[Dict[str, Any]]]:
+    """evaluate() for several grid points ({"trade_rets": [...], "metrics": Metrics}) on common draws."""
+    n_max = max((len(p["trade_rets"]) for p in points), default=0)
+    if n_max == 0:
+        return [evaluate(p["trade_rets"], p["metrics"], **kwargs) for p in points]
+    u = _uniforms(kwargs.get("seed", 7), kwargs.get("resamples", 1000), _block_cols(n_max, kwargs.get("block", 5)))
+    return [evaluate(p["trade_rets"], p["metrics"], uniforms=u, **kwargs) for p in points]
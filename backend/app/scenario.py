@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import math
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from . import db, regime, timeframes
+from .config import (
+    SCENARIO_PATHS, SCENARIO_BARS, SCENARIO_BLOCK, SCENARIO_LOOKBACK_BARS, SCENARIO_ATR_FRAC,
+    SCENARIO_CACHE_SIZE,
+)
+from .indicators import atr_sma_series
+
+# Forward projection for plan["scenario"]: a block bootstrap of this timeframe's own
+# history, conditioned on the current state.
+#   - every past bar is expressed as close/high/low log moves from the previous close,
+#     divided by the ATR% of that previous bar (volatility-standardized),
+#   - start points are the past bars in the same 1D regime bias (app/regime.py, daily
+#     bars closed by then) whose ATR% is nearest to the current one (SCENARIO_ATR_FRAC of
+#     them), and each path strings together SCENARIO_BLOCK-bar runs that followed such
+#     bars, rescaled by the current ATR%,
+#   - all SCENARIO_PATHS paths are built at once as (paths, bars) arrays.
+# Paths depend only on (tf, bar), so they are cached per bar (seeded by it, so every
+# worker returns the same numbers) and each side's plan only adds a few comparisons.
+
+_PCTS = (5, 25, 50, 75, 95)
+MIN_SAMPLES = 100
+
+_CACHE: "OrderedDict[tuple[str, int], Dict[str, Any]]" = OrderedDict()
+_LOCK = threading.Lock()
+
+
+def simulate(tf: str, paths: int = SCENARIO_PATHS, bars: int = SCENARIO_BARS) -> Optional[Dict[str, Any]]:
+    """Relative close/high/low paths (vs the last close) for the latest bar of `tf`, cached per bar."""
+    last = db.fetch_latest(tf)
+    if last is None:
+        return None
+    key = (tf, int(last["ts"]))
+    last_close = float(last["close"])
+    with _LOCK:
+        hit = _CACHE.get(key)
+        if hit is not None and hit["close"] == last_close and hit["shape"] == (paths, bars):
+            _CACHE.move_to_end(key)
+            return hit
+
+    t0 = time.perf_counter()
+    arr = np.array(db.fetch_recent_ohlcv(tf, SCENARIO_LOOKBACK_BARS + 15), dtype=np.float64).reshape(-1, 6)
+    if len(arr) < MIN_SAMPLES + 30:
+        return None
+    ts = arr[:, 0].astype(np.int64)
+    h, l, c = arr[:, 2], arr[:, 3], arr[:, 4]
+    atr_pct = atr_sma_series(h, l, c) / c
+    sec = timeframes.tf_seconds(tf)
+    bias = regime.table().bias_at(ts + sec)
+
+    # Standardized moves of bar j relative to close j-1 (valid once ATR exists at j-1).
+    prev_c, prev_atr = c[:-1], atr_pct[:-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z_c = np.log(c[1:] / prev_c) / prev_atr
+        z_h = np.log(h[1:] / prev_c) / prev_atr
+        z_l = np.log(l[1:] / prev_c) / prev_atr
+    valid = np.isfinite(z_c) & np.isfinite(z_h) & np.isfinite(z_l)
+    z_c, z_h, z_l = (np.where(valid, z, 0.0) for z in (z_c, z_h, z_l))
+    atr_now = float(atr_pct[-1])
+    if not math.isfinite(atr_now) or atr_now <= 0:
+        return None
+
+    # Start bars: state at bar j, followed by `block` valid moves j+1..j+block (z index j..j+block-1).
+    block = max(1, min(int(SCENARIO_BLOCK), bars))
+    n_z = len(z_c)
+    starts = np.arange(len(c) - 1 - block + 1)
+    ok_run = np.convolve(valid.astype(np.int32), np.ones(block, dtype=np.int32), "valid")[: len(starts)] == block
+    starts = starts[ok_run & np.isfinite(atr_pct[starts])]
+    same = starts[bias[starts] == bias[-1]]
+    if len(same) >= MIN_SAMPLES:
+        starts = same
+    if len(starts) < MIN_SAMPLES // 2:
+        return None
+    dist = np.abs(np.log(atr_pct[starts] / atr_now))
+    keep = max(min(len(starts), MIN_SAMPLES), int(len(starts) * SCENARIO_ATR_FRAC))
+    pool = starts[np.argsort(dist, kind="stable")[:keep]]
+
+    rng = np.random.default_rng(zlib.crc32(f"{tf}:{key[1]}".encode()))
+    n_blocks = -(-bars // block)
+    picks = rng.choice(pool, size=(paths, n_blocks))
+    idx = (picks[:, :, None] + np.arange(block)).reshape(paths, n_blocks * block)[:, :bars]
+    idx = np.clip(idx, 0, n_z - 1)
+    cum = np.cumsum(z_c[idx] * atr_now, axis=1)
+    close_rel = np.exp(cum)
+    prev_rel = np.concatenate([np.ones((paths, 1)), close_rel[:, :-1]], axis=1)
+    high_rel = np.maximum(prev_rel * np.exp(z_h[idx] * atr_now), close_rel)
+    low_rel = np.minimum(prev_rel * np.exp(z_l[idx] * atr_now), close_rel)
+
+    out = {
+        "tf": tf,
+        "ts": key[1],
+        "tf_sec": sec,
+        "close": last_close,
+        "shape": (paths, bars),
+        "close_rel": close_rel.astype(np.float32),
+        "high_rel": high_rel.astype(np.float32),
+        "low_rel": low_rel.astype(np.float32),
+        "bands_rel": np.percentile(close_rel, _PCTS, axis=0),
+        "samples": int(len(pool)),
+        "regime": int(bias[-1]),
+        "atr_pct": round(atr_now * 100.0, 4),
+        "elapsed_ms": round((time.perf_counter() - t0) * 1000.0, 2),
+    }
+    with _LOCK:
+        _CACHE[key] = out
+        _CACHE.move_to_end(key)
+        while len(_CACHE) > max(1, SCENARIO_CACHE_SIZE):
+            _CACHE.popitem(last=False)
+    return out
+
+
+def invalidate(tf: str) -> None:
+    """Forget cached paths of `tf` (its history changed under the same latest bar)."""
+    with _LOCK:
+        for key in [k for k in _CACHE if k[0] == tf]:
+            del _CACHE[key]
+
+
+def _first(hit: np.ndarray, start: np.ndarray) -> np.ndarray:
+    """Per path, first bar index >= start where `hit` is true (n_bars when never)."""
+    n = hit.shape[1]
+    m = hit & (np.arange(n) >= start[:, None])
+    return np.where(m.any(axis=1), m.argmax(axis=1), n)
+
+
+def probabilities(sim: Dict[str, Any], side: str, entry: float, stop: float, tp1: float,
+                  tp2: Optional[float] = None, market: bool = False) -> Dict[str, float]:
+    """Touch probabilities within the simulated bars, evaluator rules: a limit entry fills on
+    the next bar or not at all, the stop counts from the fill bar, take-profits from the next
+    one, and the stop wins a shared bar."""
+    c0 = sim["close"]
+    hi = sim["high_rel"] * c0
+    lo = sim["low_rel"] * c0
+    paths, n = hi.shape
+    long = side == "long"
+    zero = np.zeros(paths, dtype=np.int64)
+    fill = zero if market else _first(lo <= entry if long else hi >= entry, zero)
+    fill = np.where(fill == 0, 0, n)  # an unfilled limit order is dropped after the next bar
+    filled = fill < n
+    stop_k = _first(lo <= stop if long else hi >= stop, np.minimum(fill, n))
+
+    def tp_bar(level: float) -> np.ndarray:
+        return _first(hi >= level if long else lo <= level, np.minimum(fill + 1, n))
+
+    k1 = tp_bar(tp1)
+    out = {
+        "entry": float(np.mean(filled)),
+        "entry_next_bar": float(np.mean(fill == 0)),
+        "tp1": float(np.mean(filled & (k1 < n) & (k1 < stop_k))),
+        "stop_before_tp1": float(np.mean(filled & (stop_k < n) & (stop_k <= k1))),
+    }
+    if tp2 is not None:
+        k2 = tp_bar(tp2)
+        out["tp2"] = float(np.mean(filled & (k2 < n) & (k2 < stop_k)))
+    return {k: round(v, 4) for k, v in out.items()}
+
+
+def project(plan: Dict[str, Any], side: str) -> Optional[Dict[str, Any]]:
+    """Fan bands and hit probabilities for `plan` (None when the timeframe has too little history)."""
+    sim = simulate(plan["tf"])
+    if sim is None:
+        return None
+    c0, t0, sec = sim["close"], sim["ts"], sim["tf_sec"]
+    steps = [t0 + sec * (k + 1) for k in range(sim["shape"][1])]
+    bands = {
+        f"p{p}": [{"ts": t0, "value": round(c0, 2)}]
+        + [{"ts": t, "value": round(float(v) * c0, 2)} for t, v in zip(steps, sim["bands_rel"][i])]
+        for i, p in enumerate(_PCTS)
+    }
+    probs = probabilities(
+        sim, side, float(plan["entry_price"]), float(plan["stop_price"]), float(plan["tp1_price"]),
+        float(plan["tp2_price"]), market=plan.get("entry_type") == "market",
+    )
+    return {
+        "bands": bands,
+        "probabilities": probs,
+        "paths": sim["shape"][0],
+        "bars": sim["shape"][1],
+        "samples": sim["samples"],
+        "regime": {1: "long_favored", -1: "short_favored"}.get(sim["regime"], "unknown"),
+        "atr_pct": sim["atr_pct"],
+        "elapsed_ms": sim["elapsed_ms"],
+    }
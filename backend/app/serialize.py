@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import dataclasses
+import json
+import math
+from typing import Any
+
+from .config import FAST_JSON
+
+# JSON encoding shared by the API, the DB layer and the CLI tools (no web framework
+# imports here; the response class lives in app/responses.py).
+
+try:  # optional: pip install orjson
+    import orjson as _orjson
+except ImportError:  # pragma: no cover - depends on environment
+    _orjson = None
+
+_USE_ORJSON = bool(FAST_JSON and _orjson is not None)
+_ORJSON_OPTS = (_orjson.OPT_SERIALIZE_NUMPY | _orjson.OPT_NON_STR_KEYS) if _orjson is not None else 0
+
+
+def _default(o: Any) -> Any:
+    # NumPy scalars/arrays, dataclasses (as orjson does) and sets for the stdlib fallback.
+    if hasattr(o, "tolist"):
+        return o.tolist()
+    if dataclasses.is_dataclass(o) and not isinstance(o, type):
+        return dataclasses.asdict(o)
+    if isinstance(o, (set, frozenset)):
+        return list(o)
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+def _default_orjson(o: Any) -> Any:
+    if isinstance(o, (set, frozenset)):
+        return list(o)
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+def _finite(obj: Any) -> Any:
+    # Stdlib json cannot emit NaN/inf as valid JSON; mirror orjson and send null.
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {k: _finite(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_finite(v) for v in obj]
+    if hasattr(obj, "tolist"):
+        return _finite(obj.tolist())
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return _finite(dataclasses.asdict(obj))
+    return obj
+
+
+def dumps(obj: Any) -> bytes:
+    """Serialize to compact UTF-8 JSON bytes (orjson when available)."""
+    if _USE_ORJSON:
+        return _orjson.dumps(obj, default=_default_orjson, option=_ORJSON_OPTS)
+    try:
+        s = json.dumps(obj, ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=_default)
+    except ValueError:
+        s = json.dumps(_finite(obj), ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=_default)
+    return s.encode("utf-8")
+
+
+def dumps_str(obj: Any) -> str:
+    """Same as dumps() but returns text (for TEXT columns such as features/detail)."""
+    return dumps(obj).decode("utf-8")
+
+
+def backend_name() -> str:
+    return "orjson" if _USE_ORJSON else "json"
+
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional, Tuple
+
+from . import db
+from .config import SHARED_STATE
+from .serialize import dumps_str
+
+# Identifies this worker process as a lease holder.
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+_LOCAL: Dict[str, Tuple[Any, Optional[float]]] = {}
+_LOCAL_LOCK = threading.Lock()
+
+
+def is_shared() -> bool:
+    return SHARED_STATE == "sqlite"
+
+
+def cache_get(key: str) -> Optional[Any]:
+    """Return a cached value, or None when missing/expired.
+
+    local mode: plain in-process dict (values are returned as stored).
+    sqlite mode: the shared_cache table, visible to every worker (JSON round-trip).
+    """
+    now = time.time()
+    if not is_shared():
+        with _LOCAL_LOCK:
+            hit = _LOCAL.get(key)
+            if hit is None:
+                return None
+            value, expires = hit
+            if expires is not None and expires < now:
+                del _LOCAL[key]
+                return None
+            return value
+
+    conn = db.connect()
+    try:
+        row = conn.execute(
+            """SELECT value, expires_ts FROM shared_cache WHERE key=?""", (key,)
+        ).fetchone()
+    finally:
+        conn.close()
+    if row is None or (row[1] is not None and float(row[1]) < now):
+        return None
+    return json.loads(row[0])
+
+
+def cache_set(key: str, value: Any, ttl_sec: Optional[float] = None) -> None:
+    expires = (time.time() + float(ttl_sec)) if ttl_sec else None
+    if not is_shared():
+        with _LOCAL_LOCK:
+            _LOCAL[key] = (value, expires)
+        return
+
+    conn = db.connect()
+    try:
+        conn.execute(
+            """INSERT INTO shared_cache(key, value, expires_ts) VALUES (?, ?, ?)
+                 ON CONFLICT(key) DO UPDATE SET value=excluded.value, expires_ts=excluded.expires_ts""",
+            (key, dumps_str(value), expires),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def cache_delete_prefix(prefix: str) -> None:
+    if not is_shared():
+        with _LOCAL_LOCK:
+            for k in [k for k in _LOCAL if k.startswith(prefix)]:
+                del _LOCAL[k]
+        return
+
+    conn = db.connect()
+    try:
+        conn.execute("""DELETE FROM shared_cache WHERE substr(key, 1, ?) = ?""", (len(prefix), prefix))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def try_acquire_lease(name: str, ttl_sec: float) -> bool:
+    """Become (or stay) the single holder of `name` for ttl_sec.
+
+    Returns True for the current leader. A lease that is not renewed expires, so a
+    crashed leader is replaced after at most ttl_sec. Always True in local mode.
+    """
+    if not is_shared():
+        return True
+    now = time.time()
+    conn = db.connect()
+    conn.isolation_level = None
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cur = conn.execute(
+                """UPDATE leases SET holder=?, expires_ts=?
+                     WHERE name=? AND (holder=? OR expires_ts < ?)""",
+                (WORKER_ID, now + float(ttl_sec), name, WORKER_ID, now),
+            )
+            ok = bool(cur.rowcount)
+            if not ok:
+                cur = conn.execute(
+                    """INSERT OR IGNORE INTO leases(name, holder, expires_ts) VALUES (?, ?, ?)""",
+                    (name, WORKER_ID, now + float(ttl_sec)),
+                )
+                ok = bool(cur.rowcount)
+            conn.execute("COMMIT")
+            return ok
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+
+
+def release_lease(name: str) -> None:
+    if not is_shared():
+        return
+    conn = db.connect()
+    try:
+        conn.execute("""DELETE FROM leases WHERE name=? AND holder=?""", (name, WORKER_ID))
+        conn.commit()
+    finally:
+        conn.close()
@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .config import STRATEGIES
+from .indicators import (
+    atr_sma_series, rolling_max_series, rolling_min_series, rsi_sma_series, sma_series,
+)
+
+# Entry/exit rules shared by the live scorer (recommend.py), the fast backtester
+# (evaluator.py), the portfolio replay and tools/backtest.py.
+#
+# A strategy names the indicators it needs ("sma200", "rsi2", "min7", ...) and writes its
+# rules as plain comparisons on a mapping of them. The same functions then run on whole
+# numpy arrays (backtests: one vectorized pass per series) and on the float values of
+# the latest bar (recommend). Indicators are computed once per series by `Indicators`
+# and shared by every strategy and every backtest of a grid search on it.
+#
+# WONYODD_STRATEGIES lists the active strategies; the first one drives status, plans,
+# the parameter search and history, the others are scored next to it on the same
+# snapshot (candidate["strategies"]).
+
+ATR = "atr14"  # every plan sizes entries and stops by it
+
+_NAME = re.compile(r"^(sma|rsi|atr|min|max)(\d+)$")
+
+
+class Indicators:
+    """Named indicator arrays over one OHLC series, computed on first use and cached."""
+
+    def __init__(self, o: np.ndarray, h: np.ndarray, l: np.ndarray, c: np.ndarray):
+        self._cols: Dict[str, np.ndarray] = {"open": o, "high": h, "low": l, "close": c}
+        self._signals: Dict[Tuple[str, str], Tuple[np.ndarray, np.ndarray]] = {}
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[Mapping[str, Any]]) -> "Indicators":
+        arr = np.array([(r["open"], r["high"], r["low"], r["close"]) for r in rows], dtype=np.float64).reshape(-1, 4)
+        return cls(arr[:, 0], arr[:, 1], arr[:, 2], arr[:, 3])
+
+    def __len__(self) -> int:
+        return len(self._cols["close"])
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        col = self._cols.get(name)
+        if col is None:
+            m = _NAME.match(name)
+            if m is None:
+                raise KeyError(f"unknown indicator: {name}")
+            kind, n = m.group(1), int(m.group(2))
+            c = self._cols["close"]
+            if kind == "sma":
+                col = sma_series(c, n)
+            elif kind == "rsi":
+                col = rsi_sma_series(c, n)
+            elif kind == "atr":
+                col = atr_sma_series(self._cols["high"], self._cols["low"], c, n)
+            elif kind == "min":
+                col = rolling_min_series(c, n)
+            else:
+                col = rolling_max_series(c, n)
+            self._cols[name] = col
+        return col
+
+    def at(self, i: int, names: Iterable[str]) -> Dict[str, float]:
+        return {n: float(self[n][i]) for n in names}
+
+    def ready(self, names: Iterable[str]) -> np.ndarray:
+        """Bars where every named indicator has a value."""
+        ok = np.ones(len(self), dtype=bool)
+        for n in names:
+            ok &= np.isfinite(self[n])
+        return ok
+
+    def signals(self, strategy: "Strategy", side: str) -> Tuple[np.ndarray, np.ndarray]:
+        """(entry, exit) bool arrays of `strategy` for `side`; entries only where ATR is known too."""
+        key = (strategy.name, side)
+        hit = self._signals.get(key)
+        if hit is None:
+            with np.errstate(invalid="ignore"):
+                entry = np.asarray(strategy.entry(self, side), dtype=bool) & self.ready(strategy.needs + (ATR,))
+                exit_ = np.asarray(strategy.exit(self, side), dtype=bool)
+            hit = self._signals[key] = (entry, exit_)
+        return hit
+
+
+Rule = Callable[[Mapping[str, Any], str], Any]
+
+
+@dataclass(frozen=True)
+class Strategy:
+    name: str
+    needs: Tuple[str, ...]
+    entry: Rule  # trigger on the signal bar's close (trend filter included); fill on the next bar
+    trend: Rule  # trend filter alone (candidate["trend_ok"])
+    exit: Rule  # close-based exit: leave at the next bar's open
+    target: Tuple[str, str]  # indicator used as TP1 for (long, short)
+    ease: Callable[[Mapping[str, float], str], Tuple[float, Dict[str, Any]]]  # 0..100 closeness to the trigger
+    exit_note: str = ""  # plan["tp_rule"]
+
+    def evaluate(self, values: Mapping[str, float], side: str) -> Dict[str, Any]:
+        """Scalar rules on one bar's values: trigger_now, trend_ok and the ease score (before the regime)."""
+        trigger = bool(self.entry(values, side))
+        base, detail = self.ease(values, side)
+        return {"trigger_now": trigger, "trend_ok": bool(self.trend(values, side)),
+                "ease": 100.0 if trigger else base, **detail}
+
+    def tp1(self, values: Mapping[str, float], side: str) -> float:
+        return float(values[self.target[0] if side == "long" else self.target[1]])
+
+
+# Connors RSI(2): pullback (close beyond SMA5, RSI2 at an extreme) inside the SMA200 trend,
+# exit on the close back across SMA5.
+
+def _above_trend(x: Mapping[str, Any], side: str) -> Any:
+    return x["close"] > x["sma200"] if side == "long" else x["close"] < x["sma200"]
+
+
+def _rsi2_entry(x: Mapping[str, Any], side: str) -> Any:
+    if side == "long":
+        return (x["close"] > x["sma200"]) & (x["close"] < x["sma5"]) & (x["rsi2"] <= 5.0)
+    return (x["close"] < x["sma200"]) & (x["close"] > x["sma5"]) & (x["rsi2"] >= 95.0)
+
+
+def _sma5_exit(x: Mapping[str, Any], side: str) -> Any:
+    return x["close"] > x["sma5"] if side == "long" else x["close"] < x["sma5"]
+
+
+def _rsi2_ease(x: Mapping[str, float], side: str) -> Tuple[float, Dict[str, Any]]:
+    close, sma5, sma200, rsi2 = x["close"], x["sma5"], x["sma200"], x["rsi2"]
+    if side == "long":
+        dist_sma5 = max(0.0, (close - sma5) / close) * 100.0
+        dist_rsi = max(0.0, (rsi2 - 5.0) / 5.0) * 100.0
+        dist_trend = max(0.0, (sma200 - close) / close) * 100.0
+        rsi_gap = max(0.0, rsi2 - 5.0)
+    else:
+        dist_sma5 = max(0.0, (sma5 - close) / close) * 100.0
+        dist_rsi = max(0.0, (95.0 - rsi2) / 95.0) * 100.0
+        dist_trend = max(0.0, (close - sma200) / close) * 100.0
+        rsi_gap = max(0.0, 95.0 - rsi2)
+    return 100.0 - (dist_sma5 * 200.0 + dist_rsi * 1.0 + dist_trend * 300.0), {
+        "distance_close_to_sma5_pct": round(dist_sma5, 4),
+        "distance_close_to_sma200_pct": round(dist_trend, 4),
+        "distance_rsi_to_threshold": round(rsi_gap, 4),
+    }
+
+
+# Double seven: close at a 7-bar closing low (high for shorts) inside the SMA200 trend,
+# exit on a close at the opposite 7-bar extreme.
+
+def _double7_entry(x: Mapping[str, Any], side: str) -> Any:
+    if side == "long":
+        return (x["close"] > x["sma200"]) & (x["close"] <= x["min7"])
+    return (x["close"] < x["sma200"]) & (x["close"] >= x["max7"])
+
+
+def _double7_exit(x: Mapping[str, Any], side: str) -> Any:
+    return x["close"] >= x["max7"] if side == "long" else x["close"] <= x["min7"]
+
+
+def _double7_ease(x: Mapping[str, float], side: str) -> Tuple[float, Dict[str, Any]]:
+    close, sma200 = x["close"], x["sma200"]
+    if side == "long":
+        dist_ext = max(0.0, (close - x["min7"]) / close) * 100.0
+        dist_trend = max(0.0, (sma200 - close) / close) * 100.0
+    else:
+        dist_ext = max(0.0, (x["max7"] - close) / close) * 100.0
+        dist_trend = max(0.0, (close - sma200) / close) * 100.0
+    return 100.0 - (dist_ext * 200.0 + dist_trend * 300.0), {
+        "distance_close_to_extreme_pct": round(dist_ext, 4),
+        "distance_close_to_sma200_pct": round(dist_trend, 4),
+    }
+
+
+REGISTRY: Dict[str, Strategy] = {}
+
+
+def register(s: Strategy) -> Strategy:
+    REGISTRY[s.name] = s
+    return s
+
+
+CONNORS_RSI2 = register(Strategy(
+    name="connors_rsi2", needs=("sma5", "sma200", "rsi2"), entry=_rsi2_entry, trend=_above_trend,
+    exit=_sma5_exit, target=("sma5", "sma5"), ease=_rsi2_ease,
+    exit_note="exit when close crosses SMA5, then exit next bar open",
+))
+register(Strategy(
+    name="double7", needs=("sma200", "min7", "max7"), entry=_double7_entry, trend=_above_trend,
+    exit=_double7_exit, target=("max7", "min7"), ease=_double7_ease,
+    exit_note="exit when close makes a 7-bar closing high (low for shorts), then exit next bar open",
+))
+
+
+def parse(spec: str) -> List[Strategy]:
+    """Comma-separated strategy names in order (unknown names skipped); never empty."""
+    out: List[Strategy] = []
+    for name in (p.strip() for p in spec.split(",")):
+        if not name:
+            continue
+        s = REGISTRY.get(name)
+        if s is None:
+            print(f"[WARN] Unknown strategy in WONYODD_STRATEGIES: {name}")
+        elif s not in out:
+            out.append(s)
+    return out or [CONNORS_RSI2]
+
+
+_ACTIVE = parse(STRATEGIES)
+
+
+def active() -> List[Strategy]:
+    return _ACTIVE
+
+
+def get(name: Optional[str] = None) -> Strategy:
+    """Strategy by name; None = the primary (first active) one."""
+    if name is None:
+        return active()[0]
+    s = REGISTRY.get(name)
+    if s is None:
+        raise ValueError(f"unknown strategy: {name}")
+    return s
+
+
+def indicator_names(strategies: Iterable[Strategy]) -> Tuple[str, ...]:
+    """Union of the indicators `strategies` need, plus ATR, in first-use order."""
+    names: Dict[str, None] = {}
+    for s in strategies:
+        names.update(dict.fromkeys(s.needs))
+    names[ATR] = None
+    return tuple(names)
@@ -0,0 +1,172 @@
+from __future__ import annotations
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from .config import (
+    env_float,
+    TRADE_TFS, EXTRA_TFS, FEATURE_SOURCE_TFS, OUTCOME_FEED_TFS,
+    ENTRY_ATR_K_30, ENTRY_ATR_K_60, ENTRY_ATR_K_180,
+)
+
+DAY_SEC = 24 * 60 * 60
+WEEK_SEC = 7 * DAY_SEC
+# Unix epoch is a Thursday; weekly bars open on Monday 00:00 UTC.
+WEEK_OFFSET_SEC = 4 * DAY_SEC
+
+
+@dataclass(frozen=True)
+class Timeframe:
+    key: str           # canonical key stored in candles.timeframe ("30m", "240m", "1D", "1W")
+    seconds: int
+    offset_sec: int    # bucket alignment offset from the unix epoch
+    entry_k: float     # default ATR entry multiplier when no evaluated params exist
+
+    @property
+    def minutes(self) -> int:
+        return self.seconds // 60
+
+    def bucket_start(self, ts: int) -> int:
+        return int(ts) - ((int(ts) - self.offset_sec) % self.seconds)
+
+    def is_aligned(self, ts: int) -> bool:
+        # Accept alignment to bar open OR bar close (same residue for fixed-size buckets).
+        return (int(ts) - self.offset_sec) % self.seconds == 0
+
+
+_UNIT_SEC = {"S": 1, "M": 60, "MIN": 60, "MINUTE": 60, "H": 3600, "HOUR": 3600,
+             "D": DAY_SEC, "DAY": DAY_SEC, "W": WEEK_SEC, "WEEK": WEEK_SEC}
+_TF_RE = re.compile(r"^(\d+(?:\.\d+)?)?\s*([A-Z]*)$")
+
+# Legacy per-TF entry multipliers (WONYODD_ENTRY_ATR_K_30/60/180); any other TF reads
+# WONYODD_ENTRY_ATR_K_<minutes> and falls back to 0.5.
+_ENTRY_K_LEGACY = {30: ENTRY_ATR_K_30, 60: ENTRY_ATR_K_60, 180: ENTRY_ATR_K_180}
+
+# Lower timeframes TradingView alerts may send to be resampled into the trade timeframes.
+SOURCE_TIMEFRAMES: Tuple[str, ...] = ("1m", "5m", "15m")
+
+# Only configured timeframes are cached (and accepted by the webhook); any other spelling
+# still parses, for the CLI tools, but is built per call so request input cannot grow this.
+_REGISTRY: Dict[str, Timeframe] = {}
+
+
+def _parse_seconds(minutes_or_str: str) -> Optional[int]:
+    s = str(minutes_or_str).strip().upper().replace(" ", "")
+    m = _TF_RE.match(s)
+    if not m:
+        return None
+    num, unit = m.group(1), m.group(2)
+    if not num and not unit:
+        return None
+    if unit and unit not in _UNIT_SEC:
+        return None
+    # TradingView sends bare numbers as minutes ("30", "240") and "D"/"W" without a count.
+    n = float(num) if num else 1.0
+    sec = n * _UNIT_SEC[unit or "M"]
+    if sec < 60 or sec != int(sec):
+        return None
+    return int(sec)
+
+
+def _key_for_seconds(sec: int) -> str:
+    if sec % WEEK_SEC == 0:
+        return f"{sec // WEEK_SEC}W"
+    if sec % DAY_SEC == 0:
+        return f"{sec // DAY_SEC}D"
+    return f"{sec // 60}m"
+
+
+def _keys(s: str) -> Tuple[str, ...]:
+    # Like parse_tf_list, without going through get() (used to build the known set).
+    secs = (_parse_seconds(part) for part in str(s or "").split(",") if part.strip())
+    return tuple(dict.fromkeys(_key_for_seconds(sec) for sec in secs if sec is not None))
+
+
+def get(key_or_alias: str) -> Optional[Timeframe]:
+    """Resolve any accepted spelling ("30", "1H", "240m", "D", "1W") to its Timeframe."""
+    sec = _parse_seconds(key_or_alias)
+    if sec is None:
+        return None
+    key = _key_for_seconds(sec)
+    tf = _REGISTRY.get(key)
+    if tf is None:
+        offset = WEEK_OFFSET_SEC if sec % WEEK_SEC == 0 else 0
+        mins = sec // 60
+        k = _ENTRY_K_LEGACY.get(mins)
+        if k is None:
+            k = env_float(f"WONYODD_ENTRY_ATR_K_{mins}", 0.5)
+        tf = Timeframe(key=key, seconds=sec, offset_sec=offset, entry_k=float(k))
+        if key in _KNOWN:
+            tf = _REGISTRY.setdefault(key, tf)
+    return tf
+
+
+def tf_key(minutes_or_str: str) -> Optional[str]:
+    # Accept TradingView formats: "30", "60", "180", "240", "1D", "D", "1W", plus "1H", "4H", "15m"...
+    tf = get(minutes_or_str)
+    return tf.key if tf else None
+
+
+def tf_seconds(key: str) -> int:
+    tf = get(key)
+    return tf.seconds if tf else 0
+
+
+def parse_tf_list(s: str) -> Tuple[str, ...]:
+    """Comma-separated timeframes, canonicalized and de-duplicated, in the given order."""
+    out: List[str] = []
+    for part in str(s or "").split(","):
+        k = tf_key(part) if part.strip() else None
+        if k and k not in out:
+            out.append(k)
+    return tuple(out)
+
+
+def _parse_list(s: str) -> Tuple[str, ...]:
+    return tuple(sorted(parse_tf_list(s), key=tf_seconds))
+
+
+_KNOWN = frozenset(_keys(TRADE_TFS) or ("30m", "60m", "180m")) | {"1D", "1W"} | frozenset(
+    SOURCE_TIMEFRAMES + _keys(EXTRA_TFS) + _keys(FEATURE_SOURCE_TFS) + _keys(OUTCOME_FEED_TFS))
+TRADE_TIMEFRAMES: Tuple[str, ...] = _parse_list(TRADE_TFS) or ("30m", "60m", "180m")
+REGIME_TIMEFRAME = "1D"
+
+
+def trade_timeframes() -> Tuple[str, ...]:
+    """Timeframes recommend() evaluates and lower-TF bars are resampled into."""
+    return TRADE_TIMEFRAMES
+
+
+def chart_timeframes() -> Tuple[str, ...]:
+    """Timeframes /api/candles serves."""
+    extra = tuple(k for k in (REGIME_TIMEFRAME, "1W") if k not in TRADE_TIMEFRAMES)
+    return TRADE_TIMEFRAMES + extra
+
+
+def is_known(key: str) -> bool:
+    """A configured timeframe: trade / chart / resample source / feed, or WONYODD_EXTRA_TFS."""
+    return key in _KNOWN
+
+
+def known_timeframes() -> Tuple[str, ...]:
+    return tuple(sorted(_KNOWN, key=tf_seconds))
+
+
+def is_intraday(key: str) -> bool:
+    return 0 < tf_seconds(key) < DAY_SEC
+
+
+def resample_targets(src_key: str) -> List[Timeframe]:
+    """Trade timeframes that can be built from whole multiples of `src_key` bars."""
+    src = get(src_key)
+    if src is None:
+        return []
+    out = []
+    for k in TRADE_TIMEFRAMES:
+        tgt = get(k)
+        if tgt is None or tgt.seconds <= src.seconds or tgt.seconds % src.seconds != 0:
+            continue
+        if tgt.offset_sec % src.seconds != src.offset_sec % src.seconds:
+            continue
+        out.append(tgt)
+    return out
@@ -0,0 +1,268 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .config import WRITE_BUFFER_MAX_ROWS, WRITE_BUFFER_MS, WRITE_DURABILITY
+
+# Write-behind buffer (group commit) for candle upserts (opened by the app lifespan;
+# tools and other processes write directly).
+#
+# db.upsert_candle() puts the bar here instead of committing it. A flusher thread writes
+# everything pending in ONE transaction on its own connection as soon as WRITE_BUFFER_MS
+# passed since the first pending bar or WRITE_BUFFER_MAX_ROWS bars are waiting, so a burst
+# of 1m alerts and the bars resampled from them share one WAL fsync. When a writer waits for
+# its commit (WRITE_DURABILITY full/normal) the flush starts at once instead: whatever
+# arrives while it commits goes into the next batch. A re-write of a
+# pending (tf, ts) replaces it in place; only the last version is written.
+#
+# Read-your-writes: db.fetch_recent / fetch_recent_ohlcv / fetch_latest / fetch_range merge
+# pending bars over the stored ones and data_version() moves at put time, so responses and
+# ETags follow a write immediately. Readers that query SQL directly (feature matrix, gaps,
+# export, other workers) see the bar once its batch commits.
+#
+# WRITE_DURABILITY:
+#   full      the webhook answers after its batch committed (synchronous=FULL): the same
+#             guarantee as a per-request commit, one fsync per batch
+#   normal    answers after commit, synchronous=NORMAL: survives a process crash; a power
+#             loss can drop the last batches
+#   buffered  answers once the bar is buffered: a crash loses up to WRITE_BUFFER_MS of bars
+#             (TradingView will not resend them: they were acknowledged)
+
+Bar = Tuple[float, float, float, float, Optional[float], Optional[Dict[str, Any]]]  # o, h, l, c, v, features
+Batch = Dict[str, Dict[int, Bar]]  # timeframe -> ts -> bar
+
+DURABILITY = WRITE_DURABILITY.strip().lower() if WRITE_DURABILITY.strip().lower() in ("full", "normal", "buffered") else "full"
+
+
+class WriteBuffer:
+    def __init__(self, write_batch: Callable[[Batch], None], interval_sec: float, max_rows: int):
+        self._write_batch = write_batch
+        self.interval_sec = max(0.0, float(interval_sec))
+        self.max_rows = max(1, int(max_rows))
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)  # wakes the flusher
+        self._done = threading.Condition(self._lock)  # wakes writers waiting for a commit
+        self._pending: Batch = {}
+        self._pending_rows = 0
+        self._first_at = 0.0
+        self._flushing: Batch = {}  # handed to the writer, visible to readers until committed
+        self._batch = 1  # id of the batch being filled
+        self._committed = 0  # id of the last committed batch
+        self._force = False
+        self._stop = False
+        self._blocked = 0  # threads in wait()
+        self._waiters: List[Tuple[int, asyncio.AbstractEventLoop, asyncio.Future]] = []
+        self._thread: Optional[threading.Thread] = None
+        self.stats: Dict[str, Any] = {"puts": 0, "coalesced": 0, "batches": 0, "rows": 0, "errors": 0,
+                                      "max_batch": 0, "commit_sec": 0.0}
+
+    # -- writers ---------------------------------------------------------------
+
+    def put(self, timeframe: str, ts: int, bar: Bar) -> int:
+        """Buffer one bar; returns the id of the batch that will commit it."""
+        with self._cond:
+            rows = self._pending.setdefault(timeframe, {})
+            if ts in rows:
+                self.stats["coalesced"] += 1
+            else:
+                self._pending_rows += 1
+                if self._pending_rows == 1:
+                    self._first_at = time.monotonic()
+            rows[ts] = bar
+            self.stats["puts"] += 1
+            if self._pending_rows == 1 or self._pending_rows >= self.max_rows:
+                self._cond.notify()
+            return self._batch
+
+    def batch_id(self) -> int:
+        with self._cond:
+            return self._batch
+
+    def flush(self, timeout: Optional[float] = 30.0) -> bool:
+        """Commit everything buffered so far before returning (False on timeout)."""
+        with self._cond:
+            if not self._pending_rows and not self._flushing:
+                return True
+            target = self._batch if self._pending_rows else self._batch - 1
+            self._force = True
+            self._cond.notify()
+            return self._done.wait_for(lambda: self._committed >= target, timeout)
+
+    def wait(self, batch: int, timeout: Optional[float] = None) -> bool:
+        """Block until batch `batch` is on disk (False on timeout)."""
+        with self._cond:
+            self._blocked += 1
+            self._cond.notify()
+            try:
+                return self._done.wait_for(lambda: self._committed >= batch, timeout)
+            finally:
+                self._blocked -= 1
+
+    async def committed(self, batch: int) -> None:
+        """Wait (without blocking the event loop) until batch `batch` is on disk."""
+        loop = asyncio.get_running_loop()
+        with self._cond:
+            if self._committed >= batch:
+                return
+            fut = loop.create_future()
+            self._waiters.append((batch, loop, fut))
+            self._cond.notify()
+        await fut
+
+    # -- readers ---------------------------------------------------------------
+
+    def rows(self, timeframe: str, lo: int, hi: int) -> Dict[int, Bar]:
+        """Buffered bars of `timeframe` with lo <= ts <= hi (latest version of each)."""
+        with self._cond:
+            a, b = self._flushing.get(timeframe), self._pending.get(timeframe)
+            if not a and not b:
+                return {}
+            out = {ts: bar for ts, bar in a.items() if lo <= ts <= hi} if a else {}
+            if b:
+                out.update((ts, bar) for ts, bar in b.items() if lo <= ts <= hi)
+            return out
+
+    def has(self, timeframe: str) -> bool:
+        with self._cond:
+            return bool(self._pending.get(timeframe) or self._flushing.get(timeframe))
+
+    # -- flusher ---------------------------------------------------------------
+
+    def _take(self) -> Optional[Tuple[int, Batch]]:
+        with self._cond:
+            while True:
+                if self._pending_rows:
+                    due = self._first_at + self.interval_sec
+                    now = time.monotonic()
+                    # Someone waits for a commit: go now. Bars that arrive during this commit form
+                    # the next batch, so batches grow with the load instead of with the timer.
+                    waited = self._blocked or self._waiters
+                    if waited or self._force or self._stop or self._pending_rows >= self.max_rows or now >= due:
+                        break
+                    self._cond.wait(due - now)
+                elif self._stop:
+                    return None
+                else:
+                    self._force = False
+                    self._cond.wait()
+            batch, self._flushing = self._batch, self._pending
+            self._pending, self._pending_rows = {}, 0
+            self._batch += 1
+            self._force = False
+            return batch, self._flushing
+
+    def _loop(self) -> None:
+        while True:
+            taken = self._take()
+            if taken is None:
+                return
+            batch, rows = taken
+            n = sum(len(v) for v in rows.values())
+            t0 = time.perf_counter()
+            try:
+                self._write_batch(rows)
+            except Exception as e:
+                print(f"[WARN] Write buffer flush failed ({n} rows), retrying: {type(e).__name__}: {e}")
+                with self._cond:
+                    self.stats["errors"] += 1
+                    # Put the batch back under anything written since; newer versions win.
+                    for tf, bars in rows.items():
+                        merged = dict(bars)
+                        merged.update(self._pending.get(tf, {}))
+                        self._pending_rows += len(merged) - len(self._pending.get(tf, {}))
+                        self._pending[tf] = merged
+                    self._flushing = {}  # waiters of `batch` are released by the batch that now holds its rows
+                    self._first_at = time.monotonic()
+                    stopping = self._stop
+                if stopping:
+                    print(f"[WARN] Write buffer: dropping {n} unflushed rows at shutdown")
+                    return
+                time.sleep(min(1.0, max(0.05, self.interval_sec)))
+                continue
+            elapsed = time.perf_counter() - t0
+            with self._cond:
+                self._flushing = {}
+                self._committed = batch
+                self.stats["batches"] += 1
+                self.stats["rows"] += n
+                self.stats["max_batch"] = max(self.stats["max_batch"], n)
+                self.stats["commit_sec"] += elapsed
+                done = [w for w in self._waiters if w[0] <= batch]
+                self._waiters = [w for w in self._waiters if w[0] > batch]
+                self._done.notify_all()
+            for _, loop, fut in done:
+                loop.call_soon_threadsafe(_resolve, fut)
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._loop, name="wonyodd-writebuf", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 30.0) -> None:
+        """Flush what is left and stop the flusher."""
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def state(self) -> Dict[str, Any]:
+        with self._cond:
+            batches = max(1, self.stats["batches"])
+            return {"interval_ms": round(self.interval_sec * 1000.0, 3), "max_rows": self.max_rows,
+                    "durability": DURABILITY, "pending": self._pending_rows,
+                    **{k: v for k, v in self.stats.items() if k != "commit_sec"},
+                    "avg_batch": round(self.stats["rows"] / batches, 2),
+                    "avg_commit_ms": round(self.stats["commit_sec"] / batches * 1000.0, 3)}
+
+
+def _resolve(fut: asyncio.Future) -> None:
+    if not fut.done():
+        fut.set_result(None)
+
+
+_BUFFER: Optional[WriteBuffer] = None
+
+
+def start(write_batch: Callable[[Batch], None], interval_ms: float = WRITE_BUFFER_MS,
+         max_rows: int = WRITE_BUFFER_MAX_ROWS) -> bool:
+    """Start buffering db.upsert_candle() (no-op when interval_ms <= 0 or already open)."""
+    global _BUFFER
+    if interval_ms <= 0 or _BUFFER is not None:
+        return False
+    buf = WriteBuffer(write_batch, interval_ms / 1000.0, max_rows)
+    buf.start()
+    _BUFFER = buf
+    return True
+
+
+def stop() -> None:
+    global _BUFFER
+    buf, _BUFFER = _BUFFER, None
+    if buf is not None:
+        buf.stop()
+
+
+def active() -> Optional[WriteBuffer]:
+    return _BUFFER
+
+
+def batch_id() -> int:
+    buf = _BUFFER
+    return buf.batch_id() if buf is not None else 0
+
+
+async def committed(batch: int) -> None:
+    """Wait for `batch` to commit when WRITE_DURABILITY acknowledges on commit (else return at once)."""
+    buf = _BUFFER
+    if buf is None or batch <= 0 or DURABILITY == "buffered":
+        return
+    await buf.committed(batch)
+
+
+def state() -> Optional[Dict[str, Any]]:
+    buf = _BUFFER
+    return buf.state() if buf is not None else None
@@ -0,0 +1,27 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# ensure backend/ is on sys.path (same as tools/); never touch the real DB
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+os.environ.setdefault("WONYODD_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="wonyodd-tests-"), "unused.sqlite3"))
+
+
+@pytest.fixture
+def tmp_db(tmp_path, monkeypatch):
+    """A fresh, migrated DB for one test, with the per-process caches that point into it cleared."""
+    from app import db
+
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "test.sqlite3"))
+    saved = [(cache, dict(cache)) for cache in (db._TF_IDS, db._WRITE_STATE, db._SEEN_SEQ)]
+    for cache, _ in saved:
+        cache.clear()
+    monkeypatch.setattr(db, "_POLLED_AT", 0.0)
+    db.init_db()
+    yield db
+    for cache, content in saved:
+        cache.clear()
+        cache.update(content)
@@ -0,0 +1,84 @@
+import pytest
+
+from app import gaps
+
+B = 1_700_001_000  # a 30m bar open
+S = 1800
+
+
+@pytest.fixture
+def idx(tmp_db, monkeypatch):
+    monkeypatch.setattr(gaps, "_TRIED", {})
+    return tmp_db
+
+
+def _bar(i, px=100.0):
+    return (B + i * S, px, px + 1.0, px - 1.0, px + 0.5, 1.0)
+
+
+def _write(db, tf, *slots):
+    db.upsert_candles_many(tf, [_bar(i) for i in slots])
+
+
+def _gaps(tf="30m"):
+    return sorted(((g["start_ts"] - B) // S, (g["end_ts"] - B) // S, g["missing"]) for g in gaps.list_gaps(tf))
+
+
+def _rebuilt(db, tf="30m"):
+    conn = db.connect()
+    try:
+        gaps.rebuild(conn, db._tf_id(tf), tf)
+        conn.commit()
+    finally:
+        conn.close()
+    return _gaps(tf)
+
+
+def test_single_write_splits_a_gap(idx):
+    _write(idx, "30m", 0, 1, 10)
+    assert _gaps() == [(2, 9, 8)]
+    idx.upsert_candle("30m", B + 5 * S, 1.0, 1.0, 1.0, 1.0, 1.0)
+    assert _gaps() == [(2, 4, 3), (6, 9, 4)]
+
+
+def test_single_write_closes_a_gap(idx):
+    _write(idx, "30m", 0, 2, 3)
+    assert _gaps() == [(1, 1, 1)]
+    idx.upsert_candle("30m", B + S, 1.0, 1.0, 1.0, 1.0, 1.0)
+    assert _gaps() == []
+
+
+def test_write_before_the_first_bar_is_history_not_a_gap(idx):
+    _write(idx, "30m", 5, 6)
+    _write(idx, "30m", 0)
+    assert _gaps() == [(1, 4, 4)]
+
+
+def test_bulk_import_across_several_gaps_matches_a_full_rebuild(idx):
+    _write(idx, "30m", 0, 10, 20)
+    assert _gaps() == [(1, 9, 9), (11, 19, 9)]
+    _write(idx, "30m", 3, 4, 15, 19, 25)
+    expected = [(1, 2, 2), (5, 9, 5), (11, 14, 4), (16, 18, 3), (21, 24, 4)]
+    assert _gaps() == expected
+    assert _rebuilt(idx) == expected
+
+
+def test_backfill_fills_complete_lower_tf_buckets_only(idx):
+    _write(idx, "30m", 0, 3)
+    assert _gaps() == [(1, 2, 2)]
+    # 15m source: bucket 1 is complete (two bars), bucket 2 has only its first half.
+    idx.upsert_candles_many("15m", [
+        (B + S, 100.0, 104.0, 99.0, 101.0, 2.0),
+        (B + S + 900, 101.0, 102.0, 97.0, 98.0, 3.0),
+        (B + 2 * S, 98.0, 99.0, 96.0, 97.0, 1.0),
+    ])
+    assert gaps.backfill(["30m"]) == {"30m": 1}
+    assert _gaps() == [(2, 2, 1)]
+    bar, = idx.fetch_range("30m", B + S, B + S)
+    assert (bar["open"], bar["high"], bar["low"], bar["close"], bar["volume"]) == (100.0, 104.0, 97.0, 98.0, 5.0)
+
+    # Nothing new in the source: the incomplete bucket is not read again.
+    assert gaps.backfill(["30m"]) is None
+    idx.upsert_candles_many("15m", [(B + 2 * S + 900, 97.0, 98.0, 95.0, 96.0, 1.0)])
+    assert gaps.backfill(["30m"]) == {"30m": 1}
+    assert _gaps() == []
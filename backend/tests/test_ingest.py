@@ -0,0 +1,92 @@
+from collections import OrderedDict
+
+import pytest
+
+from app import ingest
+from app.models import WebhookPayload
+
+T = 1_700_001_000  # a 30m bar open
+
+
+@pytest.fixture
+def lru(monkeypatch):
+    monkeypatch.setattr(ingest, "_SEEN", OrderedDict())
+    monkeypatch.setattr(ingest, "_STATS", {"accepted": 0, "duplicates": 0, "revisions": 0, "late": 0})
+    monkeypatch.setattr(ingest, "INGEST_DEDUP_SIZE", 3)
+    return ingest
+
+
+def _payload(close=100.0, **kw):
+    body = {"timeframe": "30", "ts": T, "open": 99.0, "high": 101.0, "low": 98.0, "close": close,
+            "bar_close_confirmed": True, **kw}
+    return WebhookPayload(**body)
+
+
+def test_digest_ignores_secret_and_ts_spelling_but_not_the_bar():
+    d = ingest.digest(_payload())
+    assert ingest.digest(_payload(password="x", symbol="BTCUSDT", time=T)) == d
+    assert ingest.digest(_payload(close=100.5)) != d
+    assert ingest.digest(_payload(bar_close_confirmed=None, barstate="realtime")) != d
+
+
+def test_duplicate_short_circuits_only_after_an_accepted_write(lru):
+    d = ingest.digest(_payload())
+    assert not lru.is_duplicate("30m", T, d)
+    lru.remember("30m", T, d)
+    assert lru.is_duplicate("30m", T, d)
+    assert not lru.is_duplicate("30m", T + 1800, d)
+    assert lru.state()["duplicates"] == 1 and lru.state()["accepted"] == 1
+
+
+def test_revision_is_counted_and_replaces_the_digest(lru):
+    old, new = ingest.digest(_payload()), ingest.digest(_payload(close=100.5))
+    lru.remember("30m", T, old)
+    assert not lru.is_duplicate("30m", T, new)
+    lru.remember("30m", T, new, late=True)
+    assert lru.is_duplicate("30m", T, new) and not lru.is_duplicate("30m", T, old)
+    assert lru.state()["revisions"] == 1 and lru.state()["late"] == 1
+
+
+def test_lru_evicts_the_least_recently_seen_bar(lru):
+    d = ingest.digest(_payload())
+    for i in range(3):
+        lru.remember("30m", T + i * 1800, d)
+    assert lru.is_duplicate("30m", T, d)  # touch the oldest
+    lru.remember("30m", T + 3 * 1800, d)
+    assert lru.state()["tracked"] == 3
+    assert lru.is_duplicate("30m", T, d)
+    assert not lru.is_duplicate("30m", T + 1800, d)  # evicted instead
+
+
+def test_webhook_duplicate_and_late_bar(tmp_db, lru, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from app import history, main
+
+    closes, changed = [], []
+    monkeypatch.setattr(history, "note_bar_close", lambda tf, ts: closes.append((tf, ts)))
+    monkeypatch.setattr(ingest, "history_changed", changed.append)
+    monkeypatch.setattr(main, "_maybe_notify_spike", lambda *a, **k: None)
+    monkeypatch.setattr(main, "_maybe_notify_ready", lambda *a, **k: None)
+    client = TestClient(main.app)
+
+    def post(ts, close=100.0):
+        body = {"timeframe": "30", "ts": ts, "open": 99.0, "high": 101.0, "low": 98.0, "close": close,
+                "bar_close_confirmed": True}
+        r = client.post("/api/webhook/tradingview", json=body)
+        assert r.status_code == 200
+        return r.json()
+
+    assert post(T + 1800) == {"ok": True, "timeframe": "30m", "ts": T + 1800}
+    assert closes == [("30m", T + 1800)]
+    version = tmp_db.data_version("30m")
+
+    assert post(T + 1800)["duplicate"] is True  # retried delivery: no write, no version bump
+    assert tmp_db.data_version("30m") == version and closes == [("30m", T + 1800)]
+
+    out = post(T, close=99.5)  # older than the latest bar
+    assert out["late"] is True
+    assert closes == [("30m", T + 1800)]  # not a bar close
+    assert changed[0] == "30m"
+    assert tmp_db.fetch_range("30m", T, T)[0]["close"] == 99.5
+    assert ingest.state()["late"] == 1
@@ -0,0 +1,39 @@
+from app.config import NOTIFY_CLAIM_TTL_SEC
+
+NOW = 1_700_000_000
+
+
+def test_claim_is_exclusive_until_released(tmp_db):
+    db = tmp_db
+    assert db.claim_notification("ready:30m:long", "30m", 1800, created_ts=NOW)
+    assert not db.claim_notification("ready:30m:long", "30m", 1800, created_ts=NOW + 1)
+    db.release_notification("ready:30m:long", "30m", 1800)
+    assert db.claim_notification("ready:30m:long", "30m", 1800, created_ts=NOW + 2)
+
+
+def test_completed_notification_is_never_reclaimed(tmp_db):
+    db = tmp_db
+    assert db.claim_notification("spike:long", "30m", 1800, created_ts=NOW)
+    db.complete_notification("spike:long", "30m", 1800, detail="{}")
+    assert not db.claim_notification("spike:long", "30m", 1800, created_ts=NOW + 10 * NOTIFY_CLAIM_TTL_SEC)
+
+
+def test_abandoned_claim_expires(tmp_db):
+    db = tmp_db
+    assert db.claim_notification("spike:long", "30m", 1800, created_ts=NOW)  # sender dies before completing
+    assert not db.claim_notification("spike:long", "30m", 1800, created_ts=NOW + NOTIFY_CLAIM_TTL_SEC - 1)
+    assert db.claim_notification("spike:long", "30m", 1800, created_ts=NOW + NOTIFY_CLAIM_TTL_SEC + 1)
+
+
+def test_abandoned_claim_does_not_hold_the_cooldown(tmp_db):
+    db = tmp_db
+    cooldown = 10 * NOTIFY_CLAIM_TTL_SEC
+    assert db.claim_notification("spike:long", "30m", 1800, created_ts=NOW, cooldown_sec=cooldown)
+    # Another bar inside the cooldown: blocked while the first send may still be running ...
+    assert not db.claim_notification("spike:long", "30m", 3600, created_ts=NOW + 1, cooldown_sec=cooldown)
+    # ... but not by a claim that was never completed.
+    assert db.claim_notification("spike:long", "30m", 3600, created_ts=NOW + NOTIFY_CLAIM_TTL_SEC + 1,
+                                 cooldown_sec=cooldown)
+    db.complete_notification("spike:long", "30m", 3600, detail="{}")
+    assert not db.claim_notification("spike:long", "30m", 5400, created_ts=NOW + 2 * NOTIFY_CLAIM_TTL_SEC,
+                                     cooldown_sec=cooldown)
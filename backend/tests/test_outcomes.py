@@ -0,0 +1,96 @@
+from app.outcomes import DONE, OPEN, OutcomeIndex, Plan
+
+T = 1_700_001_000  # a 30m bar open
+BAR = 1800
+
+
+def _long(pid=1):
+    # Made at the close of bar T: the order works from T + BAR and lapses one bar later.
+    return Plan(id=pid, tf="30m", side="long", ts=T, market=False, entry=100.0, stop=95.0,
+                tps=(105.0, 110.0, 115.0))
+
+
+def _index(*plans):
+    idx = OutcomeIndex(max_bars=48)
+    for p in plans:
+        idx.add(p)
+    return idx
+
+
+def test_stop_counts_on_the_fill_bar_before_a_take_profit():
+    p = _long()
+    idx = _index(p)
+    idx.on_candle(T + BAR, o=101.0, h=106.0, l=94.0, c=96.0)  # entry, stop and TP1 all touched
+    assert p.state == DONE and p.outcome == "stop"
+    assert p.fill_ts == T + BAR and p.fill_price == 100.0
+    assert p.exit_price == 95.0 and p.tp_hit == 0
+    assert idx.sizes() == {"plans": 0, "waiting": 0, "entries": 0, "stops": 0, "tps": 0}
+
+
+def test_take_profit_only_counts_from_the_next_bar():
+    p = _long()
+    idx = _index(p)
+    idx.on_candle(T + BAR, o=101.0, h=106.0, l=99.0, c=104.0)  # fills, touches TP1 on the fill bar
+    assert p.state == OPEN and p.tp_hit == 0
+    idx.on_candle(T + 2 * BAR, o=104.0, h=111.0, l=101.0, c=109.0)
+    assert p.state == OPEN and p.tp_hit == 2
+    # Touches both the stop and TP3: the stop wins.
+    idx.on_candle(T + 3 * BAR, o=109.0, h=116.0, l=94.0, c=100.0)
+    assert p.state == DONE and p.outcome == "stop" and p.tp_hit == 2 and p.exit_price == 95.0
+
+
+def test_gap_through_the_stop_exits_at_the_open():
+    p = _long()
+    idx = _index(p)
+    idx.on_candle(T + BAR, o=101.0, h=102.0, l=99.5, c=101.0)
+    idx.on_candle(T + 2 * BAR, o=93.0, h=94.0, l=92.0, c=93.5)
+    assert p.outcome == "stop" and p.exit_price == 93.0
+
+
+def test_tp3_on_the_next_bar():
+    p = _long()
+    idx = _index(p)
+    idx.on_candle(T + BAR, o=100.5, h=101.0, l=99.0, c=100.5)
+    idx.on_candle(T + 2 * BAR, o=101.0, h=120.0, l=100.0, c=118.0)
+    assert p.state == DONE and p.outcome == "tp3" and p.tp_hit == 3 and p.exit_price == 115.0
+
+
+def test_unfilled_order_lapses_after_one_bar():
+    p = _long()
+    idx = _index(p)
+    idx.on_candle(T + BAR, o=102.0, h=103.0, l=101.0, c=102.0)
+    idx.on_candle(T + 2 * BAR, o=99.0, h=100.0, l=98.0, c=99.0)  # too late to fill
+    assert p.state == DONE and p.outcome == "unfilled" and p.fill_ts is None
+
+
+def _feed(db, tf, bars):
+    db.upsert_candles_many(tf, [(ts, o, h, l, c, 1.0) for ts, o, h, l, c in bars])
+
+
+def test_job_waits_for_the_forming_bar_to_finish(tmp_db):
+    from app import outcomes
+
+    db = tmp_db
+    outcomes._INDEX, outcomes._CURSOR = None, None
+    tid = db._tf_id("30m", create=True)
+    conn = db.connect()
+    outcomes.insert_plans(conn, [(tid, 0, T, 1, 0, 100.0, 95.0, 105.0, 110.0, 115.0)])
+    conn.commit()
+    conn.close()
+
+    m0 = T + BAR  # first live minute
+    _feed(db, "1m", [(m0, 101.0, 101.5, 99.5, 100.5)])  # fills
+    _feed(db, "1m", [(m0 + 60, 100.5, 101.0, 99.8, 100.2)])  # still forming: no stop yet
+    outcomes.run(now=m0 + 90)
+    assert outcomes.state()["covered_until"] == m0 + 60
+    (state, outcome), = db.connect().execute("SELECT state, outcome FROM plan_outcomes").fetchall()
+    assert state == OPEN and outcome is None
+
+    _feed(db, "1m", [(m0 + 60, 100.5, 101.0, 94.0, 94.5)])  # final version of that minute hits the stop
+    outcomes.run(now=m0 + 150)
+    assert outcomes.state()["covered_until"] == m0 + 60  # the minute just closed: still settling
+    outcomes.run(now=m0 + 120 + 61)
+    assert outcomes.state()["covered_until"] == m0 + 120
+    (state, outcome, exit_price), = db.connect().execute(
+        "SELECT state, outcome, exit_price FROM plan_outcomes").fetchall()
+    assert state == DONE and outcome == "stop" and exit_price == 95.0
@@ -0,0 +1,32 @@
+import numpy as np
+
+from app import robustness
+from app.evaluator import Metrics
+
+M = Metrics(0, 0.0, 0.0, 0.0, None, None, 1.0, 0.01)
+
+
+def _rets(n, seed):
+    return np.random.default_rng(seed).normal(0.002, 0.02, n).tolist()
+
+
+def test_points_of_different_length_share_relative_starts():
+    u = robustness._uniforms(7, 500, 80)
+    short, long_ = robustness._block_indices(40, 1, u), robustness._block_indices(80, 1, u)
+    assert np.array_equal(long_[:, :40] // 2, short)
+    w_short, w_long = robustness._window_indices(40, 0.5, u), robustness._window_indices(80, 0.5, u)
+    assert np.all(np.abs(w_long[:, 0] / 41 - w_short[:, 0] / 21) <= 1 / 21 + 1 / 41)  # floor error only
+
+
+def test_evaluate_many_matches_evaluate_alone():
+    points = [{"trade_rets": _rets(30, 1), "metrics": M}, {"trade_rets": _rets(120, 2), "metrics": M}]
+    for method in ("block", "window"):
+        together = robustness.evaluate_many(points, method=method, resamples=300, block=5, seed=3)
+        alone = [robustness.evaluate(p["trade_rets"], p["metrics"], method=method, resamples=300, block=5, seed=3)
+                 for p in points]
+        assert together == alone
+
+
+def test_too_few_trades():
+    assert robustness.evaluate_many([{"trade_rets": [0.01], "metrics": M}]) == [None]
+    assert robustness.evaluate_many([]) == []
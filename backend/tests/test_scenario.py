@@ -0,0 +1,65 @@
+import numpy as np
+
+from app import evaluator
+from app.scenario import probabilities
+from app.strategies import ATR, Indicators
+
+H = 3600
+
+
+def _history():
+    """A steady uptrend, then two down bars: one long connors_rsi2 signal, on the last bar."""
+    rows, c = [], 100.0
+    for k in range(300):
+        o, c = c, 100.0 + 0.5 * k
+        rows.append({"ts": k * H, "open": o, "high": max(o, c) + 0.3, "low": min(o, c) - 0.3, "close": c,
+                     "volume": 1.0})
+    for k in (300, 301):
+        o, c = c, c - 4.0
+        rows.append({"ts": k * H, "open": o, "high": o + 0.3, "low": c - 0.3, "close": c, "volume": 1.0})
+    return rows
+
+
+def _bar(k, o, h, l, c):
+    return {"ts": k * H, "open": o, "high": h, "low": l, "close": c, "volume": 1.0}
+
+
+def _compare(path):
+    rows = _history()
+    i = len(rows) - 1
+    assert evaluator.signal_bars(rows, "long") == [i]
+    atr = float(Indicators.from_rows(rows)[ATR][i])
+    rows += [_bar(i + 1 + j, *b) for j, b in enumerate(path)]
+    _, detail = evaluator.backtest_price_plan(rows, "long", "limit_atr", entry_k=1.0, stop_mult=1.0)
+
+    entry = rows[i + 1]["open"] - atr
+    stop = entry - atr
+    c0 = rows[i]["close"]
+    sim = {"close": c0, "high_rel": np.array([[b[1] / c0 for b in path]]),
+           "low_rel": np.array([[b[2] / c0 for b in path]])}
+    probs = probabilities(sim, "long", entry, stop, tp1=entry + 5 * atr, tp2=entry + 10 * atr)
+    return detail, probs
+
+
+def test_limit_entry_touched_only_after_the_next_bar_is_not_filled():
+    detail, probs = _compare([
+        (241.5, 243.0, 240.5, 242.8),  # next bar stays above the limit
+        (242.8, 243.0, 237.0, 237.5),  # touches entry and stop one bar late
+        (237.5, 237.8, 237.2, 237.5),
+        (237.5, 237.8, 237.2, 237.5),
+    ])
+    assert detail["fills"] == 0
+    assert probs["entry"] == 0.0 and probs["entry_next_bar"] == 0.0
+    assert probs["stop_before_tp1"] == 0.0 and probs["tp1"] == 0.0 and probs["tp2"] == 0.0
+
+
+def test_limit_entry_filled_on_the_next_bar_and_stopped():
+    detail, probs = _compare([
+        (241.5, 242.0, 239.5, 240.0),  # fills on the next bar
+        (240.0, 240.2, 237.0, 237.5),  # stop
+        (237.5, 237.8, 237.2, 237.5),
+        (237.5, 237.8, 237.2, 237.5),
+    ])
+    assert detail["fills"] == 1 and len(detail["trade_rets"]) == 1 and detail["trade_rets"][0] < 0
+    assert probs["entry"] == 1.0 and probs["entry_next_bar"] == 1.0
+    assert probs["stop_before_tp1"] == 1.0 and probs["tp1"] == 0.0
@@ -0,0 +1,46 @@
+import json
+import subprocess
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from app import serialize
+
+
+@dataclass
+class _Point:
+    ts: int
+    value: float
+
+
+class _Opaque:
+    def __init__(self):
+        self.secret = "internal"
+
+
+def test_dumps_numpy_dataclasses_and_sets():
+    out = json.loads(serialize.dumps({"a": np.float64(1.5), "b": np.arange(3), "p": _Point(1, 2.0), "s": {7}}))
+    assert out == {"a": 1.5, "b": [0, 1, 2], "p": {"ts": 1, "value": 2.0}, "s": [7]}
+
+
+def test_stdlib_fallback_matches(monkeypatch):
+    monkeypatch.setattr(serialize, "_USE_ORJSON", False)
+    out = json.loads(serialize.dumps({"p": _Point(1, float("nan")), "s": frozenset([1])}))
+    assert out == {"p": {"ts": 1, "value": None}, "s": [1]}
+
+
+@pytest.mark.parametrize("use_orjson", [False, True])
+def test_unknown_objects_raise(monkeypatch, use_orjson):
+    if use_orjson and serialize._orjson is None:
+        pytest.skip("orjson not installed")
+    monkeypatch.setattr(serialize, "_USE_ORJSON", use_orjson)
+    with pytest.raises(TypeError):
+        serialize.dumps({"x": _Opaque()})
+
+
+def test_db_layer_does_not_import_fastapi():
+    code = "import sys, app.db, app.serialize; sys.exit('fastapi' in sys.modules)"
+    assert subprocess.run([sys.executable, "-c", code], cwd=Path(__file__).resolve().parents[1]).returncode == 0
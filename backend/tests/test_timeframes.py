@@ -0,0 +1,31 @@
+from app import timeframes
+
+
+def test_unconfigured_timeframes_parse_without_growing_the_registry():
+    before = dict(timeframes._REGISTRY)
+    for minutes in range(1000, 3000):
+        assert timeframes.tf_key(str(minutes)) is not None
+    assert set(timeframes._REGISTRY) - set(before) <= {"1D"}  # 1440 minutes is a configured key
+    assert timeframes.tf_key("240") == "240m" and timeframes.tf_seconds("240m") == 14400
+    assert not timeframes.is_known("240m") and "240m" not in timeframes._REGISTRY
+
+
+def test_configured_timeframes_are_cached():
+    for key in timeframes.trade_timeframes() + timeframes.chart_timeframes() + timeframes.SOURCE_TIMEFRAMES:
+        assert timeframes.is_known(key)
+        assert timeframes.get(key) is timeframes.get(key)
+
+
+def test_webhook_rejects_unconfigured_timeframes(tmp_db):
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    client = TestClient(app)
+    body = {"timeframe": "7", "ts": 1_700_000_040, "open": 1.0, "high": 1.0, "low": 1.0, "close": 1.0}
+    r = client.post("/api/webhook/tradingview", json=body)
+    assert r.status_code == 400 and "unsupported timeframe" in r.json()["detail"]
+    assert tmp_db._tf_id("7m") is None
+    r = client.get("/api/candles", params={"tf": "7"})
+    assert r.status_code == 400
+    assert "7m" not in timeframes._REGISTRY
@@ -0,0 +1,91 @@
+import asyncio
+import threading
+
+from app.writebuf import WriteBuffer
+
+
+def _bar(c):
+    return (c, c, c, c, 1.0, None)
+
+
+class _FailOnce:
+    """write_batch that blocks the first flush until released, then fails it."""
+
+    def __init__(self):
+        self.calls = []
+        self.entered = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, batch):
+        self.calls.append({tf: dict(rows) for tf, rows in batch.items()})
+        if len(self.calls) == 1:
+            self.entered.set()
+            assert self.release.wait(5)
+            raise OSError("disk I/O error")
+
+
+def test_failed_flush_is_merged_under_newer_writes_and_retried():
+    writer = _FailOnce()
+    buf = WriteBuffer(writer, interval_sec=0.01, max_rows=100)
+    buf.start()
+    try:
+        first = buf.put("1m", 60, _bar(1.0))
+        buf.put("1m", 120, _bar(2.0))
+        assert writer.entered.wait(5)
+        # Written while the first batch is in flight: a newer version of ts 60 and a new bar.
+        second = buf.put("1m", 60, _bar(1.5))
+        buf.put("5m", 300, _bar(3.0))
+        assert second > first
+        writer.release.set()
+
+        assert buf.wait(first, timeout=5)
+        assert buf.wait(second, timeout=5)
+        assert len(writer.calls) == 2
+        assert writer.calls[1] == {"1m": {60: _bar(1.5), 120: _bar(2.0)}, "5m": {300: _bar(3.0)}}
+        state = buf.state()
+        assert state["errors"] == 1
+        assert state["pending"] == 0
+        assert state["rows"] == 3
+        assert buf.rows("1m", 0, 1000) == {}
+    finally:
+        writer.release.set()
+        buf.stop(timeout=5)
+
+
+def test_failed_flush_keeps_bars_readable_until_the_retry_commits():
+    writer = _FailOnce()
+    buf = WriteBuffer(writer, interval_sec=0.01, max_rows=100)
+    buf.start()
+    try:
+        batch = buf.put("1m", 60, _bar(1.0))
+        assert writer.entered.wait(5)
+        assert buf.rows("1m", 0, 1000) == {60: _bar(1.0)}
+        writer.release.set()
+        assert buf.wait(batch, timeout=5)
+        assert buf.rows("1m", 0, 1000) == {}
+    finally:
+        writer.release.set()
+        buf.stop(timeout=5)
+
+
+def test_async_waiter_of_a_failed_batch_is_released_by_the_retry():
+    writer = _FailOnce()
+    buf = WriteBuffer(writer, interval_sec=0.01, max_rows=100)
+    buf.start()
+
+    async def run():
+        batch = buf.put("1m", 60, _bar(1.0))
+        waiter = asyncio.ensure_future(buf.committed(batch))
+        assert await asyncio.get_running_loop().run_in_executor(None, writer.entered.wait, 5)
+        await asyncio.sleep(0.05)
+        assert not waiter.done()  # the failed flush must not release it
+        writer.release.set()
+        await asyncio.wait_for(waiter, 5)
+
+    try:
+        asyncio.run(run())
+        assert len(writer.calls) == 2
+        assert writer.calls[1] == {"1m": {60: _bar(1.0)}}
+    finally:
+        writer.release.set()
+        buf.stop(timeout=5)
@@ -7,15 +7,39 @@ THIS = Path(__file__).resolve()
 BACKEND_DIR = THIS.parents[1]
 sys.path.insert(0, str(BACKEND_DIR))
 
-from app import db  # noqa
-from app.indicators import sma_last, rsi_sma_last  # noqa
+import numpy as np  # noqa
 
-def backtest(tf: str):
-    rows = db.fetch_recent(tf, 1_000_000)
+from app import db, features, regime, strategies, timeframes  # noqa
+
+def backtest(tf: str, include_archive: bool = False, feature_names=(), feature_filter: str = "",
+             feature_sources=(), feature_max_age=None, strategy=None, regime_filter: str = ""):
+    if include_archive:
+        from app.retention import fetch_history
+        rows = fetch_history(tf)
+    else:
+        rows = db.fetch_recent(tf, 1_000_000)
     if len(rows) < 250:
         raise SystemExit("not enough data")
 
-    closes = [r["close"] for r in rows]
+    filters = features.parse_filters(feature_filter)
+    cols = features.rule_names(filters, []) + [n for n in feature_names if n not in {f[1] for f in filters}]
+    if cols:
+        rows = features.attach([dict(r) for r in rows], tf, cols,
+                               source_tfs=(tf,) + tuple(feature_sources), max_age_sec=feature_max_age)
+    entry_feats = []  # (feature values at entry, trade return)
+    blocked = 0
+
+    strat = strategies.get(strategy)
+    entry, exit_ = strategies.Indicators.from_rows(rows).signals(strat, "long")
+    # 1D regime in force at each bar close: one lookup for the whole series (app/regime.py)
+    ts = np.array([int(r["ts"]) for r in rows], dtype=np.int64)
+    bias = regime.load(include_archive=include_archive).bias_at(ts + timeframes.tf_seconds(tf))
+    skipped = 0
+    if regime_filter:
+        want = {"long_favored": 1, "short_favored": -1, "unknown": 0}[regime_filter]
+        skipped = int((entry & (bias != want)).sum())
+        entry = entry & (bias == want)
+    by_regime = {}  # bias code at entry -> [trades, wins, compounded return]
     position = 0
     entry_px = None
     eq = 1.0
@@ -23,41 +47,68 @@ def backtest(tf: str):
     wins = 0
 
     for i in range(len(rows)-1):
-        window = closes[:i+1]
-        sma200 = sma_last(window, 200)
-        sma5 = sma_last(window, 5)
-        rsi2 = rsi_sma_last(window, 2)
-
-        if sma200 is None or sma5 is None or rsi2 is None:
-            continue
-
-        close = float(rows[i]["close"])
         next_open = float(rows[i+1]["open"])
 
         if position == 0:
-            if close > sma200 and close < sma5 and rsi2 <= 5.0:
+            if entry[i]:
+                if filters and features.check_filters(filters, "long", rows[i]):
+                    blocked += 1
+                    continue
                 position = 1
                 entry_px = next_open
+                entry_bias = int(bias[i])
+                entry_vals = {n: rows[i][n] for n in cols}
         else:
-            if close > sma5:
+            if exit_[i]:
                 exit_px = next_open
                 ret = exit_px / entry_px - 1.0
                 eq *= (1.0 + ret)
                 trades += 1
                 if ret > 0:
                     wins += 1
+                st = by_regime.setdefault(entry_bias, [0, 0, 1.0])
+                st[0] += 1
+                st[1] += int(ret > 0)
+                st[2] *= 1.0 + ret
+                if cols:
+                    entry_feats.append((entry_vals, ret))
                 position = 0
                 entry_px = None
 
     win_rate = wins / trades if trades else 0
-    print(f"TF={tf} trades={trades} total_return={(eq-1)*100:.2f}% win_rate={win_rate*100:.2f}%")
+    print(f"TF={tf} strategy={strat.name} trades={trades} total_return={(eq-1)*100:.2f}% win_rate={win_rate*100:.2f}%")
+    if filters:
+        print(f"  feature filter blocked {blocked} entry signals")
+    if regime_filter:
+        print(f"  regime filter ({regime_filter}) skipped {skipped} entry signals")
+    for code in (1, -1, 0):
+        if code in by_regime:
+            n, w, g = by_regime[code]
+            print(f"  1D {regime.BIAS_NAMES[code]:14} trades={n} return={(g-1)*100:.2f}% win_rate={w/n*100:.2f}%")
+    for n in cols:
+        won = [v[n] for v, ret in entry_feats if ret > 0 and v[n] is not None]
+        lost = [v[n] for v, ret in entry_feats if ret <= 0 and v[n] is not None]
+        avg = lambda xs: f"{sum(xs) / len(xs):.4g}" if xs else "n/a"
+        print(f"  {n:24} at entry: winners avg={avg(won)} (n={len(won)})  losers avg={avg(lost)} (n={len(lost)})")
 
 def main():
     ap = argparse.ArgumentParser()
-    ap.add_argument("--tf", required=True, help="30m,60m,180m,1D")
+    ap.add_argument("--tf", required=True, help="30m,60m,180m,240m,1D")
+    ap.add_argument("--strategy", default=None, help="rule set from app/strategies.py (default: first of WONYODD_STRATEGIES)")
+    ap.add_argument("--include-archive", action="store_true", help="also read bars moved to the archive by retention")
+    ap.add_argument("--features", default="", help="feature-store columns to attach and report at entries (comma-separated)")
+    ap.add_argument("--feature-filter", default="", help='entry filter, same syntax as WONYODD_FEATURE_FILTERS e.g. "hy_spread<5"')
+    ap.add_argument("--feature-source-tfs", default="", help="fallback timeframes for feature values, e.g. 1D")
+    ap.add_argument("--feature-max-age-sec", type=float, default=None, help="treat older feature values as missing")
+    ap.add_argument("--regime", default="", choices=("", "long_favored", "short_favored", "unknown"),
+                    help="only take entries while the 1D regime bias is this")
     args = ap.parse_args()
     db.init_db()
-    backtest(args.tf)
+    from app.timeframes import parse_tf_list
+    names = [n for n in (features.feature_name(x) for x in args.features.split(",")) if n]
+    backtest(args.tf, include_archive=args.include_archive, feature_names=names, feature_filter=args.feature_filter,
+             feature_sources=parse_tf_list(args.feature_source_tfs), feature_max_age=args.feature_max_age_sec,
+             strategy=args.strategy, regime_filter=args.regime)
 
 if __name__ == "__main__":
     main()
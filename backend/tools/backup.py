@@ -0,0 +1,45 @@
+from __future__ import annotations
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# ensure backend/ is on sys.path
+THIS = Path(__file__).resolve()
+BACKEND_DIR = THIS.parents[1]
+sys.path.insert(0, str(BACKEND_DIR))
+
+from app import backup, db  # noqa
+
+def main():
+    ap = argparse.ArgumentParser(description="Online DB snapshots (SQLite backup API) and restore")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    snap = sub.add_parser("snapshot", help="copy the live DB without stopping ingestion")
+    snap.add_argument("--out", default=None, help="target file (default: timestamped file in WONYODD_BACKUP_DIR, rotated)")
+    snap.add_argument("--pages", type=int, default=backup.BACKUP_PAGES, help="pages copied per step")
+    snap.add_argument("--sleep", type=float, default=backup.BACKUP_SLEEP_SEC, help="pause between steps (seconds)")
+    sub.add_parser("list", help="snapshots in the backup directory")
+    ver = sub.add_parser("verify", help="quick_check a snapshot file")
+    ver.add_argument("path")
+    res = sub.add_parser("restore", help="replace the DB with a snapshot (stop the service first)")
+    res.add_argument("path")
+    res.add_argument("--no-keep-current", action="store_true", help="do not save the current DB before overwriting it")
+    args = ap.parse_args()
+
+    try:
+        if args.cmd == "snapshot":
+            db.init_db()
+            out = backup.snapshot(dest=args.out, pages=args.pages, sleep=args.sleep)
+        elif args.cmd == "list":
+            out = {"dir": str(backup.backup_dir()),
+                   "files": [{"name": p.name, "bytes": p.stat().st_size} for p in backup.list_backups()]}
+        elif args.cmd == "verify":
+            out = backup.verify(args.path)
+        else:
+            out = backup.restore(args.path, keep_current=not args.no_keep_current)
+    except (ValueError, RuntimeError) as e:
+        raise SystemExit(str(e))
+    print(json.dumps(out, indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Shared helpers for the tools/bench_*.py scripts.
+
+Import this BEFORE `app` when a throwaway database is wanted: app.config reads
+WONYODD_DB_PATH at import time.
+"""
+from __future__ import annotations
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+THIS = Path(__file__).resolve()
+BACKEND_DIR = THIS.parents[1]
+sys.path.insert(0, str(BACKEND_DIR))
+
+
+def use_temp_db(prefix: str = "wonyodd-bench-") -> Path:
+    """Point WONYODD_DB_PATH at a fresh temporary SQLite file."""
+    d = Path(tempfile.mkdtemp(prefix=prefix))
+    path = d / "bench.sqlite3"
+    os.environ["WONYODD_DB_PATH"] = str(path)
+    return path
+
+
+def synth_candles(n: int, step_sec: int, end_ts: int | None = None, seed: int = 7,
+                  start_price: float = 30000.0) -> List[Tuple[int, float, float, float, float, float]]:
+    """Random-walk OHLCV rows (ts, open, high, low, close, volume), ascending."""
+    rnd = random.Random(seed)
+    if end_ts is None:
+        end_ts = int(time.time())
+    end_ts -= end_ts % step_sec
+    ts0 = end_ts - (n - 1) * step_sec
+    out = []
+    px = start_price
+    for i in range(n):
+        o = px
+        c = max(1.0, o * (1.0 + rnd.gauss(0.0, 0.006)))
+        h = max(o, c) * (1.0 + abs(rnd.gauss(0.0, 0.002)))
+        l = min(o, c) * (1.0 - abs(rnd.gauss(0.0, 0.002)))
+        v = abs(rnd.gauss(1000.0, 300.0))
+        out.append((ts0 + i * step_sec, round(o, 2), round(h, 2), round(l, 2), round(c, 2), round(v, 3)))
+        px = c
+    return out
+
+
+def timed(fn: Callable[[], object], repeat: int = 5) -> Tuple[float, float]:
+    """Return (best, median) wall time in seconds over `repeat` runs."""
+    samples = []
+    for _ in range(max(1, repeat)):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return min(samples), statistics.median(samples)
+
+
+def fmt_ms(sec: float) -> str:
+    return f"{sec * 1000.0:9.3f} ms"
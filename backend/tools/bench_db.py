@@ -0,0 +1,127 @@
+from __future__ import annotations
+import argparse
+import sqlite3
+import time
+from pathlib import Path
+
+from bench_common import use_temp_db, synth_candles, timed, fmt_ms
+
+use_temp_db()
+
+from app import db, migrations  # noqa
+
+TFS = (("30m", 1800), ("60m", 3600), ("180m", 10800), ("1m", 60))
+
+# Statements equivalent to what db.upsert_candle()/db.fetch_recent() run on each layout.
+LEGACY = {
+    "upsert": [
+        """INSERT INTO candles(timeframe, ts, open, high, low, close, volume, features)
+             VALUES (?, ?, ?, ?, ?, ?, ?, NULL)
+             ON CONFLICT(timeframe, ts) DO UPDATE SET
+               open=excluded.open, high=excluded.high, low=excluded.low, close=excluded.close,
+               volume=excluded.volume, features=excluded.features""",
+    ],
+    "recent": """SELECT * FROM candles WHERE timeframe=? ORDER BY ts DESC LIMIT ?""",
+}
+CURRENT = {
+    "upsert": [
+        db._UPSERT_CANDLE_SQL,
+        """DELETE FROM candle_features WHERE tf_id=? AND ts=?""",
+    ],
+    "recent": f"""SELECT {db._OHLCV_COLS} FROM candles WHERE tf_id=? ORDER BY ts DESC LIMIT ?""",
+}
+
+
+def _open(path: Path, version: int) -> sqlite3.Connection:
+    conn = sqlite3.connect(str(path))
+    conn.executescript(db.PRAGMAS)
+    migrations.migrate(conn, target=version)
+    return conn
+
+
+def _key(conn: sqlite3.Connection, legacy: bool, tf: str):
+    if legacy:
+        return tf
+    conn.execute("INSERT OR IGNORE INTO timeframes(key) VALUES (?)", (tf,))
+    return conn.execute("SELECT id FROM timeframes WHERE key=?", (tf,)).fetchone()[0]
+
+
+def _bind(sql_list, key, r):
+    out = [(sql_list[0], (key,) + tuple(r))]
+    if len(sql_list) > 1:
+        out.append((sql_list[1], (key, r[0])))
+    return out
+
+
+def _db_bytes(conn: sqlite3.Connection) -> int:
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return conn.execute("PRAGMA page_count").fetchone()[0] * conn.execute("PRAGMA page_size").fetchone()[0]
+
+
+def run_layout(name: str, version: int, stmts, args) -> dict:
+    legacy = version == 1
+    path = Path(db.DB_PATH).with_name(f"{name}.sqlite3")
+    conn = _open(path, version)
+    data = {tf: synth_candles(args.rows, step) for tf, step in TFS}
+    keys = {tf: _key(conn, legacy, tf) for tf, _ in TFS}
+    conn.commit()
+
+    # bulk load: one transaction per timeframe
+    t0 = time.perf_counter()
+    for tf, rows in data.items():
+        conn.executemany(stmts["upsert"][0], [(keys[tf],) + r for r in rows])
+        conn.commit()
+    bulk = time.perf_counter() - t0
+    n_bulk = sum(len(r) for r in data.values())
+
+    # webhook path: one upsert + commit per bar (re-writes of existing bars)
+    single_rows = data["1m"][-args.single:]
+    t0 = time.perf_counter()
+    for r in single_rows:
+        for sql, params in _bind(stmts["upsert"], keys["1m"], r):
+            conn.execute(sql, params)
+        conn.commit()
+    single = time.perf_counter() - t0
+
+    recent = {}
+    for limit in args.limits:
+        recent[limit] = timed(lambda: conn.execute(stmts["recent"], (keys["30m"], limit)).fetchall(), args.repeat)
+    size = _db_bytes(conn)
+    conn.close()
+    return {"path": path, "bulk_rps": n_bulk / bulk, "single_rps": len(single_rows) / single,
+            "recent": recent, "bytes": size}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Compare the legacy (v1) and current candles layout")
+    ap.add_argument("--rows", type=int, default=50_000, help="bars per timeframe for the bulk load")
+    ap.add_argument("--single", type=int, default=2_000, help="single-row upserts (commit each)")
+    ap.add_argument("--limits", type=int, nargs="+", default=[260, 2000], help="fetch_recent limits")
+    ap.add_argument("--repeat", type=int, default=50)
+    args = ap.parse_args()
+
+    results = {
+        "legacy (schema v1)": run_layout("legacy", 1, LEGACY, args),
+        f"current (schema v{migrations.LATEST_VERSION})": run_layout("current", migrations.LATEST_VERSION, CURRENT, args),
+    }
+    for label, r in results.items():
+        print(f"== {label}")
+        print(f"  {'bulk insert':24}: {r['bulk_rps']:>12,.0f} rows/s")
+        print(f"  {'single upsert + commit':24}: {r['single_rps']:>12,.0f} rows/s")
+        for limit, (best, med) in r["recent"].items():
+            print(f"  {f'fetch_recent({limit})':24}: best {fmt_ms(best)}  median {fmt_ms(med)}")
+        print(f"  {'database size':24}: {r['bytes'] / 1e6:>12.2f} MB")
+
+    # Cost of upgrading an existing database in place.
+    conn = sqlite3.connect(str(results["legacy (schema v1)"]["path"]))
+    t0 = time.perf_counter()
+    migrations.migrate(conn)
+    elapsed = time.perf_counter() - t0
+    conn.execute("VACUUM")
+    print(f"== migrate v1 -> v{migrations.LATEST_VERSION} ({4 * args.rows} rows): {elapsed:.2f}s, "
+          f"{_db_bytes(conn) / 1e6:.2f} MB after VACUUM")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
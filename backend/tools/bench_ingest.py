@@ -0,0 +1,98 @@
+from __future__ import annotations
+import argparse
+import json
+import threading
+import time
+
+from bench_common import use_temp_db, synth_candles
+
+use_temp_db()
+
+from app import db, writebuf  # noqa
+
+# Candle ingest throughput with and without the write buffer (app/writebuf.py).
+# Every symbol is one sender thread posting its own 1m series; every 30th bar also
+# resamples a 30m bar (fetch_range + upsert), as the webhook does with
+# WONYODD_RESAMPLE_FROM_LOWER_TF. "off" commits each upsert; the buffered modes
+# group-commit and, except for "buffered", wait for their batch before the next bar.
+# This repo stores one instrument; a symbol here is just a separate series key.
+
+MODES = ("off", "full", "normal", "buffered")
+
+
+def _sender(key: str, bars, ack: bool, lat: list, errors: list) -> None:
+    buf = writebuf.active()
+    for i, (ts, o, h, l, c, v) in enumerate(bars):
+        t0 = time.perf_counter()
+        try:
+            db.upsert_candle(f"{key}:1m", ts, o, h, l, c, v)
+            if (i + 1) % 30 == 0:
+                rows = db.fetch_range(f"{key}:1m", ts - 29 * 60, ts)
+                db.upsert_candle(f"{key}:30m", ts - 29 * 60, rows[0]["open"], max(r["high"] for r in rows),
+                                 min(r["low"] for r in rows), rows[-1]["close"], sum(r["volume"] for r in rows))
+            if ack and buf is not None:
+                buf.wait(buf.batch_id())
+        except Exception as e:
+            errors.append(f"{type(e).__name__}: {e}")
+        lat.append(time.perf_counter() - t0)
+
+
+def run(mode: str, symbols: int, bars: int, interval_ms: float, max_rows: int, case: int) -> dict:
+    if mode != "off":
+        writebuf.DURABILITY = mode  # read by open_write_buffer() for PRAGMA synchronous
+        db.open_write_buffer(interval_ms=interval_ms, max_rows=max_rows)
+    series = synth_candles(bars, 60, end_ts=1_700_000_000 + bars * 60)
+    lat: list = []
+    errors: list = []
+    threads = [threading.Thread(target=_sender, args=(f"c{case}s{n}", series, mode in ("full", "normal"), lat, errors))
+               for n in range(symbols)]
+    t0 = time.perf_counter()
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    buf = writebuf.active()
+    db.close_write_buffer()
+    buf_state = buf.state() if buf is not None else None
+    elapsed = time.perf_counter() - t0  # includes the final flush
+    rows = symbols * (bars + bars // 30)
+    lat.sort()
+    return {
+        "mode": mode,
+        "symbols": symbols,
+        "rows": rows,
+        "elapsed_sec": round(elapsed, 3),
+        "rows_per_sec": round(rows / elapsed, 1),
+        "p50_ms": round(lat[len(lat) // 2] * 1000.0, 3),
+        "p99_ms": round(lat[min(len(lat) - 1, int(len(lat) * 0.99))] * 1000.0, 3),
+        "errors": len(errors),
+        "avg_batch": buf_state["avg_batch"] if buf_state else 1.0,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Ingest throughput: per-upsert commits vs group commit")
+    ap.add_argument("--symbols", default="1,10,100")
+    ap.add_argument("--bars", type=int, default=120, help="1m bars per symbol")
+    ap.add_argument("--modes", default=",".join(MODES))
+    ap.add_argument("--interval-ms", type=float, default=5.0)
+    ap.add_argument("--max-rows", type=int, default=500)
+    args = ap.parse_args()
+
+    db.init_db()
+    db.open_pool(8)
+    out = []
+    case = 0
+    for n in [int(x) for x in args.symbols.split(",") if x.strip()]:
+        for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+            case += 1
+            r = run(mode, n, args.bars, args.interval_ms, args.max_rows, case)
+            print(f"  {mode:9} symbols={n:<4} {r['rows_per_sec']:>9} rows/s  p50 {r['p50_ms']:>8} ms  "
+                  f"p99 {r['p99_ms']:>8} ms  batch {r['avg_batch']:>7}  errors {r['errors']}")
+            out.append(r)
+    db.close_pool()
+    print(json.dumps(out, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
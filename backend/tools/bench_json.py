@@ -0,0 +1,79 @@
+from __future__ import annotations
+import argparse
+
+from bench_common import use_temp_db, synth_candles, timed, fmt_ms
+
+use_temp_db()
+
+from fastapi.encoders import jsonable_encoder  # noqa
+from fastapi.responses import JSONResponse  # noqa
+
+from app import db  # noqa
+from app.recommend import recommend  # noqa
+from app.serialize import dumps, backend_name  # noqa
+
+
+def _seed(n_intra: int) -> None:
+    db.init_db()
+    for tf, step, n in (("30m", 1800, n_intra), ("60m", 3600, n_intra), ("180m", 10800, n_intra), ("1D", 86400, 400)):
+        db.upsert_candles_many(tf, synth_candles(n, step))
+
+
+def _candles_legacy(limit: int) -> dict:
+    rows = db.fetch_recent("30m", limit)
+    data = []
+    for r in rows:
+        data.append({
+            "ts": int(r["ts"]),
+            "open": float(r["open"]),
+            "high": float(r["high"]),
+            "low": float(r["low"]),
+            "close": float(r["close"]),
+            "volume": float(r["volume"]) if r["volume"] else 0.0
+        })
+    return {"ok": True, "timeframe": "30m", "data": data}
+
+
+def _candles_fast(limit: int) -> dict:
+    keys = ("ts", "open", "high", "low", "close", "volume")
+    data = [dict(zip(keys, r)) for r in db.fetch_recent_ohlcv("30m", limit)]
+    return {"ok": True, "timeframe": "30m", "data": data}
+
+
+def _report(name: str, payload: dict, repeat: int) -> None:
+    default_bytes = JSONResponse(jsonable_encoder(payload)).body
+    fast_bytes = dumps(payload)
+    b1, m1 = timed(lambda: JSONResponse(jsonable_encoder(payload)), repeat)
+    b2, m2 = timed(lambda: JSONResponse(payload), repeat)
+    b3, m3 = timed(lambda: dumps(payload), repeat)
+    print(f"== {name}")
+    print(f"  {'fastapi default (jsonable_encoder+json)':39}: best {fmt_ms(b1)}  median {fmt_ms(m1)}  {len(default_bytes):>9} bytes")
+    print(f"  {'JSONResponse (json only)':39}: best {fmt_ms(b2)}  median {fmt_ms(m2)}")
+    label = f"serialize.dumps [{backend_name()}]"
+    print(f"  {label:39}: best {fmt_ms(b3)}  median {fmt_ms(m3)}  {len(fast_bytes):>9} bytes")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Compare JSON encode time/size for hot API payloads")
+    ap.add_argument("--candles", type=int, default=5000, help="candle rows in the /api/candles payload")
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+
+    _seed(max(args.candles, 2500))
+
+    b_old, _ = timed(lambda: _candles_legacy(args.candles), args.repeat)
+    b_new, _ = timed(lambda: _candles_fast(args.candles), args.repeat)
+    print(f"== candles build ({args.candles} rows)")
+    print(f"  per-row float() dicts : best {fmt_ms(b_old)}")
+    print(f"  typed tuples + zip    : best {fmt_ms(b_new)}")
+
+    _report(f"/api/candles ({args.candles} rows)", _candles_fast(args.candles), args.repeat)
+    rec = recommend(side="long")
+    if not rec.get("ok"):
+        print(f"recommend failed: {rec.get('error')}")
+        return
+    _report("/api/recommend (full)", rec, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+from __future__ import annotations
+import argparse
+
+from bench_common import use_temp_db, synth_candles, timed, fmt_ms
+
+use_temp_db()
+
+from app import robustness  # noqa
+from app.evaluator import backtest_price_plan  # noqa
+from app.recommend import _grid_from_cfg  # noqa
+from app.config import ENTRY_K_GRID, STOP_MULT_GRID  # noqa
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Time the bootstrap robustness evaluation over the best-params grid")
+    ap.add_argument("--bars", type=int, default=3000, help="synthetic 30m bars to backtest")
+    ap.add_argument("--resamples", type=int, default=1000)
+    ap.add_argument("--block", type=int, default=5)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    keys = ("ts", "open", "high", "low", "close", "volume")
+    rows = [dict(zip(keys, r)) for r in synth_candles(args.bars, 1800)]
+    points = []
+    m, det = backtest_price_plan(rows, "long", "market", 0.0, 1.0)
+    points.append({"trade_rets": det["trade_rets"], "metrics": m})
+    for k in _grid_from_cfg(ENTRY_K_GRID):
+        for sm in _grid_from_cfg(STOP_MULT_GRID):
+            m, det = backtest_price_plan(rows, "long", "limit_atr", k, sm)
+            points.append({"trade_rets": det["trade_rets"], "metrics": m})
+    trades = [len(p["trade_rets"]) for p in points]
+    print(f"== {len(points)} grid points, trades per point min={min(trades)} max={max(trades)}")
+
+    for method in ("block", "window"):
+        best, med = timed(lambda: robustness.evaluate_many(
+            points, method=method, resamples=args.resamples, block=args.block), args.repeat)
+        print(f"  {method + f' x{args.resamples}':16}: best {fmt_ms(best)}  median {fmt_ms(med)}")
+
+
+if __name__ == "__main__":
+    main()
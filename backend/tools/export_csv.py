@@ -1,9 +1,7 @@
 from __future__ import annotations
 import argparse
-import csv
 import sys
-import os
-import datetime
+import time
 from pathlib import Path
 
 # ensure backend/ is on sys.path
@@ -11,11 +9,20 @@ THIS = Path(__file__).resolve()
 BACKEND_DIR = THIS.parents[1]
 sys.path.insert(0, str(BACKEND_DIR))
 
-from app import db  # noqa
+from app import db, export  # noqa
+from app.timeframes import parse_tf_list  # noqa
 
 def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--out-dir", default="./data/backup", help="directory to save csv files")
+    ap = argparse.ArgumentParser(description="Stream candles (+ feature-store columns) to CSV/Parquet files.")
+    ap.add_argument("--out-dir", default="./data/backup", help="directory to save export files")
+    ap.add_argument("--tf", default="", help="timeframes to export, comma-separated (default: all stored)")
+    ap.add_argument("--from", dest="start", default=None, help="first bar: epoch seconds or ISO date, e.g. 2024-01-01")
+    ap.add_argument("--to", dest="end", default=None, help="last bar (inclusive): epoch seconds or ISO date")
+    ap.add_argument("--format", default="csv", choices=export.FORMATS,
+                    help="csv | csv.gz | csv.zst (needs zstandard) | parquet (needs pyarrow)")
+    ap.add_argument("--features", default="all", help="feature columns: all | none | comma-separated names")
+    ap.add_argument("--include-archive", action="store_true", help="also export bars moved to the archive by retention")
+    ap.add_argument("--chunk-rows", type=int, default=export.EXPORT_CHUNK_ROWS, help="rows per read / row group")
     args = ap.parse_args()
 
     out_dir = Path(args.out_dir)
@@ -23,45 +30,28 @@ def main():
 
     db.init_db() # ensure connection logic works
 
-    # Get available timeframes
-    timeframes = db.timeframes_available()
-    print(f"Found timeframes: {timeframes}")
-
-    conn = db.connect()
-    try:
-        for tf in timeframes:
-            # Select all rows for this timeframe
-            cur = conn.execute("SELECT ts, open, high, low, close, volume FROM candles WHERE timeframe=? ORDER BY ts ASC", (tf,))
-            rows = cur.fetchall()
-            
-            if not rows:
-                continue
-
-            filename = f"candles_{tf}.csv"
-            filepath = out_dir / filename
-            
-            with open(filepath, "w", newline="", encoding="utf-8") as f:
-                writer = csv.writer(f)
-                writer.writerow(["time", "open", "high", "low", "close", "volume"])
-                
-                for row in rows:
-                    # Convert ts to ISO string
-                    dt = datetime.datetime.fromtimestamp(row["ts"], tz=datetime.timezone.utc)
-                    iso_time = dt.isoformat()
-                    
-                    writer.writerow([
-                        iso_time,
-                        row["open"],
-                        row["high"],
-                        row["low"],
-                        row["close"],
-                        row["volume"]
-                    ])
-            
-            print(f"Exported {len(rows)} rows to {filepath}")
-
-    finally:
-        conn.close()
+    timeframes = parse_tf_list(args.tf) if args.tf else db.timeframes_available()
+    print(f"Exporting timeframes: {timeframes}")
+    start_ts, end_ts = export.parse_time(args.start), export.parse_time(args.end)
+
+    for tf in timeframes:
+        names = export.feature_names(tf, args.features)
+        filepath = out_dir / f"candles_{tf}.{args.format}"
+        tmp = filepath.with_name(filepath.name + ".tmp")
+        t0 = time.time()
+        size = 0
+        try:
+            with open(tmp, "wb") as f:
+                for part in export.stream(tf, args.format, start_ts, end_ts, names,
+                                          include_archive=args.include_archive, chunk=args.chunk_rows):
+                    f.write(part)
+                    size += len(part)
+        except RuntimeError as e:
+            tmp.unlink(missing_ok=True)
+            raise SystemExit(str(e))
+        tmp.replace(filepath)
+        feat = f" + {len(names)} feature columns" if names else ""
+        print(f"Exported {tf}{feat} to {filepath} ({size / 1e6:.1f} MB, {time.time() - t0:.1f}s)")
 
 if __name__ == "__main__":
     main()
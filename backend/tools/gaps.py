@@ -0,0 +1,47 @@
+from __future__ import annotations
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# ensure backend/ is on sys.path
+THIS = Path(__file__).resolve()
+BACKEND_DIR = THIS.parents[1]
+sys.path.insert(0, str(BACKEND_DIR))
+
+from app import db, gaps  # noqa
+from app.timeframes import parse_tf_list  # noqa
+
+def main():
+    ap = argparse.ArgumentParser(description="Missing-bar index (candle_gaps) and backfill from lower timeframes")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("summary", help="gap count and missing bars per timeframe")
+    ls = sub.add_parser("list", help="gaps of one timeframe, newest first")
+    ls.add_argument("--tf", required=True)
+    ls.add_argument("--limit", type=int, default=50)
+    bf = sub.add_parser("backfill", help="rebuild missing trade-TF bars from stored lower-TF bars "
+                                         "(run after tools/import_csv.py loads the missing 1m data; a running "
+                                         "server picks the bars up within WONYODD_DATA_VERSION_POLL_SEC)")
+    bf.add_argument("--tf", default="", help="target timeframes, comma-separated (default: WONYODD_TRADE_TFS)")
+    bf.add_argument("--max-buckets", type=int, default=gaps.GAP_BACKFILL_MAX_BUCKETS, help="bars tried per timeframe")
+    sub.add_parser("rebuild", help="rescan every timeframe (the index is otherwise kept current on each write)")
+    args = ap.parse_args()
+
+    db.init_db()
+    if args.cmd == "summary":
+        out = gaps.summary()
+    elif args.cmd == "list":
+        out = gaps.list_gaps(args.tf, limit=args.limit)
+    elif args.cmd == "backfill":
+        out = gaps.backfill(parse_tf_list(args.tf) or None, max_buckets=args.max_buckets) or {}
+    else:
+        conn = db.connect()
+        try:
+            out = gaps.rebuild_all(conn)
+            conn.commit()
+        finally:
+            conn.close()
+    print(json.dumps(out, indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
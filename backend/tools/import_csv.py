@@ -1,6 +1,7 @@
 from __future__ import annotations
 import argparse
 import csv
+import math
 import sys
 from pathlib import Path
 from dateutil import parser as dtparser
@@ -10,7 +11,9 @@ THIS = Path(__file__).resolve()
 BACKEND_DIR = THIS.parents[1]
 sys.path.insert(0, str(BACKEND_DIR))
 
-from app import db  # noqa
+from app import db, features  # noqa
+from app.features import feature_name  # noqa
+from app.timeframes import tf_key  # noqa
 
 def parse_ts(s: str) -> int:
     s = (s or "").strip()
@@ -30,14 +33,21 @@ def parse_ts(s: str) -> int:
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--csv", required=True, help="path to OHLCV csv (must include time/open/high/low/close)")
-    ap.add_argument("--timeframe", required=True, help="1D,30m,60m,180m")
+    ap.add_argument("--timeframe", required=True, help="1D,30m,60m,180m,240m,1W (TradingView spellings like 240 or 4H also work)")
+    ap.add_argument("--features", default="all",
+                    help="extra columns to load into the feature store: all | none | comma-separated column names")
     args = ap.parse_args()
 
     path = args.csv
-    tf = args.timeframe
+    tf = tf_key(args.timeframe)
+    if tf is None:
+        raise SystemExit(f"unsupported timeframe: {args.timeframe}")
 
     db.init_db()
     n = 0
+    n_feat = 0
+    batch = []
+    feat_batch = []
     with open(path, "r", newline="", encoding="utf-8") as f:
         reader = csv.DictReader(f)
         if not reader.fieldnames:
@@ -49,6 +59,19 @@ def main():
             if r not in cols:
                 raise SystemExit(f"CSV missing column: {r}")
 
+        ohlcv = set(required) | {"volume"}
+        if args.features.strip().lower() == "none":
+            feat_cols = []
+        elif args.features.strip().lower() == "all":
+            feat_cols = [c for c in reader.fieldnames if c.lower() not in ohlcv]
+        else:
+            feat_cols = [c.strip() for c in args.features.split(",") if c.strip()]
+            unknown = [c for c in feat_cols if c not in reader.fieldnames]
+            if unknown:
+                raise SystemExit(f"CSV missing feature column(s): {unknown}")
+        feat_names = {c: feature_name(c) for c in feat_cols if feature_name(c)}
+        source = f"csv:{Path(path).name}"
+
         for row in reader:
             ts = parse_ts(row[cols["time"]])
             if ts == 0:
@@ -63,10 +86,28 @@ def main():
                     v = float(row[cols["volume"]])
                 except Exception:
                     v = None
-            db.upsert_candle(tf, ts, o, h, l, c, v, features=None)
-            n += 1
+            batch.append((ts, o, h, l, c, v))
+            if feat_names:
+                vals = {}
+                for col, name in feat_names.items():
+                    try:
+                        fv = float(row.get(col) or "nan")
+                    except ValueError:
+                        continue
+                    if math.isfinite(fv):
+                        vals[name] = fv
+                feat_batch.append((ts, vals))
+            if len(batch) >= 5000:
+                n += db.upsert_candles_many(tf, batch)
+                n_feat += features.store(tf, feat_batch, source=source)
+                batch = []
+                feat_batch = []
+    n += db.upsert_candles_many(tf, batch)
+    n_feat += features.store(tf, feat_batch, source=source)
 
     print(f"Imported {n} rows into timeframe={tf}")
+    if feat_names:
+        print(f"Stored {n_feat} feature values ({len(feat_names)} features: {', '.join(feat_names.values())})")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,50 @@
+from __future__ import annotations
+import argparse
+import csv
+import math
+import sys
+from pathlib import Path
+
+THIS = Path(__file__).resolve()
+BACKEND_DIR = THIS.parents[1]
+sys.path.insert(0, str(BACKEND_DIR))
+
+from app import db  # noqa
+from import_csv import parse_ts  # noqa
+
+TIME_COLS = ("time", "ts", "fundingtime", "funding_time", "timestamp")
+RATE_COLS = ("rate", "fundingrate", "funding_rate", "realizedrate")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Load perpetual funding rates (time, rate) into the funding_rates table")
+    ap.add_argument("--csv", required=True, help="csv with a time column (time/ts/fundingTime) and a rate column (rate/fundingRate)")
+    ap.add_argument("--percent", action="store_true", help="rates are in percent (0.01 = 0.01%%) instead of fractions")
+    args = ap.parse_args()
+
+    db.init_db()
+    rows = []
+    with open(args.csv, "r", newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        if not reader.fieldnames:
+            raise SystemExit("CSV has no header")
+        cols = {c.lower(): c for c in reader.fieldnames}
+        t_col = next((cols[c] for c in TIME_COLS if c in cols), None)
+        r_col = next((cols[c] for c in RATE_COLS if c in cols), None)
+        if t_col is None or r_col is None:
+            raise SystemExit(f"CSV needs one of {TIME_COLS} and one of {RATE_COLS}")
+        scale = 0.01 if args.percent else 1.0
+        for row in reader:
+            ts = parse_ts(row[t_col])
+            try:
+                rate = float(row[r_col]) * scale
+            except (TypeError, ValueError):
+                continue
+            if ts and math.isfinite(rate):
+                rows.append((ts, rate))
+    n = db.upsert_funding_many(rows)
+    print(f"Imported {n} funding rates")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+from __future__ import annotations
+import argparse
+import http.client
+import json
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+# Load generator for POST /api/webhook/tradingview (admission control, README 6-13).
+# Standard library only; run it against a local server with a scratch DB, e.g.
+#   WONYODD_DB_PATH=/tmp/load.sqlite3 uvicorn app.main:app --port 8000
+#   python tools/load_webhook.py --requests 2000 --concurrency 32 --partial 0.7 --probe /api/health
+#   python tools/load_webhook.py --requests 200 --storm 300 --secret s   # alert storm from one sender
+# Bar-close and partial-bar payloads are counted separately, so the report shows whether
+# closes keep getting through (and how fast) while partial updates are shed with 429.
+
+
+def _pct(samples: List[float], q: float) -> Optional[float]:
+    if not samples:
+        return None
+    s = sorted(samples)
+    return round(s[min(len(s) - 1, int(len(s) * q))] * 1000.0, 2)
+
+
+def _summary(lat: List[float]) -> Dict[str, Optional[float]]:
+    return {"p50_ms": _pct(lat, 0.50), "p99_ms": _pct(lat, 0.99), "max_ms": _pct(lat, 1.0)}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Concurrent webhook load with bar-close / partial-update mix")
+    ap.add_argument("--url", default="http://127.0.0.1:8000/api/webhook/tradingview")
+    ap.add_argument("--requests", type=int, default=1000)
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--partial", type=float, default=0.5, help="share of partial (still-open) bar updates")
+    ap.add_argument("--tf", default="1")
+    ap.add_argument("--secret", default="", help="sent as X-Webhook-Secret")
+    ap.add_argument("--senders", type=int, default=1, help="distinct secrets to spread over (separate rate buckets)")
+    ap.add_argument("--start-ts", type=int, default=1_700_000_000 - 1_700_000_000 % 60)
+    ap.add_argument("--probe", default="", help="GET path timed once per 100 ms during the run (e.g. /api/health)")
+    ap.add_argument("--storm", type=int, default=0,
+                    help="partial updates sent first, beyond the rate burst, so the closes that follow "
+                         "land on a drained bucket (use with --senders 1)")
+    args = ap.parse_args()
+
+    u = urlsplit(args.url)
+    host, port = u.hostname or "127.0.0.1", u.port or 80
+    step = 60 * (int(args.tf) if args.tf.isdigit() else 1)
+    rng = random.Random(7)
+    jobs = []
+    bar = 0
+    for i in range(args.storm + args.requests):
+        partial = i < args.storm or rng.random() < args.partial
+        if not partial:
+            bar += 1
+        px = 100.0 + rng.random()
+        body = {"timeframe": args.tf, "ts": args.start_ts + bar * step, "open": px, "high": px + 1, "low": px - 1,
+                "close": px, "volume": 1.0}
+        if partial:
+            body["barstate"] = "realtime"
+        else:
+            body["bar_close_confirmed"] = True
+        jobs.append(("partial" if partial else "close", json.dumps(body)))
+
+    lock = threading.Lock()
+    status: Dict[str, Counter] = {"close": Counter(), "partial": Counter()}
+    lat: Dict[str, List[float]] = {"close": [], "partial": []}
+    retry_after: Counter = Counter()
+    probe_lat: List[float] = []
+    idx = [0]
+    done = threading.Event()
+
+    def worker(n: int) -> None:
+        conn = http.client.HTTPConnection(host, port, timeout=30)
+        while True:
+            with lock:
+                if idx[0] >= len(jobs):
+                    break
+                i = idx[0]
+                idx[0] += 1
+            kind, body = jobs[i]
+            headers = {"Content-Type": "application/json"}
+            if args.secret:
+                headers["X-Webhook-Secret"] = args.secret if args.senders <= 1 else f"{args.secret}-{i % args.senders}"
+            t = time.perf_counter()
+            try:
+                conn.request("POST", u.path or "/", body=body, headers=headers)
+                resp = conn.getresponse()
+                resp.read()
+                code, ra = str(resp.status), resp.getheader("Retry-After")
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()
+                conn = http.client.HTTPConnection(host, port, timeout=30)
+                code, ra = type(e).__name__, None
+            dt = time.perf_counter() - t
+            with lock:
+                status[kind][code] += 1
+                if code == "200":
+                    lat[kind].append(dt)
+                if ra is not None:
+                    retry_after[ra] += 1
+        conn.close()
+
+    def prober() -> None:
+        conn = http.client.HTTPConnection(host, port, timeout=30)
+        while not done.wait(0.1):
+            t = time.perf_counter()
+            try:
+                conn.request("GET", args.probe)
+                conn.getresponse().read()
+                probe_lat.append(time.perf_counter() - t)
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection(host, port, timeout=30)
+        conn.close()
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(max(1, args.concurrency))]
+    probe = threading.Thread(target=prober) if args.probe else None
+    t0 = time.perf_counter()
+    if probe:
+        probe.start()
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    elapsed = time.perf_counter() - t0
+    done.set()
+    if probe:
+        probe.join()
+
+    out = {
+        "requests": len(jobs),
+        "concurrency": args.concurrency,
+        "elapsed_sec": round(elapsed, 3),
+        "req_per_sec": round(len(jobs) / elapsed, 1) if elapsed > 0 else None,
+        **{kind: {"status": dict(status[kind]), "ok_latency": _summary(lat[kind])} for kind in ("close", "partial")},
+        "retry_after": dict(retry_after),
+        # Closes are never rate limited; any 429 here came from a full or slow ingest queue.
+        "close_rejected": sum(n for code, n in status["close"].items() if code != "200"),
+    }
+    if probe:
+        out["probe"] = {"path": args.probe, "count": len(probe_lat), **_summary(probe_lat)}
+    print(json.dumps(out, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+from __future__ import annotations
+import argparse
+import csv
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+THIS = Path(__file__).resolve()
+BACKEND_DIR = THIS.parents[1]
+sys.path.insert(0, str(BACKEND_DIR))
+
+from app import costs, db, portfolio  # noqa
+from app.config import FUNDING_ENABLED  # noqa
+from app.timeframes import parse_tf_list  # noqa
+
+
+def _ts(s: str):
+    if not s:
+        return None
+    if s.isdigit():
+        return int(s)
+    return int(datetime.fromisoformat(s).replace(tzinfo=timezone.utc).timestamp())
+
+
+def _fmt_pct(x):
+    return "n/a" if x is None else f"{x * 100:.2f}%"
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Replay recommend() over history across trade timeframes (one position at a time)")
+    ap.add_argument("--side", default="long", choices=("long", "short"))
+    ap.add_argument("--tfs", default="", help="timeframes to choose from (default: WONYODD_TRADE_TFS)")
+    ap.add_argument("--start", default="", help="UTC date/ISO time or unix ts (default: first bar with 210 bars of history)")
+    ap.add_argument("--end", default="", help="UTC date/ISO time or unix ts (default: last bar)")
+    ap.add_argument("--refit-days", type=float, default=7.0, help="walk-forward refit interval for best params")
+    ap.add_argument("--maker-bps", type=float, default=None, help="override WONYODD_FEE_MAKER_BPS")
+    ap.add_argument("--taker-bps", type=float, default=None, help="override WONYODD_FEE_TAKER_BPS")
+    ap.add_argument("--slippage-bps", type=float, default=None, help="override WONYODD_SLIPPAGE_BPS")
+    ap.add_argument("--no-costs", action="store_true", help="gross returns (no fees, slippage or funding)")
+    ap.add_argument("--include-archive", action="store_true", help="also read bars moved to the archive by retention")
+    ap.add_argument("--equity-csv", default="", help="write the equity curve (ts,equity) to this file")
+    ap.add_argument("--trades-csv", default="", help="write the trade log to this file")
+    args = ap.parse_args()
+    db.init_db()
+
+    cost_model = None
+    if args.no_costs:
+        cost_model = costs.NO_COSTS
+    elif args.maker_bps is not None or args.taker_bps is not None or args.slippage_bps is not None:
+        base = costs.from_config()
+        cost_model = costs.CostModel(
+            maker_bps=base.maker_bps if args.maker_bps is None else args.maker_bps,
+            taker_bps=base.taker_bps if args.taker_bps is None else args.taker_bps,
+            slippage_bps=base.slippage_bps if args.slippage_bps is None else args.slippage_bps,
+            slippage_atr_frac=base.slippage_atr_frac, volume_scaled=base.volume_scaled,
+        )
+        if FUNDING_ENABLED:
+            cost_model = costs.with_funding(cost_model, 0, 2**62)
+
+    r = portfolio.simulate(args.side, tfs=parse_tf_list(args.tfs) or None, start_ts=_ts(args.start),
+                           end_ts=_ts(args.end), refit_days=args.refit_days, cost_model=cost_model,
+                           include_archive=args.include_archive)
+    if not r.get("ok"):
+        raise SystemExit(r.get("error"))
+
+    span = f"{datetime.fromtimestamp(r['start_ts'], timezone.utc):%Y-%m-%d} ~ {datetime.fromtimestamp(r['end_ts'], timezone.utc):%Y-%m-%d}"
+    print(f"{r['side'].upper()} {','.join(r['timeframes'])} {span}")
+    print(f"  total_return={_fmt_pct(r['total_return'])} mdd={_fmt_pct(r['mdd'])} trades={r['trades']} "
+          f"win_rate={_fmt_pct(r['win_rate'])} decisions={r['decisions']} refits={r['refits']} "
+          f"({r['elapsed_sec']['total']}s, fit {r['elapsed_sec']['fit']}s)")
+    c = r["costs"]
+    print(f"  costs: maker={c['maker_bps']:g}bps taker={c['taker_bps']:g}bps slippage={c['slippage_bps']:g}bps "
+          f"funding points={c['funding_points']}")
+    print(f"  {'tf':6} {'selected':>8} {'orders':>7} {'unfilled':>8} {'trades':>6} {'win':>8} {'return':>9} {'pnl share':>9} {'bars':>6}")
+    for tf, st in r["by_tf"].items():
+        print(f"  {tf:6} {st['decisions_selected']:>8} {st['orders']:>7} {st['unfilled']:>8} {st['trades']:>6} "
+              f"{_fmt_pct(st['win_rate']):>8} {_fmt_pct(st['return']):>9} {_fmt_pct(st['pnl_share']):>9} {st['bars_held']:>6}")
+
+    if args.equity_csv:
+        with open(args.equity_csv, "w", newline="") as f:
+            w = csv.writer(f)
+            w.writerow(["ts", "equity"])
+            w.writerows(r["equity"])
+        print(f"  equity curve -> {args.equity_csv}")
+    if args.trades_csv and r["trade_log"]:
+        with open(args.trades_csv, "w", newline="") as f:
+            w = csv.DictWriter(f, fieldnames=list(r["trade_log"][0].keys()))
+            w.writeheader()
+            w.writerows(r["trade_log"])
+        print(f"  trades -> {args.trades_csv}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+from __future__ import annotations
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# ensure backend/ is on sys.path
+THIS = Path(__file__).resolve()
+BACKEND_DIR = THIS.parents[1]
+sys.path.insert(0, str(BACKEND_DIR))
+
+from app import db  # noqa
+from app import retention  # noqa
+
+def main():
+    ap = argparse.ArgumentParser(description="Candles retention / archival / maintenance")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("stats", help="DB size and row counts per timeframe")
+    run = sub.add_parser("run", help="archive expired raw bars, checkpoint WAL, incremental vacuum")
+    run.add_argument("--now", type=int, default=None, help="pretend current unix time (testing)")
+    sub.add_parser("enable-incremental-vacuum", help="one-time VACUUM to switch an existing DB to auto_vacuum=INCREMENTAL")
+    args = ap.parse_args()
+
+    db.init_db()
+    if args.cmd == "stats":
+        out = retention.db_stats()
+    elif args.cmd == "run":
+        out = retention.run_maintenance(now=args.now)
+    else:
+        out = {"changed": retention.enable_incremental_vacuum()}
+    print(json.dumps(out, indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
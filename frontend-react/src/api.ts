@@ -12,6 +12,12 @@ export type Scenario = {
   tf_sec: number;
   path: { ts: number; value: number }[];
   levels: { entry: number; stop: number; tp1: number; tp2?: number };
+  // Bootstrap projection (absent when the timeframe has too little history)
+  bands?: Record<'p5' | 'p25' | 'p50' | 'p75' | 'p95', { ts: number; value: number }[]>;
+  probabilities?: { entry: number; entry_next_bar: number; tp1: number; stop_before_tp1: number; tp2?: number };
+  paths?: number;
+  bars?: number;
+  samples?: number;
 };
 
 export type RecommendResponse = {
@@ -26,6 +26,7 @@ export default function PriceChart({
   const chartRef = useRef<IChartApi | null>(null);
   const candleSeriesRef = useRef<ISeriesApi<'Candlestick'> | null>(null);
   const pathSeriesRef = useRef<ISeriesApi<'Line'> | null>(null);
+  const bandSeriesRef = useRef<ISeriesApi<'Line'>[]>([]);
   const sma5SeriesRef = useRef<ISeriesApi<'Line'> | null>(null);
   const sma200SeriesRef = useRef<ISeriesApi<'Line'> | null>(null);
   const priceLineCleanupRef = useRef<(() => void) | null>(null);
@@ -106,6 +107,14 @@ export default function PriceChart({
       lineWidth: 2,
       lineStyle: LineStyle.Dashed,
     });
+    // Scenario fan: p5/p95 (outer) and p25/p75 (inner) bands
+    const bandSeries = [1, 2, 2, 1].map((w) => chart.addLineSeries({
+      color: w === 1 ? 'rgba(138, 147, 169, 0.5)' : 'rgba(138, 147, 169, 0.8)',
+      lineWidth: w as 1 | 2,
+      lineStyle: LineStyle.Dotted,
+      priceLineVisible: false,
+      lastValueVisible: false,
+    }));
     const sma5Series = chart.addLineSeries({
       color: '#3f6bf6',
       lineWidth: 1,
@@ -119,6 +128,7 @@ export default function PriceChart({
     chartRef.current = chart;
     candleSeriesRef.current = candleSeries;
     pathSeriesRef.current = pathSeries;
+    bandSeriesRef.current = bandSeries;
     sma5SeriesRef.current = sma5Series;
     sma200SeriesRef.current = sma200Series;
 
@@ -138,6 +148,7 @@ export default function PriceChart({
       chartRef.current = null;
       candleSeriesRef.current = null;
       pathSeriesRef.current = null;
+      bandSeriesRef.current = [];
       sma5SeriesRef.current = null;
       sma200SeriesRef.current = null;
     };
@@ -166,7 +177,7 @@ export default function PriceChart({
     }
     if (candleData.length > 0) {
       const lastIndex = candleData.length - 1;
-      const futureBars = 10; // keep some right-side space for scenario points
+      const futureBars = 20; // keep some right-side space for scenario points
       const from = Math.max(0, lastIndex - Math.max(10, windowBars) + 1);
       const to = lastIndex + futureBars;
 
@@ -188,8 +199,10 @@ export default function PriceChart({
     const pathSeries = pathSeriesRef.current;
     if (!candleSeries || !pathSeries) return;
 
+    const bandSeries = bandSeriesRef.current;
     if (!scenario) {
       pathSeries.setData([]);
+      for (const s of bandSeries) s.setData([]);
       return;
     }
 
@@ -201,6 +214,13 @@ export default function PriceChart({
       })),
     );
 
+    // Projection bands (older backends send only the path)
+    const bandKeys = ['p5', 'p25', 'p75', 'p95'] as const;
+    bandSeries.forEach((s, i) => {
+      const pts = scenario.bands?.[bandKeys[i]] ?? [];
+      s.setData(pts.map((p) => ({ time: toTs(p.ts), value: p.value })));
+    });
+
     // Horizontal levels: Entry/Stop/TP1
     const lines = [
       { price: scenario.levels.entry, title: 'Entry' },
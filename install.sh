@@ -44,6 +44,9 @@ WONYODD_ENTRY_ATR_K_30=1.0
 WONYODD_ENTRY_ATR_K_60=0.25
 WONYODD_ENTRY_ATR_K_180=0.6
 WONYODD_STOP_ATR_MULT=1.5
+
+# Worker processes. >1 switches caches/leases/notification claims to shared SQLite state.
+WONYODD_WORKERS=1
 EOF
 fi
 
@@ -58,7 +61,7 @@ After=network.target
 Type=simple
 WorkingDirectory=$APP_DIR/backend
 EnvironmentFile=$APP_DIR/.env
-ExecStart=$APP_DIR/venv/bin/uvicorn app.main:app --host 0.0.0.0 --port $PORT
+ExecStart=/bin/sh -c 'exec $APP_DIR/venv/bin/uvicorn app.main:app --host 0.0.0.0 --port $PORT --workers "\$\${WONYODD_WORKERS:-1}"'
 Restart=always
 RestartSec=3
 User=$USER_NAME